@@ -4,6 +4,7 @@ Configurazione Celery centralizzata per evitare import circolari.
 import os
 from celery import Celery
 from celery.schedules import crontab # <-- Importa crontab
+from task_scheduler import get_celery_queue_config
 
 REDIS_URL = os.getenv('REDIS_URL', 'redis://localhost:6379/0')
 
@@ -22,6 +23,11 @@ celery_app.conf.update(
     worker_prefetch_multiplier=1,
 )
 
+# --- CODE DI INGESTIONE ---
+# Code separate per upload interattivi/scansioni bulk e documenti piccoli/grandi,
+# ognuna con i propri limiti di tempo (vedi task_scheduler.QUEUE_PROFILES)
+celery_app.conf.update(**get_celery_queue_config())
+
 # --- TASK PIANIFICATE (Beat Schedule) ---
 celery_app.conf.beat_schedule = {
     # La tua task di pulizia, eseguita ogni giorno alle 2:30 del mattino
@@ -1,10 +1,13 @@
 import os
 import sys
-from llama_index.core import Settings
-from llama_index.llms.ollama import Ollama
-from llama_index.embeddings.huggingface import HuggingFaceEmbedding
-from llama_index.core.node_parser import SemanticSplitterNodeParser
-from dotenv import load_dotenv
+import threading
+
+# LlamaIndex, Ollama, HuggingFace e dotenv si importano dentro le funzioni: importare
+# questo modulo non carica gli stack ML, che costano secondi a ogni avvio a freddo.
+_init_lock = threading.Lock()
+_services_ready = threading.Event()
+_init_thread = None
+_init_error = None
 
 def safe_print(msg: str):
     """Stampa un messaggio in modo sicuro senza causare errori di codifica."""
@@ -14,8 +17,56 @@ def safe_print(msg: str):
         enc = sys.stdout.encoding or 'utf-8'
         sys.stdout.buffer.write(msg.encode(enc, errors='replace') + b"\n")
 
-def initialize_services():
-    """Inizializza i servizi AI condivisi (LLM, embeddings, parser)."""
+def initialize_services(force: bool = False):
+    """
+    Inizializza i servizi AI condivisi (LLM, embeddings, parser) una volta
+    per processo: le chiamate successive (nuove sessioni Streamlit, ogni
+    task del worker) non ricaricano il modello di embedding.
+    """
+    global _init_error
+    with _init_lock:
+        if _services_ready.is_set() and not force:
+            return
+        try:
+            _initialize_services()
+        except Exception as e:
+            # Resta leggibile da chi attende in wait_for_services (il thread non la propaga)
+            _init_error = e
+            raise
+        _init_error = None
+        _services_ready.set()
+
+def start_services_in_background():
+    """Avvia initialize_services in un thread, così la UI si disegna senza attendere i modelli."""
+    global _init_thread
+    with _init_lock:
+        if _services_ready.is_set() or (_init_thread and _init_thread.is_alive()):
+            return
+        _init_thread = threading.Thread(target=initialize_services, name="services-init", daemon=True)
+        _init_thread.start()
+
+def wait_for_services(timeout=None) -> bool:
+    """Attende la fine dell'inizializzazione (avviandola se serve); False se scade o fallisce."""
+    start_services_in_background()
+    thread = _init_thread
+    if thread is not None:
+        thread.join(timeout)
+    return _services_ready.is_set()
+
+def services_ready() -> bool:
+    return _services_ready.is_set()
+
+def services_error():
+    """Errore dell'ultima inizializzazione fallita, o None."""
+    return _init_error
+
+def _initialize_services():
+    from dotenv import load_dotenv
+    from llama_index.core import Settings
+    from llama_index.llms.ollama import Ollama
+    from llama_index.embeddings.huggingface import HuggingFaceEmbedding
+    from llama_index.core.node_parser import SemanticSplitterNodeParser
+
     safe_print("Inizializzazione dei servizi AI condivisi...")
 
     # --- NUOVO: Caricamento robusto del file .env ---
@@ -99,7 +150,8 @@ def initialize_services():
         safe_print(f"❌ Errore caricamento embedding: {e}")
         Settings.embed_model = None
 
-    # Configurazione Node parser (invariato)
+    # Configurazione Node parser (l'indicizzazione in archivista_processing usa embedding_chunker,
+    # che riusa gli embedding di frase dello split per i chunk)
     if Settings.embed_model:
         Settings.node_parser = SemanticSplitterNodeParser.from_defaults(embed_model=Settings.embed_model)
         safe_print("✅ Parser semantico configurato.")
@@ -113,6 +165,7 @@ def get_chat_llm():
     """Restituisce un LLM per la chat basato su Ollama."""
     ollama_base_url = os.getenv('OLLAMA_BASE_URL', 'http://localhost:11434')
     try:
+        from llama_index.llms.ollama import Ollama
         # Usa un modello diverso/multimodale per la chat se necessario
         return Ollama(model="llava-llama3", request_timeout=300.0, base_url=ollama_base_url)
     except Exception:
@@ -3,13 +3,12 @@ import os
 import time
 import json
 import sqlite3
-import pandas as pd
 from datetime import datetime
 
 # Import delle funzionalità condivise
-from config import initialize_services, get_chat_llm
+from config import start_services_in_background, get_chat_llm
 from file_utils import (
-    setup_database, get_papers_dataframe, update_paper_metadata,
+    setup_database, get_papers_overview, update_paper_metadata,
     get_today_planned_sessions, generate_study_schedule, get_study_insights,
     get_user_tasks, get_user_courses, get_course_lectures, implement_generated_schedule,
     record_user_activity, get_dashboard_data, check_first_time_user, mark_user_not_new,
@@ -40,8 +39,8 @@ os.makedirs(DOCS_TO_PROCESS_DIR, exist_ok=True)
 
 # Blocco di inizializzazione eseguito una sola volta per sessione
 if 'initialized' not in st.session_state:
-    # Inizializza i servizi LLM e di embedding
-    initialize_services()
+    # Inizializza i servizi LLM e di embedding in background: la pagina si disegna subito
+    start_services_in_background()
     # Configura il database dei metadati
     setup_database()
 
@@ -72,13 +71,21 @@ def add_log_message(message):
     if len(st.session_state.log_messages) > 5:
         st.session_state.log_messages.pop()
 
-def scan_and_process_documents(files_to_process=None):
+def scan_and_process_documents(files_to_process=None, origin=None, allow_duplicate=False):
     """
     Scansiona la cartella di input o processa una lista specifica di file
     inviandoli al worker Celery.
+
+    I file indicati esplicitamente (upload dalla UI) vanno sulle code interattive,
+    la scansione della cartella sulle code bulk a priorità più bassa.
+    allow_duplicate salta il controllo dei quasi-duplicati (file segnalati per errore).
     """
     try:
         from archivista_processing import process_document_task
+        from task_scheduler import enqueue_document, ORIGIN_INTERACTIVE, ORIGIN_BULK
+
+        if origin is None:
+            origin = ORIGIN_BULK if files_to_process is None else ORIGIN_INTERACTIVE
 
         if files_to_process is None:
             supported_extensions = ['.pdf', '.docx', '.rtf', '.html', '.htm', '.txt']
@@ -89,12 +96,16 @@ def scan_and_process_documents(files_to_process=None):
 
         add_log_message(f"Trovati {len(files_to_process)} documenti.")
 
+        # I file caricati dalla UI aggiornano i suggerimenti di chi li ha caricati
+        uploader_id = st.session_state.get('user_id') if origin == ORIGIN_INTERACTIVE else None
+
         sent_tasks = 0
         for file_name in files_to_process:
             file_path = os.path.join(DOCS_TO_PROCESS_DIR, file_name)
             if os.path.exists(file_path):
                 try:
-                    process_document_task.delay(file_path)
+                    enqueue_document(process_document_task, file_path, origin, user_id=uploader_id,
+                                     allow_duplicate=allow_duplicate)
                     add_log_message(f"Inviato per processamento: {file_name}")
                     sent_tasks += 1
                 except Exception as e:
@@ -250,10 +261,14 @@ def render_navigation_sidebar():
                 show_enhanced_academic_upload_form(st.session_state['user_id'], uploaded_files)
             else:
                 # Simple upload for non-logged users
+                allow_duplicate = st.checkbox(
+                    "Carica anche se simile a un documento esistente",
+                    help="Salta il controllo dei quasi-duplicati (es. nuova edizione segnalata per errore come copia)"
+                )
                 if st.button("🚀 Carica Documenti", type="primary", use_container_width=True):
                     saved_files = save_uploaded_files(uploaded_files)
                     if saved_files:
-                        scan_and_process_documents(files_to_process=saved_files)
+                        scan_and_process_documents(files_to_process=saved_files, allow_duplicate=allow_duplicate)
                         st.rerun()
         else:
             # Show upload tips when no files selected
@@ -520,20 +535,20 @@ def main():
         st.markdown("### 📊 Statistiche Rapide")
 
         try:
-            papers_df = get_papers_dataframe()
+            overview = get_papers_overview()
             courses = get_user_courses(user_id)
             tasks = get_user_tasks(user_id)
 
             col1, col2 = st.columns(2)
 
             with col1:
-                st.metric("📚 Documenti", len(papers_df))
+                st.metric("📚 Documenti", overview['documents'])
                 st.metric("🎓 Corsi Attivi", len(courses))
 
             with col2:
                 completed_tasks = len([t for t in tasks if t['status'] == 'completed'])
                 st.metric("✅ Task Completati", f"{completed_tasks}/{len(tasks)}")
-                st.metric("🤖 AI Processed", len(papers_df[papers_df['formatted_preview'].notna()]))
+                st.metric("🤖 AI Processed", overview['ai_processed'])
 
         except Exception as e:
             st.error(f"Errore nel caricamento statistiche: {e}")
@@ -587,19 +602,17 @@ def show_welcome_dashboard():
 
     # Statistiche dell'applicazione
     st.divider()
-    papers_df = get_papers_dataframe()
+    overview = get_papers_overview()
 
-    if not papers_df.empty:
+    if overview['documents']:
         col1, col2, col3 = st.columns(3)
 
         with col1:
-            st.metric("📚 Documenti Indicizzati", len(papers_df))
+            st.metric("📚 Documenti Indicizzati", overview['documents'])
         with col2:
-            categories = papers_df['category_id'].nunique()
-            st.metric("📂 Categorie", categories)
+            st.metric("📂 Categorie", overview['categories'])
         with col3:
-            processed = len(papers_df[papers_df['formatted_preview'].notna()])
-            st.metric("🤖 Elaborati dall'AI", processed)
+            st.metric("🤖 Elaborati dall'AI", overview['ai_processed'])
 
 def show_academic_upload_form(user_id):
     """Form di upload accademico semplificato e intelligente"""
@@ -1009,6 +1022,11 @@ def show_enhanced_academic_upload_form(user_id: str, uploaded_files: list):
             }.get(x, x.title().replace('_', ' '))
         )
 
+        allow_duplicate = st.checkbox(
+            "Carica anche se simile a un documento esistente",
+            help="Salta il controllo dei quasi-duplicati (es. nuova edizione segnalata per errore come copia)"
+        )
+
         # Pulsante di caricamento finale
         submit_button = st.form_submit_button("🚀 Carica e Processa Documenti", type="primary", use_container_width=True)
 
@@ -1085,8 +1103,9 @@ def show_enhanced_academic_upload_form(user_id: str, uploaded_files: list):
                     add_log_message(f"Errore associazione {file_name}: {e}")
                     st.warning(f"Errore associazione {file_name}: {e}")
 
-            # Avvía processamento
-            scan_and_process_documents(files_to_process=saved_files)
+            # Avvía processamento sulle code interattive (priorità sulle scansioni in background)
+            scan_and_process_documents(files_to_process=saved_files, origin="interactive",
+                                       allow_duplicate=allow_duplicate)
 
             # Mostra risultati
             st.success(f"✅ {len(saved_files)} documenti caricati con successo!")
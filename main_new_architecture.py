@@ -8,17 +8,19 @@ import streamlit as st
 import os
 import time
 import json
-import pandas as pd
 from datetime import datetime
-from llama_index.core import Settings, StorageContext, load_index_from_storage
-from llama_index.core.vector_stores import MetadataFilters, ExactMatchFilter
 
-from config import initialize_services, get_chat_llm
+from config import start_services_in_background, wait_for_services, services_error, get_chat_llm
+from lazy_imports import lazy_import
 from file_utils import setup_database, get_papers_dataframe, update_paper_metadata, delete_paper
 import knowledge_structure
 
+# pandas serve solo alle statistiche: non rallenta il primo rendering
+pd = lazy_import("pandas")
+
 # --- CONFIGURATION ---
 DB_STORAGE_DIR = "db_memoria"
+SERVICES_TIMEOUT_SECONDS = 120  # attesa massima dei servizi AI al primo messaggio
 DOCS_TO_PROCESS_DIR = "documenti_da_processare"
 ARCHIVISTA_STATUS_FILE = os.path.join(DB_STORAGE_DIR, "archivista_status.json")
 
@@ -31,7 +33,8 @@ os.makedirs(DOCS_TO_PROCESS_DIR, exist_ok=True)
 
 # Initialize session state
 if 'initialized' not in st.session_state:
-    initialize_services()
+    # LLM ed embedding si caricano in background; la chat li attende al primo messaggio
+    start_services_in_background()
     setup_database()
 
     st.session_state.initialized = True
@@ -91,10 +94,18 @@ def display_temporary_notifications():
         else:
             del st.session_state.temp_notification
 
-def scan_and_process_documents(files_to_process=None):
-    """Scan and process documents with Celery."""
+def scan_and_process_documents(files_to_process=None, origin=None, allow_duplicate=False):
+    """
+    Scan and process documents with Celery (uploads go to the interactive queues).
+
+    allow_duplicate skips the near-duplicate check, for files wrongly flagged as copies.
+    """
     try:
         from archivista_processing import process_document_task
+        from task_scheduler import enqueue_document, ORIGIN_INTERACTIVE, ORIGIN_BULK
+
+        if origin is None:
+            origin = ORIGIN_BULK if files_to_process is None else ORIGIN_INTERACTIVE
 
         if files_to_process is None:
             supported_extensions = ['.pdf', '.docx', '.rtf', '.html', '.htm', '.txt', '.pptx']
@@ -105,12 +116,15 @@ def scan_and_process_documents(files_to_process=None):
 
         add_log_message(f"Trovati {len(files_to_process)} documenti.")
 
+        uploader_id = st.session_state.get('user_id') if origin == ORIGIN_INTERACTIVE else None
+
         sent_tasks = 0
         for file_name in files_to_process:
             file_path = os.path.join(DOCS_TO_PROCESS_DIR, file_name)
             if os.path.exists(file_path):
                 try:
-                    process_document_task.delay(file_path)
+                    enqueue_document(process_document_task, file_path, origin, user_id=uploader_id,
+                                     allow_duplicate=allow_duplicate)
                     add_log_message(f"Inviato per processamento: {file_name}")
                     sent_tasks += 1
                 except Exception as e:
@@ -198,6 +212,10 @@ def render_navigation_sidebar():
             type=['pdf', 'docx', 'txt', 'rtf', 'html', 'htm', 'pptx'],
             label_visibility="collapsed"
         )
+        allow_duplicate = st.checkbox(
+            "Carica anche se simile a un documento esistente",
+            help="Salta il controllo dei quasi-duplicati (es. nuova edizione segnalata per errore come copia)"
+        )
 
         if uploaded_files:
             saved_files = []
@@ -208,7 +226,7 @@ def render_navigation_sidebar():
                 saved_files.append(uploaded_file.name)
             if saved_files:
                 add_log_message(f"Caricati {len(saved_files)} file.")
-                scan_and_process_documents(files_to_process=saved_files)
+                scan_and_process_documents(files_to_process=saved_files, allow_duplicate=allow_duplicate)
                 st.rerun()
 
         if st.button("🔍 Controlla Nuovi File", use_container_width=True):
@@ -313,6 +331,12 @@ def render_chat_view():
             with st.chat_message("assistant"):
                 with st.spinner("🤔 L'AI sta pensando..."):
                     try:
+                        from llama_index.core import Settings, StorageContext, load_index_from_storage
+                        from llama_index.core.vector_stores import MetadataFilters, ExactMatchFilter
+                        if not wait_for_services(SERVICES_TIMEOUT_SECONDS):
+                            reason = services_error() or "inizializzazione non completata in tempo"
+                            raise ConnectionError(f"Servizi AI non disponibili ({reason}). Riprova tra poco.")
+
                         # Setup filters
                         filters = None
                         if selected_doc_title != "Tutti i documenti":
@@ -19,7 +19,7 @@ Tab Funzionali:
 
 import streamlit as st
 import pandas as pd
-from scripts.utilities.file_utils import get_archive_tree, get_papers_dataframe
+from scripts.utilities.file_utils import get_archive_tree, get_papers_dataframe, get_papers_overview
 import os
 
 # Import UX components for improved user experience
@@ -43,8 +43,7 @@ def main():
 
     # Check if archive is empty and show contextual help
     try:
-        papers_df = get_papers_dataframe()
-        if papers_df.empty:
+        if get_papers_overview()['documents'] == 0:
             show_contextual_help("empty_archive")
     except:
         pass
@@ -611,7 +610,10 @@ def render_batch_operations_view():
     st.info("🔧 **Tab Operazioni Batch**: Modifiche massive sicure e validate")
 
     try:
-        from batch_operations import get_available_operations, create_batch_operation, get_batch_preview, execute_batch_operation
+        from batch_operations import (
+            get_available_operations, create_batch_operation, get_batch_preview, execute_batch_operation,
+            count_batch_changes, get_batch_history, undo_batch_operation
+        )
 
         papers_df = get_papers_dataframe()
         if papers_df.empty:
@@ -707,7 +709,7 @@ def render_batch_operations_view():
                             use_container_width=True,
                             hide_index=True
                         )
-                        st.info(f"📊 Anteprima mostra primi 10 documenti. Saranno modificati **{len(selected_files)}** documenti totali.")
+                        st.info(f"📊 Anteprima mostra primi 10 documenti. Saranno modificati **{count_batch_changes(batch_op)}** documenti totali.")
                     else:
                         st.warning("⚠️ Impossibile generare anteprima")
 
@@ -728,8 +730,7 @@ def render_batch_operations_view():
 
                         if success:
                             st.success(f"✅ Operazione completata! **{affected_count}** documenti aggiornati.")
-                            # Ricarica dati
-                            papers_df = get_papers_dataframe()
+                            # La modifica di papers ha già invalidato la cache: il rerun legge i dati nuovi
                             st.rerun()
                         else:
                             st.error(f"❌ Operazione fallita: {message}")
@@ -739,6 +740,18 @@ def render_batch_operations_view():
         else:
             st.info("💡 Seleziona almeno un documento per iniziare")
 
+        # --- ANNULLA ULTIMA OPERAZIONE ---
+        history = get_batch_history(limit=1)
+        if history and not history[0]['undone_at']:
+            last_operation = history[0]
+            if st.button(f"↩️ Annulla ultima operazione ({last_operation['affected_count']} documenti)", key="undo_batch_operation"):
+                success, message, _ = undo_batch_operation(last_operation['id'])
+                if success:
+                    st.success(f"✅ {message}")
+                    st.rerun()
+                else:
+                    st.error(f"❌ {message}")
+
     except ImportError:
         st.error("❌ Modulo batch_operations non disponibile")
     except Exception as e:
@@ -3,7 +3,7 @@ import pandas as pd
 import json
 import networkx as nx
 from streamlit.components.v1 import html
-from scripts.utilities.file_utils import get_user_knowledge_graph, get_entity_neighbors, get_entities_by_confidence, get_relationships_by_confidence, get_confidence_statistics
+from scripts.utilities.file_utils import get_user_knowledge_graph, get_knowledge_graph_engine, get_influential_entities, get_entity_neighbors, get_entities_by_confidence, get_relationships_by_confidence, get_confidence_statistics
 # Import delle funzioni Bayesian per la visualizzazione della confidenza
 from tools.knowledge_structure import (
     get_confidence_color,
@@ -81,12 +81,10 @@ st.title("🧠 Grafo della Conoscenza")
 st.markdown(f"**Benvenuto, {username}!** Esplora le connessioni concettuali estratte dai tuoi documenti accademici.")
 
 # --- LOAD KNOWLEDGE GRAPH ---
-@st.cache_data(ttl=300)  # Cache for 5 minutes
-def load_knowledge_graph(user_id):
-    """Load knowledge graph with caching for performance"""
-    return get_user_knowledge_graph(user_id)
-
-graph_data = load_knowledge_graph(user_id)
+# In cache per versione del grafo dell'utente: si ricarica solo quando cambiano entità o relazioni
+graph_data = get_user_knowledge_graph(user_id)
+# Grafo CSR per conteggi e filtri vettoriali (aggiornato in modo incrementale)
+graph_engine = get_knowledge_graph_engine(user_id)
 
 # --- SIDEBAR CONTROLS ---
 st.sidebar.header("🔍 Controlli Grafo")
@@ -163,22 +161,19 @@ if not graph_data['entities']:
 else:
     # Statistics
     col1, col2, col3, col4 = st.columns(4)
+    graph_summary = graph_engine.summary()
 
     with col1:
-        entities_count = len(graph_data['entities'])
-        st.metric("🔵 Entità", entities_count)
+        st.metric("🔵 Entità", graph_summary['entities'])
 
     with col2:
-        relationships_count = len(graph_data['relationships'])
-        st.metric("🔗 Relazioni", relationships_count)
+        st.metric("🔗 Relazioni", graph_summary['relationships'])
 
     with col3:
-        entity_types = len(set([e['entity_type'] for e in graph_data['entities']]))
-        st.metric("🏷️ Tipi Entità", entity_types)
+        st.metric("🏷️ Tipi Entità", graph_summary['entity_types'])
 
     with col4:
-        sources_count = len(set([e['source_file_name'] for e in graph_data['entities']]))
-        st.metric("📄 Documenti Sorgente", sources_count)
+        st.metric("📄 Documenti Sorgente", graph_summary['sources'])
 
     # Bayesian Confidence Statistics
     if show_confidence_stats:
@@ -261,7 +256,8 @@ else:
         with col1:
             st.info(f"🔍 **Filtro Attivo**: Confidenza ≥ {min_confidence:.1%}")
         with col2:
-            st.info(f"📊 **Risultati**: {len(filtered_entities)} entità, {len(filtered_relationships)} relazioni")
+            filtered_summary = graph_engine.summary(min_confidence)
+            st.info(f"📊 **Risultati**: {filtered_summary['entities']} entità, {filtered_summary['relationships']} relazioni")
 
     # Filter entities by type (applied after confidence filtering)
     if selected_entity_type != "All":
@@ -427,44 +423,19 @@ else:
         if filtered_relationships:
             st.subheader("🌟 Entità più Influenti")
 
-            entity_connections = {}
-            entity_confidence_sum = {}
-
-            for rel in filtered_relationships:
-                source_name = rel['source_name']
-                target_name = rel['target_name']
-                rel_confidence = rel.get('confidence_score', 0.5)
-
-                # Weighted connections by confidence
-                entity_connections[source_name] = entity_connections.get(source_name, 0) + rel_confidence
-                entity_connections[target_name] = entity_connections.get(target_name, 0) + rel_confidence
-
-                # Sum confidence for averaging
-                if source_name not in entity_confidence_sum:
-                    entity_confidence_sum[source_name] = []
-                if target_name not in entity_confidence_sum:
-                    entity_confidence_sum[target_name] = []
-
-                entity_confidence_sum[source_name].append(rel_confidence)
-                entity_confidence_sum[target_name].append(rel_confidence)
-
-            # Calculate most influential entities (connections weighted by confidence)
-            influential_entities = []
-            for entity_name, total_weight in entity_connections.items():
-                avg_confidence = sum(entity_confidence_sum[entity_name]) / len(entity_confidence_sum[entity_name])
-                influential_entities.append((entity_name, total_weight, avg_confidence))
-
-            influential_entities.sort(key=lambda x: x[1], reverse=True)
+            # Classifica precalcolata per versione del grafo (tools.graph_centrality)
+            influential_entities = get_influential_entities(
+                user_id, k=10, min_confidence=min_confidence,
+                entity_type=None if selected_entity_type == "All" else selected_entity_type
+            )
 
             if influential_entities:
                 st.write("**🎯 Entità più influenti (ponderate per confidenza):**")
 
-                for entity_name, influence_score, avg_confidence in influential_entities[:10]:
-                    entity_info = next((e for e in filtered_entities if e['entity_name'] == entity_name), None)
-                    if entity_info:
-                        confidence_emoji = get_confidence_emoji(avg_confidence)
-                        st.write(f"• **{entity_name}** {confidence_emoji} - Influenza: {influence_score:.2f}")
-                        st.caption(f"  Tipo: {entity_info['entity_type']} | Confidenza media: {avg_confidence:.2f}")
+                for entity in influential_entities:
+                    confidence_emoji = get_confidence_emoji(entity['avg_confidence'])
+                    st.write(f"• **{entity['entity_name']}** {confidence_emoji} - Influenza: {entity['score']:.2f}")
+                    st.caption(f"  Tipo: {entity['entity_type']} | Confidenza media: {entity['avg_confidence']:.2f} | PageRank: {entity['pagerank']:.3f}")
     else:
         st.info("🔍 **Nessuna relazione trovata con i filtri attuali.** Prova ad abbassare la confidenza minima o carica più documenti!")
 
@@ -8,13 +8,443 @@ import os
 import sys
 import shutil
 import logging
+import hashlib
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from typing import Dict, List, Optional
 from datetime import datetime, timedelta
 import json
 import tarfile
 import sqlite3
+import zlib
 from pathlib import Path
 
+try:
+    import zstandard
+except ImportError:  # senza zstandard si ripiega su gzip
+    zstandard = None
+
+# --- CONFIGURAZIONE BACKUP ONLINE ---
+CHUNK_SIZE = 4 * 1024 * 1024         # blocchi dello store content-addressed
+SQLITE_BACKUP_PAGES = 1024           # pagine copiate per passo dell'API di backup
+SQLITE_BACKUP_SLEEP = 0.005          # pausa tra i passi: i writer acquisiscono il lock
+ZSTD_LEVEL = 3
+GZIP_LEVEL = 6
+BACKUP_WORKERS = min(8, os.cpu_count() or 4)
+COMPRESSION = "zstd" if zstandard else "gzip"
+ARCHIVE_SUFFIX = ".tar.zst" if zstandard else ".tar.gz"
+ARCHIVE_SUFFIXES = (".tar.zst", ".tar.gz")
+SQLITE_SUFFIXES = (".sqlite", ".sqlite3", ".db")
+SQLITE_SIDE_SUFFIXES = ("-wal", "-shm", "-journal")
+
+# --- COPIA ONLINE DEI DATABASE SQLITE ---
+
+def online_sqlite_backup(source_path: str, dest_path: str, pages: int = SQLITE_BACKUP_PAGES,
+                         sleep: float = SQLITE_BACKUP_SLEEP) -> Dict:
+    """
+    Copia consistente di un database SQLite in uso con l'API di backup.
+
+    La copia procede a passi di `pages` pagine con una pausa tra i passi:
+    i worker possono scrivere nel frattempo (se il sorgente cambia, SQLite
+    riprende la copia in modo che il risultato resti consistente). La
+    copia viene verificata con PRAGMA integrity_check prima di sostituire
+    `dest_path`.
+    """
+    start = time.perf_counter()
+    os.makedirs(os.path.dirname(dest_path) or ".", exist_ok=True)
+    tmp_path = f"{dest_path}.partial"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+
+    progress = {"steps": 0, "pages": 0}
+
+    def on_progress(status, remaining, total):
+        progress["steps"] += 1
+        progress["pages"] = total
+
+    source = sqlite3.connect(source_path, timeout=30)
+    dest = sqlite3.connect(tmp_path)
+    try:
+        source.backup(dest, pages=pages, progress=on_progress, sleep=sleep)
+        result = dest.execute("PRAGMA integrity_check").fetchone()[0]
+    finally:
+        dest.close()
+        source.close()
+
+    if result != "ok":
+        os.remove(tmp_path)
+        raise sqlite3.DatabaseError(f"Integrity check failed for backup of {source_path}: {result}")
+    os.replace(tmp_path, dest_path)
+
+    return {
+        "source": source_path,
+        "pages": progress["pages"],
+        "steps": progress["steps"],
+        "bytes": os.path.getsize(dest_path),
+        "seconds": time.perf_counter() - start
+    }
+
+
+def is_sqlite_file(path: str) -> bool:
+    """File SQLite o suoi file ausiliari (-wal, -shm, -journal)."""
+    return path.endswith(SQLITE_SUFFIXES) or any(
+        path.endswith(suffix + side) for suffix in SQLITE_SUFFIXES for side in SQLITE_SIDE_SUFFIXES
+    )
+
+
+def _is_within(path: str, roots: List[str]) -> bool:
+    path = os.path.abspath(path)
+    return any(path == root or path.startswith(root + os.sep) for root in roots)
+
+
+# --- COMPRESSIONE ---
+
+_compressors = threading.local()
+
+
+def compress_bytes(data: bytes, compression: str = COMPRESSION) -> bytes:
+    """Comprime un blocco (un compressore zstd per thread: non sono thread-safe)."""
+    if compression == "zstd":
+        if not hasattr(_compressors, "zstd"):
+            _compressors.zstd = zstandard.ZstdCompressor(level=ZSTD_LEVEL)
+        return _compressors.zstd.compress(data)
+    return zlib.compress(data, GZIP_LEVEL)
+
+
+DECOMPRESS_ERRORS = (zlib.error, RuntimeError) + ((zstandard.ZstdError,) if zstandard else ())
+
+
+def decompress_bytes(data: bytes, compression: str) -> bytes:
+    if compression == "zstd":
+        if zstandard is None:
+            raise RuntimeError("zstandard is required to read zstd backups")
+        return zstandard.ZstdDecompressor().decompress(data)
+    return zlib.decompress(data)
+
+
+@contextmanager
+def compressed_tar_writer(archive_path: str):
+    """Archivio tar compresso con zstd multi-thread (.tar.zst), o gzip se zstandard manca."""
+    if archive_path.endswith(".tar.zst"):
+        with open(archive_path, "wb") as fh:
+            compressor = zstandard.ZstdCompressor(level=ZSTD_LEVEL, threads=-1)
+            with compressor.stream_writer(fh, closefd=False) as writer:
+                with tarfile.open(fileobj=writer, mode="w|") as tar:
+                    yield tar
+    else:
+        with tarfile.open(archive_path, "w:gz", compresslevel=GZIP_LEVEL) as tar:
+            yield tar
+
+
+@contextmanager
+def compressed_tar_reader(archive_path: str):
+    """Lettura sequenziale di un archivio .tar.zst o .tar.gz."""
+    if archive_path.endswith(".tar.zst"):
+        if zstandard is None:
+            raise RuntimeError("zstandard is required to read .tar.zst archives")
+        with open(archive_path, "rb") as fh:
+            with zstandard.ZstdDecompressor().stream_reader(fh) as reader:
+                with tarfile.open(fileobj=reader, mode="r|") as tar:
+                    yield tar
+    else:
+        with tarfile.open(archive_path, "r:gz") as tar:
+            yield tar
+
+
+# --- SNAPSHOT INCREMENTALI CONTENT-ADDRESSED ---
+
+def _restore_target(destination: str, path: str) -> str:
+    """Percorso sotto `destination` anche per sorgenti assolute (che os.path.join non annida)."""
+    _, tail = os.path.splitdrive(path)
+    return os.path.join(destination, tail.lstrip("/\\"))
+
+
+class SnapshotStore:
+    """
+    Store di snapshot deduplicati per contenuto.
+
+    I file sono divisi in blocchi da CHUNK_SIZE salvati una sola volta in
+    `objects/` con nome pari allo SHA-256 del contenuto, compressi in
+    parallelo. Ogni snapshot è un manifest JSON in `snapshots/` con, per
+    file, dimensione, mtime, hash e lista dei blocchi. Gli snapshot
+    incrementali riusano le voci dei file con dimensione e mtime invariati
+    senza rileggerli; i database SQLite vengono copiati online e poi
+    salvati come gli altri file.
+    """
+
+    def __init__(self, root: str, chunk_size: int = CHUNK_SIZE, workers: int = BACKUP_WORKERS,
+                 compression: str = COMPRESSION):
+        self.root = root
+        self.objects_dir = os.path.join(root, "objects")
+        self.snapshots_dir = os.path.join(root, "snapshots")
+        self.chunk_size = chunk_size
+        self.workers = workers
+        self.compression = compression
+        self._lock = threading.Lock()
+        self._stats = {}
+
+    # --- Oggetti ---
+
+    def _object_path(self, digest: str, compression: str) -> str:
+        suffix = ".zst" if compression == "zstd" else ".gz"
+        return os.path.join(self.objects_dir, digest[:2], digest + suffix)
+
+    def _count(self, key: str, amount: int = 1):
+        with self._lock:
+            self._stats[key] = self._stats.get(key, 0) + amount
+
+    def _store_chunk(self, data: bytes) -> str:
+        digest = hashlib.sha256(data).hexdigest()
+        path = self._object_path(digest, self.compression)
+        if os.path.exists(path):
+            self._count("deduplicated_bytes", len(data))
+            return digest
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(compress_bytes(data, self.compression))
+        os.replace(tmp_path, path)
+        self._count("new_objects")
+        self._count("new_bytes", len(data))
+        return digest
+
+    def read_chunk(self, digest: str, compression: str) -> bytes:
+        with open(self._object_path(digest, compression), "rb") as f:
+            return decompress_bytes(f.read(), compression)
+
+    def _store_file(self, path: str, previous: Optional[Dict]) -> Dict:
+        stat = os.stat(path)
+        if (previous and previous["size"] == stat.st_size and previous["mtime_ns"] == stat.st_mtime_ns
+                and all(os.path.exists(self._object_path(d, self.compression)) for d in previous["chunks"])):
+            self._count("reused_files")
+            return previous
+
+        file_hash = hashlib.sha256()
+        chunks = []
+        with open(path, "rb") as f:
+            while True:
+                data = f.read(self.chunk_size)
+                if not data:
+                    break
+                file_hash.update(data)
+                chunks.append(self._store_chunk(data))
+        self._count("read_files")
+        self._count("read_bytes", stat.st_size)
+        return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "sha256": file_hash.hexdigest(), "chunks": chunks}
+
+    # --- Snapshot ---
+
+    def list_snapshots(self, kind: Optional[str] = None) -> List[str]:
+        """Manifest degli snapshot, dal più vecchio."""
+        if not os.path.isdir(self.snapshots_dir):
+            return []
+        names = sorted(
+            name for name in os.listdir(self.snapshots_dir)
+            if name.endswith(".json") and (kind is None or name.startswith(f"{kind}_"))
+        )
+        return [os.path.join(self.snapshots_dir, name) for name in names]
+
+    @staticmethod
+    def load_manifest(manifest_path: str) -> Dict:
+        with open(manifest_path, encoding="utf-8") as f:
+            return json.load(f)
+
+    def _collect_files(self, sources: Dict[str, str], exclude: List[str]) -> Dict[str, str]:
+        """{'etichetta/percorso relativo': percorso} dei file da salvare."""
+        excluded = [os.path.abspath(path) for path in exclude + [self.root]]
+        files = {}
+        for label, root in sources.items():
+            if os.path.isfile(root):
+                files[label] = root
+                continue
+            for dirpath, dirnames, filenames in os.walk(root):
+                dirnames[:] = [d for d in dirnames if not _is_within(os.path.join(dirpath, d), excluded)]
+                for filename in filenames:
+                    path = os.path.join(dirpath, filename)
+                    if is_sqlite_file(path) or _is_within(path, excluded):
+                        continue
+                    files[f"{label}/{os.path.relpath(path, root).replace(os.sep, '/')}"] = path
+        return files
+
+    def create_snapshot(self, sources: Dict[str, str], sqlite_files: Optional[Dict[str, str]] = None,
+                        kind: str = "incremental", trust_metadata: bool = True,
+                        exclude: Optional[List[str]] = None) -> str:
+        """
+        Crea uno snapshot e ne restituisce il manifest.
+
+        Args:
+            sources: {etichetta: file o directory}; i file SQLite al loro
+                interno vengono esclusi (vanno in `sqlite_files`)
+            sqlite_files: {etichetta: database} copiati con online_sqlite_backup
+            kind: 'full' o 'incremental' (prefisso del manifest)
+            trust_metadata: riusa le voci dell'ultimo snapshot per i file con
+                dimensione e mtime invariati; False rilegge e verifica tutto
+            exclude: percorsi da non includere
+        """
+        start = time.perf_counter()
+        self._stats = {}
+        previous_files = {}
+        previous_snapshots = self.list_snapshots()
+        if trust_metadata and previous_snapshots:
+            previous_manifest = self.load_manifest(previous_snapshots[-1])
+            if previous_manifest.get("compression") == self.compression:
+                previous_files = previous_manifest["files"]
+
+        files = self._collect_files(sources, exclude or [])
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            entries = dict(zip(files, executor.map(
+                lambda key: self._store_file(files[key], previous_files.get(key)), files
+            )))
+
+        databases = {}
+        staging_dir = os.path.join(self.root, "staging")
+        for label, db_path in (sqlite_files or {}).items():
+            if not os.path.exists(db_path):
+                continue
+            staged = os.path.join(staging_dir, f"{label}.sqlite")
+            copy_stats = online_sqlite_backup(db_path, staged)
+            entry = self._store_file(staged, None)
+            entry.update(path=db_path, pages=copy_stats["pages"], copy_seconds=copy_stats["seconds"])
+            databases[label] = entry
+            os.remove(staged)
+
+        created_at = datetime.now()
+        manifest = {
+            "kind": kind,
+            "created_at": created_at.isoformat(),
+            "compression": self.compression,
+            "chunk_size": self.chunk_size,
+            "sources": sources,
+            "files": entries,
+            "databases": databases,
+            "stats": dict(self._stats, seconds=time.perf_counter() - start,
+                          total_bytes=sum(e["size"] for e in entries.values()))
+        }
+
+        os.makedirs(self.snapshots_dir, exist_ok=True)
+        name = f"{kind}_{created_at.strftime('%Y%m%d_%H%M%S_%f')}.json"
+        manifest_path = os.path.join(self.snapshots_dir, name)
+        with open(manifest_path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(manifest, f)
+        os.replace(manifest_path + ".tmp", manifest_path)
+        return manifest_path
+
+    # --- Verifica e ripristino ---
+
+    def verify_snapshot(self, manifest_path: str, deep: bool = True) -> Dict:
+        """
+        Verifica che uno snapshot sia ripristinabile.
+
+        Controlla l'esistenza di tutti i blocchi; con `deep` decomprime ogni
+        blocco, ne ricalcola l'hash, ricompone l'hash di ogni file e fa
+        PRAGMA integrity_check sui database ricostruiti.
+        """
+        manifest = self.load_manifest(manifest_path)
+        compression = manifest["compression"]
+        errors = []
+        verified = {}
+
+        def check_entry(key: str, entry: Dict):
+            file_hash = hashlib.sha256()
+            for digest in entry["chunks"]:
+                path = self._object_path(digest, compression)
+                if not os.path.exists(path):
+                    return f"{key}: missing object {digest}"
+                if deep:
+                    try:
+                        data = self.read_chunk(digest, compression)
+                    except DECOMPRESS_ERRORS:
+                        return f"{key}: unreadable object {digest}"
+                    if hashlib.sha256(data).hexdigest() != digest:
+                        return f"{key}: corrupted object {digest}"
+                    file_hash.update(data)
+            if deep and file_hash.hexdigest() != entry["sha256"]:
+                return f"{key}: content hash mismatch"
+            return None
+
+        all_entries = dict(manifest["files"])
+        all_entries.update({f"sqlite/{label}": entry for label, entry in manifest["databases"].items()})
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            for key, error in zip(all_entries, executor.map(lambda k: check_entry(k, all_entries[k]), all_entries)):
+                if error:
+                    errors.append(error)
+                verified[key] = error is None
+
+        if deep:
+            staging_dir = os.path.join(self.root, "staging")
+            os.makedirs(staging_dir, exist_ok=True)
+            for label, entry in manifest["databases"].items():
+                if not verified.get(f"sqlite/{label}"):
+                    continue
+                restored = os.path.join(staging_dir, f"verify_{label}.sqlite")
+                self._write_entry(entry, restored, compression)
+                try:
+                    with sqlite3.connect(restored) as conn:
+                        result = conn.execute("PRAGMA integrity_check").fetchone()[0]
+                    if result != "ok":
+                        errors.append(f"sqlite/{label}: integrity check failed ({result})")
+                finally:
+                    os.remove(restored)
+
+        return {"ok": not errors, "errors": errors, "entries_checked": len(all_entries), "deep": deep}
+
+    def _write_entry(self, entry: Dict, target: str, compression: str):
+        os.makedirs(os.path.dirname(target) or ".", exist_ok=True)
+        with open(target, "wb") as f:
+            for digest in entry["chunks"]:
+                f.write(self.read_chunk(digest, compression))
+
+    def restore_snapshot(self, manifest_path: str, destination: str) -> int:
+        """Ripristina file e database dello snapshot sotto `destination`; restituisce i file scritti."""
+        manifest = self.load_manifest(manifest_path)
+        compression = manifest["compression"]
+        written = 0
+        for key, entry in manifest["files"].items():
+            label, _, relative = key.partition("/")
+            root = manifest["sources"][label]
+            target = _restore_target(destination, os.path.join(root, relative) if relative else root)
+            self._write_entry(entry, target, compression)
+            written += 1
+        for entry in manifest["databases"].values():
+            self._write_entry(entry, _restore_target(destination, entry["path"]), compression)
+            written += 1
+        return written
+
+    # --- Retention ---
+
+    def prune(self, keep_last: int = 7, older_than: Optional[datetime] = None) -> Dict:
+        """
+        Elimina gli snapshot oltre gli ultimi `keep_last` (e più vecchi di
+        `older_than`, se indicato) e i blocchi non più referenziati.
+        """
+        snapshots = self.list_snapshots()
+        removable = snapshots[:-keep_last] if keep_last else list(snapshots)
+        removed = 0
+        for manifest_path in removable:
+            if older_than and datetime.fromtimestamp(os.path.getmtime(manifest_path)) >= older_than:
+                continue
+            os.remove(manifest_path)
+            removed += 1
+
+        referenced = set()
+        for manifest_path in self.list_snapshots():
+            manifest = self.load_manifest(manifest_path)
+            for entry in list(manifest["files"].values()) + list(manifest["databases"].values()):
+                referenced.update(entry["chunks"])
+
+        deleted_objects = 0
+        if os.path.isdir(self.objects_dir):
+            for dirpath, _, filenames in os.walk(self.objects_dir):
+                for filename in filenames:
+                    if filename.split(".")[0] not in referenced:
+                        os.remove(os.path.join(dirpath, filename))
+                        deleted_objects += 1
+        return {"removed_snapshots": removed, "deleted_objects": deleted_objects}
+
+
 class BackupManager:
     """Gestore backup completo per produzione"""
 
@@ -25,7 +455,24 @@ class BackupManager:
         # Configurazione backup
         self.backup_base_dir = "backups"
         self.retention_days = 30
-        self.compression_level = 9
+        self.snapshots_to_keep = 30
+
+        # Store degli snapshot incrementali deduplicati (file, uploads, Chroma)
+        self.snapshot_store = SnapshotStore(f"{self.backup_base_dir}/store")
+        self.snapshot_sources = {
+            "src": "src",
+            "tests": "tests",
+            "docs": "docs",
+            "database_layer": "database_layer",
+            "uploads": "uploads",
+            "documents": "documents",
+            "static": "static",
+            "db_memoria": "db_memoria",
+            "pyproject.toml": "pyproject.toml",
+            "requirements.txt": "requirements.txt",
+            "requirements-dev.txt": "requirements-dev.txt",
+            ".env": ".env"
+        }
 
         # Tipi di backup
         self.backup_types = {
@@ -63,54 +510,42 @@ class BackupManager:
             os.makedirs(directory, exist_ok=True)
 
     def create_full_backup(self) -> Optional[str]:
-        """Crea backup completo del sistema"""
+        """
+        Crea backup completo del sistema: snapshot che rilegge e
+        verifica ogni file e copia online i database
+        """
         self.logger.info("Creating full system backup...")
+        return self.create_snapshot("full", trust_metadata=False)
 
+    def create_snapshot(self, kind: str, trust_metadata: bool) -> Optional[str]:
+        """Crea uno snapshot nello store content-addressed e ne restituisce il manifest"""
         try:
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            backup_name = f"full_backup_{timestamp}"
-            backup_path = f"{self.backup_base_dir}/daily/{backup_name}"
-
             self.create_backup_directories()
+            sources = {label: path for label, path in self.snapshot_sources.items() if os.path.exists(path)}
+            manifest_path = self.snapshot_store.create_snapshot(
+                sources,
+                self.get_sqlite_sources(),
+                kind=kind,
+                trust_metadata=trust_metadata,
+                exclude=[self.backup_base_dir]
+            )
 
-            # Backup database
-            db_backup = self.backup_database(f"{backup_path}/database")
-            if not db_backup:
-                return None
-
-            # Backup configurazione
-            config_backup = self.backup_configuration(f"{backup_path}/config")
-            if not config_backup:
-                return None
-
-            # Backup uploads
-            uploads_backup = self.backup_uploads(f"{backup_path}/uploads")
-            if not uploads_backup:
-                return None
-
-            # Backup codice sorgente
-            code_backup = self.backup_code(f"{backup_path}/code")
-            if not code_backup:
-                return None
-
-            # Crea manifest backup
-            manifest = self.create_backup_manifest(backup_path, "full")
-            with open(f"{backup_path}/manifest.json", 'w') as f:
-                json.dump(manifest, f, indent=2)
-
-            # Crea archivio compresso
-            archive_path = self.create_compressed_archive(backup_path, backup_name)
-
-            # Pulisci directory temporanea
-            shutil.rmtree(backup_path)
-
-            self.logger.info(f"Full backup completed: {archive_path}")
-            return archive_path
+            stats = self.snapshot_store.load_manifest(manifest_path)["stats"]
+            self.logger.info(
+                f"{kind.capitalize()} backup completed: {manifest_path} "
+                f"({stats.get('read_files', 0)} files read, {stats.get('reused_files', 0)} unchanged, "
+                f"{stats.get('new_bytes', 0)} new bytes, {stats['seconds']:.1f}s)"
+            )
+            return manifest_path
 
         except Exception as e:
-            self.logger.error(f"Full backup failed: {str(e)}")
+            self.logger.error(f"{kind.capitalize()} backup failed: {str(e)}")
             return None
 
+    def get_sqlite_sources(self) -> Dict[str, str]:
+        """Database SQLite da copiare online, per etichetta"""
+        return {db_file.replace("/", "_").replace(".", "_"): db_file for db_file in self.find_database_files()}
+
     def backup_database(self, backup_dir: str) -> bool:
         """Backup database"""
         try:
@@ -122,7 +557,10 @@ class BackupManager:
             for db_file in db_files:
                 if os.path.exists(db_file):
                     backup_path = f"{backup_dir}/{os.path.basename(db_file)}"
-                    shutil.copy2(db_file, backup_path)
+                    # Copia online a passi: i worker continuano a scrivere
+                    stats = online_sqlite_backup(db_file, backup_path)
+                    self.logger.info(f"{db_file}: {stats['pages']} pages in {stats['steps']} steps "
+                                     f"({stats['seconds']:.1f}s)")
 
                     # Verifica integrità backup
                     if not self.verify_database_backup(backup_path, db_file):
@@ -159,16 +597,9 @@ class BackupManager:
     def verify_database_backup(self, backup_path: str, original_path: str) -> bool:
         """Verifica integrità backup database"""
         try:
-            # Verifica dimensione file
-            backup_size = os.path.getsize(backup_path)
-            original_size = os.path.getsize(original_path)
-
-            if backup_size != original_size:
-                self.logger.error(f"Size mismatch: backup={backup_size}, original={original_size}")
-                return False
-
-            # Verifica integrità SQLite
-            if backup_path.endswith('.sqlite') or backup_path.endswith('.db'):
+            # La copia online può differire in dimensione dal file live (WAL, pagine libere):
+            # conta solo l'integrità
+            if backup_path.endswith(SQLITE_SUFFIXES):
                 with sqlite3.connect(backup_path) as conn:
                     cursor = conn.cursor()
                     cursor.execute("PRAGMA integrity_check")
@@ -199,10 +630,11 @@ class BackupManager:
                 "monitoring_setup.py"
             ]
 
-            # Crea archivio tar compresso
-            backup_path = f"{backup_dir}/config.tar.gz"
+            # Crea archivio tar compresso (zstd multi-thread)
+            os.makedirs(backup_dir, exist_ok=True)
+            backup_path = f"{backup_dir}/config{ARCHIVE_SUFFIX}"
 
-            with tarfile.open(backup_path, "w:gz", compresslevel=self.compression_level) as tar:
+            with compressed_tar_writer(backup_path) as tar:
                 for config_item in config_files:
                     if os.path.exists(config_item):
                         if os.path.isdir(config_item):
@@ -229,10 +661,11 @@ class BackupManager:
                 "db_memoria/"
             ]
 
-            # Crea archivio tar compresso
-            backup_path = f"{backup_dir}/uploads.tar.gz"
+            # Crea archivio tar compresso (zstd multi-thread)
+            os.makedirs(backup_dir, exist_ok=True)
+            backup_path = f"{backup_dir}/uploads{ARCHIVE_SUFFIX}"
 
-            with tarfile.open(backup_path, "w:gz", compresslevel=self.compression_level) as tar:
+            with compressed_tar_writer(backup_path) as tar:
                 for upload_dir in upload_dirs:
                     if os.path.exists(upload_dir):
                         tar.add(upload_dir, arcname=os.path.basename(upload_dir))
@@ -257,10 +690,11 @@ class BackupManager:
                 "db_memoria/"
             ]
 
-            # Crea archivio tar compresso
-            backup_path = f"{backup_dir}/code.tar.gz"
+            # Crea archivio tar compresso (zstd multi-thread)
+            os.makedirs(backup_dir, exist_ok=True)
+            backup_path = f"{backup_dir}/code{ARCHIVE_SUFFIX}"
 
-            with tarfile.open(backup_path, "w:gz", compresslevel=self.compression_level) as tar:
+            with compressed_tar_writer(backup_path) as tar:
                 for code_dir in code_dirs:
                     if os.path.exists(code_dir):
                         tar.add(code_dir, arcname=os.path.basename(code_dir))
@@ -342,43 +776,34 @@ class BackupManager:
 
     def create_compressed_archive(self, backup_path: str, backup_name: str) -> str:
         """Crea archivio compresso del backup"""
-        archive_path = f"{self.backup_base_dir}/daily/{backup_name}.tar.gz"
+        archive_path = f"{self.backup_base_dir}/daily/{backup_name}{ARCHIVE_SUFFIX}"
 
-        with tarfile.open(archive_path, "w:gz", compresslevel=self.compression_level) as tar:
+        with compressed_tar_writer(archive_path) as tar:
             tar.add(backup_path, arcname=backup_name)
 
         return archive_path
 
-    def create_incremental_backup(self, last_backup: str) -> Optional[str]:
-        """Crea backup incrementale"""
+    def create_incremental_backup(self, last_backup: Optional[str] = None) -> Optional[str]:
+        """
+        Crea backup incrementale: i file con dimensione e mtime invariati
+        riusano i blocchi dell'ultimo snapshot, quelli modificati salvano
+        solo i blocchi nuovi
+        """
         self.logger.info("Creating incremental backup...")
 
-        try:
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            backup_name = f"incremental_backup_{timestamp}"
-            backup_path = f"{self.backup_base_dir}/daily/{backup_name}"
-
-            # Trova ultimo backup completo
-            last_full_backup = self.find_last_full_backup()
-
-            if not last_full_backup:
-                self.logger.warning("No full backup found, creating full backup instead")
-                return self.create_full_backup()
+        if not self.find_last_full_backup():
+            self.logger.warning("No full backup found, creating full backup instead")
+            return self.create_full_backup()
 
-            # Crea backup incrementale
-            # Qui implementare logica backup incrementale
-            # Per ora crea backup completo
-
-            self.logger.info(f"Incremental backup completed: {backup_path}")
-            return backup_path
-
-        except Exception as e:
-            self.logger.error(f"Incremental backup failed: {str(e)}")
-            return None
+        return self.create_snapshot("incremental", trust_metadata=True)
 
     def find_last_full_backup(self) -> Optional[str]:
         """Trova ultimo backup completo"""
         try:
+            full_snapshots = self.snapshot_store.list_snapshots("full")
+            if full_snapshots:
+                return full_snapshots[-1]
+
             backup_dir = f"{self.backup_base_dir}/daily"
 
             if not os.path.exists(backup_dir):
@@ -389,7 +814,7 @@ class BackupManager:
             latest_time = 0
 
             for item in os.listdir(backup_dir):
-                if item.startswith("full_backup_") and item.endswith(".tar.gz"):
+                if item.startswith("full_backup_") and item.endswith(ARCHIVE_SUFFIXES):
                     backup_path = os.path.join(backup_dir, item)
                     backup_time = os.path.getmtime(backup_path)
 
@@ -419,6 +844,11 @@ class BackupManager:
             # Pulisci backup mensili
             self.cleanup_directory(f"{self.backup_base_dir}/monthly", cutoff_date, keep_days=365)
 
+            # Snapshot oltre la retention e blocchi non più referenziati
+            pruned = self.snapshot_store.prune(keep_last=self.snapshots_to_keep, older_than=cutoff_date)
+            self.logger.info(f"Removed {pruned['removed_snapshots']} snapshots and "
+                             f"{pruned['deleted_objects']} unreferenced objects")
+
             self.logger.info("Backup cleanup completed")
 
         except Exception as e:
@@ -462,12 +892,22 @@ class BackupManager:
                 self.logger.error("Backup file is empty")
                 return False
 
-            # Verifica archivio tar.gz
-            if backup_path.endswith('.tar.gz'):
-                with tarfile.open(backup_path, 'r:gz') as tar:
+            # Verifica snapshot: blocchi, hash dei file e integrità dei database ricostruiti
+            if backup_path.endswith('.json'):
+                result = self.snapshot_store.verify_snapshot(backup_path, deep=True)
+                for error in result["errors"]:
+                    self.logger.error(f"Snapshot verification: {error}")
+                if not result["ok"]:
+                    return False
+
+            # Verifica archivio tar.zst / tar.gz
+            elif backup_path.endswith(ARCHIVE_SUFFIXES):
+                with compressed_tar_reader(backup_path) as tar:
                     # Prova a leggere tutti i file
-                    for member in tar.getmembers():
-                        tar.extractfile(member)
+                    for member in tar:
+                        extracted = tar.extractfile(member)
+                        if extracted:
+                            extracted.read()
 
             self.logger.info("Backup integrity verification passed")
             return True
@@ -486,8 +926,11 @@ class BackupManager:
                 return False
 
             # Estrai backup
-            if backup_path.endswith('.tar.gz'):
-                with tarfile.open(backup_path, 'r:gz') as tar:
+            if backup_path.endswith('.json'):
+                restored = self.snapshot_store.restore_snapshot(backup_path, restore_path)
+                self.logger.info(f"Restored {restored} files from snapshot")
+            elif backup_path.endswith(ARCHIVE_SUFFIXES):
+                with compressed_tar_reader(backup_path) as tar:
                     tar.extractall(restore_path)
 
             self.logger.info(f"Restore completed: {restore_path}")
@@ -557,7 +1000,7 @@ class BackupManager:
 
         for root, dirs, files in os.walk(self.backup_base_dir):
             for file in files:
-                if file.endswith('.tar.gz') or file.endswith('.db') or file.endswith('.sql'):
+                if file.endswith(ARCHIVE_SUFFIXES + ('.db', '.sql')) or self.is_snapshot_manifest(root, file):
                     count += 1
 
         return count
@@ -568,10 +1011,11 @@ class BackupManager:
             "total_bytes": 0,
             "daily_bytes": 0,
             "weekly_bytes": 0,
-            "monthly_bytes": 0
+            "monthly_bytes": 0,
+            "store_bytes": 0
         }
 
-        for backup_type, bytes_key in [("daily", "daily_bytes"), ("weekly", "weekly_bytes"), ("monthly", "monthly_bytes")]:
+        for backup_type, bytes_key in [("daily", "daily_bytes"), ("weekly", "weekly_bytes"), ("monthly", "monthly_bytes"), ("store", "store_bytes")]:
             backup_dir = f"{self.backup_base_dir}/{backup_type}"
             if os.path.exists(backup_dir):
                 usage[bytes_key] = self.calculate_directory_size(backup_dir)
@@ -585,7 +1029,7 @@ class BackupManager:
 
         for root, dirs, files in os.walk(self.backup_base_dir):
             for file in files:
-                if file.endswith('.tar.gz'):
+                if file.endswith(ARCHIVE_SUFFIXES) or self.is_snapshot_manifest(root, file):
                     filepath = os.path.join(root, file)
                     rel_path = os.path.relpath(filepath, self.backup_base_dir)
 
@@ -605,6 +1049,10 @@ class BackupManager:
 
         return backups[:limit]
 
+    def is_snapshot_manifest(self, directory: str, filename: str) -> bool:
+        """Manifest di uno snapshot dello store"""
+        return filename.endswith('.json') and os.path.abspath(directory) == os.path.abspath(self.snapshot_store.snapshots_dir)
+
     def determine_backup_type(self, backup_path: str) -> str:
         """Determina tipo backup dal path"""
         if "full" in backup_path.lower():
@@ -625,8 +1073,8 @@ class BackupManager:
         self.logger.info("Starting backup cycle...")
 
         try:
-            # Crea backup completo
-            backup_path = self.create_full_backup()
+            # Crea backup incrementale (completo se non ne esiste ancora uno)
+            backup_path = self.create_incremental_backup()
 
             if backup_path:
                 # Verifica backup
@@ -651,8 +1099,11 @@ def main():
     backup_manager = BackupManager()
 
     try:
-        # Crea backup completo
-        backup_path = backup_manager.create_full_backup()
+        # Backup incrementale con --incremental, altrimenti completo
+        if "--incremental" in sys.argv:
+            backup_path = backup_manager.create_incremental_backup()
+        else:
+            backup_path = backup_manager.create_full_backup()
 
         if backup_path:
             print(f"✅ Backup completed successfully: {backup_path}")
@@ -15,9 +15,18 @@ if exist "venv\Scripts\activate.bat" (
     call venv\Scripts\activate.bat
 )
 
-REM Start Celery worker
-echo Starting worker...
-celery -A tasks worker --loglevel=info --concurrency=2 --pool=solo
+REM Due worker separati (vedi task_scheduler.WORKER_POOLS): un solo worker
+REM consumerebbe le code a turno e gli upload aspetterebbero le scansioni bulk.
+REM Il pool prefork (abilitato su Windows da FORKED_BY_MULTIPROCESSING) termina
+REM i task oltre il time_limit; --pool=solo non applica alcun limite.
+REM Il soft_time_limit richiede segnali POSIX: e' applicato solo su Linux/Docker.
+set FORKED_BY_MULTIPROCESSING=1
+
+echo Starting bulk worker...
+start "Archivista AI - Bulk worker" celery -A tasks worker -Q ingest_bulk_small,ingest_bulk_large,tasks_background -n bulk@%%h --loglevel=info --concurrency=1 --pool=prefork
+
+echo Starting interactive worker...
+celery -A tasks worker -Q ingest_interactive_small,ingest_interactive_large,tasks_interactive -n interactive@%%h --loglevel=info --concurrency=2 --pool=prefork
 
 echo.
 echo Worker stopped.
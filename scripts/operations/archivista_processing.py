@@ -7,7 +7,6 @@ import os
 import shutil
 import sqlite3
 import json
-import time
 from datetime import datetime
 from pydantic import BaseModel, Field
 from typing import List, Optional
@@ -20,34 +19,49 @@ from error_diagnosis_framework import (
     ErrorCategory,
     ErrorSeverity
 )
-
-# Import per l'estrazione granulare del testo
-import fitz
-from docx import Document as DocxDocument
-import pdfplumber
-from pypdf import PdfReader
-from pdfminer.high_level import extract_text as pdfminer_extract
-from bs4 import BeautifulSoup
-import chardet
-
-from llama_index.core import Document, Settings, VectorStoreIndex, StorageContext, PromptTemplate, load_index_from_storage
+# Lock distribuiti (Redis SET NX PX con heartbeat, fallback fcntl)
+from task_locks import acquire_document_lock, LockLostError
+# Checkpoint delle fasi per retry riprendibili
+from pipeline_checkpoints import PipelineCheckpointer, compute_content_hash, clear_checkpoints, find_checkpoint_hash
+# Rilevamento quasi-duplicati (MinHash + LSH)
+import near_duplicate_detector
+# Pre-classificazione per centroidi di embedding (fallback LLM sui casi ambigui)
+from category_classifier import CentroidClassifier
+# Chunking con riuso degli embedding di frase (semantico o a finestra fissa per tipo di file)
+from embedding_chunker import get_chunker
+
+# Estrattori di testo differiti: ogni libreria si carica al primo file del suo tipo
+from lazy_imports import lazy_callable, lazy_import
+fitz = lazy_import("fitz")
+DocxDocument = lazy_callable("docx", "Document")
+pdfplumber = lazy_import("pdfplumber")
+PdfReader = lazy_callable("pypdf", "PdfReader")
+pdfminer_extract = lazy_callable("pdfminer.high_level", "extract_text")
+BeautifulSoup = lazy_callable("bs4", "BeautifulSoup")
+chardet = lazy_import("chardet")
+
+# LlamaIndex si carica al primo documento: il worker e chi importa il modulo partono senza
+Document = lazy_callable("llama_index.core", "Document")
+Settings = lazy_callable("llama_index.core", "Settings")
+VectorStoreIndex = lazy_callable("llama_index.core", "VectorStoreIndex")
+StorageContext = lazy_callable("llama_index.core", "StorageContext")
+PromptTemplate = lazy_callable("llama_index.core", "PromptTemplate")
+load_index_from_storage = lazy_callable("llama_index.core", "load_index_from_storage")
 
 from celery_app import celery_app
 from celery.exceptions import SoftTimeLimitExceeded
+from celery.signals import worker_ready
 from config import initialize_services
 import prompt_manager # <-- MODIFICA: Importa il nuovo gestore dei prompt
 import knowledge_structure
-from file_utils import setup_database
-# Import del motore di inferenza Bayesiano
-from bayesian_inference_engine import (
-    create_inference_engine,
-    ConfidenceUpdateRequest,
-    process_evidence_batch
-)
+from file_utils import setup_database, notify_suggestions
+# Motore di inferenza Bayesiano, caricato alla prima fase o task che lo usa
+create_inference_engine = lazy_callable("bayesian_inference_engine", "create_inference_engine")
 
 # --- CONFIGURAZIONE ---
 DOCS_TO_PROCESS_DIR = "documenti_da_processare"
 CATEGORIZED_ARCHIVE_DIR = "Dall_Origine_alla_Complessita"
+DUPLICATES_DIR = os.path.join(DOCS_TO_PROCESS_DIR, "_duplicates")
 DB_STORAGE_DIR = "db_memoria"
 METADATA_DB_FILE = os.path.join(DB_STORAGE_DIR, "metadata.sqlite")
 ARCHIVISTA_STATUS_FILE = os.path.join(DB_STORAGE_DIR, "archivista_status.json")
@@ -279,7 +293,7 @@ def get_text_extractor(file_extension: str):
     }
     return extractors.get(file_extension.lower())
 
-def classify_document(text_content):
+def classify_document_with_llm(text_content):
     if not Settings.llm:
         raise ConnectionError("LLM non disponibile per la classificazione.")
     classification_structure = knowledge_structure.get_structure_for_prompt()
@@ -290,6 +304,388 @@ def classify_document(text_content):
     category_id = str(response).strip()
     return category_id if knowledge_structure.is_valid_category_id(category_id) else "UNCATEGORIZED/C00"
 
+_category_classifier = None
+
+def get_category_classifier():
+    """Pre-classificatore per centroidi (uno per processo worker), o None senza modello di embedding."""
+    global _category_classifier
+    if _category_classifier is None and Settings.embed_model:
+        try:
+            _category_classifier = CentroidClassifier(
+                Settings.embed_model, knowledge_structure.KNOWLEDGE_BASE_STRUCTURE, db_connect
+            )
+        except Exception as e:
+            # Senza embedding dei capitoli classifica l'LLM; si riprova al documento successivo
+            print(f"⚠️ Pre-classificatore per centroidi non disponibile: {e}")
+    return _category_classifier
+
+def classify_document(text_content, file_name=None):
+    """Categoria del documento: centroidi di embedding se sicuri, altrimenti LLM con il manuale."""
+    classifier = get_category_classifier()
+    if classifier is None:
+        return classify_document_with_llm(text_content)
+    return classifier.classify(text_content, classify_document_with_llm, file_name)
+
+# --- FASI DELLA PIPELINE (ognuna produce un output JSON-serializzabile per il checkpoint) ---
+
+# Fase di processamento (framework errori) associata a ciascuna fase della pipeline
+STAGE_PHASES = {
+    "extract": ProcessingPhase.PHASE_2,
+    "classify": ProcessingPhase.PHASE_3,
+    "metadata": ProcessingPhase.PHASE_3,
+    "index": ProcessingPhase.PHASE_4,
+    "preview": ProcessingPhase.PHASE_3,
+    "academic_analysis": ProcessingPhase.PHASE_3,
+    "bayesian": ProcessingPhase.PHASE_3,
+    "persist": ProcessingPhase.PHASE_5,
+}
+
+def run_extraction_stage(file_path: str, file_name: str) -> str:
+    """Fase 1: estrazione del testo completo."""
+    update_status("Estrazione testo...", file_name)
+    file_ext = os.path.splitext(file_name)[1].lower()
+    extractor = get_text_extractor(file_ext)
+    if not extractor: raise ValueError(f"Formato file non supportato: {file_ext}")
+    full_text = extractor(file_path)
+    if not full_text or not full_text.strip(): raise ValueError("Documento vuoto o illeggibile.")
+    return full_text
+
+def run_classification_stage(full_text: str, file_name: str) -> dict:
+    """Fase 2: classificazione nella struttura della conoscenza."""
+    update_status("Classificazione AI...", file_name)
+    category_id = classify_document(full_text, file_name)
+    if category_id == "UNCATEGORIZED/C00":
+        part_id, chapter_id = "UNCATEGORIZED", "C00"
+        part_name, chapter_name = "Non Categorizzato", "Generale"
+    else:
+        part_id, chapter_id = category_id.split('/')
+        part_name = knowledge_structure.KNOWLEDGE_BASE_STRUCTURE[part_id]['name']
+        chapter_name = knowledge_structure.KNOWLEDGE_BASE_STRUCTURE[part_id]['chapters'][chapter_id]
+    return {
+        'category_id': category_id,
+        'part_id': part_id,
+        'chapter_id': chapter_id,
+        'category_full_name': f"{part_name} -> {chapter_name}"
+    }
+
+def run_metadata_stage(full_text: str, file_name: str, category_full_name: str) -> dict:
+    """Fase 3: estrazione dei metadati bibliografici."""
+    update_status("Estrazione metadati...", file_name)
+    # MODIFICA: Usa il prompt manager
+    metadata_prompt = PromptTemplate(prompt_manager.get_prompt("PYDANTIC_METADATA_PROMPT"))
+    metadata_query = metadata_prompt.format(document_text=full_text[:4000], category_name=category_full_name)
+    response = Settings.llm.complete(metadata_query)
+    try:
+        response_text = str(response).strip()
+        # Try to extract JSON from the response if it contains extra text
+        if '{' in response_text and '}' in response_text:
+            start_idx = response_text.find('{')
+            end_idx = response_text.rfind('}') + 1
+            json_str = response_text[start_idx:end_idx]
+            metadata = PaperMetadata(**json.loads(json_str))
+        else:
+            # Fallback if no JSON found
+            metadata = PaperMetadata(title=file_name, authors=[], publication_year=None)
+    except (json.JSONDecodeError, TypeError, ValueError) as e:
+        print(f"⚠️ Errore parsing metadati JSON: {e}. Response: {str(response)[:200]}...")
+        metadata = PaperMetadata(title=file_name, authors=[], publication_year=None)
+    return metadata.dict()
+
+def run_indexing_stage(full_text: str, file_name: str, content_hash: str,
+                       metadata: PaperMetadata, classification: dict) -> dict:
+    """
+    Fase 4: indicizzazione vettoriale (logica semplificata e atomica).
+
+    Il documento usa il nome del file come id: se la fase viene ripetuta
+    dopo un inserimento parziale, o il file viene riprocessato, i nodi
+    precedenti vengono rimossi prima di reinserire. L'hash del contenuto non
+    può fare da id: due file identici condividerebbero i nodi e cancellarne
+    uno eliminerebbe anche l'altro.
+    """
+    update_status("Indicizzazione...", file_name)
+    doc = Document(text=full_text, id_=file_name)
+    doc.metadata.update({"file_name": file_name, "title": metadata.title, "authors": json.dumps(metadata.authors), "publication_year": metadata.publication_year, "category_id": classification['category_id'], "category_name": classification['category_full_name']})
+
+    # Nodi con embedding già calcolati durante lo split: l'indice non li ricalcola
+    chunker = get_chunker(file_name, Settings.embed_model)
+    nodes = chunker.build_nodes(doc)
+    print(f"✂️ Chunking {chunker.strategy}: {len(nodes)} chunk, {chunker.stats['embedded_texts']} embedding calcolati, "
+          f"{chunker.stats['reused_chunks']} riusati dalle frasi")
+
+    # Crea storage context per l'indicizzazione con ChromaVectorStore
+    from llama_index.core.storage.docstore import SimpleDocumentStore
+    from llama_index.core.storage.index_store import SimpleIndexStore
+
+    # Crea/ottiene collezione ChromaDB
+    try:
+        import chromadb
+        from llama_index.vector_stores.chroma import ChromaVectorStore
+
+        db = chromadb.PersistentClient(path=DB_STORAGE_DIR)
+        chroma_collection = db.get_or_create_collection("documents")
+        vector_store = ChromaVectorStore(chroma_collection=chroma_collection)
+
+        print(f"🚀 Utilizzo ChromaVectorStore per alte performance")
+
+    except ImportError:
+        print(f"⚠️ ChromaDB non disponibile, fallback a SimpleVectorStore")
+        from llama_index.core.vector_stores import SimpleVectorStore
+        vector_store = SimpleVectorStore()
+
+    storage_context = StorageContext.from_defaults(
+        docstore=SimpleDocumentStore(),
+        vector_store=vector_store,
+        index_store=SimpleIndexStore(),
+        persist_dir=DB_STORAGE_DIR
+    )
+
+    try:
+        # Tenta di caricare un indice esistente
+        storage_context = StorageContext.from_defaults(persist_dir=DB_STORAGE_DIR, vector_store=vector_store)
+        index = load_index_from_storage(storage_context)
+        print("✅ Indice esistente caricato. Aggiungo nuovo documento...")
+        # Rimuove eventuali nodi di un tentativo precedente interrotto
+        try:
+            index.delete_ref_doc(doc.id_, delete_from_docstore=True)
+        except Exception:
+            pass
+        index.insert_nodes(nodes)
+        index.docstore.set_document_hash(doc.id_, doc.hash)
+
+    except FileNotFoundError:
+        # Se nessun indice esiste, creane uno nuovo
+        print("🆕 Nessun indice trovato. Ne creo uno nuovo.")
+        storage_context = StorageContext.from_defaults(vector_store=vector_store)
+        index = VectorStoreIndex(nodes, storage_context=storage_context)
+        index.docstore.set_document_hash(doc.id_, doc.hash)
+
+    # A prescindere da cosa sia successo, salva lo stato finale
+    index.storage_context.persist(persist_dir=DB_STORAGE_DIR)
+    print("💾 Indice salvato correttamente su disco.")
+    return {'indexed': True, 'doc_id': doc.id_}
+
+def run_preview_stage(full_text: str, file_name: str) -> str:
+    """Fase 4.5: generazione dell'anteprima formattata."""
+    update_status("Generazione anteprima...", file_name)
+    # Usa il prompt manager per caricare il template di anteprima
+    preview_prompt = PromptTemplate(prompt_manager.get_prompt("FORMAT_PREVIEW_PROMPT"))
+    preview_query = preview_prompt.format(raw_text=full_text[:2500])  # Usa primi 2500 caratteri
+    preview_response = Settings.llm.complete(preview_query)
+    return str(preview_response).strip()
+
+def run_academic_analysis_stage(full_text: str, file_name: str) -> dict:
+    """Fase 4.6: analisi accademica (parole chiave, task e grafo della conoscenza)."""
+    update_status("Analisi accademica...", file_name)
+    academic_metadata = {}
+    knowledge_entities = []
+    knowledge_relationships = []
+
+    # Estrazione parole chiave
+    try:
+        keywords_prompt = PromptTemplate(prompt_manager.get_prompt("ACADEMIC_KEYWORDS_PROMPT"))
+        keywords_query = keywords_prompt.format(document_text=full_text[:4000])
+        keywords_response = Settings.llm.complete(keywords_query)
+        keywords_text = str(keywords_response).strip()
+        # Try to parse JSON
+        try:
+            keywords_data = json.loads(keywords_text)
+            academic_metadata['keywords'] = keywords_data['keywords']
+        except (json.JSONDecodeError, KeyError):
+            print(f"⚠️ Impossibile parsare parole chiave JSON per {file_name}")
+            academic_metadata['keywords'] = []
+    except Exception as e:
+        print(f"⚠️ Errore estrazione parole chiave per {file_name}: {e}")
+        academic_metadata['keywords'] = []
+
+    # Estrazione entità concettuali per il grafo della conoscenza
+    try:
+        entities_prompt = PromptTemplate(prompt_manager.get_prompt("KNOWLEDGE_ENTITIES_PROMPT"))
+        entities_query = entities_prompt.format(document_text=full_text[:3000])
+        entities_response = Settings.llm.complete(entities_query)
+        entities_text = str(entities_response).strip()
+
+        # Try to parse JSON entities
+        try:
+            entities_data = json.loads(entities_text)
+            knowledge_entities = entities_data
+            print(f"✅ Estratte {len(knowledge_entities)} entità concettuali da {file_name}")
+        except (json.JSONDecodeError, KeyError):
+            print(f"⚠️ Impossibile parsare entità JSON per {file_name}")
+            knowledge_entities = []
+
+    except Exception as e:
+        print(f"⚠️ Errore estrazione entità per {file_name}: {e}")
+        knowledge_entities = []
+
+    # Estrazione relazioni concettuali (solo se abbiamo entità)
+    if knowledge_entities:
+        try:
+            entities_list = [f"- {e['entity_name']} ({e['entity_type']})" for e in knowledge_entities]
+            entities_list_text = "\n".join(entities_list)
+
+            relationships_prompt = PromptTemplate(prompt_manager.get_prompt("ENTITY_RELATIONSHIPS_PROMPT"))
+            relationships_query = relationships_prompt.format(
+                document_text=full_text[:3000],
+                entities_list=entities_list_text
+            )
+            relationships_response = Settings.llm.complete(relationships_query)
+            relationships_text = str(relationships_response).strip()
+
+            # Try to parse JSON relationships
+            try:
+                relationships_data = json.loads(relationships_text)
+                knowledge_relationships = relationships_data
+                print(f"✅ Estratte {len(knowledge_relationships)} relazioni concettuali da {file_name}")
+            except (json.JSONDecodeError, KeyError):
+                print(f"⚠️ Impossibile parsare relazioni JSON per {file_name}")
+                knowledge_relationships = []
+
+        except Exception as e:
+            print(f"⚠️ Errore estrazione relazioni per {file_name}: {e}")
+            knowledge_relationships = []
+
+    # Generazione task AI
+    try:
+        tasks_prompt = PromptTemplate(prompt_manager.get_prompt("ACADEMIC_TASK_GENERATION_PROMPT"))
+        tasks_query = tasks_prompt.format(document_text=full_text[:3000])
+        tasks_response = Settings.llm.complete(tasks_query)
+        tasks_text = str(tasks_response).strip()
+        # Try to parse JSON
+        try:
+            tasks_data = json.loads(tasks_text)
+            academic_metadata['ai_tasks'] = tasks_data
+        except (json.JSONDecodeError, KeyError):
+            print(f"⚠️ Impossibile parsare task JSON per {file_name}")
+            academic_metadata['ai_tasks'] = {}
+    except Exception as e:
+        print(f"⚠️ Errore generazione task AI per {file_name}: {e}")
+        academic_metadata['ai_tasks'] = {}
+
+    return {
+        'academic_metadata': academic_metadata,
+        'knowledge_entities': knowledge_entities,
+        'knowledge_relationships': knowledge_relationships
+    }
+
+def run_bayesian_stage(file_name: str, knowledge_entities: list, knowledge_relationships: list) -> dict:
+    """Fase 4.7: processamento Bayesiano della conoscenza."""
+    update_status("Analisi Bayesiana...", file_name)
+
+    # Crea motore di inferenza Bayesiano (usa user_id di default se disponibile)
+    # Nota: In produzione, questo dovrebbe usare l'user_id del chiamante
+    # Per ora usiamo un user_id di default (1) per documenti non associati a utenti specifici
+    default_user_id = 1
+    bayesian_engine = create_inference_engine(user_id=default_user_id, learning_rate=0.3)
+
+    # Prepara entità per il processamento Bayesiano
+    extracted_entities = []
+    for entity in knowledge_entities:
+        extracted_entities.append({
+            'name': entity.get('entity_name', ''),
+            'type': entity.get('entity_type', 'concept'),
+            'description': entity.get('entity_description', '')
+        })
+
+    # Prepara relazioni per il processamento Bayesiano
+    extracted_relationships = []
+    for relationship in knowledge_relationships:
+        extracted_relationships.append({
+            'source': relationship.get('source_name', ''),
+            'target': relationship.get('target_name', ''),
+            'type': relationship.get('relationship_type', 'related_to'),
+            'description': relationship.get('relationship_description', '')
+        })
+
+    # Processa le prove estratte tramite il motore Bayesiano
+    try:
+        bayesian_result = bayesian_engine.process_document_evidence(
+            document_file_name=file_name,
+            extracted_entities=extracted_entities,
+            extracted_relationships=extracted_relationships
+        )
+
+        if bayesian_result.success:
+            print(f"✅ Processamento Bayesiano completato: {bayesian_result.entities_created} entità, {bayesian_result.relationships_created} relazioni")
+            return {
+                'success': True,
+                'entities_created': bayesian_result.entities_created,
+                'relationships_created': bayesian_result.relationships_created,
+                'confidence_summary': bayesian_engine.get_confidence_summary()
+            }
+        else:
+            print(f"⚠️ Processamento Bayesiano fallito: {bayesian_result.errors}")
+            return {
+                'success': False,
+                'errors': bayesian_result.errors
+            }
+
+    except Exception as e:
+        print(f"❌ Errore nel processamento Bayesiano: {e}")
+        return {
+            'success': False,
+            'error': str(e)
+        }
+
+def run_persist_stage(file_path: str, file_name: str, metadata: PaperMetadata, classification: dict,
+                      formatted_preview: str, academic_metadata: dict) -> dict:
+    """Fase 5: salvataggio su DB e archiviazione del file."""
+    update_status("Salvataggio finale...", file_name)
+    with db_connect() as conn:
+        conn.cursor().execute("""
+            INSERT INTO papers (file_name, title, authors, publication_year, category_id, category_name, formatted_preview, keywords, ai_tasks, processed_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?) ON CONFLICT(file_name) DO UPDATE SET
+            title=excluded.title, authors=excluded.authors, publication_year=excluded.publication_year,
+            category_id=excluded.category_id, category_name=excluded.category_name, formatted_preview=excluded.formatted_preview,
+            keywords=excluded.keywords, ai_tasks=excluded.ai_tasks, processed_at=excluded.processed_at;
+        """, (file_name, metadata.title, json.dumps(metadata.authors), metadata.publication_year, classification['category_id'], classification['category_full_name'], formatted_preview, json.dumps(academic_metadata.get('keywords', [])), json.dumps(academic_metadata.get('ai_tasks', {})), datetime.now().isoformat()))
+        conn.commit()
+
+    destination_folder = os.path.join(CATEGORIZED_ARCHIVE_DIR, classification['part_id'], classification['chapter_id'])
+    destination_path = os.path.join(destination_folder, file_name)
+    os.makedirs(destination_folder, exist_ok=True)
+    # Il file potrebbe essere già stato spostato da un tentativo precedente interrotto
+    if os.path.exists(file_path):
+        shutil.move(file_path, destination_path)
+    return {'archived_path': destination_path}
+
+def compute_dedup_signature(full_text: str):
+    """Firma MinHash delle prime pagine; None se disattivato o in caso di errore."""
+    if not near_duplicate_detector.NEAR_DUP_ENABLED:
+        return None
+    try:
+        return near_duplicate_detector.compute_signature(near_duplicate_detector.get_dedup_text(full_text))
+    except Exception as e:
+        print(f"⚠️ Errore calcolo firma MinHash: {e}")
+        return None
+
+def check_near_duplicate(file_name: str, content_hash: str, signature):
+    """Cerca un documento già archiviato quasi identico (prima di qualsiasi chiamata LLM)."""
+    if not near_duplicate_detector.NEAR_DUP_ENABLED:
+        return None
+    try:
+        return near_duplicate_detector.find_near_duplicate(signature, content_hash, exclude_file_name=file_name)
+    except Exception as e:
+        print(f"⚠️ Errore ricerca quasi-duplicati per {file_name}: {e}")
+        return None
+
+def load_archived_document(paper: dict):
+    """Testo e hash del file archiviato di una riga di papers; senza file resta l'anteprima salvata."""
+    part_id, chapter_id = (paper.get('category_id') or "UNCATEGORIZED/C00").split('/')
+    archived_path = os.path.join(CATEGORIZED_ARCHIVE_DIR, part_id, chapter_id, paper['file_name'])
+    extractor = get_text_extractor(os.path.splitext(paper['file_name'])[1].lower())
+    if extractor and os.path.exists(archived_path):
+        return extractor(archived_path), compute_content_hash(archived_path)
+    return " ".join(filter(None, [paper.get('title'), paper.get('formatted_preview')])), None
+
+def archive_as_duplicate(file_path: str, file_name: str, content_hash: str, match) -> str:
+    """Collega il file al documento esistente e lo sposta fuori dalla coda di processamento."""
+    near_duplicate_detector.record_duplicate_link(file_name, match, content_hash)
+    os.makedirs(DUPLICATES_DIR, exist_ok=True)
+    destination_path = os.path.join(DUPLICATES_DIR, file_name)
+    if os.path.exists(file_path):
+        shutil.move(file_path, destination_path)
+    return destination_path
+
 # --- TASK PRINCIPALE ---
 @celery_app.task(
     name='archivista.process_document',
@@ -300,10 +696,15 @@ def classify_document(text_content):
     soft_time_limit=300,
     time_limit=360
 )
-def process_document_task(self, file_path):
+def process_document_task(self, file_path, user_id=None, allow_duplicate=False):
     """
     Task principale di processamento documenti con framework di diagnosi errori avanzato.
 
+    user_id è l'utente che ha caricato il file (None per la scansione della
+    cartella): a processamento riuscito i suoi suggerimenti vengono ricalcolati.
+    allow_duplicate salta il controllo dei quasi-duplicati, per i file
+    segnalati per errore come copie di un documento esistente.
+
     Implementa:
     - Tracciamento completo dello stato di processamento
     - Gestione errori strutturata con classificazione automatica
@@ -328,41 +729,32 @@ def process_document_task(self, file_path):
                                       extra={"correlation_id": correlation_id})
         return {'status': 'initialization_failed', 'file_name': file_name, 'error': str(e)}
 
-    lock_file = file_path + ".lock"
+    # Lock atomico: un solo worker per documento, rilasciato subito se il worker muore
+    try:
+        document_lock = acquire_document_lock("process", file_name)
+    except Exception as e:
+        error_msg = f"Errore acquisizione lock per {file_name}: {e}"
+        error_framework.update_processing_state(
+            file_name,
+            ProcessingState.FAILED_PARSING,
+            ProcessingPhase.PHASE_1,
+            error_message=error_msg,
+            correlation_id=correlation_id
+        )
+        return {'status': 'lock_error', 'file_name': file_name, 'error': error_msg}
 
-    # Check for existing lock with timeout
-    if os.path.exists(lock_file):
-        lock_age = time.time() - os.path.getmtime(lock_file)
-        if lock_age < 600:  # Increased timeout to 10 minutes
-            error_framework.update_processing_state(
-                file_name,
-                ProcessingState.PROCESSING,
-                ProcessingPhase.PHASE_1,
-                error_message=f"File già in elaborazione da {lock_age:.0f}s",
-                correlation_id=correlation_id
-            )
-            print(f"⏳ {file_name} già in elaborazione, attendo...")
-            return {'status': 'already_processing', 'file_name': file_name}
-        else:
-            print(f"⚠️ Rimuovo lock obsoleto per {file_name} (età: {lock_age:.0f}s)")
-            os.remove(lock_file)
+    if document_lock is None:
+        error_framework.update_processing_state(
+            file_name,
+            ProcessingState.PROCESSING,
+            ProcessingPhase.PHASE_1,
+            error_message="File già in elaborazione da un altro worker",
+            correlation_id=correlation_id
+        )
+        print(f"⏳ {file_name} già in elaborazione, attendo...")
+        return {'status': 'already_processing', 'file_name': file_name}
 
     try:
-        # Create lock file atomically
-        try:
-            with open(lock_file, "w") as f:
-                f.write(f"{os.getpid()},{time.time()}")
-        except Exception as e:
-            error_msg = f"Errore creazione lock per {file_name}: {e}"
-            error_framework.update_processing_state(
-                file_name,
-                ProcessingState.FAILED_PARSING,
-                ProcessingPhase.PHASE_1,
-                error_message=error_msg,
-                correlation_id=correlation_id
-            )
-            return {'status': 'lock_error', 'file_name': file_name, 'error': error_msg}
-
         # Inizializza servizi
         try:
             initialize_services()
@@ -392,249 +784,88 @@ def process_document_task(self, file_path):
             correlation_id=correlation_id
         )
         update_status("Avviato processamento", file_name)
-        
-        # 1. ESTRAZIONE TESTO
-        update_status("Estrazione testo...", file_name)
-        file_ext = os.path.splitext(file_name)[1].lower()
-        extractor = get_text_extractor(file_ext)
-        if not extractor: raise ValueError(f"Formato file non supportato: {file_ext}")
-        full_text = extractor(file_path)
-        if not full_text or not full_text.strip(): raise ValueError("Documento vuoto o illeggibile.")
-        doc = Document(text=full_text)
 
-        # 2. CLASSIFICAZIONE
-        update_status("Classificazione AI...", file_name)
-        category_id = classify_document(full_text)
-        if category_id == "UNCATEGORIZED/C00":
-            part_id, chapter_id = "UNCATEGORIZED", "C00"
-            part_name, chapter_name = "Non Categorizzato", "Generale"
+        # Checkpoint per fase, indicizzati per hash del contenuto: un retry
+        # riprende dalla prima fase incompleta invece di ripartire da zero
+        if os.path.exists(file_path):
+            content_hash = compute_content_hash(file_path)
         else:
-            part_id, chapter_id = category_id.split('/')
-            part_name = knowledge_structure.KNOWLEDGE_BASE_STRUCTURE[part_id]['name']
-            chapter_name = knowledge_structure.KNOWLEDGE_BASE_STRUCTURE[part_id]['chapters'][chapter_id]
-        category_full_name = f"{part_name} -> {chapter_name}"
-
-        # 3. ESTRAZIONE METADATI
-        update_status("Estrazione metadati...", file_name)
-        # MODIFICA: Usa il prompt manager
-        metadata_prompt = PromptTemplate(prompt_manager.get_prompt("PYDANTIC_METADATA_PROMPT"))
-        metadata_query = metadata_prompt.format(document_text=full_text[:4000], category_name=category_full_name)
-        response = Settings.llm.complete(metadata_query)
-        try:
-            response_text = str(response).strip()
-            # Try to extract JSON from the response if it contains extra text
-            if '{' in response_text and '}' in response_text:
-                start_idx = response_text.find('{')
-                end_idx = response_text.rfind('}') + 1
-                json_str = response_text[start_idx:end_idx]
-                metadata = PaperMetadata(**json.loads(json_str))
-            else:
-                # Fallback if no JSON found
-                metadata = PaperMetadata(title=file_name, authors=[], publication_year=None)
-        except (json.JSONDecodeError, TypeError, ValueError) as e:
-            print(f"⚠️ Errore parsing metadati JSON: {e}. Response: {str(response)[:200]}...")
-            metadata = PaperMetadata(title=file_name, authors=[], publication_year=None)
-
-        # 4. INDICIZZAZIONE (LOGICA SEMPLIFICATA E ATOMICA)
-        update_status("Indicizzazione...", file_name)
-        doc.metadata.update({"file_name": file_name, "title": metadata.title, "authors": json.dumps(metadata.authors), "publication_year": metadata.publication_year, "category_id": category_id, "category_name": category_full_name})
-
-        # Crea storage context per l'indicizzazione con ChromaVectorStore
-        from llama_index.core.storage.docstore import SimpleDocumentStore
-        from llama_index.core.storage.index_store import SimpleIndexStore
-
-        # Crea/ottiene collezione ChromaDB
-        try:
-            import chromadb
-            from llama_index.vector_stores.chroma import ChromaVectorStore
-
-            db = chromadb.PersistentClient(path=DB_STORAGE_DIR)
-            chroma_collection = db.get_or_create_collection("documents")
-            vector_store = ChromaVectorStore(chroma_collection=chroma_collection)
+            # Retry dopo che la fase di salvataggio ha già spostato il file: l'hash viene dai checkpoint
+            content_hash = find_checkpoint_hash(file_name)
+            if content_hash is None:
+                raise FileNotFoundError(f"File non trovato e nessun checkpoint da riprendere: {file_path}")
+        checkpointer = PipelineCheckpointer(file_name, content_hash, task_id=self.request.id)
+
+        def run_stage(stage, func):
+            if not checkpointer.is_completed(stage):
+                error_framework.update_processing_state(
+                    file_name,
+                    ProcessingState.PROCESSING,
+                    STAGE_PHASES[stage],
+                    correlation_id=correlation_id
+                )
+            return checkpointer.run_stage(stage, func)
 
-            print(f"🚀 Utilizzo ChromaVectorStore per alte performance")
+        # 1. ESTRAZIONE TESTO
+        full_text = run_stage("extract", lambda: run_extraction_stage(file_path, file_name))
 
-        except ImportError:
-            print(f"⚠️ ChromaDB non disponibile, fallback a SimpleVectorStore")
-            from llama_index.core.vector_stores import SimpleVectorStore
-            vector_store = SimpleVectorStore()
-
-        storage_context = StorageContext.from_defaults(
-            docstore=SimpleDocumentStore(),
-            vector_store=vector_store,
-            index_store=SimpleIndexStore(),
-            persist_dir=DB_STORAGE_DIR
-        )
+        # 1.5. QUASI-DUPLICATI: se il documento è già in archivio, nessun lavoro LLM
+        dedup_signature = compute_dedup_signature(full_text)
+        duplicate = None if allow_duplicate else check_near_duplicate(file_name, content_hash, dedup_signature)
+        if allow_duplicate:
+            # Forzato dall'utente: un collegamento registrato in precedenza non vale più
+            try:
+                near_duplicate_detector.remove_duplicate_link(file_name)
+            except Exception as e:
+                print(f"⚠️ Errore rimozione collegamento duplicato per {file_name}: {e}")
+        if duplicate:
+            document_lock.ensure_held()
+            archive_as_duplicate(file_path, file_name, content_hash, duplicate)
+            checkpointer.finalize()
+            error_framework.update_processing_state(
+                file_name,
+                ProcessingState.COMPLETED,
+                ProcessingPhase.PHASE_5,
+                error_message=f"Quasi-duplicato di {duplicate.file_name} (similarità {duplicate.similarity:.2f})",
+                correlation_id=correlation_id
+            )
+            print(f"♻️ {file_name} è un quasi-duplicato di {duplicate.file_name} (similarità {duplicate.similarity:.2f}), processamento saltato")
+            update_status("Completato (duplicato)", file_name)
+            return {
+                'status': 'duplicate',
+                'file_name': file_name,
+                'duplicate_of': duplicate.file_name,
+                'similarity': duplicate.similarity
+            }
 
-        try:
-            # Tenta di caricare un indice esistente
-            storage_context = StorageContext.from_defaults(persist_dir=DB_STORAGE_DIR, vector_store=vector_store)
-            index = load_index_from_storage(storage_context)
-            print("✅ Indice esistente caricato. Aggiungo nuovo documento...")
-            index.insert(doc)
+        # 2. CLASSIFICAZIONE
+        classification = run_stage("classify", lambda: run_classification_stage(full_text, file_name))
+        category_id = classification['category_id']
 
-        except FileNotFoundError:
-            # Se nessun indice esiste, creane uno nuovo
-            print("🆕 Nessun indice trovato. Ne creo uno nuovo.")
-            storage_context = StorageContext.from_defaults(vector_store=vector_store)
-            index = VectorStoreIndex.from_documents([doc], storage_context=storage_context)
+        # 3. ESTRAZIONE METADATI
+        metadata = PaperMetadata(**run_stage(
+            "metadata",
+            lambda: run_metadata_stage(full_text, file_name, classification['category_full_name'])
+        ))
 
-        # A prescindere da cosa sia successo, salva lo stato finale
-        index.storage_context.persist(persist_dir=DB_STORAGE_DIR)
-        print("💾 Indice salvato correttamente su disco.")
+        # 4. INDICIZZAZIONE
+        document_lock.ensure_held()
+        run_stage("index", lambda: run_indexing_stage(full_text, file_name, content_hash, metadata, classification))
 
         # 4.5. GENERAZIONE ANTEPRIMA
-        update_status("Generazione anteprima...", file_name)
-        # Usa il prompt manager per caricare il template di anteprima
-        preview_prompt = PromptTemplate(prompt_manager.get_prompt("FORMAT_PREVIEW_PROMPT"))
-        preview_query = preview_prompt.format(raw_text=full_text[:2500])  # Usa primi 2500 caratteri
-        preview_response = Settings.llm.complete(preview_query)
-        formatted_preview = str(preview_response).strip()
+        formatted_preview = run_stage("preview", lambda: run_preview_stage(full_text, file_name))
 
         # 4.6. ANALISI ACCADEMICA (parole chiave, task e grafo della conoscenza)
-        update_status("Analisi accademica...", file_name)
-        academic_metadata = {}
-        knowledge_entities = []
-        knowledge_relationships = []
-
-        # Estrazione parole chiave
-        try:
-            keywords_prompt = PromptTemplate(prompt_manager.get_prompt("ACADEMIC_KEYWORDS_PROMPT"))
-            keywords_query = keywords_prompt.format(document_text=full_text[:4000])
-            keywords_response = Settings.llm.complete(keywords_query)
-            keywords_text = str(keywords_response).strip()
-            # Try to parse JSON
-            try:
-                keywords_data = json.loads(keywords_text)
-                academic_metadata['keywords'] = keywords_data['keywords']
-            except (json.JSONDecodeError, KeyError):
-                print(f"⚠️ Impossibile parsare parole chiave JSON per {file_name}")
-                academic_metadata['keywords'] = []
-        except Exception as e:
-            print(f"⚠️ Errore estrazione parole chiave per {file_name}: {e}")
-            academic_metadata['keywords'] = []
-
-        # Estrazione entità concettuali per il grafo della conoscenza
-        try:
-            entities_prompt = PromptTemplate(prompt_manager.get_prompt("KNOWLEDGE_ENTITIES_PROMPT"))
-            entities_query = entities_prompt.format(document_text=full_text[:3000])
-            entities_response = Settings.llm.complete(entities_query)
-            entities_text = str(entities_response).strip()
-
-            # Try to parse JSON entities
-            try:
-                entities_data = json.loads(entities_text)
-                knowledge_entities = entities_data
-                print(f"✅ Estratte {len(knowledge_entities)} entità concettuali da {file_name}")
-            except (json.JSONDecodeError, KeyError):
-                print(f"⚠️ Impossibile parsare entità JSON per {file_name}")
-                knowledge_entities = []
-
-        except Exception as e:
-            print(f"⚠️ Errore estrazione entità per {file_name}: {e}")
-            knowledge_entities = []
-
-        # Estrazione relazioni concettuali (solo se abbiamo entità)
-        if knowledge_entities:
-            try:
-                entities_list = [f"- {e['entity_name']} ({e['entity_type']})" for e in knowledge_entities]
-                entities_list_text = "\n".join(entities_list)
-
-                relationships_prompt = PromptTemplate(prompt_manager.get_prompt("ENTITY_RELATIONSHIPS_PROMPT"))
-                relationships_query = relationships_prompt.format(
-                    document_text=full_text[:3000],
-                    entities_list=entities_list_text
-                )
-                relationships_response = Settings.llm.complete(relationships_query)
-                relationships_text = str(relationships_response).strip()
-
-                # Try to parse JSON relationships
-                try:
-                    relationships_data = json.loads(relationships_text)
-                    knowledge_relationships = relationships_data
-                    print(f"✅ Estratte {len(knowledge_relationships)} relazioni concettuali da {file_name}")
-                except (json.JSONDecodeError, KeyError):
-                    print(f"⚠️ Impossibile parsare relazioni JSON per {file_name}")
-                    knowledge_relationships = []
-
-            except Exception as e:
-                print(f"⚠️ Errore estrazione relazioni per {file_name}: {e}")
-                knowledge_relationships = []
-
-        # Generazione task AI
-        try:
-            tasks_prompt = PromptTemplate(prompt_manager.get_prompt("ACADEMIC_TASK_GENERATION_PROMPT"))
-            tasks_query = tasks_prompt.format(document_text=full_text[:3000])
-            tasks_response = Settings.llm.complete(tasks_query)
-            tasks_text = str(tasks_response).strip()
-            # Try to parse JSON
-            try:
-                tasks_data = json.loads(tasks_text)
-                academic_metadata['ai_tasks'] = tasks_data
-            except (json.JSONDecodeError, KeyError):
-                print(f"⚠️ Impossibile parsare task JSON per {file_name}")
-                academic_metadata['ai_tasks'] = {}
-        except Exception as e:
-            print(f"⚠️ Errore generazione task AI per {file_name}: {e}")
-            academic_metadata['ai_tasks'] = {}
+        analysis = run_stage("academic_analysis", lambda: run_academic_analysis_stage(full_text, file_name))
+        academic_metadata = dict(analysis['academic_metadata'])
+        knowledge_entities = analysis['knowledge_entities']
+        knowledge_relationships = analysis['knowledge_relationships']
 
         # 4.7. PROCESAMENTO BAYESIANO DELLA CONOSCENZA
-        update_status("Analisi Bayesiana...", file_name)
-
-        # Crea motore di inferenza Bayesiano (usa user_id di default se disponibile)
-        # Nota: In produzione, questo dovrebbe usare l'user_id del chiamante
-        # Per ora usiamo un user_id di default (1) per documenti non associati a utenti specifici
-        default_user_id = 1
-        bayesian_engine = create_inference_engine(user_id=default_user_id, learning_rate=0.3)
-
-        # Prepara entità per il processamento Bayesiano
-        extracted_entities = []
-        for entity in knowledge_entities:
-            extracted_entities.append({
-                'name': entity.get('entity_name', ''),
-                'type': entity.get('entity_type', 'concept'),
-                'description': entity.get('entity_description', '')
-            })
-
-        # Prepara relazioni per il processamento Bayesiano
-        extracted_relationships = []
-        for relationship in knowledge_relationships:
-            extracted_relationships.append({
-                'source': relationship.get('source_name', ''),
-                'target': relationship.get('target_name', ''),
-                'type': relationship.get('relationship_type', 'related_to'),
-                'description': relationship.get('relationship_description', '')
-            })
-
-        # Processa le prove estratte tramite il motore Bayesiano
-        try:
-            bayesian_result = bayesian_engine.process_document_evidence(
-                document_file_name=file_name,
-                extracted_entities=extracted_entities,
-                extracted_relationships=extracted_relationships
-            )
-
-            if bayesian_result.success:
-                print(f"✅ Processamento Bayesiano completato: {bayesian_result.entities_created} entità, {bayesian_result.relationships_created} relazioni")
-                academic_metadata['bayesian_processing'] = {
-                    'success': True,
-                    'entities_created': bayesian_result.entities_created,
-                    'relationships_created': bayesian_result.relationships_created,
-                    'confidence_summary': bayesian_engine.get_confidence_summary()
-                }
-            else:
-                print(f"⚠️ Processamento Bayesiano fallito: {bayesian_result.errors}")
-                academic_metadata['bayesian_processing'] = {
-                    'success': False,
-                    'errors': bayesian_result.errors
-                }
-
-        except Exception as e:
-            print(f"❌ Errore nel processamento Bayesiano: {e}")
-            academic_metadata['bayesian_processing'] = {
-                'success': False,
-                'error': str(e)
-            }
+        academic_metadata['bayesian_processing'] = run_stage(
+            "bayesian",
+            lambda: run_bayesian_stage(file_name, knowledge_entities, knowledge_relationships)
+        )
 
         # Salvare entità e relazioni nel grafo della conoscenza
         # Nota: Dato che process_document_task non ha user_id, questo sarà gestito dal chiamante
@@ -643,24 +874,39 @@ def process_document_task(self, file_path):
         academic_metadata['knowledge_relationships'] = knowledge_relationships
 
         # 5. SALVATAGGIO SU DB E ARCHIVIAZIONE
-        update_status("Salvataggio finale...", file_name)
-        with db_connect() as conn:
-            conn.cursor().execute("""
-                INSERT INTO papers (file_name, title, authors, publication_year, category_id, category_name, formatted_preview, keywords, ai_tasks, processed_at)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?) ON CONFLICT(file_name) DO UPDATE SET
-                title=excluded.title, authors=excluded.authors, publication_year=excluded.publication_year,
-                category_id=excluded.category_id, category_name=excluded.category_name, formatted_preview=excluded.formatted_preview,
-                keywords=excluded.keywords, ai_tasks=excluded.ai_tasks, processed_at=excluded.processed_at;
-            """, (file_name, metadata.title, json.dumps(metadata.authors), metadata.publication_year, category_id, category_full_name, formatted_preview, json.dumps(academic_metadata.get('keywords', [])), json.dumps(academic_metadata.get('ai_tasks', {})), datetime.now().isoformat()))
-            conn.commit()
+        document_lock.ensure_held()
+        run_stage("persist", lambda: run_persist_stage(
+            file_path, file_name, metadata, classification, formatted_preview, academic_metadata
+        ))
+
+        # Registra la firma nell'indice LSH per riconoscere i duplicati futuri
+        try:
+            near_duplicate_detector.register_signature(file_name, content_hash, dedup_signature)
+        except Exception as e:
+            print(f"⚠️ Errore registrazione firma MinHash per {file_name}: {e}")
+
+        # Pipeline completata: i checkpoint non servono più (le durate restano per il profiling)
+        checkpointer.finalize()
+        print(f"⏱️ Durate fasi per {file_name}: " + ", ".join(f"{s}={ms:.0f}ms" for s, ms in checkpointer.timings.items()))
+
+        # Stato finale: scritto subito, senza attendere il flush periodico del buffer
+        error_framework.update_processing_state(
+            file_name,
+            ProcessingState.COMPLETED,
+            ProcessingPhase.PHASE_5,
+            correlation_id=correlation_id
+        )
 
-        destination_folder = os.path.join(CATEGORIZED_ARCHIVE_DIR, part_id, chapter_id)
-        os.makedirs(destination_folder, exist_ok=True)
-        shutil.move(file_path, os.path.join(destination_folder, file_name))
-        
         update_status("Completato", file_name)
+        if user_id is not None:
+            notify_suggestions(user_id, 'document_processed', wait=True)
         return {'status': 'success', 'file_name': file_name, 'category': category_id}
 
+    except LockLostError as e:
+        # Un altro worker può aver preso il documento: nessun retry né quarantena
+        print(f"⚠️ {e}")
+        return {'status': 'lock_lost', 'file_name': file_name, 'error': str(e)}
+
     except Exception as e:
         """
         Gestione errori avanzata con framework di diagnosi completo.
@@ -673,7 +919,7 @@ def process_document_task(self, file_path):
         try:
             # Determina la fase corrente basata sullo stato di processamento
             current_status = error_framework.get_processing_status(file_name)
-            current_phase = current_status.current_phase if current_status else ProcessingPhase.PHASE_2
+            current_phase = ProcessingPhase(current_status.current_phase) if current_status else ProcessingPhase.PHASE_2
 
             error_record = error_framework.classify_error(e, file_name, current_phase)
             error_framework.record_error(error_record, correlation_id)
@@ -756,9 +1002,9 @@ def process_document_task(self, file_path):
                 'framework_error': str(framework_error)
             }
     finally:
-        if os.path.exists(lock_file):
-            os.remove(lock_file)
-            print(f"🔓 Lock rilasciato per {file_name}")
+        error_framework.flush_state_updates()
+        document_lock.release()
+        print(f"🔓 Lock rilasciato per {file_name}")
 
 @celery_app.task(name='archivista.delete_document')
 def delete_document_task(file_name):
@@ -766,23 +1012,18 @@ def delete_document_task(file_name):
     Task di cancellazione atomica: elimina un documento da indice, database e filesystem.
     Tutte le operazioni devono riuscire o fallire atomicamente per garantire consistenza.
     """
-    lock_file = os.path.join(DB_STORAGE_DIR, f"delete_{file_name}.lock")
-
-    # Check for existing deletion lock
-    if os.path.exists(lock_file):
-        lock_age = time.time() - os.path.getmtime(lock_file)
-        if lock_age < 300:  # 5 minutes timeout for deletion
-            print(f"⏳ Cancellazione di {file_name} già in corso, attendo...")
-            return {'status': 'already_deleting', 'file_name': file_name}
-        else:
-            print(f"⚠️ Rimuovo lock obsoleto per cancellazione di {file_name}")
-            os.remove(lock_file)
-
     try:
-        # Create deletion lock
-        with open(lock_file, "w") as f:
-            f.write(f"{os.getpid()},{time.time()}")
+        delete_lock = acquire_document_lock("delete", file_name)
+    except Exception as e:
+        error_msg = f"Errore acquisizione lock di cancellazione per {file_name}: {e}"
+        print(f"❌ {error_msg}")
+        return {'status': 'lock_error', 'file_name': file_name, 'error': error_msg}
+
+    if delete_lock is None:
+        print(f"⏳ Cancellazione di {file_name} già in corso, attendo...")
+        return {'status': 'already_deleting', 'file_name': file_name}
 
+    try:
         print(f"🗑️ Inizio cancellazione atomica di {file_name}")
 
         # STEP 1: Trova informazioni documento nel database
@@ -800,6 +1041,7 @@ def delete_document_task(file_name):
         print(f"📋 Documento trovato: {file_name} in categoria {category_id}")
 
         # STEP 2: Rimuovi dall'indice vettoriale
+        delete_lock.ensure_held()
         try:
             from llama_index.core.storage.docstore import SimpleDocumentStore
             from llama_index.core.storage.index_store import SimpleIndexStore
@@ -854,6 +1096,7 @@ def delete_document_task(file_name):
             # Continuiamo con le altre operazioni
 
         # STEP 3: Rimuovi dal database
+        delete_lock.ensure_held()
         with db_connect() as conn:
             cursor = conn.cursor()
             cursor.execute("DELETE FROM papers WHERE file_name = ?", (file_name,))
@@ -865,6 +1108,11 @@ def delete_document_task(file_name):
         else:
             print(f"⚠️ Nessuna riga rimossa dal database per {file_name}")
 
+        # Rimuovi eventuali checkpoint di pipeline rimasti da tentativi interrotti
+        clear_checkpoints(file_name=file_name)
+        # Rimuovi la firma dall'indice dei quasi-duplicati
+        near_duplicate_detector.remove_signature(file_name)
+
         # STEP 4: Cancella file fisico
         file_deleted = False
         if category_id and category_id != "UNCATEGORIZED/C00":
@@ -914,9 +1162,24 @@ def delete_document_task(file_name):
         }
     finally:
         # Rimuovi lock di cancellazione
-        if os.path.exists(lock_file):
-            os.remove(lock_file)
-            print(f"🔓 Lock di cancellazione rilasciato per {file_name}")
+        delete_lock.release()
+        print(f"🔓 Lock di cancellazione rilasciato per {file_name}")
+
+@celery_app.task(name='archivista.backfill_near_duplicate_signatures')
+def backfill_near_duplicate_signatures_task():
+    """Task una tantum: firma MinHash dei documenti archiviati prima dell'indice dei quasi-duplicati."""
+    if not near_duplicate_detector.NEAR_DUP_ENABLED:
+        return {'status': 'disabled'}
+    stats = near_duplicate_detector.backfill_signatures(load_archived_document)
+    if any(stats.values()):
+        print(f"🔎 Backfill firme MinHash: {stats['registered']} registrate, "
+              f"{stats['too_short']} testi troppo corti, {stats['errors']} errori")
+    return dict(stats, status='success')
+
+@worker_ready.connect
+def _backfill_signatures_on_start(**kwargs):
+    # Dopo il primo avvio non trova righe senza firma: costa una query
+    backfill_near_duplicate_signatures_task.delay()
 
 @celery_app.task(name='archivista.cleanup_old_data')
 def cleanup_old_data():
@@ -943,23 +1206,18 @@ def process_user_bayesian_knowledge_task(user_id: int, file_name: str):
     Returns:
         dict: Risultato del processamento Bayesiano
     """
-    lock_file = os.path.join(DB_STORAGE_DIR, f"bayesian_{user_id}_{file_name}.lock")
-
-    # Check for existing lock
-    if os.path.exists(lock_file):
-        lock_age = time.time() - os.path.getmtime(lock_file)
-        if lock_age < 300:  # 5 minutes timeout
-            print(f"⏳ Processamento Bayesiano già in corso per user {user_id}, file {file_name}")
-            return {'status': 'already_processing', 'user_id': user_id, 'file_name': file_name}
-        else:
-            print(f"⚠️ Rimuovo lock obsoleto per processamento Bayesiano")
-            os.remove(lock_file)
-
     try:
-        # Create lock file
-        with open(lock_file, "w") as f:
-            f.write(f"{os.getpid()},{time.time()}")
+        bayesian_lock = acquire_document_lock(f"bayesian_{user_id}", file_name)
+    except Exception as e:
+        error_msg = f"Errore acquisizione lock Bayesiano per user {user_id}, file {file_name}: {e}"
+        print(f"❌ {error_msg}")
+        return {'status': 'lock_error', 'user_id': user_id, 'file_name': file_name, 'error': error_msg}
 
+    if bayesian_lock is None:
+        print(f"⏳ Processamento Bayesiano già in corso per user {user_id}, file {file_name}")
+        return {'status': 'already_processing', 'user_id': user_id, 'file_name': file_name}
+
+    try:
         print(f"🧠 Inizio processamento Bayesiano per user {user_id}, file {file_name}")
 
         # Verifica che il documento esista nel database
@@ -1071,6 +1329,7 @@ def process_user_bayesian_knowledge_task(user_id: int, file_name: str):
             })
 
         # Processa tramite motore Bayesiano
+        bayesian_lock.ensure_held()
         bayesian_result = bayesian_engine.process_document_evidence(
             document_file_name=file_name,
             extracted_entities=extracted_entities,
@@ -1089,6 +1348,8 @@ def process_user_bayesian_knowledge_task(user_id: int, file_name: str):
 
         if not bayesian_result.success:
             result_data['errors'] = bayesian_result.errors
+        else:
+            notify_suggestions(user_id, 'document_processed', wait=True)
 
         print(f"✅ Processamento Bayesiano completato per user {user_id}")
         return result_data
@@ -1103,9 +1364,8 @@ def process_user_bayesian_knowledge_task(user_id: int, file_name: str):
             'error': str(e)
         }
     finally:
-        if os.path.exists(lock_file):
-            os.remove(lock_file)
-            print(f"🔓 Lock rilasciato per processamento Bayesiano user {user_id}")
+        bayesian_lock.release()
+        print(f"🔓 Lock rilasciato per processamento Bayesiano user {user_id}")
 
 @celery_app.task(name='archivista.process_user_feedback_bayesian')
 def process_user_feedback_bayesian_task(user_id: int, target_type: str, target_id: int,
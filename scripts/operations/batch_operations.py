@@ -2,17 +2,13 @@
 Modulo per operazioni batch sui metadati dei documenti.
 Permette modifiche massive sicure e validate.
 """
-import pandas as pd
-import sqlite3
-import os
-import json
 from datetime import datetime
-from typing import List, Dict, Any, Tuple, Optional
-from file_utils import db_connect, get_papers_dataframe, update_paper_metadata
-
-# --- CONFIGURAZIONE ---
-DB_STORAGE_DIR = "db_memoria"
-METADATA_DB_FILE = os.path.join(DB_STORAGE_DIR, "metadata.sqlite")
+from typing import List, Dict, Any, Tuple
+from file_utils import db_connect
+from tools.batch_metadata import (
+    BATCH_FIELDS, compile_operation, execute_operation, find_missing_files,
+    get_operation_history, load_selection, preview_operation, undo_operation
+)
 
 class BatchOperation:
     """Rappresenta una singola operazione batch."""
@@ -33,37 +29,61 @@ class BatchOperation:
             'timestamp': self.timestamp.isoformat()
         }
 
-def validate_batch_operation(operation: BatchOperation, df: pd.DataFrame) -> Tuple[bool, str]:
+def _validate_operation_values(operation: BatchOperation) -> Tuple[bool, str]:
+    """Valida campo, tipo di operazione e valore (senza accedere al database)."""
+    # Verifica che il campo sia valido
+    if operation.field not in BATCH_FIELDS:
+        return False, f"Campo non valido: {operation.field}"
+
+    # Validazione specifica per tipo di operazione
+    if operation.operation_type == 'set':
+        if operation.field == 'publication_year' and operation.value is not None:
+            try:
+                year = int(operation.value)
+                if year < 1000 or year > datetime.now().year + 1:
+                    return False, f"Anno non valido: {operation.value}"
+            except:
+                return False, f"Anno deve essere un numero valido: {operation.value}"
+
+    elif operation.operation_type == 'append' and operation.field == 'authors':
+        if not isinstance(operation.value, str) or not operation.value.strip():
+            return False, "Nome autore non valido per operazione di aggiunta"
+
+    elif operation.operation_type == 'remove' and operation.field == 'authors':
+        if not isinstance(operation.value, str) or not operation.value.strip():
+            return False, "Nome autore non valido per operazione di rimozione"
+
+    try:
+        compile_operation(operation.operation_type, operation.field, operation.value)
+    except ValueError as e:
+        return False, str(e)
+
+    return True, ""
+
+def validate_batch_operation(operation: BatchOperation, df=None) -> Tuple[bool, str]:
     """
     Valida un'operazione batch prima dell'esecuzione.
     Restituisce (is_valid, error_message).
+
+    L'esistenza dei file si verifica in SQL sulla selezione (il parametro
+    `df` è mantenuto per compatibilità e non viene usato).
     """
     try:
-        # Verifica che tutti i file esistano nel dataframe
-        existing_files = set(df['file_name'].tolist())
-        missing_files = [f for f in operation.file_names if f not in existing_files]
-
-        if missing_files:
-            return False, f"File non trovati nell'archivio: {', '.join(missing_files[:5])}"
-
-        # Verifica che il campo sia valido
-        valid_fields = {'title', 'authors', 'publication_year', 'category_id'}
-        if operation.field not in valid_fields:
-            return False, f"Campo non valido: {operation.field}"
+        is_valid, error_msg = _validate_operation_values(operation)
+        if not is_valid:
+            return False, error_msg
 
-        # Validazione specifica per tipo di operazione
-        if operation.operation_type == 'set':
-            if operation.field == 'publication_year' and operation.value is not None:
-                try:
-                    year = int(operation.value)
-                    if year < 1000 or year > datetime.now().year + 1:
-                        return False, f"Anno non valido: {operation.value}"
-                except:
-                    return False, f"Anno deve essere un numero valido: {operation.value}"
+        # Verifica che tutti i file esistano nell'archivio
+        conn = db_connect()
+        try:
+            load_selection(conn, operation.file_names)
+            missing_files = find_missing_files(conn)
+            conn.commit()
+        finally:
+            conn.close()
 
-        elif operation.operation_type == 'append' and operation.field == 'authors':
-            if not isinstance(operation.value, str) or not operation.value.strip():
-                return False, "Nome autore non valido per operazione di aggiunta"
+        if missing_files:
+            return False, f"File non trovati nell'archivio: {', '.join(missing_files)}"
 
         return True, ""
 
@@ -73,139 +93,87 @@ def validate_batch_operation(operation: BatchOperation, df: pd.DataFrame) -> Tup
 def execute_batch_operation(operation: BatchOperation) -> Tuple[bool, str, int]:
     """
     Esegue un'operazione batch e restituisce (success, message, affected_count).
+
+    L'operazione è compilata in pochi statement SQL eseguiti in un'unica
+    transazione (tools.batch_metadata), che verifica anche l'esistenza dei
+    file; i valori precedenti restano nello storico per `undo_batch_operation`.
     """
     try:
-        # Crea backup preventivo (in produzione, salva su file)
-        df = get_papers_dataframe()
-        if df.empty:
-            return False, "Archivio vuoto", 0
-
         # Valida l'operazione
-        is_valid, error_msg = validate_batch_operation(operation, df)
+        is_valid, error_msg = _validate_operation_values(operation)
         if not is_valid:
             return False, error_msg, 0
 
-        affected_count = 0
-
-        for file_name in operation.file_names:
-            try:
-                # Trova il documento corrente
-                file_df = df[df['file_name'] == file_name]
-                if file_df.empty:
-                    continue
-
-                current_data = {
-                    'title': file_df.iloc[0].get('title'),
-                    'authors': file_df.iloc[0].get('authors', '[]'),
-                    'publication_year': file_df.iloc[0].get('publication_year'),
-                    'category_id': file_df.iloc[0].get('category_id')
-                }
-
-                # Applica l'operazione
-                if operation.operation_type == 'set':
-                    if operation.field == 'authors':
-                        # Per gli autori, sostituisci completamente
-                        current_data['authors'] = json.dumps([operation.value] if operation.value else [])
-                    else:
-                        current_data[operation.field] = operation.value
-
-                elif operation.operation_type == 'append' and operation.field == 'authors':
-                    # Aggiungi autore alla lista esistente
-                    try:
-                        current_authors = json.loads(current_data['authors']) if current_data['authors'] else []
-                        if operation.value and operation.value.strip() not in current_authors:
-                            current_authors.append(operation.value.strip())
-                            current_data['authors'] = json.dumps(current_authors)
-                    except:
-                        current_data['authors'] = json.dumps([operation.value] if operation.value else [])
-
-                elif operation.operation_type == 'remove' and operation.field == 'authors':
-                    # Rimuovi autore dalla lista
-                    try:
-                        current_authors = json.loads(current_data['authors']) if current_data['authors'] else []
-                        current_authors = [a for a in current_authors if a.strip() != operation.value.strip()]
-                        current_data['authors'] = json.dumps(current_authors)
-                    except:
-                        pass
-
-                # Esegui l'aggiornamento
-                if update_paper_metadata(file_name, current_data):
-                    affected_count += 1
-
-            except Exception as e:
-                print(f"Errore nell'aggiornamento di {file_name}: {e}")
-                continue
+        conn = db_connect()
+        try:
+            operation_id, affected_count = execute_operation(conn, operation)
+        finally:
+            conn.close()
 
         if affected_count > 0:
-            return True, f"Operazione completata con successo. {affected_count} documenti aggiornati.", affected_count
+            return True, f"Operazione completata con successo. {affected_count} documenti aggiornati (annullabile, id {operation_id}).", affected_count
         else:
             return False, "Nessun documento aggiornato", 0
 
+    except ValueError as e:
+        return False, str(e), 0
     except Exception as e:
         return False, f"Errore durante l'operazione batch: {str(e)}", 0
 
-def get_batch_preview(operation: BatchOperation, df: pd.DataFrame) -> List[Dict]:
+def get_batch_preview(operation: BatchOperation, df=None, limit: int = 10) -> List[Dict]:
     """
-    Restituisce un'anteprima delle modifiche che saranno applicate.
+    Restituisce un'anteprima delle modifiche che saranno applicate
+    (primi `limit` documenti, calcolati in SQL senza caricare l'archivio).
     """
     try:
-        preview_data = []
-
-        for file_name in operation.file_names[:10]:  # Limita a 10 per performance
-            file_df = df[df['file_name'] == file_name]
-            if file_df.empty:
-                continue
-
-            current_row = file_df.iloc[0]
-            current_data = {
-                'title': current_row.get('title'),
-                'authors': current_row.get('authors', '[]'),
-                'publication_year': current_row.get('publication_year'),
-                'category_id': current_row.get('category_id')
-            }
-
-            # Calcola i nuovi valori
-            new_data = current_data.copy()
+        conn = db_connect()
+        try:
+            return preview_operation(conn, operation, limit)['rows']
+        finally:
+            conn.close()
 
-            if operation.operation_type == 'set':
-                if operation.field == 'authors':
-                    new_data['authors'] = json.dumps([operation.value] if operation.value else [])
-                else:
-                    new_data[operation.field] = operation.value
+    except Exception as e:
+        print(f"Errore nella generazione anteprima: {e}")
+        return []
 
-            elif operation.operation_type == 'append' and operation.field == 'authors':
-                try:
-                    current_authors = json.loads(current_data['authors']) if current_data['authors'] else []
-                    if operation.value and operation.value.strip() not in current_authors:
-                        current_authors.append(operation.value.strip())
-                        new_data['authors'] = json.dumps(current_authors)
-                except:
-                    new_data['authors'] = json.dumps([operation.value] if operation.value else [])
+def count_batch_changes(operation: BatchOperation) -> int:
+    """Numero di documenti della selezione che l'operazione modificherebbe."""
+    try:
+        conn = db_connect()
+        try:
+            return preview_operation(conn, operation, limit=0)['changed_count']
+        finally:
+            conn.close()
+    except Exception as e:
+        print(f"Errore nel conteggio delle modifiche: {e}")
+        return 0
 
-            elif operation.operation_type == 'remove' and operation.field == 'authors':
-                try:
-                    current_authors = json.loads(current_data['authors']) if current_data['authors'] else []
-                    current_authors = [a for a in current_authors if a.strip() != operation.value.strip()]
-                    new_data['authors'] = json.dumps(current_authors)
-                except:
-                    pass
+def undo_batch_operation(operation_id: int) -> Tuple[bool, str, int]:
+    """Annulla un'operazione batch ripristinando i valori precedenti."""
+    try:
+        conn = db_connect()
+        try:
+            restored = undo_operation(conn, operation_id)
+        finally:
+            conn.close()
 
-            preview_data.append({
-                'file_name': file_name,
-                'current_title': current_data.get('title', ''),
-                'new_title': new_data.get('title', ''),
-                'current_authors': current_data.get('authors', '[]'),
-                'new_authors': new_data.get('authors', '[]'),
-                'current_year': current_data.get('publication_year'),
-                'new_year': new_data.get('publication_year'),
-                'current_category': current_data.get('category_id', ''),
-                'new_category': new_data.get('category_id', '')
-            })
+        if restored > 0:
+            return True, f"Operazione annullata. {restored} documenti ripristinati.", restored
+        return False, "Operazione non trovata o già annullata", 0
 
-        return preview_data
+    except Exception as e:
+        return False, f"Errore durante l'annullamento: {str(e)}", 0
 
+def get_batch_history(limit: int = 20) -> List[Dict]:
+    """Ultime operazioni batch eseguite, annullabili se `undone_at` è vuoto."""
+    try:
+        conn = db_connect()
+        try:
+            return get_operation_history(conn, limit)
+        finally:
+            conn.close()
     except Exception as e:
-        print(f"Errore nella generazione anteprima: {e}")
+        print(f"Errore nel recupero dello storico batch: {e}")
         return []
 
 def get_available_operations() -> List[Dict]:
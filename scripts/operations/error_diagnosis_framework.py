@@ -5,10 +5,14 @@ Implementazione completa del sistema di tracciamento e gestione errori.
 import os
 import json
 import time
+import atexit
 import logging
+import threading
+from functools import lru_cache
 from datetime import datetime, timedelta
 from enum import Enum
-from typing import Dict, List, Optional, Any
+from types import MappingProxyType
+from typing import Dict, List, Mapping, Optional, Any
 from dataclasses import dataclass, asdict
 import traceback
 
@@ -21,6 +25,10 @@ QUARANTINE_DIR = os.path.join(DB_STORAGE_DIR, "quarantine")
 ERROR_LOG_DIR = os.path.join(DB_STORAGE_DIR, "error_logs")
 PROCESSING_METRICS_DIR = os.path.join(DB_STORAGE_DIR, "metrics")
 
+# Buffer delle transizioni di stato (flush periodico in transazioni batch)
+STATE_FLUSH_INTERVAL = float(os.getenv('ARCHIVISTA_STATE_FLUSH_INTERVAL', 2.0))  # secondi
+STATE_FLUSH_MAX_PENDING = int(os.getenv('ARCHIVISTA_STATE_FLUSH_MAX_PENDING', 50))
+
 # Crea directory necessarie
 for dir_path in [QUARANTINE_DIR, ERROR_LOG_DIR, PROCESSING_METRICS_DIR]:
     os.makedirs(dir_path, exist_ok=True)
@@ -136,6 +144,201 @@ class ProcessingMetrics:
         if self.created_at is None:
             self.created_at = datetime.now()
 
+# Stati finali: la transizione viene scritta subito, senza attendere il flush periodico
+TERMINAL_STATES = {
+    ProcessingState.COMPLETED,
+    ProcessingState.FAILED_PARSING,
+    ProcessingState.FAILED_EXTRACTION_API,
+    ProcessingState.FAILED_EXTRACTION_FORMAT,
+    ProcessingState.FAILED_INDEXING,
+    ProcessingState.FAILED_ARCHIVING,
+    ProcessingState.MANUAL_INTERVENTION_REQUIRED,
+}
+
+# --- BUFFER DELLE TRANSIZIONI DI STATO ---
+
+# Inizializzazione: riscrive lo stato mantenendo retry_count e max_retries
+_RESET_UPSERT_SQL = """
+    INSERT INTO document_processing_status
+    (file_name, processing_state, current_phase, phase_started_at, error_message, error_details,
+     processing_metadata, created_at, updated_at)
+    VALUES (:file_name, :processing_state, COALESCE(:current_phase, 'phase_1'), :phase_started_at,
+            :error_message, :error_details, :processing_metadata, :created_at, :updated_at)
+    ON CONFLICT(file_name) DO UPDATE SET
+        processing_state = excluded.processing_state,
+        current_phase = excluded.current_phase,
+        phase_started_at = excluded.phase_started_at,
+        phase_completed_at = NULL,
+        error_message = excluded.error_message,
+        error_details = excluded.error_details,
+        processing_metadata = excluded.processing_metadata,
+        quarantine_path = NULL,
+        created_at = excluded.created_at,
+        updated_at = excluded.updated_at
+"""
+
+# Transizione: aggiorna solo i campi forniti, senza SELECT preliminare
+_UPDATE_UPSERT_SQL = """
+    INSERT INTO document_processing_status
+    (file_name, processing_state, current_phase, phase_started_at, error_message, error_details,
+     created_at, updated_at)
+    VALUES (:file_name, :processing_state, COALESCE(:current_phase, 'phase_1'), :phase_started_at,
+            :error_message, :error_details, :created_at, :updated_at)
+    ON CONFLICT(file_name) DO UPDATE SET
+        processing_state = excluded.processing_state,
+        current_phase = COALESCE(:current_phase, document_processing_status.current_phase),
+        phase_started_at = CASE
+            WHEN :current_phase IS NOT NULL AND document_processing_status.current_phase != :current_phase
+            THEN :phase_started_at ELSE document_processing_status.phase_started_at END,
+        phase_completed_at = CASE
+            WHEN :current_phase IS NOT NULL AND document_processing_status.current_phase != :current_phase
+            THEN NULL ELSE document_processing_status.phase_completed_at END,
+        error_message = COALESCE(excluded.error_message, document_processing_status.error_message),
+        error_details = COALESCE(excluded.error_details, document_processing_status.error_details),
+        updated_at = excluded.updated_at
+"""
+
+class ProcessingStateBuffer:
+    """
+    Buffer in-worker delle transizioni di stato.
+
+    Le transizioni dello stesso file vengono unite (vince l'ultima) e scritte
+    in un'unica transazione con upsert, al raggiungimento di un numero massimo
+    di voci, periodicamente da un thread in background oppure subito quando lo
+    stato è finale. Riduce la contesa sui lock SQLite con più worker concorrenti.
+    """
+
+    def __init__(self, flush_interval: float = STATE_FLUSH_INTERVAL,
+                 max_pending: int = STATE_FLUSH_MAX_PENDING):
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self._pending: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.RLock()
+        self._stop_event = threading.Event()
+        self._flush_thread: Optional[threading.Thread] = None
+        self._owner_pid: Optional[int] = None
+        self.logger = logging.getLogger("ProcessingStateBuffer")
+        self.stats = {'transitions': 0, 'rows_written': 0, 'flushes': 0, 'flush_errors': 0}
+
+    def add(self, file_name: str, state: ProcessingState, phase: Optional[ProcessingPhase] = None,
+            error_message: Optional[str] = None, error_details: Optional[Dict[str, Any]] = None,
+            processing_metadata: Optional[str] = None, reset: bool = False):
+        """Accoda una transizione di stato unendola a quelle già in attesa per lo stesso file."""
+        now = datetime.now().isoformat()
+
+        with self._lock:
+            entry = self._pending.get(file_name)
+            if entry is None or reset:
+                entry = {
+                    'file_name': file_name,
+                    'current_phase': None,
+                    'phase_started_at': None,
+                    'error_message': None,
+                    'error_details': None,
+                    'processing_metadata': None,
+                    'created_at': now,
+                    'reset': reset,
+                }
+                self._pending[file_name] = entry
+
+            if phase is not None and phase.value != entry['current_phase']:
+                entry['current_phase'] = phase.value
+                entry['phase_started_at'] = now
+            if error_message:
+                entry['error_message'] = error_message
+            if error_details:
+                entry['error_details'] = json.dumps(error_details, default=str)
+            if processing_metadata is not None:
+                entry['processing_metadata'] = processing_metadata
+            entry['processing_state'] = state.value
+            entry['updated_at'] = now
+
+            self.stats['transitions'] += 1
+            pending_count = len(self._pending)
+
+        if state in TERMINAL_STATES or pending_count >= self.max_pending:
+            self.flush()
+        else:
+            self._ensure_flush_thread()
+
+    def has_pending(self, file_name: Optional[str] = None) -> bool:
+        with self._lock:
+            return file_name in self._pending if file_name else bool(self._pending)
+
+    def flush(self) -> int:
+        """
+        Scrive tutte le transizioni in attesa in un'unica transazione.
+
+        Returns:
+            int: Numero di righe scritte
+        """
+        with self._lock:
+            if not self._pending:
+                return 0
+            batch = list(self._pending.values())
+            self._pending.clear()
+
+        resets = [entry for entry in batch if entry['reset']]
+        updates = [entry for entry in batch if not entry['reset']]
+
+        try:
+            with db_connect() as conn:
+                cursor = conn.cursor()
+                if resets:
+                    cursor.executemany(_RESET_UPSERT_SQL, resets)
+                if updates:
+                    cursor.executemany(_UPDATE_UPSERT_SQL, updates)
+                conn.commit()
+        except Exception:
+            # Rimette in coda le voci non scritte, senza sovrascrivere transizioni più recenti
+            with self._lock:
+                for entry in batch:
+                    self._pending.setdefault(entry['file_name'], entry)
+                self.stats['flush_errors'] += 1
+            raise
+
+        with self._lock:
+            self.stats['flushes'] += 1
+            self.stats['rows_written'] += len(batch)
+        return len(batch)
+
+    def _ensure_flush_thread(self):
+        """Avvia il thread di flush periodico (anche dopo un fork del worker)."""
+        with self._lock:
+            if (self._flush_thread is not None and self._flush_thread.is_alive()
+                    and self._owner_pid == os.getpid()):
+                return
+            self._owner_pid = os.getpid()
+            self._stop_event.clear()
+            self._flush_thread = threading.Thread(
+                target=self._flush_loop, name="processing-state-flush", daemon=True
+            )
+            self._flush_thread.start()
+
+    def _flush_loop(self):
+        while not self._stop_event.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception as e:
+                self.logger.warning(f"Periodic state flush failed: {e}")
+
+    def close(self):
+        """Ferma il thread periodico e scrive le transizioni rimaste."""
+        self._stop_event.set()
+        try:
+            self.flush()
+        except Exception as e:
+            self.logger.error(f"Final state flush failed: {e}")
+
+@lru_cache(maxsize=1024)
+def _parse_processing_metadata(raw: Optional[str]) -> Mapping[str, Any]:
+    """
+    Parsing dei metadati JSON, in cache: lo stesso valore viene riletto a ogni transizione.
+
+    Il risultato è condiviso tra i chiamanti, quindi è di sola lettura.
+    """
+    return MappingProxyType(json.loads(raw) if raw else {})
+
 # --- GESTORE PRINCIPALE DEL FRAMEWORK ---
 
 class ErrorDiagnosisFramework:
@@ -147,6 +350,7 @@ class ErrorDiagnosisFramework:
     def __init__(self):
         self.logger = self._setup_logger()
         self._ensure_directories()
+        self.state_buffer = ProcessingStateBuffer()
 
     def _setup_logger(self) -> logging.Logger:
         """Configura il logger strutturato"""
@@ -212,22 +416,14 @@ class ErrorDiagnosisFramework:
                 current_phase=ProcessingPhase.PHASE_1.value
             )
 
-            # Salva nel database
-            with db_connect() as conn:
-                cursor = conn.cursor()
-                cursor.execute("""
-                    INSERT OR REPLACE INTO document_processing_status
-                    (file_name, processing_state, current_phase, processing_metadata, created_at, updated_at)
-                    VALUES (?, ?, ?, ?, ?, ?)
-                """, (
-                    file_name,
-                    metadata.processing_state,
-                    metadata.current_phase,
-                    json.dumps(asdict(metadata), default=str),  # Convert datetime objects to strings
-                    metadata.created_at.isoformat(),
-                    metadata.updated_at.isoformat()
-                ))
-                conn.commit()
+            # Accoda l'inizializzazione (upsert che conserva il contatore dei retry)
+            self.state_buffer.add(
+                file_name,
+                ProcessingState.PENDING,
+                ProcessingPhase.PHASE_1,
+                processing_metadata=json.dumps(asdict(metadata), default=str),  # Convert datetime objects to strings
+                reset=True
+            )
 
             self.logger.info(f"Initialized processing status for {file_name}", extra={"correlation_id": correlation_id})
             return correlation_id
@@ -259,45 +455,18 @@ class ErrorDiagnosisFramework:
             correlation_id = self.generate_correlation_id()
 
         try:
-            with db_connect() as conn:
-                cursor = conn.cursor()
-
-                # Recupera stato attuale
-                cursor.execute("SELECT * FROM document_processing_status WHERE file_name = ?", (file_name,))
-                current = cursor.fetchone()
-
-                if not current:
-                    self.logger.warning(f"No processing status found for {file_name}, creating new",
-                                      extra={"correlation_id": correlation_id})
-                    return self.initialize_processing_status(file_name, file_name) is not None
-
-                # Aggiorna stato
-                update_time = datetime.now()
-                update_fields = ["processing_state = ?", "updated_at = ?"]
-                values = [new_state.value, update_time.isoformat()]
-
-                if phase:
-                    update_fields.append("current_phase = ?")
-                    values.append(phase.value)
-
-                if error_message:
-                    update_fields.append("error_message = ?")
-                    values.append(error_message)
-
-                if error_details:
-                    update_fields.append("error_details = ?")
-                    values.append(json.dumps(error_details))
-
-                # Gestisci transizioni di fase
-                if phase and current['current_phase'] != phase.value:
-                    update_fields.extend(["phase_started_at = ?", "phase_completed_at = ?"])
-                    values.extend([update_time.isoformat(), None])
-
-                values.append(file_name)
-
-                query = f"UPDATE document_processing_status SET {', '.join(update_fields)} WHERE file_name = ?"
-                cursor.execute(query, tuple(values))
-                conn.commit()
+            if isinstance(phase, str):
+                phase = ProcessingPhase(phase)
+
+            # Nessuna lettura preliminare: la transizione viene unita nel buffer
+            # e scritta con un upsert (subito se lo stato è finale)
+            self.state_buffer.add(
+                file_name,
+                new_state,
+                phase,
+                error_message=error_message,
+                error_details=error_details
+            )
 
             # Log della transizione
             self.logger.info(f"State transition: {file_name} -> {new_state.value}",
@@ -310,6 +479,19 @@ class ErrorDiagnosisFramework:
                             extra={"correlation_id": correlation_id})
             return False
 
+    def flush_state_updates(self) -> int:
+        """Scrive subito le transizioni di stato in attesa nel buffer."""
+        try:
+            return self.state_buffer.flush()
+        except Exception as e:
+            self.logger.error(f"Failed to flush processing state updates: {e}")
+            return 0
+
+    def _flush_pending(self, file_name: Optional[str] = None):
+        """Garantisce che le letture vedano le transizioni ancora nel buffer."""
+        if self.state_buffer.has_pending(file_name):
+            self.flush_state_updates()
+
     def get_processing_status(self, file_name: str) -> Optional[ProcessingMetadata]:
         """
         Recupera lo stato di processamento di un file.
@@ -320,6 +502,8 @@ class ErrorDiagnosisFramework:
         Returns:
             ProcessingMetadata o None se non trovato
         """
+        self._flush_pending(file_name)
+
         try:
             with db_connect() as conn:
                 cursor = conn.cursor()
@@ -327,7 +511,7 @@ class ErrorDiagnosisFramework:
                 row = cursor.fetchone()
 
                 if row:
-                    metadata_dict = json.loads(row['processing_metadata']) if row['processing_metadata'] else {}
+                    metadata_dict = _parse_processing_metadata(row['processing_metadata'])
                     return ProcessingMetadata(
                         file_name=row['file_name'],
                         file_size=metadata_dict.get('file_size', 0),
@@ -579,6 +763,8 @@ class ErrorDiagnosisFramework:
         if date_period is None:
             date_period = datetime.now().strftime("%Y-%m-%d")
 
+        self._flush_pending()
+
         try:
             with db_connect() as conn:
                 cursor = conn.cursor()
@@ -679,6 +865,8 @@ class ErrorDiagnosisFramework:
         Returns:
             bool: True se dovrebbe essere ritentato
         """
+        self._flush_pending(file_name)
+
         try:
             with db_connect() as conn:
                 cursor = conn.cursor()
@@ -701,6 +889,8 @@ class ErrorDiagnosisFramework:
 
     def increment_retry_count(self, file_name: str) -> bool:
         """Incrementa il contatore di retry per un file"""
+        self._flush_pending(file_name)
+
         try:
             with db_connect() as conn:
                 cursor = conn.cursor()
@@ -726,6 +916,8 @@ class ErrorDiagnosisFramework:
         Returns:
             bool: True se il reset è riuscito
         """
+        self._flush_pending(file_name)
+
         try:
             with db_connect() as conn:
                 cursor = conn.cursor()
@@ -753,19 +945,33 @@ class ErrorDiagnosisFramework:
 # --- ISTANZA GLOBALE ---
 error_framework = ErrorDiagnosisFramework()
 
+# Flush garantito delle transizioni in attesa alla chiusura del processo
+atexit.register(error_framework.state_buffer.close)
+
+try:
+    from celery.signals import worker_process_shutdown
+
+    @worker_process_shutdown.connect
+    def _flush_states_on_shutdown(**kwargs):
+        error_framework.state_buffer.close()
+except ImportError:
+    pass
+
 # --- FUNZIONI DI UTILITÀ PUBBLICHE ---
 
 def get_processing_status_summary() -> Dict[str, Any]:
     """Restituisce un riassunto dello stato di processamento di tutti i file"""
+    error_framework._flush_pending()
+
     try:
         with db_connect() as conn:
             cursor = conn.cursor()
 
-            # Conta per stato
+            # Conta per stato (tabella riassuntiva mantenuta dai trigger)
             cursor.execute("""
-                SELECT processing_state, COUNT(*) as count
-                FROM document_processing_status
-                GROUP BY processing_state
+                SELECT processing_state, count
+                FROM processing_state_counts
+                WHERE count > 0
             """)
 
             state_counts = dict(cursor.fetchall())
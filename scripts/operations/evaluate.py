@@ -4,46 +4,42 @@ import json
 import asyncio
 import argparse
 import pandas as pd
-from llama_index.core import (
-    StorageContext,
-    load_index_from_storage,
-    VectorStoreIndex,
-    SimpleDirectoryReader
+from file_utils import db_connect
+from tools.rag_benchmark import (
+    DEFAULT_CONCURRENCY,
+    REPORT_DIR,
+    EvalQuestion,
+    RetrieverConfig,
+    StubLLM,
+    OverlapFaithfulnessJudge,
+    LlamaIndexRetriever,
+    LlamaIndexAnswerer,
+    LlamaIndexEvaluatorJudge,
+    run_benchmark,
+    write_report,
+    load_latest_report,
+    find_regressions,
 )
-from llama_index.core.vector_stores import MetadataFilters, ExactMatchFilter
-from llama_index.core.evaluation import (
-    FaithfulnessEvaluator,
-    RelevancyEvaluator,
-    ContextRelevancyEvaluator,
-)
-from llama_index.llms.ollama import Ollama
-from llama_index.core.query_engine import RetrieverQueryEngine
-from config import initialize_services
 
 DB_STORAGE_DIR = "db_memoria"
 
-async def main():
-    parser = argparse.ArgumentParser(description="Esegue la valutazione automatica del sistema RAG.")
-    parser.add_argument("--focus_file", help="Esegue la valutazione solo su un file specifico.")
-    args = parser.parse_args()
+# Configurazioni confrontate dal benchmark offline (retriever locali sull'archivio)
+OFFLINE_CONFIGS = [
+    RetrieverConfig("keyword_k5", mode="keyword", top_k=5),
+    RetrieverConfig("vector_k5", mode="vector", top_k=5),
+    RetrieverConfig("hybrid_k5", mode="hybrid", top_k=5),
+    RetrieverConfig("hybrid_k10", mode="hybrid", top_k=10),
+    RetrieverConfig("hybrid_k5_small_chunks", mode="hybrid", top_k=5, chunk_size=100, chunk_overlap=20),
+]
 
-    print("--- Avvio del Sistema di Valutazione Automatica ---")
-    initialize_services()
+# Con l'indice reale il chunking è quello dell'indicizzazione: si confronta il top-k
+INDEX_TOP_K = (3, 5, 10)
 
-    try:
-        storage_context = StorageContext.from_defaults(persist_dir=DB_STORAGE_DIR)
-        # Ensure embed_model is set before loading index
-        if hasattr(index, 'embed_model') and index.embed_model is None:
-            print("Embedding model not set, reinitializing services...")
-            initialize_services()
-        index = load_index_from_storage(storage_context)
-        print("Indice caricato correttamente dalla memoria.")
-    except FileNotFoundError:
-        print(f"ERRORE: La cartella della memoria '{DB_STORAGE_DIR}' non è stata trovata.")
-        sys.exit(1)
 
+def load_eval_dataset(path="evaluation_dataset.json"):
+    """Carica il dataset di valutazione; termina con un messaggio se il formato non è valido."""
     try:
-        with open("evaluation_dataset.json", "r", encoding="utf-8") as f:
+        with open(path, "r", encoding="utf-8") as f:
             eval_data = json.load(f)
 
         # --- MODIFICA CHIAVE: Controllo robusto del formato del dataset ---
@@ -53,18 +49,145 @@ async def main():
             print("È necessario rigenerarlo per includere il nome del documento di origine.")
             print("\nSOLUZIONE: Esegui di nuovo 'generate_testset.py' per il tuo file di destinazione.")
             sys.exit(1)
-            
+
         eval_source_doc = eval_data.get("source_document")
         eval_questions = eval_data.get("questions", [])
-        
+
         if not eval_source_doc or not eval_questions:
-             raise ValueError("Formato JSON non valido o chiavi 'source_document'/'questions' mancanti.")
+            raise ValueError("Formato JSON non valido o chiavi 'source_document'/'questions' mancanti.")
 
         print(f"Dataset di valutazione caricato per '{eval_source_doc}' con {len(eval_questions)} domande.")
     except (FileNotFoundError, json.JSONDecodeError, ValueError) as e:
         print(f"ERRORE: File 'evaluation_dataset.json' non trovato, corrotto o in formato non valido. ({e})")
         sys.exit(1)
 
+    # Il documento di origine è il riferimento per la recall@k
+    questions = [
+        EvalQuestion(
+            query=qa_pair["query"],
+            relevant_documents=[eval_source_doc],
+            reference_answer=qa_pair.get("reference_answer", "N/A")
+        )
+        for qa_pair in eval_questions
+    ]
+    return eval_source_doc, questions
+
+
+def load_archive_documents(focus_file=None):
+    """Testo dei documenti dell'archivio (titolo e anteprima) per i retriever offline."""
+    with db_connect() as conn:
+        query = "SELECT file_name, title, formatted_preview FROM papers"
+        params = ()
+        if focus_file:
+            query += " WHERE file_name = ?"
+            params = (focus_file,)
+        rows = conn.execute(query, params).fetchall()
+    return {row[0]: f"{row[1] or ''}. {row[2] or ''}" for row in rows}
+
+
+async def run_offline(questions, focus_file, concurrency):
+    """Benchmark offline: retriever locali, LLM stub e giudice lessicale."""
+    documents = load_archive_documents(focus_file)
+    if not documents:
+        print("ERRORE: Nessun documento nell'archivio per il benchmark offline.")
+        sys.exit(1)
+    print(f"Benchmark offline su {len(documents)} documenti e {len(OFFLINE_CONFIGS)} configurazioni.")
+    return await run_benchmark(
+        documents, questions, OFFLINE_CONFIGS,
+        llm=StubLLM(), judge=OverlapFaithfulnessJudge(), concurrency=concurrency
+    )
+
+
+async def run_with_index(questions, focus_file, concurrency):
+    """Valutazione sull'indice reale con Ollama come generatore e giudice."""
+    from llama_index.core import StorageContext, load_index_from_storage
+    from llama_index.core.vector_stores import MetadataFilters, ExactMatchFilter
+    from llama_index.core.evaluation import (
+        FaithfulnessEvaluator,
+        RelevancyEvaluator,
+        ContextRelevancyEvaluator,
+    )
+    from llama_index.llms.ollama import Ollama
+    from config import initialize_services
+
+    initialize_services()
+
+    try:
+        storage_context = StorageContext.from_defaults(persist_dir=DB_STORAGE_DIR)
+        index = load_index_from_storage(storage_context)
+        # L'indice deve usare il modello di embedding configurato
+        if hasattr(index, 'embed_model') and index.embed_model is None:
+            print("Embedding model not set, reinitializing services...")
+            initialize_services()
+        print("Indice caricato correttamente dalla memoria.")
+    except FileNotFoundError:
+        print(f"ERRORE: La cartella della memoria '{DB_STORAGE_DIR}' non è stata trovata.")
+        sys.exit(1)
+
+    filters = None
+    if focus_file:
+        print(f"--- ATTIVATA MODALITÀ FOCUS SUL FILE: {focus_file} ---")
+        filters = MetadataFilters(filters=[ExactMatchFilter(key="file_name", value=focus_file)])
+
+    # Un retriever per top-k, condiviso tra le domande
+    retriever = LlamaIndexRetriever(lambda top_k: index.as_retriever(similarity_top_k=top_k, filters=filters))
+    configs = [RetrieverConfig(f"index_k{top_k}", mode="vector", top_k=top_k) for top_k in INDEX_TOP_K]
+
+    eval_llm = Ollama(model="llama3", request_timeout=120.0)
+    print("Evaluators configurati. Inizio della valutazione...\n")
+    return await run_benchmark(
+        {}, questions, configs,
+        llm=LlamaIndexAnswerer(eval_llm),
+        judge=LlamaIndexEvaluatorJudge(FaithfulnessEvaluator(llm=eval_llm)),
+        concurrency=concurrency,
+        retriever_factory=lambda config: retriever,
+        extra_judges={
+            "answer_relevancy": LlamaIndexEvaluatorJudge(RelevancyEvaluator(llm=eval_llm)),
+            "context_relevancy": LlamaIndexEvaluatorJudge(ContextRelevancyEvaluator(llm=eval_llm)),
+        }
+    )
+
+
+def print_report(report):
+    """Riepilogo per configurazione e confronto con il report precedente."""
+    def score(value):
+        return None if value is None else round(value, 3)
+
+    rows = []
+    for name, entry in report["configurations"].items():
+        summary = entry["summary"]
+        scores = summary.get("scores", {})
+        rows.append({
+            "Config": name,
+            "Recall@k": round(summary["recall_at_k"], 3),
+            "Faithfulness": score(summary["faithfulness"]),
+            "Answer Relevancy": score(scores.get("answer_relevancy")),
+            "Context Relevancy": score(scores.get("context_relevancy")),
+            "p50 ms": round(summary["latency_p50_ms"], 1),
+            "p95 ms": round(summary["latency_p95_ms"], 1),
+            "p99 ms": round(summary["latency_p99_ms"], 1),
+            "Errori": summary["errors"],
+        })
+    print("--- 📊 Riepilogo per Configurazione ---")
+    print(pd.DataFrame(rows).to_string(index=False))
+    print("---------------------------------------\n")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Esegue la valutazione automatica del sistema RAG.")
+    parser.add_argument("--focus_file", help="Esegue la valutazione solo su un file specifico.")
+    parser.add_argument("--offline", action="store_true",
+                        help="Benchmark con retriever locali e LLM stub, senza indice né Ollama.")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY,
+                        help="Numero massimo di domande valutate in parallelo.")
+    parser.add_argument("--report-dir", default=REPORT_DIR, help="Cartella dei report versionati.")
+    parser.add_argument("--fail-on-regression", action="store_true",
+                        help="Termina con codice 1 se ci sono regressioni rispetto al report precedente.")
+    args = parser.parse_args()
+
+    print("--- Avvio del Sistema di Valutazione Automatica ---")
+    eval_source_doc, questions = load_eval_dataset()
+
     # Controllo di coerenza tra focus e dataset
     if args.focus_file and eval_source_doc != args.focus_file:
         print("\n--- ERRORE DI COERENZA ---")
@@ -74,69 +197,44 @@ async def main():
         print(f'python generate_testset.py "percorso/a/{args.focus_file}"')
         sys.exit(1)
 
-    eval_llm = Ollama(model="llama3", request_timeout=120.0)
-    
-    faithfulness_evaluator = FaithfulnessEvaluator(llm=eval_llm)
-    relevancy_evaluator = RelevancyEvaluator(llm=eval_llm)
-    context_relevancy_evaluator = ContextRelevancyEvaluator(llm=eval_llm)
-
-    if args.focus_file:
-        print(f"--- ATTIVATA MODALITÀ FOCUS SUL FILE: {args.focus_file} ---")
-        retriever = index.as_retriever(
-            similarity_top_k=5,
-            filters=MetadataFilters(filters=[ExactMatchFilter(key="file_name", value=args.focus_file)])
-        )
+    if args.offline:
+        report = await run_offline(questions, args.focus_file, args.concurrency)
     else:
-        retriever = index.as_retriever(similarity_top_k=5)
-
-    query_engine = RetrieverQueryEngine.from_args(
-        retriever=retriever,
-        llm=eval_llm
-    )
+        report = await run_with_index(questions, args.focus_file, args.concurrency)
+    report["mode"] = "offline" if args.offline else "index"
 
-    print("Evaluators configurati. Inizio del ciclo di valutazione...\n")
-    
-    results = []
-    for i, qa_pair in enumerate(eval_questions):
-        query = qa_pair["query"]
-        reference_answer = qa_pair.get("reference_answer", "N/A")
-        
-        print(f"--- Valutando Domanda {i+1}/{len(eval_questions)} ---")
-        print(f"Query: {query}")
-        
-        response_obj = query_engine.query(query)
-        
-        faithfulness_result = await faithfulness_evaluator.aevaluate_response(response=response_obj)
-        relevancy_result = await relevancy_evaluator.aevaluate_response(query=query, response=response_obj)
-        context_relevancy_result = await context_relevancy_evaluator.aevaluate_response(query=query, response=response_obj)
-
-        results.append({
-            "Query": query,
-            "Generated Answer": str(response_obj),
-            "Reference Answer": reference_answer,
-            "Faithfulness Score": faithfulness_result.score,
-            "Answer Relevancy Score": relevancy_result.score,
-            "Context Relevancy Score": context_relevancy_result.score
-        })
-
-    df = pd.DataFrame(results)
-    
     print("\n\n--- Valutazione Completata. Generazione del Report. ---\n")
-    summary = {
-        "Faithfulness": f"{df['Faithfulness Score'].mean():.2f} / 1.0",
-        "Answer Relevancy": f"{df['Answer Relevancy Score'].mean():.2f} / 1.0",
-        "Context Relevancy": f"{df['Context Relevancy Score'].mean():.2f} / 1.0",
-    }
-    
-    print("--- 📊 Riepilogo Punteggi Medi ---")
-    for metric, score in summary.items():
-        print(f"{metric}: {score}")
-    print("----------------------------------\n")
-    
-    print(df[["Query", "Faithfulness Score", "Answer Relevancy Score", "Context Relevancy Score"]])
-    df.to_csv("evaluation_results.csv", index=False)
+    print_report(report)
+
+    baseline = load_latest_report(args.report_dir)
+    report_path = write_report(report, args.report_dir)
+    print(f"Report versionato salvato in: '{report_path}'")
+
+    regressions = []
+    if baseline is not None and baseline.get("mode") != report["mode"]:
+        print(f"Il report v{baseline['report_version']:04d} usa un'altra modalità: confronto saltato.")
+    elif baseline is not None and baseline.get("dataset", {}).get("fingerprint") != report["dataset"]["fingerprint"]:
+        print(f"Il report v{baseline['report_version']:04d} usa un altro dataset di valutazione: confronto saltato.")
+    elif baseline is not None:
+        regressions = find_regressions(baseline, report)
+        if regressions:
+            print(f"\n⚠️ Regressioni rispetto al report v{baseline['report_version']:04d}:")
+            for regression in regressions:
+                print(f"  - {regression}")
+        else:
+            print(f"Nessuna regressione rispetto al report v{baseline['report_version']:04d}.")
+
+    results = [
+        dict({k: v for k, v in question.items() if k != "scores"}, **question.get("scores", {}), Config=name)
+        for name, entry in report["configurations"].items()
+        for question in entry["questions"]
+    ]
+    pd.DataFrame(results).to_csv("evaluation_results.csv", index=False)
     print("\nReport dettagliato salvato in: 'evaluation_results.csv'")
 
+    # Con --fail-on-regression la CI si ferma sulle regressioni
+    return 1 if regressions and args.fail_on_regression else 0
+
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    sys.exit(asyncio.run(main()))
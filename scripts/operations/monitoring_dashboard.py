@@ -17,6 +17,7 @@ from error_diagnosis_framework import (
     error_framework
 )
 from file_utils import get_papers_dataframe
+from task_locks import get_shared_lock_metrics
 
 # --- CONFIGURAZIONE PAGINA ---
 st.set_page_config(
@@ -354,6 +355,37 @@ def render_performance_metrics():
     except Exception as e:
         st.error(f"❌ Errore nel caricamento metriche performance: {e}")
 
+def render_lock_metrics():
+    """Render metriche di attesa e contesa dei lock dei task, sommate da tutti i worker"""
+    st.subheader("🔒 Lock Task Documenti")
+
+    try:
+        lock_metrics = get_shared_lock_metrics()
+
+        col1, col2, col3, col4 = st.columns(4)
+
+        with col1:
+            st.metric("Backend", lock_metrics['backend'])
+
+        with col2:
+            st.metric("Acquisizioni", int(lock_metrics['acquired']))
+
+        with col3:
+            st.metric("Tasso Contesa", f"{lock_metrics['contention_rate'] * 100:.1f}%")
+
+        with col4:
+            st.metric("Attesa Media", f"{lock_metrics['avg_wait_time_ms']:.1f} ms")
+
+        if lock_metrics['lost']:
+            st.warning(f"⚠️ {int(lock_metrics['lost'])} lock persi per lease scaduto")
+
+        if lock_metrics['contention_by_prefix']:
+            with st.expander("📡 Contese per operazione"):
+                st.json(lock_metrics['contention_by_prefix'])
+
+    except Exception as e:
+        st.error(f"❌ Errore nel caricamento metriche lock: {e}")
+
 # --- PAGINA PRINCIPALE ---
 
 def main():
@@ -394,6 +426,8 @@ def main():
 
     with tab5:
         render_performance_metrics()
+        st.markdown("---")
+        render_lock_metrics()
 
     # Footer con informazioni tecniche
     st.markdown("---")
@@ -0,0 +1,275 @@
+"""
+Rilevamento dei quasi-duplicati in fase di ingestione.
+
+Il solo hash SHA-256 riconosce i file identici byte per byte, ma non i PDF
+riesportati, le versioni con una copertina diversa o lo stesso articolo
+scaricato due volte. Qui il testo delle prime pagine viene ridotto a una
+firma MinHash su shingle di parole; le firme sono indicizzate con LSH
+(banding) in SQLite, così la ricerca dei candidati è una lookup indicizzata
+e non un confronto con tutto l'archivio. Se la similarità stimata supera la
+soglia, il task collega il file al documento esistente senza chiamare l'LLM.
+I documenti archiviati prima dell'indice ricevono la firma con
+`backfill_signatures`, eseguito all'avvio dei worker.
+"""
+import os
+import re
+import random
+import struct
+import zlib
+import logging
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from file_utils import db_connect
+
+# --- CONFIGURAZIONE ---
+NEAR_DUP_THRESHOLD = float(os.getenv('ARCHIVISTA_NEAR_DUP_THRESHOLD', 0.85))  # Jaccard stimato
+NEAR_DUP_PAGES = int(os.getenv('ARCHIVISTA_NEAR_DUP_PAGES', 10))               # pagine iniziali considerate
+NEAR_DUP_ENABLED = os.getenv('ARCHIVISTA_NEAR_DUP_ENABLED', '1') != '0'
+
+CHARS_PER_PAGE = 3000      # stima caratteri per pagina del testo estratto
+SHINGLE_SIZE = 5           # parole per shingle
+MIN_SHINGLES = 20          # sotto questa soglia il testo è troppo corto per un confronto affidabile
+BACKFILL_BATCH_SIZE = 100  # righe di papers lette per query durante il backfill
+
+# 128 permutazioni in 16 bande da 8 righe: soglia LSH implicita ~ (1/16)^(1/8) ≈ 0.71,
+# sotto la soglia di similarità, così i candidati validi non vengono persi
+NUM_PERM = 128
+LSH_BANDS = 16
+LSH_ROWS = NUM_PERM // LSH_BANDS
+
+# Hashing universale (a*x + b) mod p con p primo di Mersenne; i coefficienti
+# sono fissi (seed costante) perché le firme salvate restino confrontabili
+_MERSENNE_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+_rng = random.Random(1)
+_PERMUTATIONS = [(_rng.randrange(1, _MERSENNE_PRIME), _rng.randrange(0, _MERSENNE_PRIME)) for _ in range(NUM_PERM)]
+
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+
+logger = logging.getLogger("NearDuplicateDetector")
+
+
+@dataclass
+class DuplicateMatch:
+    """Documento esistente riconosciuto come quasi-duplicato"""
+    file_name: str
+    similarity: float
+    content_hash: Optional[str] = None
+
+
+# --- FIRMA MINHASH ---
+
+def get_dedup_text(full_text: str, pages: int = NEAR_DUP_PAGES) -> str:
+    """Porzione iniziale del testo usata per il confronto (prime N pagine stimate)."""
+    return full_text[:pages * CHARS_PER_PAGE]
+
+
+def shingle_hashes(text: str, shingle_size: int = SHINGLE_SIZE) -> set:
+    """Hash a 32 bit degli shingle di parole del testo normalizzato."""
+    words = _WORD_RE.findall(text.lower())
+    if len(words) < shingle_size:
+        return {zlib.crc32(" ".join(words).encode("utf-8"))} if words else set()
+    return {
+        zlib.crc32(" ".join(words[i:i + shingle_size]).encode("utf-8"))
+        for i in range(len(words) - shingle_size + 1)
+    }
+
+
+def compute_signature(text: str) -> Optional[List[int]]:
+    """
+    Calcola la firma MinHash del testo.
+
+    Returns:
+        Lista di NUM_PERM interi, None se il testo è troppo corto
+    """
+    hashes = shingle_hashes(text)
+    if len(hashes) < MIN_SHINGLES:
+        return None
+    return [
+        min(((a * h + b) % _MERSENNE_PRIME) & _MAX_HASH for h in hashes)
+        for a, b in _PERMUTATIONS
+    ]
+
+
+def estimate_similarity(sig_a: List[int], sig_b: List[int]) -> float:
+    """Stima del coefficiente di Jaccard: frazione di componenti uguali."""
+    if not sig_a or len(sig_a) != len(sig_b):
+        return 0.0
+    return sum(1 for x, y in zip(sig_a, sig_b) if x == y) / len(sig_a)
+
+
+def _band_hashes(signature: List[int]) -> List[Tuple[int, int]]:
+    """Hash di ciascuna banda LSH: (indice banda, hash a 32 bit)."""
+    return [
+        (band, zlib.crc32(struct.pack(f"<{LSH_ROWS}I", *signature[band * LSH_ROWS:(band + 1) * LSH_ROWS])))
+        for band in range(LSH_BANDS)
+    ]
+
+
+def _pack_signature(signature: List[int]) -> bytes:
+    return struct.pack(f"<{len(signature)}I", *signature)
+
+
+def _unpack_signature(blob: bytes) -> List[int]:
+    return list(struct.unpack(f"<{len(blob) // 4}I", blob))
+
+
+# --- INDICE LSH PERSISTENTE ---
+
+def find_near_duplicate(signature: Optional[List[int]], content_hash: Optional[str] = None,
+                        exclude_file_name: Optional[str] = None,
+                        threshold: float = NEAR_DUP_THRESHOLD) -> Optional[DuplicateMatch]:
+    """
+    Cerca nell'indice LSH il documento più simile sopra la soglia.
+
+    Args:
+        signature: Firma MinHash del nuovo documento
+        content_hash: SHA-256 del file (match esatto immediato)
+        exclude_file_name: File da escludere (ri-processamento dello stesso file)
+        threshold: Similarità minima
+
+    Returns:
+        DuplicateMatch o None
+    """
+    with db_connect() as conn:
+        cursor = conn.cursor()
+
+        if content_hash:
+            cursor.execute("""
+                SELECT file_name FROM document_minhash_signatures
+                WHERE content_hash = ? AND file_name != ?
+                LIMIT 1
+            """, (content_hash, exclude_file_name or ""))
+            row = cursor.fetchone()
+            if row:
+                return DuplicateMatch(file_name=row['file_name'], similarity=1.0, content_hash=content_hash)
+
+        if signature is None:
+            return None
+
+        bands = _band_hashes(signature)
+        conditions = " OR ".join(["(band_index = ? AND band_hash = ?)"] * len(bands))
+        params = [value for band in bands for value in band]
+        cursor.execute(f"""
+            SELECT DISTINCT s.file_name, s.content_hash, s.signature
+            FROM document_minhash_bands b
+            JOIN document_minhash_signatures s ON s.file_name = b.file_name
+            WHERE ({conditions}) AND b.file_name != ?
+        """, params + [exclude_file_name or ""])
+        candidates = cursor.fetchall()
+
+    best = None
+    for candidate in candidates:
+        similarity = estimate_similarity(signature, _unpack_signature(candidate['signature']))
+        if similarity >= threshold and (best is None or similarity > best.similarity):
+            best = DuplicateMatch(candidate['file_name'], similarity, candidate['content_hash'])
+    return best
+
+
+def register_signature(file_name: str, content_hash: str, signature: Optional[List[int]]):
+    """Aggiunge (o sostituisce) la firma di un documento processato all'indice LSH."""
+    with db_connect() as conn:
+        cursor = conn.cursor()
+        cursor.execute("DELETE FROM document_minhash_bands WHERE file_name = ?", (file_name,))
+        cursor.execute("""
+            INSERT INTO document_minhash_signatures (file_name, content_hash, signature, num_perm, created_at)
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT(file_name) DO UPDATE SET
+                content_hash = excluded.content_hash, signature = excluded.signature,
+                num_perm = excluded.num_perm, created_at = excluded.created_at
+        """, (file_name, content_hash, _pack_signature(signature) if signature else None,
+              NUM_PERM, datetime.now().isoformat()))
+        if signature:
+            cursor.executemany("""
+                INSERT INTO document_minhash_bands (band_index, band_hash, file_name)
+                VALUES (?, ?, ?)
+            """, [(band, band_hash, file_name) for band, band_hash in _band_hashes(signature)])
+        conn.commit()
+
+
+def backfill_signatures(load_document: Callable[[Dict[str, Any]], Tuple[Optional[str], Optional[str]]],
+                        batch_size: int = BACKFILL_BATCH_SIZE) -> Dict[str, int]:
+    """
+    Registra la firma dei documenti in papers che non ne hanno ancora una.
+
+    Args:
+        load_document: Riceve la riga di papers e restituisce (testo, hash del
+            contenuto); un'eccezione lascia il documento al prossimo backfill
+        batch_size: Righe lette per query
+
+    Returns:
+        Conteggi 'registered', 'too_short' (firma assente, resta il match per hash) e 'errors'
+    """
+    stats = {'registered': 0, 'too_short': 0, 'errors': 0}
+    last_file_name = ""
+    while True:
+        with db_connect() as conn:
+            rows = [dict(row) for row in conn.execute("""
+                SELECT p.* FROM papers p
+                LEFT JOIN document_minhash_signatures s ON s.file_name = p.file_name
+                WHERE s.file_name IS NULL AND p.file_name > ?
+                ORDER BY p.file_name
+                LIMIT ?
+            """, (last_file_name, batch_size)).fetchall()]
+        if not rows:
+            return stats
+
+        for row in rows:
+            try:
+                text, content_hash = load_document(row)
+                signature = compute_signature(get_dedup_text(text or ""))
+                register_signature(row['file_name'], content_hash, signature)
+            except Exception as e:
+                stats['errors'] += 1
+                logger.warning(f"Backfill firma MinHash fallito per {row['file_name']}: {e}")
+                continue
+            stats['registered' if signature else 'too_short'] += 1
+        last_file_name = rows[-1]['file_name']
+
+
+def record_duplicate_link(file_name: str, match: DuplicateMatch, content_hash: Optional[str] = None):
+    """Registra il collegamento tra il file scartato e il documento esistente."""
+    with db_connect() as conn:
+        conn.execute("""
+            INSERT INTO document_duplicates (file_name, duplicate_of, similarity, content_hash, detected_at)
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT(file_name) DO UPDATE SET
+                duplicate_of = excluded.duplicate_of, similarity = excluded.similarity,
+                content_hash = excluded.content_hash, detected_at = excluded.detected_at
+        """, (file_name, match.file_name, match.similarity, content_hash, datetime.now().isoformat()))
+        conn.commit()
+
+
+def remove_duplicate_link(file_name: str):
+    """Annulla il collegamento di un file scartato (processamento forzato dall'utente)."""
+    with db_connect() as conn:
+        conn.execute("DELETE FROM document_duplicates WHERE file_name = ?", (file_name,))
+        conn.commit()
+
+
+# --- FUNZIONI DI UTILITÀ PUBBLICHE ---
+
+def remove_signature(file_name: str):
+    """Rimuove un documento dall'indice (es. dopo la cancellazione)."""
+    with db_connect() as conn:
+        cursor = conn.cursor()
+        cursor.execute("DELETE FROM document_minhash_bands WHERE file_name = ?", (file_name,))
+        cursor.execute("DELETE FROM document_minhash_signatures WHERE file_name = ?", (file_name,))
+        cursor.execute("DELETE FROM document_duplicates WHERE file_name = ? OR duplicate_of = ?", (file_name, file_name))
+        conn.commit()
+
+
+def get_duplicate_links(file_name: Optional[str] = None) -> List[Dict[str, Any]]:
+    """Collegamenti ai duplicati registrati, opzionalmente filtrati per documento originale."""
+    with db_connect() as conn:
+        cursor = conn.cursor()
+        if file_name:
+            cursor.execute("""
+                SELECT * FROM document_duplicates WHERE duplicate_of = ?
+                ORDER BY detected_at DESC
+            """, (file_name,))
+        else:
+            cursor.execute("SELECT * FROM document_duplicates ORDER BY detected_at DESC")
+        return [dict(row) for row in cursor.fetchall()]
@@ -0,0 +1,255 @@
+"""
+Checkpoint persistenti per le fasi della pipeline di processamento documenti.
+
+Ogni fase (estrazione, classificazione, metadati, indicizzazione, anteprima,
+analisi accademica, Bayesiana, salvataggio) salva il proprio output nella
+tabella `pipeline_stage_checkpoints`, indicizzata per hash del contenuto e nome
+del file: due upload con gli stessi byte sotto nomi diversi hanno checkpoint
+distinti, così ciascuno ottiene la propria riga in papers, il proprio documento
+nell'indice e il proprio file archiviato. Un retry riprende dalla prima fase incompleta invece di ripetere
+estrazione, indicizzazione e tutte le chiamate LLM. Le durate di ogni fase
+sono registrate in `pipeline_stage_metrics` per il profiling.
+"""
+import json
+import time
+import hashlib
+import logging
+from datetime import datetime
+from typing import Any, Callable, Dict, Optional
+
+from file_utils import db_connect
+
+# Ordine delle fasi della pipeline
+PIPELINE_STAGES = [
+    "extract",
+    "classify",
+    "metadata",
+    "index",
+    "preview",
+    "academic_analysis",
+    "bayesian",
+    "persist",
+]
+
+STAGE_STATUS_COMPLETED = "completed"
+STAGE_STATUS_FAILED = "failed"
+
+logger = logging.getLogger("PipelineCheckpoints")
+
+
+def compute_content_hash(file_path: str, chunk_size: int = 1024 * 1024) -> str:
+    """Calcola lo SHA-256 del contenuto del file a blocchi (memoria costante)."""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class PipelineCheckpointer:
+    """
+    Gestisce i checkpoint di un singolo documento.
+
+    Uso tipico nel task:
+        checkpointer = PipelineCheckpointer(file_name, content_hash)
+        text = checkpointer.run_stage("extract", lambda: extractor(file_path))
+    """
+
+    def __init__(self, file_name: str, content_hash: str, task_id: Optional[str] = None):
+        self.file_name = file_name
+        self.content_hash = content_hash
+        self.task_id = task_id
+        self.completed: Dict[str, Any] = {}
+        self.timings: Dict[str, float] = {}
+        self._load()
+
+    def _load(self):
+        """Carica con una sola query gli output delle fasi già completate."""
+        with db_connect() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT stage, output FROM pipeline_stage_checkpoints
+                WHERE content_hash = ? AND file_name = ? AND status = ?
+            """, (self.content_hash, self.file_name, STAGE_STATUS_COMPLETED))
+            for row in cursor.fetchall():
+                self.completed[row['stage']] = json.loads(row['output']) if row['output'] else None
+
+        if self.completed:
+            logger.info(f"Resuming {self.file_name} from stage '{self.first_incomplete_stage()}' "
+                        f"({len(self.completed)}/{len(PIPELINE_STAGES)} stages checkpointed)")
+
+    def is_completed(self, stage: str) -> bool:
+        return stage in self.completed
+
+    def get(self, stage: str, default: Any = None) -> Any:
+        """Output salvato di una fase completata."""
+        return self.completed.get(stage, default)
+
+    def first_incomplete_stage(self) -> Optional[str]:
+        """Prima fase non ancora completata, None se la pipeline è conclusa."""
+        for stage in PIPELINE_STAGES:
+            if stage not in self.completed:
+                return stage
+        return None
+
+    def run_stage(self, stage: str, func: Callable[[], Any]) -> Any:
+        """
+        Esegue una fase se non è già completata, salvandone output e durata.
+
+        Args:
+            stage: Nome della fase (vedi PIPELINE_STAGES)
+            func: Funzione senza argomenti che produce l'output (JSON-serializzabile)
+
+        Returns:
+            Output della fase (dal checkpoint se già completata)
+        """
+        if stage not in PIPELINE_STAGES:
+            raise ValueError(f"Fase pipeline sconosciuta: {stage}")
+
+        if stage in self.completed:
+            print(f"⏭️ Fase '{stage}' già completata per {self.file_name}, riprendo dal checkpoint")
+            self._record_metric(stage, 0.0, STAGE_STATUS_COMPLETED, resumed=True)
+            return self.completed[stage]
+
+        started = time.perf_counter()
+        try:
+            output = func()
+        except Exception as e:
+            duration_ms = (time.perf_counter() - started) * 1000
+            self._save(stage, None, STAGE_STATUS_FAILED, duration_ms, error_message=str(e))
+            self._record_metric(stage, duration_ms, STAGE_STATUS_FAILED)
+            raise
+
+        duration_ms = (time.perf_counter() - started) * 1000
+        self._save(stage, output, STAGE_STATUS_COMPLETED, duration_ms)
+        self._record_metric(stage, duration_ms, STAGE_STATUS_COMPLETED)
+        self.completed[stage] = output
+        self.timings[stage] = duration_ms
+        return output
+
+    def _save(self, stage: str, output: Any, status: str, duration_ms: float,
+              error_message: Optional[str] = None):
+        now = datetime.now().isoformat()
+        with db_connect() as conn:
+            conn.execute("""
+                INSERT INTO pipeline_stage_checkpoints
+                (content_hash, stage, file_name, status, output, duration_ms, attempts,
+                 error_message, celery_task_id, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?, 1, ?, ?, ?)
+                ON CONFLICT(content_hash, file_name, stage) DO UPDATE SET
+                    status = excluded.status,
+                    output = excluded.output, duration_ms = excluded.duration_ms,
+                    attempts = pipeline_stage_checkpoints.attempts + 1,
+                    error_message = excluded.error_message,
+                    celery_task_id = excluded.celery_task_id, updated_at = excluded.updated_at
+            """, (
+                self.content_hash, stage, self.file_name, status,
+                json.dumps(output, default=str) if output is not None else None,
+                duration_ms, error_message, self.task_id, now
+            ))
+            conn.commit()
+
+    def _record_metric(self, stage: str, duration_ms: float, status: str, resumed: bool = False):
+        try:
+            with db_connect() as conn:
+                conn.execute("""
+                    INSERT INTO pipeline_stage_metrics
+                    (content_hash, file_name, stage, status, duration_ms, resumed, created_at)
+                    VALUES (?, ?, ?, ?, ?, ?, ?)
+                """, (self.content_hash, self.file_name, stage, status, duration_ms,
+                      1 if resumed else 0, datetime.now().isoformat()))
+                conn.commit()
+        except Exception as e:
+            logger.warning(f"Failed to record stage metric for {self.file_name}/{stage}: {e}")
+
+    def finalize(self):
+        """
+        Rimuove i checkpoint a pipeline completata: un nuovo upload dello stesso
+        contenuto dopo una cancellazione deve ripartire da zero. Le metriche restano.
+        """
+        clear_checkpoints(content_hash=self.content_hash, file_name=self.file_name)
+
+
+# --- FUNZIONI DI UTILITÀ PUBBLICHE ---
+
+def clear_checkpoints(content_hash: Optional[str] = None, file_name: Optional[str] = None) -> int:
+    """Elimina i checkpoint per hash del contenuto, per nome file o per entrambi."""
+    filters = {'content_hash': content_hash, 'file_name': file_name}
+    filters = {column: value for column, value in filters.items() if value is not None}
+    if not filters:
+        raise ValueError("Specificare content_hash o file_name")
+    with db_connect() as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            "DELETE FROM pipeline_stage_checkpoints WHERE " + " AND ".join(f"{column} = ?" for column in filters),
+            tuple(filters.values())
+        )
+        conn.commit()
+        return cursor.rowcount
+
+
+def find_checkpoint_hash(file_name: str) -> Optional[str]:
+    """
+    Hash del contenuto dell'ultimo tentativo interrotto per un file.
+
+    Serve al retry quando il file non è più nel percorso originale (la fase
+    di salvataggio lo ha già spostato): l'hash non si può ricalcolare, ma i
+    checkpoint lo conservano.
+    """
+    with db_connect() as conn:
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT content_hash FROM pipeline_stage_checkpoints
+            WHERE file_name = ? AND status = ?
+            ORDER BY updated_at DESC LIMIT 1
+        """, (file_name, STAGE_STATUS_COMPLETED))
+        row = cursor.fetchone()
+    return row['content_hash'] if row else None
+
+
+def get_resume_stage(file_name: str) -> Optional[str]:
+    """
+    Fase da cui riprenderà il prossimo tentativo per un file.
+
+    Returns:
+        Nome della prima fase incompleta, None se non esistono checkpoint
+    """
+    with db_connect() as conn:
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT stage FROM pipeline_stage_checkpoints
+            WHERE file_name = ? AND status = ?
+        """, (file_name, STAGE_STATUS_COMPLETED))
+        completed = {row['stage'] for row in cursor.fetchall()}
+
+    if not completed:
+        return None
+    return next((stage for stage in PIPELINE_STAGES if stage not in completed), None)
+
+
+def get_stage_timing_summary(days: int = 7) -> Dict[str, Any]:
+    """Durata media e massima, esecuzioni e fallimenti per fase, più le fasi saltate grazie ai checkpoint."""
+    with db_connect() as conn:
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT stage,
+                   COUNT(*) AS runs,
+                   AVG(duration_ms) AS avg_ms,
+                   MAX(duration_ms) AS max_ms,
+                   SUM(CASE WHEN status = 'failed' THEN 1 ELSE 0 END) AS failures
+            FROM pipeline_stage_metrics
+            WHERE resumed = 0 AND created_at >= DATE('now', ?)
+            GROUP BY stage
+        """, (f"-{days} days",))
+        rows = {row['stage']: dict(row) for row in cursor.fetchall()}
+
+        cursor.execute("""
+            SELECT COUNT(*) AS resumed_stages FROM pipeline_stage_metrics
+            WHERE resumed = 1 AND created_at >= DATE('now', ?)
+        """, (f"-{days} days",))
+        resumed = cursor.fetchone()['resumed_stages']
+
+    return {
+        'stages': [rows[stage] for stage in PIPELINE_STAGES if stage in rows],
+        'resumed_stages': resumed,
+    }
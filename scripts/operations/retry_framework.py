@@ -2,7 +2,9 @@
 Sistema di Retry Intelligente con Backoff Esponenziale
 Implementa logica di retry avanzata per il processamento documenti.
 """
+import os
 import time
+import shutil
 import random
 from datetime import datetime, timedelta
 from typing import Dict, List, Optional, Callable
@@ -15,6 +17,11 @@ from error_diagnosis_framework import (
     ErrorCategory,
     ErrorSeverity
 )
+from celery_app import celery_app
+from task_scheduler import enqueue_document, ORIGIN_BULK
+from pipeline_checkpoints import get_resume_stage
+
+DOCS_TO_PROCESS_DIR = "documenti_da_processare"
 
 # --- CONFIGURAZIONE RETRY ---
 
@@ -214,27 +221,54 @@ def get_retry_info(file_name: str) -> Optional[Dict]:
             'max_retries': strategy.config.max_retries_by_category.get(strategy.error_category, 2),
             'next_retry': strategy.next_retry.isoformat() if strategy.next_retry else None,
             'last_attempt': strategy.last_attempt.isoformat() if strategy.last_attempt else None,
-            'should_retry': strategy.should_retry()
+            'should_retry': strategy.should_retry(),
+            'resume_from_stage': get_resume_stage(file_name)
         }
     return None
 
+def _resolve_retry_path(file_name: str) -> Optional[str]:
+    """
+    Trova il file da ritentare: nella cartella di input oppure in quarantena,
+    nel qual caso viene riportato nella cartella di input.
+    """
+    file_path = os.path.join(DOCS_TO_PROCESS_DIR, file_name)
+    if os.path.exists(file_path):
+        return file_path
+
+    status = error_framework.get_processing_status(file_name)
+    if status and status.quarantine_path and os.path.exists(status.quarantine_path):
+        os.makedirs(DOCS_TO_PROCESS_DIR, exist_ok=True)
+        shutil.move(status.quarantine_path, file_path)
+        return file_path
+
+    return None
+
 def process_retry_queue():
     """
     Processa la coda di retry e restituisce file pronti per essere ritentati.
     Da chiamare periodicamente dal sistema principale.
     """
+    # Import locale: archivista_processing importa a sua volta i moduli operativi
+    from archivista_processing import process_document_task
+
     ready_files = get_files_ready_for_retry()
 
     for file_name in ready_files:
         try:
+            file_path = _resolve_retry_path(file_name)
+            if file_path is None:
+                retry_manager.logger.error(f"File not found for retry: {file_name}")
+                continue
+
             # Resetta stato processamento per permettere nuovo tentativo
             success = error_framework.reset_processing_status(file_name)
             if success:
                 retry_manager.logger.info(f"Reset processing status for retry: {file_name}")
 
-                # Qui dovresti chiamare il task di processamento
-                # from archivista_processing import process_document_task
-                # process_document_task.delay(file_path)
+                # Il task riprende dalla prima fase senza checkpoint
+                resume_stage = get_resume_stage(file_name)
+                enqueue_document(process_document_task, file_path, ORIGIN_BULK)
+                retry_manager.logger.info(f"Re-enqueued {file_name} (resume from: {resume_stage or 'start'})")
 
             else:
                 retry_manager.logger.error(f"Failed to reset processing status for {file_name}")
@@ -303,11 +337,6 @@ def retry_failed_files_task():
         if ready_files:
             print(f"🔄 Ritentato {len(ready_files)} file: {', '.join(ready_files[:5])}{'...' if len(ready_files) > 5 else ''}")
 
-            # Qui dovresti effettivamente chiamare il task di processamento
-            # for file_name in ready_files:
-            #     file_path = trova_file_path(file_name)
-            #     process_document_task.delay(file_path)
-
         return {
             'status': 'success',
             'files_retried': len(ready_files),
@@ -12,7 +12,6 @@ Features:
 """
 
 import streamlit as st
-import pandas as pd
 import json
 from typing import Dict, List, Optional, Any, Tuple
 from datetime import datetime, timedelta
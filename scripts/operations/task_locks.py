@@ -0,0 +1,522 @@
+"""
+Gestore dei lock distribuiti per i task di processamento documenti.
+
+Sostituisce i vecchi file `<file>.lock` (controllo `os.path.exists` seguito da
+`open(..., "w")`, non atomico e basato su finestre di staleness via mtime) con:
+- un backend Redis basato su `SET NX PX` con rinnovo periodico (heartbeat) e
+  rilascio tramite compare-and-delete, per deployment multi-worker;
+- un backend su file con `fcntl.flock` (o `msvcrt.locking` su Windows) per
+  deployment a singolo nodo: il lock è rilasciato dal kernel alla morte del processo.
+
+Espone inoltre metriche di attesa e contesa dei lock, sommate da tutti i
+processi (worker e UI) in uno store condiviso: un hash Redis o, con il
+backend su file, un database SQLite accanto ai file di lock.
+"""
+import os
+import time
+import sqlite3
+import uuid
+import atexit
+import socket
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Dict, Optional, Any
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+# --- CONFIGURAZIONE ---
+DB_STORAGE_DIR = "db_memoria"
+LOCKS_DIR = os.path.join(DB_STORAGE_DIR, "locks")
+REDIS_URL = os.getenv('REDIS_URL', 'redis://localhost:6379/0')
+LOCK_BACKEND = os.getenv('ARCHIVISTA_LOCK_BACKEND', 'auto')  # 'auto', 'redis', 'file'
+LOCK_KEY_PREFIX = "archivista:lock:"
+LOCK_METRICS_KEY = "archivista:lock_metrics"
+LOCK_METRICS_FILE = "lock_metrics.sqlite"
+DEFAULT_LEASE_MS = 30000  # Lease breve: un worker morto libera il lock entro 30s
+HEARTBEAT_FRACTION = 3    # Rinnovo ogni lease/3
+
+# Rilascia solo se il token corrisponde (evita di cancellare il lock di un altro worker)
+_RELEASE_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+# Estende la scadenza solo se il lock è ancora nostro
+_RENEW_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('pexpire', KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+
+class LockLostError(RuntimeError):
+    """Il lease del lock è scaduto e la risorsa può essere già di un altro worker."""
+
+
+class LockHandle:
+    """Lock acquisito: va rilasciato con `release()` o tramite context manager."""
+
+    def __init__(self, manager: "TaskLockManager", name: str, token: str,
+                 lease_ms: int, resource: Any = None):
+        self.manager = manager
+        self.name = name
+        self.token = token
+        self.lease_ms = lease_ms
+        self.resource = resource  # File descriptor per il backend su file
+        self.acquired_at = time.monotonic()
+        self.lost = False
+        self.released = False
+
+    def release(self) -> bool:
+        """Rilascia il lock. Idempotente."""
+        return self.manager.release(self)
+
+    def ensure_held(self):
+        """
+        Da chiamare prima di ogni effetto collaterale (indice, database, file).
+
+        Raises:
+            LockLostError: se il lock è stato perso
+        """
+        if not self.manager.is_held(self):
+            raise LockLostError(f"Lock perso per {self.name}: operazione interrotta")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.release()
+        return False
+
+
+class RedisLockBackend:
+    """Backend Redis: `SET key token NX PX lease` con heartbeat e compare-and-delete."""
+
+    name = "redis"
+
+    def __init__(self, client):
+        self.client = client
+        self._release = client.register_script(_RELEASE_SCRIPT)
+        self._renew = client.register_script(_RENEW_SCRIPT)
+
+    def try_acquire(self, name: str, token: str, lease_ms: int):
+        if self.client.set(LOCK_KEY_PREFIX + name, token, nx=True, px=lease_ms):
+            return True, None
+        return False, None
+
+    def renew(self, handle: LockHandle) -> bool:
+        return bool(self._renew(keys=[LOCK_KEY_PREFIX + handle.name], args=[handle.token, handle.lease_ms]))
+
+    def release(self, handle: LockHandle) -> bool:
+        return bool(self._release(keys=[LOCK_KEY_PREFIX + handle.name], args=[handle.token]))
+
+    def holder(self, name: str) -> Optional[str]:
+        value = self.client.get(LOCK_KEY_PREFIX + name)
+        return value.decode() if isinstance(value, bytes) else value
+
+    def publish_metrics(self, deltas: Dict[str, float]):
+        """Aggrega le metriche di tutti i worker in un hash Redis condiviso."""
+        pipe = self.client.pipeline(transaction=False)
+        for field, delta in deltas.items():
+            pipe.hincrbyfloat(LOCK_METRICS_KEY, field, delta)
+        pipe.execute()
+
+    def read_metrics(self) -> Dict[str, float]:
+        raw = self.client.hgetall(LOCK_METRICS_KEY)
+        return {(k.decode() if isinstance(k, bytes) else k): float(v) for k, v in raw.items()}
+
+
+class FileLockBackend:
+    """
+    Backend su file per deployment a singolo nodo.
+
+    Il lock è un `flock` esclusivo e non bloccante sul file: la creazione e il
+    controllo sono un'unica operazione atomica, e il kernel lo rilascia
+    immediatamente se il processo termina, senza finestre di staleness.
+    """
+
+    name = "file"
+
+    def __init__(self, locks_dir: str = LOCKS_DIR):
+        self.locks_dir = locks_dir
+        self.metrics_path = os.path.join(locks_dir, LOCK_METRICS_FILE)
+        os.makedirs(self.locks_dir, exist_ok=True)
+
+    def _path(self, name: str) -> str:
+        safe_name = "".join(c if c.isalnum() or c in "._-" else "_" for c in name)
+        return os.path.join(self.locks_dir, f"{safe_name}.lock")
+
+    def try_acquire(self, name: str, token: str, lease_ms: int):
+        fd = os.open(self._path(name), os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            if fcntl is not None:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            else:
+                msvcrt.locking(fd, msvcrt.LK_NBLCK, 1)
+        except OSError:
+            os.close(fd)
+            return False, None
+
+        # Il contenuto è solo informativo (diagnostica), il lock è il flock
+        os.ftruncate(fd, 0)
+        os.write(fd, token.encode())
+        return True, fd
+
+    def renew(self, handle: LockHandle) -> bool:
+        return True  # Il flock non scade: vale finché il processo è vivo
+
+    def release(self, handle: LockHandle) -> bool:
+        fd = handle.resource
+        if fd is None:
+            return False
+        try:
+            if fcntl is not None:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+            else:
+                os.lseek(fd, 0, os.SEEK_SET)
+                msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+        finally:
+            os.close(fd)
+        return True
+
+    def holder(self, name: str) -> Optional[str]:
+        try:
+            with open(self._path(name), "r") as f:
+                return f.read() or None
+        except OSError:
+            return None
+
+    def _metrics_connection(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.metrics_path, timeout=5)
+        conn.execute("CREATE TABLE IF NOT EXISTS lock_metrics (field TEXT PRIMARY KEY, value REAL NOT NULL)")
+        return conn
+
+    def publish_metrics(self, deltas: Dict[str, float]):
+        """Somma le metriche dei processi del nodo (worker e UI) in un database condiviso."""
+        conn = self._metrics_connection()
+        try:
+            with conn:
+                conn.executemany("""
+                    INSERT INTO lock_metrics (field, value) VALUES (?, ?)
+                    ON CONFLICT(field) DO UPDATE SET value = value + excluded.value
+                """, list(deltas.items()))
+        finally:
+            conn.close()
+
+    def read_metrics(self) -> Dict[str, float]:
+        conn = self._metrics_connection()
+        try:
+            return dict(conn.execute("SELECT field, value FROM lock_metrics").fetchall())
+        finally:
+            conn.close()
+
+
+class TaskLockManager:
+    """
+    Gestore centrale dei lock per i task Celery.
+
+    Uso tipico:
+        lock = task_lock_manager.acquire(f"process:{file_name}")
+        if lock is None:
+            return {'status': 'already_processing', ...}
+        try:
+            ...
+        finally:
+            lock.release()
+    """
+
+    def __init__(self, backend=None, lease_ms: int = DEFAULT_LEASE_MS):
+        self.logger = logging.getLogger("TaskLockManager")
+        self.lease_ms = lease_ms
+        self._backend = backend
+        self._held: Dict[str, LockHandle] = {}
+        self._lock = threading.Lock()
+        self._heartbeat_thread: Optional[threading.Thread] = None
+        self._stop_heartbeat = threading.Event()
+        self.metrics = {
+            'acquired': 0,
+            'contended': 0,
+            'timeouts': 0,
+            'released': 0,
+            'lost': 0,
+            'renewals': 0,
+            'wait_time_total_ms': 0.0,
+            'wait_time_max_ms': 0.0,
+            'hold_time_total_ms': 0.0,
+            'hold_time_max_ms': 0.0,
+        }
+        self._contention_by_prefix: Dict[str, int] = {}
+
+    @property
+    def backend(self):
+        """Backend selezionato al primo utilizzo, per non rallentare l'import."""
+        if self._backend is None:
+            self._backend = self._select_backend()
+        return self._backend
+
+    def _select_backend(self):
+        """Seleziona il backend: Redis se raggiungibile, altrimenti file lock."""
+        if LOCK_BACKEND in ('auto', 'redis'):
+            try:
+                import redis
+                client = redis.Redis.from_url(REDIS_URL, socket_connect_timeout=2, socket_timeout=5)
+                client.ping()
+                return RedisLockBackend(client)
+            except Exception as e:
+                if LOCK_BACKEND == 'redis':
+                    raise ConnectionError(f"Backend lock Redis non disponibile: {e}")
+                self.logger.warning(f"Redis non disponibile per i lock, uso file lock: {e}")
+        return FileLockBackend()
+
+    def _new_token(self) -> str:
+        return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex}"
+
+    # --- ACQUISIZIONE E RILASCIO ---
+
+    def acquire(self, name: str, wait_timeout: float = 0.0, poll_interval: float = 0.2,
+                lease_ms: Optional[int] = None) -> Optional[LockHandle]:
+        """
+        Tenta di acquisire il lock `name`.
+
+        Args:
+            name: Nome logico della risorsa (es. 'process:doc.pdf')
+            wait_timeout: Secondi massimi di attesa (0 = un solo tentativo)
+            poll_interval: Intervallo tra i tentativi in secondi
+            lease_ms: Durata del lease Redis (rinnovato dall'heartbeat)
+
+        Returns:
+            LockHandle se acquisito, None se la risorsa è occupata
+        """
+        lease_ms = lease_ms or self.lease_ms
+        token = self._new_token()
+        started = time.monotonic()
+        contended = False
+
+        while True:
+            acquired, resource = self.backend.try_acquire(name, token, lease_ms)
+            if acquired:
+                break
+            if not contended:
+                contended = True
+                self._record_contention(name)
+            if time.monotonic() - started >= wait_timeout:
+                self._record('timeouts', 1)
+                return None
+            time.sleep(poll_interval)
+
+        handle = LockHandle(self, name, token, lease_ms, resource)
+        wait_ms = (time.monotonic() - started) * 1000
+        with self._lock:
+            self._held[token] = handle
+            self.metrics['acquired'] += 1
+            self.metrics['wait_time_total_ms'] += wait_ms
+            self.metrics['wait_time_max_ms'] = max(self.metrics['wait_time_max_ms'], wait_ms)
+        self._publish({'acquired': 1, 'wait_time_total_ms': wait_ms})
+
+        if isinstance(self.backend, RedisLockBackend):
+            self._ensure_heartbeat()
+        return handle
+
+    def release(self, handle: LockHandle) -> bool:
+        """Rilascia un lock acquisito. Chiamate ripetute non hanno effetto."""
+        with self._lock:
+            if handle.released:
+                return False
+            handle.released = True
+            self._held.pop(handle.token, None)
+
+        hold_ms = (time.monotonic() - handle.acquired_at) * 1000
+        try:
+            released = self.backend.release(handle)
+        except Exception as e:
+            self.logger.error(f"Errore rilascio lock {handle.name}: {e}")
+            released = False
+
+        with self._lock:
+            self.metrics['released'] += 1
+            self.metrics['hold_time_total_ms'] += hold_ms
+            self.metrics['hold_time_max_ms'] = max(self.metrics['hold_time_max_ms'], hold_ms)
+        self._publish({'released': 1, 'hold_time_total_ms': hold_ms})
+        return released
+
+    def is_held(self, handle: LockHandle) -> bool:
+        """
+        Verifica che il lock sia ancora nostro. Con Redis controlla anche il
+        detentore, senza attendere il prossimo heartbeat.
+        """
+        if handle.lost or handle.released:
+            return False
+        if isinstance(self.backend, RedisLockBackend):
+            try:
+                holder = self.backend.holder(handle.name)
+            except Exception as e:
+                self.logger.warning(f"Verifica lock {handle.name} fallita: {e}")
+                return True  # Redis irraggiungibile: decide il prossimo heartbeat
+            if holder != handle.token:
+                self._mark_lost(handle)
+                return False
+        return True
+
+    def _mark_lost(self, handle: LockHandle):
+        with self._lock:
+            if handle.lost:
+                return
+            handle.lost = True
+            self._held.pop(handle.token, None)
+        self._record('lost', 1)
+        self.logger.error(f"Lock perso per {handle.name}: lease scaduto prima del rinnovo")
+
+    @contextmanager
+    def hold(self, name: str, wait_timeout: float = 0.0, lease_ms: Optional[int] = None):
+        """Context manager: restituisce il LockHandle o None se occupato."""
+        handle = self.acquire(name, wait_timeout=wait_timeout, lease_ms=lease_ms)
+        try:
+            yield handle
+        finally:
+            if handle is not None:
+                handle.release()
+
+    def release_all(self):
+        """Rilascia tutti i lock del processo (shutdown del worker)."""
+        with self._lock:
+            handles = list(self._held.values())
+        for handle in handles:
+            handle.release()
+        self._stop_heartbeat.set()
+
+    def holder(self, name: str) -> Optional[str]:
+        """Restituisce il token del detentore corrente (host:pid:uuid), se noto."""
+        try:
+            return self.backend.holder(name)
+        except Exception:
+            return None
+
+    # --- HEARTBEAT ---
+
+    def _ensure_heartbeat(self):
+        with self._lock:
+            if self._heartbeat_thread and self._heartbeat_thread.is_alive():
+                return
+            self._stop_heartbeat.clear()
+            self._heartbeat_thread = threading.Thread(
+                target=self._heartbeat_loop, name="task-lock-heartbeat", daemon=True
+            )
+            self._heartbeat_thread.start()
+
+    def _heartbeat_loop(self):
+        """Rinnova periodicamente i lease dei lock detenuti da questo processo."""
+        interval = self.lease_ms / 1000 / HEARTBEAT_FRACTION
+        while not self._stop_heartbeat.wait(interval):
+            with self._lock:
+                handles = list(self._held.values())
+            for handle in handles:
+                try:
+                    if self.backend.renew(handle):
+                        self._record('renewals', 1)
+                        continue
+                except Exception as e:
+                    self.logger.warning(f"Rinnovo lock {handle.name} fallito: {e}")
+                    continue
+                # Il lease è scaduto ed è stato preso da un altro worker
+                self._mark_lost(handle)
+
+    # --- METRICHE ---
+
+    def _record(self, field: str, delta: float):
+        with self._lock:
+            self.metrics[field] += delta
+        self._publish({field: delta})
+
+    def _record_contention(self, name: str):
+        prefix = name.split(":", 1)[0]
+        with self._lock:
+            self.metrics['contended'] += 1
+            self._contention_by_prefix[prefix] = self._contention_by_prefix.get(prefix, 0) + 1
+        self._publish({'contended': 1, f'contended:{prefix}': 1})
+
+    def _publish(self, deltas: Dict[str, float]):
+        try:
+            self.backend.publish_metrics(deltas)
+        except Exception:
+            pass  # Le metriche non devono mai bloccare i task
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """Metriche del processo corrente, con quelle aggregate in 'cluster'."""
+        with self._lock:
+            metrics = dict(self.metrics)
+            metrics['contention_by_prefix'] = dict(self._contention_by_prefix)
+            metrics['currently_held'] = len(self._held)
+        metrics.update(_derived_metrics(metrics))
+        metrics['backend'] = self.backend.name
+        metrics['cluster'] = self._read_shared()
+        return metrics
+
+    def get_shared_metrics(self) -> Dict[str, Any]:
+        """
+        Metriche sommate da tutti i processi che usano lo stesso store.
+
+        Il processo Streamlit non acquisisce lock: la dashboard deve leggere
+        queste, non i contatori del proprio processo.
+        """
+        raw = self._read_shared()
+        metrics = {field: raw.get(field, 0.0) for field in self.metrics if not field.endswith('_max_ms')}
+        metrics['contention_by_prefix'] = {
+            field.split(':', 1)[1]: value for field, value in raw.items() if field.startswith('contended:')
+        }
+        metrics.update(_derived_metrics(metrics))
+        metrics['backend'] = self.backend.name
+        return metrics
+
+    def _read_shared(self) -> Dict[str, float]:
+        try:
+            return self.backend.read_metrics()
+        except Exception as e:
+            self.logger.warning(f"Metriche condivise dei lock non disponibili: {e}")
+            return {}
+
+
+def _derived_metrics(metrics: Dict[str, Any]) -> Dict[str, float]:
+    """Tasso di contesa e tempi medi dai contatori."""
+    attempts = metrics['acquired'] + metrics['timeouts']
+    return {
+        'contention_rate': metrics['contended'] / attempts if attempts else 0.0,
+        'avg_wait_time_ms': metrics['wait_time_total_ms'] / metrics['acquired'] if metrics['acquired'] else 0.0,
+        'avg_hold_time_ms': metrics['hold_time_total_ms'] / metrics['released'] if metrics['released'] else 0.0,
+    }
+
+
+# --- ISTANZA GLOBALE ---
+task_lock_manager = TaskLockManager()
+atexit.register(task_lock_manager.release_all)
+
+# Rilascio immediato dei lock Redis allo shutdown del processo worker
+try:
+    from celery.signals import worker_process_shutdown
+
+    @worker_process_shutdown.connect
+    def _release_locks_on_shutdown(**kwargs):
+        task_lock_manager.release_all()
+except ImportError:
+    pass
+
+# --- FUNZIONI DI UTILITÀ PUBBLICHE ---
+
+def acquire_document_lock(operation: str, file_name: str, wait_timeout: float = 0.0) -> Optional[LockHandle]:
+    """Acquisisce il lock per un'operazione su un documento (es. 'process', 'delete')."""
+    return task_lock_manager.acquire(f"{operation}:{file_name}", wait_timeout=wait_timeout)
+
+def get_lock_metrics() -> Dict[str, Any]:
+    """Restituisce le metriche di attesa e contesa dei lock del processo corrente."""
+    return task_lock_manager.get_metrics()
+
+def get_shared_lock_metrics() -> Dict[str, Any]:
+    """Restituisce le metriche dei lock sommate da tutti i worker."""
+    return task_lock_manager.get_shared_metrics()
@@ -0,0 +1,218 @@
+"""
+Scheduler per l'instradamento dei task di ingestione su code separate.
+
+Con una sola coda e `soft_time_limit=300` un PDF di 300 pagine blocca decine
+di piccoli appunti e va in timeout rimbalzando tra i retry. Qui ogni documento
+viene classificato per dimensione, numero di pagine ed estensione e per
+origine (upload interattivo dalla UI o scansione in background), e inviato
+alla coda corrispondente con limiti di tempo propri.
+
+Il broker Redis non ordina i messaggi tra code diverse (un worker le consuma
+a turno), quindi la precedenza degli upload non si ottiene con le priorità:
+le code interattive hanno worker dedicati (WORKER_POOLS), che non restano
+mai in attesa dietro a una scansione bulk.
+"""
+import os
+import re
+import zipfile
+import logging
+from dataclasses import dataclass
+from typing import Dict, Optional, Any
+
+# --- CONFIGURAZIONE ---
+LARGE_FILE_BYTES = int(os.getenv('ARCHIVISTA_LARGE_FILE_BYTES', 10 * 1024 * 1024))  # 10 MB
+LARGE_PAGE_COUNT = int(os.getenv('ARCHIVISTA_LARGE_PAGE_COUNT', 60))
+
+# Formati costosi da estrarre a parità di dimensione (fogli e slide)
+HEAVY_EXTENSIONS = {'.xlsx', '.xls', '.pptx', '.ppt'}
+HEAVY_EXTENSION_SIZE_FACTOR = 4
+
+# Stima pagine per i formati testuali (caratteri per pagina)
+BYTES_PER_TEXT_PAGE = 3000
+
+ORIGIN_INTERACTIVE = "interactive"
+ORIGIN_BULK = "bulk"
+
+logger = logging.getLogger("TaskScheduler")
+
+
+@dataclass(frozen=True)
+class QueueProfile:
+    """Profilo di una coda di ingestione"""
+    name: str
+    soft_time_limit: int   # secondi
+    time_limit: int        # secondi
+
+
+QUEUE_PROFILES: Dict[str, QueueProfile] = {
+    "ingest_interactive_small": QueueProfile("ingest_interactive_small", 300, 360),
+    "ingest_interactive_large": QueueProfile("ingest_interactive_large", 1800, 2100),
+    "ingest_bulk_small": QueueProfile("ingest_bulk_small", 300, 360),
+    "ingest_bulk_large": QueueProfile("ingest_bulk_large", 3600, 4200),
+}
+
+# Documenti inviati senza enqueue_document (es. .delay dal codice esistente)
+INGEST_DEFAULT_QUEUE = "ingest_bulk_small"
+
+# Task non di ingestione: quelli avviati da un utente e quelli periodici
+INTERACTIVE_TASKS_QUEUE = "tasks_interactive"
+DEFAULT_QUEUE = "tasks_background"
+
+TASK_ROUTES = {
+    'archivista.process_document': INGEST_DEFAULT_QUEUE,
+    'archivista.delete_document': INTERACTIVE_TASKS_QUEUE,
+    'archivista.process_user_bayesian_knowledge': INTERACTIVE_TASKS_QUEUE,
+    'archivista.process_user_feedback_bayesian': INTERACTIVE_TASKS_QUEUE,
+}
+
+# Code consumate da ciascun gruppo di worker (vedi docker-compose*.yml e
+# start_celery_worker.bat): ogni coda appartiene a un solo gruppo
+WORKER_POOLS = {
+    "interactive": ["ingest_interactive_small", "ingest_interactive_large", INTERACTIVE_TASKS_QUEUE],
+    "bulk": ["ingest_bulk_small", "ingest_bulk_large", DEFAULT_QUEUE],
+}
+
+
+@dataclass
+class DocumentJobProfile:
+    """Caratteristiche del documento usate per l'instradamento"""
+    file_path: str
+    file_size: int
+    file_extension: str
+    page_count: Optional[int]
+    is_large: bool
+
+
+# --- STIMA DEL COSTO DEL DOCUMENTO ---
+
+def _count_pdf_pages(file_path: str) -> Optional[int]:
+    try:
+        from pypdf import PdfReader
+        return len(PdfReader(file_path).pages)
+    except Exception:
+        return None
+
+
+def _count_pptx_slides(file_path: str) -> Optional[int]:
+    try:
+        with zipfile.ZipFile(file_path) as zf:
+            return sum(1 for n in zf.namelist() if re.match(r"ppt/slides/slide\d+\.xml$", n))
+    except Exception:
+        return None
+
+
+def _count_docx_pages(file_path: str) -> Optional[int]:
+    """Legge il numero di pagine salvato da Word in docProps/app.xml, senza parsare il documento."""
+    try:
+        with zipfile.ZipFile(file_path) as zf:
+            app_xml = zf.read("docProps/app.xml").decode("utf-8", errors="ignore")
+        match = re.search(r"<Pages>(\d+)</Pages>", app_xml)
+        return int(match.group(1)) if match else None
+    except Exception:
+        return None
+
+
+def estimate_page_count(file_path: str, file_extension: str, file_size: int) -> Optional[int]:
+    """Stima economica del numero di pagine (legge solo i metadati quando possibile)."""
+    if file_extension == '.pdf':
+        return _count_pdf_pages(file_path)
+    if file_extension == '.pptx':
+        return _count_pptx_slides(file_path)
+    if file_extension == '.docx':
+        return _count_docx_pages(file_path)
+    if file_extension in {'.txt', '.html', '.htm', '.rtf', '.csv'}:
+        return max(1, file_size // BYTES_PER_TEXT_PAGE)
+    return None
+
+
+def profile_document(file_path: str) -> DocumentJobProfile:
+    """Calcola il profilo di costo di un documento da instradare."""
+    file_extension = os.path.splitext(file_path)[1].lower()
+    try:
+        file_size = os.path.getsize(file_path)
+    except OSError:
+        file_size = 0
+
+    page_count = estimate_page_count(file_path, file_extension, file_size)
+
+    effective_size = file_size
+    if file_extension in HEAVY_EXTENSIONS:
+        effective_size *= HEAVY_EXTENSION_SIZE_FACTOR
+
+    is_large = (
+        effective_size >= LARGE_FILE_BYTES
+        or (page_count is not None and page_count >= LARGE_PAGE_COUNT)
+    )
+
+    return DocumentJobProfile(
+        file_path=file_path,
+        file_size=file_size,
+        file_extension=file_extension,
+        page_count=page_count,
+        is_large=is_large,
+    )
+
+
+# --- INSTRADAMENTO ---
+
+def select_queue(profile: DocumentJobProfile, origin: str = ORIGIN_BULK) -> QueueProfile:
+    """Sceglie la coda in base a origine e dimensione del documento."""
+    origin = ORIGIN_INTERACTIVE if origin == ORIGIN_INTERACTIVE else ORIGIN_BULK
+    size_class = "large" if profile.is_large else "small"
+    return QUEUE_PROFILES[f"ingest_{origin}_{size_class}"]
+
+
+def get_routing_options(file_path: str, origin: str = ORIGIN_BULK) -> Dict[str, Any]:
+    """
+    Restituisce le opzioni di `apply_async` per un documento.
+
+    Args:
+        file_path: Percorso del documento da processare
+        origin: 'interactive' per upload dalla UI, 'bulk' per scansioni in background
+
+    Returns:
+        Dict con queue, soft_time_limit e time_limit
+    """
+    profile = profile_document(file_path)
+    queue = select_queue(profile, origin)
+    return {
+        'queue': queue.name,
+        'soft_time_limit': queue.soft_time_limit,
+        'time_limit': queue.time_limit,
+    }
+
+
+def enqueue_document(task, file_path: str, origin: str = ORIGIN_BULK, user_id: Optional[int] = None,
+                     allow_duplicate: bool = False):
+    """
+    Invia un documento al task di processamento sulla coda appropriata.
+
+    Args:
+        task: Task Celery (es. process_document_task)
+        file_path: Percorso del documento
+        origin: 'interactive' o 'bulk'
+        user_id: Utente che ha caricato il file, se noto
+        allow_duplicate: Processa il file anche se è simile a un documento già in archivio
+
+    Returns:
+        AsyncResult del task inviato
+    """
+    options = get_routing_options(file_path, origin)
+    logger.info(f"Routing {os.path.basename(file_path)} -> {options['queue']}")
+    kwargs = {'user_id': user_id} if user_id is not None else {}
+    if allow_duplicate:
+        kwargs['allow_duplicate'] = True
+    return task.apply_async(args=[file_path], kwargs=kwargs, **options)
+
+
+# --- CONFIGURAZIONE CELERY ---
+
+def get_celery_queue_config() -> Dict[str, Any]:
+    """Configurazione code per `celery_app.conf.update(...)`."""
+    from kombu import Queue
+
+    return {
+        'task_queues': [Queue(name) for pool in WORKER_POOLS.values() for name in pool],
+        'task_default_queue': DEFAULT_QUEUE,
+        'task_routes': {task: {'queue': queue} for task, queue in TASK_ROUTES.items()},
+    }
@@ -1,7 +1,6 @@
 import streamlit as st
 import sqlite3
 import os
-import pandas as pd
 import json
 from tools.knowledge_structure import (
     KNOWLEDGE_BASE_STRUCTURE,
@@ -14,6 +13,12 @@ from tools.knowledge_structure import (
     calculate_confidence_update,
     validate_confidence_score
 )
+from tools.graph_engine import knowledge_graph_registry
+from tools.graph_centrality import graph_centrality_service
+from tools.activity_logger import activity_logger
+from tools.achievements import evaluate_achievements
+from tools.archive_stats import archive_statistics_engine, get_recent_documents as get_recent_archive_rows
+from tools.ui_data_layer import create_data_version_schema, versioned_data
 from datetime import datetime
 
 # --- CONFIGURAZIONE ---
@@ -28,6 +33,19 @@ def db_connect():
     conn.row_factory = sqlite3.Row
     return conn
 
+def notify_suggestions(user_id, event_type: str, wait: bool = False) -> bool:
+    """
+    Segnala un evento al sistema dei suggerimenti, che invalida e ricalcola
+    quelli dell'utente (in background, o subito con wait=True dai worker).
+    Non solleva mai eccezioni.
+    """
+    try:
+        from src.services.ai.smart_suggestions import notify_suggestion_event
+    except ImportError as e:
+        print(f"Suggerimenti non disponibili: {e}")
+        return False
+    return notify_suggestion_event(user_id, event_type, wait=wait)
+
 def setup_database():
     """
     Crea le tabelle del database se non esistono,
@@ -62,6 +80,75 @@ def setup_database():
             if 'ai_tasks' not in columns:
                 cursor.execute("ALTER TABLE papers ADD COLUMN ai_tasks TEXT")  # JSON object
 
+            # La versione dell'archivio per tools.archive_stats è il contatore di papers in
+            # data_versions (create_data_version_schema): il vecchio contatore dedicato non serve più
+            for event in ("insert", "update", "delete"):
+                cursor.execute(f"DROP TRIGGER IF EXISTS trg_papers_{event}_archive_version")
+            cursor.execute("DROP TABLE IF EXISTS archive_version")
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_papers_processed_at ON papers(processed_at)")
+
+            # Storico delle operazioni batch con before-image per l'undo (tools.batch_metadata)
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS batch_operation_history (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    operation_type TEXT NOT NULL,
+                    field TEXT NOT NULL,
+                    value TEXT, -- JSON
+                    file_count INTEGER NOT NULL,
+                    affected_count INTEGER NOT NULL DEFAULT 0,
+                    created_at TEXT NOT NULL,
+                    undone_at TEXT
+                )
+            """)
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS batch_operation_before_images (
+                    operation_id INTEGER NOT NULL,
+                    file_name TEXT NOT NULL,
+                    old_value, -- nessuna affinità: conserva il tipo originale del campo
+                    PRIMARY KEY (operation_id, file_name),
+                    FOREIGN KEY (operation_id) REFERENCES batch_operation_history (id) ON DELETE CASCADE
+                )
+            """)
+
+            # Riassunti intermedi per hash di prompt e contenuto (tools.document_summarizer)
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS summary_cache (
+                    content_hash TEXT PRIMARY KEY,
+                    stage TEXT NOT NULL,
+                    summary TEXT NOT NULL,
+                    created_at TEXT NOT NULL,
+                    last_used_at TEXT NOT NULL
+                )
+            """)
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_summary_cache_last_used ON summary_cache(last_used_at)")
+
+            # Embedding dei documenti classificati e registro delle decisioni (tools.category_classifier)
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS category_centroid_members (
+                    file_name TEXT PRIMARY KEY,
+                    category_id TEXT NOT NULL,
+                    embedding_model TEXT NOT NULL,
+                    vector BLOB NOT NULL, -- float32 normalizzato
+                    updated_at TEXT NOT NULL
+                )
+            """)
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS classification_log (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    file_name TEXT,
+                    centroid_category TEXT NOT NULL,
+                    similarity REAL NOT NULL,
+                    margin REAL NOT NULL,
+                    confident INTEGER NOT NULL,
+                    llm_category TEXT,
+                    final_category TEXT NOT NULL,
+                    decided_by TEXT NOT NULL, -- 'centroid', 'llm', 'audit'
+                    embedding_model TEXT NOT NULL,
+                    created_at TEXT NOT NULL
+                )
+            """)
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_classification_log_created ON classification_log(created_at)")
+
             # Tabelle per il sistema utenti e memoria chat
             cursor.execute("""
                 CREATE TABLE IF NOT EXISTS users (
@@ -270,6 +357,128 @@ def setup_database():
                 )
             """)
 
+            # Indici per i riepiloghi di stato e la dashboard errori (evitano le scansioni complete)
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_processing_status_state ON document_processing_status(processing_state)")
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_processing_status_updated ON document_processing_status(updated_at)")
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_error_log_open_category ON processing_error_log(resolution_status, error_category)")
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_error_log_open_type ON processing_error_log(resolution_status, error_type)")
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_error_log_open_created ON processing_error_log(resolution_status, created_at)")
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_error_log_created ON processing_error_log(created_at)")
+
+            # Conteggi per stato di processamento, mantenuti dai trigger
+            cursor.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name = 'processing_state_counts'")
+            state_counts_exists = cursor.fetchone() is not None
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS processing_state_counts (
+                    processing_state TEXT PRIMARY KEY,
+                    count INTEGER NOT NULL DEFAULT 0
+                )
+            """)
+            if not state_counts_exists:
+                # Popolamento iniziale dai dati esistenti (una sola volta)
+                cursor.execute("""
+                    INSERT INTO processing_state_counts (processing_state, count)
+                    SELECT processing_state, COUNT(*) FROM document_processing_status
+                    GROUP BY processing_state
+                """)
+            cursor.execute("""
+                CREATE TRIGGER IF NOT EXISTS trg_processing_state_insert
+                AFTER INSERT ON document_processing_status
+                BEGIN
+                    INSERT INTO processing_state_counts (processing_state, count) VALUES (NEW.processing_state, 1)
+                    ON CONFLICT(processing_state) DO UPDATE SET count = count + 1;
+                END
+            """)
+            cursor.execute("""
+                CREATE TRIGGER IF NOT EXISTS trg_processing_state_update
+                AFTER UPDATE OF processing_state ON document_processing_status
+                WHEN OLD.processing_state != NEW.processing_state
+                BEGIN
+                    UPDATE processing_state_counts SET count = count - 1 WHERE processing_state = OLD.processing_state;
+                    INSERT INTO processing_state_counts (processing_state, count) VALUES (NEW.processing_state, 1)
+                    ON CONFLICT(processing_state) DO UPDATE SET count = count + 1;
+                END
+            """)
+            cursor.execute("""
+                CREATE TRIGGER IF NOT EXISTS trg_processing_state_delete
+                AFTER DELETE ON document_processing_status
+                BEGIN
+                    UPDATE processing_state_counts SET count = count - 1 WHERE processing_state = OLD.processing_state;
+                END
+            """)
+
+            # Firme MinHash e bande LSH per il rilevamento dei quasi-duplicati in ingestione
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS document_minhash_signatures (
+                    file_name TEXT PRIMARY KEY,
+                    content_hash TEXT,
+                    signature BLOB, -- NUM_PERM interi a 32 bit (little endian)
+                    num_perm INTEGER NOT NULL,
+                    created_at TEXT NOT NULL
+                )
+            """)
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_minhash_content_hash ON document_minhash_signatures(content_hash)")
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS document_minhash_bands (
+                    band_index INTEGER NOT NULL,
+                    band_hash INTEGER NOT NULL,
+                    file_name TEXT NOT NULL
+                )
+            """)
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_minhash_bands_lookup ON document_minhash_bands(band_index, band_hash)")
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_minhash_bands_file ON document_minhash_bands(file_name)")
+
+            # Collegamenti tra file scartati come quasi-duplicati e il documento esistente
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS document_duplicates (
+                    file_name TEXT PRIMARY KEY,
+                    duplicate_of TEXT NOT NULL,
+                    similarity REAL NOT NULL,
+                    content_hash TEXT,
+                    detected_at TEXT NOT NULL
+                )
+            """)
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_duplicates_of ON document_duplicates(duplicate_of)")
+
+            # Checkpoint delle fasi della pipeline, per riprendere i retry dalla prima fase incompleta
+            cursor.execute("PRAGMA table_info(pipeline_stage_checkpoints)")
+            checkpoint_key = {col[1] for col in cursor.fetchall() if col[5]}
+            if checkpoint_key and 'file_name' not in checkpoint_key:
+                # Chiave senza file_name: file diversi con gli stessi byte condividevano i checkpoint.
+                # Sono solo punti di ripresa, si ricrea la tabella
+                cursor.execute("DROP TABLE pipeline_stage_checkpoints")
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS pipeline_stage_checkpoints (
+                    content_hash TEXT NOT NULL, -- SHA-256 del contenuto del file
+                    stage TEXT NOT NULL, -- 'extract', 'classify', 'metadata', 'index', 'preview', 'academic_analysis', 'bayesian', 'persist'
+                    file_name TEXT NOT NULL,
+                    status TEXT NOT NULL CHECK (status IN ('completed', 'failed')),
+                    output TEXT, -- JSON con l'output della fase
+                    duration_ms REAL,
+                    attempts INTEGER DEFAULT 1,
+                    error_message TEXT,
+                    celery_task_id TEXT,
+                    updated_at TEXT NOT NULL,
+                    PRIMARY KEY (content_hash, file_name, stage)
+                )
+            """)
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_stage_checkpoints_file ON pipeline_stage_checkpoints(file_name)")
+
+            # Durate per fase (append-only) per il profiling della pipeline
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS pipeline_stage_metrics (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    content_hash TEXT NOT NULL,
+                    file_name TEXT NOT NULL,
+                    stage TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    duration_ms REAL NOT NULL,
+                    resumed INTEGER DEFAULT 0, -- 1 = fase saltata grazie al checkpoint
+                    created_at TEXT NOT NULL
+                )
+            """)
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_stage_metrics_created ON pipeline_stage_metrics(created_at, stage)")
+
             cursor.execute("""
                 CREATE TABLE IF NOT EXISTS concept_relationships (
                     id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -286,6 +495,56 @@ def setup_database():
                 )
             """)
 
+            # Log delle modifiche al grafo della conoscenza, per le patch incrementali del motore CSR
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS knowledge_graph_changes (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    user_id INTEGER NOT NULL,
+                    entity_kind TEXT NOT NULL CHECK (entity_kind IN ('entity', 'relationship')),
+                    row_id INTEGER NOT NULL,
+                    operation TEXT NOT NULL CHECK (operation IN ('upsert', 'delete')),
+                    changed_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+                )
+            """)
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_graph_changes_user ON knowledge_graph_changes(user_id, id)")
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_graph_changes_time ON knowledge_graph_changes(changed_at)")
+            for table, kind in (("concept_entities", "entity"), ("concept_relationships", "relationship")):
+                for event, row, operation in (("INSERT", "NEW", "upsert"), ("UPDATE", "NEW", "upsert"), ("DELETE", "OLD", "delete")):
+                    cursor.execute(f"""
+                        CREATE TRIGGER IF NOT EXISTS trg_{table}_{event.lower()}_graph_log
+                        AFTER {event} ON {table}
+                        BEGIN
+                            INSERT INTO knowledge_graph_changes (user_id, entity_kind, row_id, operation)
+                            VALUES ({row}.user_id, '{kind}', {row}.id, '{operation}');
+                        END
+                    """)
+            # Il motore ricostruisce da zero i grafi più vecchi di un'ora: basta un giorno di log
+            cursor.execute("DELETE FROM knowledge_graph_changes WHERE changed_at < DATETIME('now', '-1 day')")
+
+            # Centralità precalcolate (tools.graph_centrality): una versione per utente
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS graph_centrality_runs (
+                    user_id INTEGER PRIMARY KEY,
+                    graph_version INTEGER NOT NULL,
+                    node_count INTEGER NOT NULL,
+                    edge_count INTEGER NOT NULL,
+                    duration_ms REAL,
+                    computed_at TEXT NOT NULL,
+                    FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE
+                )
+            """)
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS graph_centrality_scores (
+                    user_id INTEGER NOT NULL,
+                    entity_id INTEGER NOT NULL,
+                    weighted_degree REAL NOT NULL DEFAULT 0,
+                    pagerank REAL NOT NULL DEFAULT 0,
+                    betweenness REAL NOT NULL DEFAULT 0,
+                    PRIMARY KEY (user_id, entity_id),
+                    FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE
+                )
+            """)
+
             cursor.execute("""
                 CREATE TABLE IF NOT EXISTS user_xp (
                     id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -312,6 +571,11 @@ def setup_database():
                 )
             """)
 
+            # Indici per le metriche degli achievement (tools.achievements)
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_user_xp_user ON user_xp(user_id)")
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_courses_user ON courses(user_id)")
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_tasks_user_status ON tasks(user_id, status)")
+
             cursor.execute("""
                 CREATE TABLE IF NOT EXISTS study_sessions (
                     id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -350,6 +614,49 @@ def setup_database():
                     FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE
                 )
             """)
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_user_activity_user_time ON user_activity(user_id, timestamp)")
+
+            # Tabelle derivate da user_activity, aggiornate a ogni flush di tools.activity_logger
+            cursor.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name = 'user_recent_documents'")
+            backfill_recent = cursor.fetchone() is None
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS user_recent_documents (
+                    user_id INTEGER NOT NULL,
+                    file_name TEXT NOT NULL,
+                    last_accessed TEXT NOT NULL,
+                    last_action TEXT,
+                    PRIMARY KEY (user_id, file_name),
+                    FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE
+                )
+            """)
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS user_recent_uploads (
+                    user_id INTEGER NOT NULL,
+                    file_name TEXT NOT NULL,
+                    upload_date TEXT NOT NULL,
+                    upload_metadata TEXT,
+                    PRIMARY KEY (user_id, file_name),
+                    FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE
+                )
+            """)
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_recent_documents_user_time ON user_recent_documents(user_id, last_accessed DESC)")
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_recent_uploads_user_time ON user_recent_uploads(user_id, upload_date DESC)")
+            if backfill_recent:
+                # Prima creazione: popola le tabelle dallo storico (ultima azione per documento)
+                cursor.execute("""
+                    INSERT OR IGNORE INTO user_recent_documents (user_id, file_name, last_accessed, last_action)
+                    SELECT user_id, target_id, MAX(timestamp), action_type
+                    FROM user_activity
+                    WHERE target_type = 'document' AND target_id IS NOT NULL
+                    GROUP BY user_id, target_id
+                """)
+                cursor.execute("""
+                    INSERT OR IGNORE INTO user_recent_uploads (user_id, file_name, upload_date, upload_metadata)
+                    SELECT user_id, target_id, MAX(timestamp), metadata
+                    FROM user_activity
+                    WHERE action_type = 'create_doc' AND target_id IS NOT NULL
+                    GROUP BY user_id, target_id
+                """)
 
             # Aggiungi campo is_new_user alla tabella users se non esiste
             cursor.execute("PRAGMA table_info(users)")
@@ -357,26 +664,98 @@ def setup_database():
             if 'is_new_user' not in user_columns:
                 cursor.execute("ALTER TABLE users ADD COLUMN is_new_user INTEGER DEFAULT 1")
 
+            # Contatori per (tabella, utente) che versionano le cache dell'interfaccia (tools.ui_data_layer)
+            create_data_version_schema(cursor)
+
             conn.commit()
             print("✅ Database verificato: tutte le tabelle sono pronte.")
     except sqlite3.Error as e:
         print(f"❌ Errore nella creazione delle tabelle database: {e}")
         raise
 
-@st.cache_data(ttl=10)
+def get_archive_statistics() -> dict:
+    """
+    Statistiche complete dell'archivio (tools.archive_stats), calcolate con
+    query aggregate e riusate finché la versione dell'archivio non cambia.
+    """
+    if not os.path.exists(METADATA_DB_FILE):
+        return {}
+    try:
+        return archive_statistics_engine.get_stats(db_connect)
+    except Exception as e:
+        print(f"Errore nel calcolo delle statistiche dell'archivio: {e}")
+        return {}
+
+def clear_archive_statistics():
+    """Forza il ricalcolo delle statistiche dell'archivio alla prossima richiesta."""
+    archive_statistics_engine.invalidate()
+
+def get_recent_archive_documents(days: int = 7) -> list:
+    """Documenti processati negli ultimi `days` giorni, dal più recente."""
+    try:
+        conn = db_connect()
+        try:
+            return get_recent_archive_rows(conn, days)
+        finally:
+            conn.close()
+    except Exception as e:
+        print(f"Errore nel recupero dei documenti recenti: {e}")
+        return []
+
+@versioned_data(db_connect, tables=['papers'])
+def _load_papers_dataframe():
+    import pandas as pd  # differito: pandas non serve al primo rendering
+    conn = db_connect()
+    try:
+        return pd.read_sql_query("SELECT * FROM papers ORDER BY category_id, title", conn)
+    finally:
+        conn.close()
+
 def get_papers_dataframe():
-    """Recupera i dati dei paper dal DB e li restituisce come DataFrame."""
+    """
+    Recupera i dati dei paper dal DB e li restituisce come DataFrame.
+
+    Il risultato resta in cache finché `papers` non viene modificata;
+    ogni chiamata restituisce un DataFrame nuovo.
+    """
+    import pandas as pd  # differito: pandas non serve al primo rendering
     if not os.path.exists(METADATA_DB_FILE):
         return pd.DataFrame()  # Return empty DataFrame if no database exists
-    
+
     try:
-        with db_connect() as conn:
-            df = pd.read_sql_query("SELECT * FROM papers ORDER BY category_id, title", conn)
-            return df
+        return _load_papers_dataframe()
     except Exception as e:
         print(f"Errore nel recupero dei paper: {e}")
         return pd.DataFrame()
 
+@versioned_data(db_connect, tables=['papers'])
+def _load_papers_overview() -> dict:
+    conn = db_connect()
+    try:
+        row = conn.execute("""
+            SELECT COUNT(*) AS documents,
+                   COUNT(DISTINCT category_id) AS categories,
+                   COUNT(formatted_preview) AS ai_processed
+            FROM papers
+        """).fetchone()
+        return dict(row)
+    finally:
+        conn.close()
+
+def get_papers_overview() -> dict:
+    """
+    Conteggi dell'archivio per le metriche della home (documenti, categorie,
+    elaborati dall'AI) senza caricare la tabella in un DataFrame.
+    """
+    empty = {'documents': 0, 'categories': 0, 'ai_processed': 0}
+    if not os.path.exists(METADATA_DB_FILE):
+        return empty
+    try:
+        return _load_papers_overview()
+    except Exception as e:
+        print(f"Errore nel conteggio dei paper: {e}")
+        return empty
+
 def delete_paper(file_name: str):
     """
     Elimina un documento dal database e dal disco.
@@ -703,6 +1082,7 @@ def authenticate_user(username: str, password: str) -> dict:
             )
             user = cursor.fetchone()
             if user and verify_password(password, user['password_hash']):
+                notify_suggestions(user['id'], 'session_started')
                 return {'id': user['id'], 'username': user['username']}
             return None
     except Exception as e:
@@ -1121,6 +1501,12 @@ def update_task(task_id: int, task_title: str = None, task_description: str = No
             query = f"UPDATE tasks SET {', '.join(update_fields)} WHERE id = ?"
             cursor.execute(query, tuple(values))
             conn.commit()
+
+            if status == 'completed':
+                cursor.execute("SELECT user_id FROM tasks WHERE id = ?", (task_id,))
+                row = cursor.fetchone()
+                if row:
+                    notify_suggestions(row['user_id'], 'task_completed')
     except Exception as e:
         print(f"Errore nell'aggiornamento del task: {e}")
         raise
@@ -1186,100 +1572,107 @@ def create_concept_relationship(user_id: int, source_entity_name: str, target_en
         print(f"Errore nella creazione della relazione concettuale: {e}")
         raise
 
-def get_user_knowledge_graph(user_id: int) -> dict:
-    """Recupera l'intero grafo della conoscenza dell'utente."""
+@versioned_data(db_connect, tables=['concept_entities', 'concept_relationships'])
+def _load_user_knowledge_graph(user_id: int) -> dict:
+    conn = db_connect()
     try:
-        with db_connect() as conn:
-            cursor = conn.cursor()
+        cursor = conn.cursor()
 
-            # Recupera tutte le entità
-            cursor.execute("SELECT * FROM concept_entities WHERE user_id = ?", (user_id,))
-            entities = [dict(entity) for entity in cursor.fetchall()]
+        # Recupera tutte le entità
+        cursor.execute("SELECT * FROM concept_entities WHERE user_id = ?", (user_id,))
+        entities = [dict(entity) for entity in cursor.fetchall()]
 
-            # Recupera tutte le relazioni
-            cursor.execute("""
-                SELECT r.*, e1.entity_name as source_name, e1.entity_type as source_type,
-                       e2.entity_name as target_name, e2.entity_type as target_type
-                FROM concept_relationships r
-                JOIN concept_entities e1 ON r.source_entity_id = e1.id
-                JOIN concept_entities e2 ON r.target_entity_id = e2.id
-                WHERE r.user_id = ?
-            """, (user_id,))
-            relationships = [dict(rel) for rel in cursor.fetchall()]
+        # Recupera tutte le relazioni
+        cursor.execute("""
+            SELECT r.*, e1.entity_name as source_name, e1.entity_type as source_type,
+                   e2.entity_name as target_name, e2.entity_type as target_type
+            FROM concept_relationships r
+            JOIN concept_entities e1 ON r.source_entity_id = e1.id
+            JOIN concept_entities e2 ON r.target_entity_id = e2.id
+            WHERE r.user_id = ?
+        """, (user_id,))
+        relationships = [dict(rel) for rel in cursor.fetchall()]
 
-            return {
-                "entities": entities,
-                "relationships": relationships
-            }
+        return {
+            "entities": entities,
+            "relationships": relationships
+        }
+    finally:
+        conn.close()
+
+def get_user_knowledge_graph(user_id: int) -> dict:
+    """
+    Recupera l'intero grafo della conoscenza dell'utente, in cache finché
+    le sue entità o relazioni non cambiano.
+    """
+    try:
+        return _load_user_knowledge_graph(user_id)
     except Exception as e:
         print(f"Errore nel recupero del grafo della conoscenza: {e}")
         return {"entities": [], "relationships": []}
 
+def get_knowledge_graph_engine(user_id: int):
+    """
+    Restituisce il grafo della conoscenza dell'utente in formato CSR (tools.graph_engine),
+    caricato una volta e aggiornato in modo incrementale alle modifiche.
+    """
+    return knowledge_graph_registry.get(user_id, db_connect)
+
+def get_influential_entities(user_id: int, k: int = 10, min_confidence: float = 0.0,
+                             entity_type: str = None, metric: str = 'weighted_degree') -> list:
+    """
+    Le k entità più influenti del grafo dell'utente (grado pesato per confidenza,
+    'pagerank' o 'betweenness'), lette dalle centralità precalcolate per versione del grafo.
+    """
+    try:
+        return graph_centrality_service.top_entities(user_id, db_connect, metric, k, min_confidence, entity_type)
+    except Exception as e:
+        print(f"Errore nel calcolo delle entità influenti: {e}")
+        return []
+
 def get_entity_neighbors(user_id: int, entity_name: str, max_depth: int = 2) -> dict:
     """Recupera le entità collegate a una entità specifica entro una profondità massima."""
     try:
+        graph = get_knowledge_graph_engine(user_id)
+        start_nodes = graph.nodes_for_name(entity_name)
+        if not start_nodes:
+            return {"entities": [], "relationships": []}
+
+        # Visita k-hop vettoriale sul grafo CSR (sostituisce la CTE ricorsiva)
+        nodes, depths = graph.k_hop(start_nodes, max_depth)
+        entities = [
+            {
+                "entity_id": int(graph.entity_ids[node]),
+                "entity_name": graph.names[node],
+                "entity_type": graph.type_labels[graph.type_codes[node]],
+                "depth": int(depth)
+            }
+            for node, depth in zip(nodes.tolist(), depths.tolist())
+        ]
+        entities.sort(key=lambda e: (e["depth"], e["entity_name"]))
+
+        # Recupera le relazioni tra queste entità
+        relationship_ids = graph.edge_ids[graph.edges_within(nodes)].tolist()
+        relationships = []
         with db_connect() as conn:
             cursor = conn.cursor()
-
-            # Query complessa per trovare vicini
-            query = """
-                WITH RECURSIVE entity_paths AS (
-                    -- Prima livello: entità di partenza
-                    SELECT id as entity_id, entity_name, entity_type, 0 as depth
-                    FROM concept_entities
-                    WHERE user_id = ? AND entity_name = ?
-
-                    UNION ALL
-
-                    -- Livelli successivi tramite relazioni
-                    SELECT DISTINCT
-                        CASE
-                            WHEN ep.entity_id = r.source_entity_id THEN r.target_entity_id
-                            ELSE r.source_entity_id
-                        END as entity_id,
-                        ce.entity_name, ce.entity_type, ep.depth + 1 as depth
-                    FROM entity_paths ep
-                    JOIN concept_relationships r ON (
-                        r.source_entity_id = ep.entity_id OR r.target_entity_id = ep.entity_id
-                    )
-                    JOIN concept_entities ce ON (
-                        ce.id = CASE
-                            WHEN ep.entity_id = r.source_entity_id THEN r.target_entity_id
-                            ELSE r.source_entity_id
-                        END
-                    )
-                    WHERE ep.depth < ? AND ce.user_id = ?
-                )
-                SELECT DISTINCT entity_id, entity_name, entity_type, depth
-                FROM entity_paths
-                ORDER BY depth, entity_name
-            """
-
-            cursor.execute(query, (user_id, entity_name, max_depth, user_id))
-            entities = cursor.fetchall()
-
-            # Recupera le relazioni tra queste entità
-            if entities:
-                entity_ids = [e['entity_id'] for e in entities]
-                placeholders = ','.join('?' * len(entity_ids))
-
+            for start in range(0, len(relationship_ids), 900):
+                chunk = relationship_ids[start:start + 900]
+                placeholders = ','.join('?' * len(chunk))
                 cursor.execute(f"""
                     SELECT r.*, e1.entity_name as source_name, e1.entity_type as source_type,
                            e2.entity_name as target_name, e2.entity_type as target_type
                     FROM concept_relationships r
                     JOIN concept_entities e1 ON r.source_entity_id = e1.id
                     JOIN concept_entities e2 ON r.target_entity_id = e2.id
-                    WHERE r.user_id = ? AND r.source_entity_id IN ({placeholders}) AND r.target_entity_id IN ({placeholders})
-                """, [user_id] + entity_ids + entity_ids)
-
-                relationships = cursor.fetchall()
-            else:
-                relationships = []
+                    WHERE r.id IN ({placeholders})
+                """, chunk)
+                relationships.extend(dict(r) for r in cursor.fetchall())
 
-            return {
-                "entities": [dict(e) for e in entities],
-                "relationships": [dict(r) for r in relationships]
-            }
+        return {
+            "entities": entities,
+            "relationships": relationships
+        }
     except Exception as e:
         print(f"Errore nel recupero dei vicini dell'entità: {e}")
         return {"entities": [], "relationships": []}
@@ -1287,7 +1680,7 @@ def get_entity_neighbors(user_id: int, entity_name: str, max_depth: int = 2) ->
 # --- FUNZIONI PER LA GESTIONE DEL SISTEMA XP E ACHIEVEMENTS ---
 
 def award_xp(user_id: int, xp_amount: int, xp_source: str, xp_description: str, source_id: int = None):
-    """Assegna XP all'utente."""
+    """Assegna XP all'utente e, nella stessa transazione, gli achievement sbloccati."""
     try:
         with db_connect() as conn:
             cursor = conn.cursor()
@@ -1298,10 +1691,10 @@ def award_xp(user_id: int, xp_amount: int, xp_source: str, xp_description: str,
                 "INSERT INTO user_xp (user_id, xp_amount, xp_source, xp_description, source_id, created_at) VALUES (?, ?, ?, ?, ?, ?)",
                 (user_id, xp_amount, xp_source, xp_description, source_id, now)
             )
-            conn.commit()
 
             # Verifica se ci sono nuovi achievement da sbloccare
-            check_and_award_achievements(user_id)
+            evaluate_achievements(conn, user_id)
+            conn.commit()
 
     except Exception as e:
         print(f"Errore nell'assegnazione dell'XP: {e}")
@@ -1333,76 +1726,23 @@ def get_user_xp_history(user_id: int, limit: int = 50) -> list:
         print(f"Errore nel recupero della cronologia XP: {e}")
         return []
 
-def check_and_award_achievements(user_id: int):
-    """Verifica e assegna achievement basati sui progressi dell'utente."""
+def check_and_award_achievements(user_id: int) -> list:
+    """
+    Verifica e assegna achievement basati sui progressi dell'utente.
+
+    Le regole sono in tools.achievements: metriche e achievement ottenuti
+    si leggono con una sola query e le assegnazioni avvengono in un'unica
+    transazione. Restituisce gli achievement appena sbloccati.
+    """
     try:
         with db_connect() as conn:
-            cursor = conn.cursor()
-
-            # Ottieni statistiche dell'utente
-            total_xp = get_user_total_xp(user_id)
-            courses_count = len(get_user_courses(user_id))
-            tasks_completed = len([t for t in get_user_tasks(user_id) if t['status'] == 'completed'])
-            documents_count = len(get_papers_dataframe())
-
-            # Achievement disponibili con condizioni
-            achievements = [
-                {
-                    'type': 'first_steps',
-                    'title': 'Primi Passi',
-                    'description': 'Hai creato il tuo primo corso!',
-                    'condition': lambda: courses_count >= 1
-                },
-                {
-                    'type': 'knowledge_builder',
-                    'title': 'Costruttore di Conoscenza',
-                    'description': 'Hai caricato 10 documenti!',
-                    'condition': lambda: documents_count >= 10
-                },
-                {
-                    'type': 'task_master',
-                    'title': 'Maestro dei Task',
-                    'description': 'Hai completato 25 attività!',
-                    'condition': lambda: tasks_completed >= 25
-                },
-                {
-                    'type': 'xp_hunter',
-                    'title': 'Cacciatore di XP',
-                    'description': 'Hai guadagnato 500 XP!',
-                    'condition': lambda: total_xp >= 500
-                },
-                {
-                    'type': 'scholar',
-                    'title': 'Studioso',
-                    'description': 'Hai creato 5 corsi diversi!',
-                    'condition': lambda: courses_count >= 5
-                }
-            ]
-
-            # Verifica quali achievement sono stati guadagnati
-            from datetime import datetime
-            now = datetime.now().isoformat()
-
-            for achievement in achievements:
-                if achievement['condition']():
-                    # Verifica se già ottenuto
-                    cursor.execute(
-                        "SELECT id FROM user_achievements WHERE user_id = ? AND achievement_type = ?",
-                        (user_id, achievement['type'])
-                    )
-                    if not cursor.fetchone():
-                        # Assegna l'achievement
-                        cursor.execute(
-                            "INSERT INTO user_achievements (user_id, achievement_type, achievement_title, achievement_description, earned_at) VALUES (?, ?, ?, ?, ?)",
-                            (user_id, achievement['type'], achievement['title'], achievement['description'], now)
-                        )
-                        # Bonus XP per achievement
-                        award_xp(user_id, 50, 'achievement_unlocked', f"Achievement sbloccato: {achievement['title']}")
-
+            awarded = evaluate_achievements(conn, user_id)
             conn.commit()
+            return awarded
 
     except Exception as e:
         print(f"Errore nella verifica degli achievement: {e}")
+        return []
 
 def get_user_achievements(user_id: int) -> list:
     """Recupera tutti gli achievement dell'utente."""
@@ -1785,6 +2125,9 @@ def record_user_activity(user_id: int, action_type: str, target_type: str = None
     """
     Registra un'attività dell'utente per l'analisi comportamentale e la dashboard.
 
+    L'evento viene accodato e scritto in batch da un thread in background
+    (tools.activity_logger), senza attendere il database.
+
     Args:
         user_id: ID dell'utente
         action_type: Tipo di azione ('view_doc', 'edit_doc', 'create_doc', 'start_chat', etc.)
@@ -1793,21 +2136,8 @@ def record_user_activity(user_id: int, action_type: str, target_type: str = None
         metadata: Informazioni aggiuntive in formato JSON
     """
     try:
-        with db_connect() as conn:
-            cursor = conn.cursor()
-            from datetime import datetime
-            now = datetime.now().isoformat()
-            session_id = st.session_state.get('current_session_id', 'unknown')
-
-            cursor.execute("""
-                INSERT INTO user_activity (user_id, action_type, target_type, target_id, metadata, timestamp, session_id)
-                VALUES (?, ?, ?, ?, ?, ?, ?)
-            """, (
-                user_id, action_type, target_type, target_id,
-                json.dumps(metadata) if metadata else None,
-                now, session_id
-            ))
-            conn.commit()
+        session_id = st.session_state.get('current_session_id', 'unknown')
+        activity_logger.record(db_connect, user_id, action_type, target_type, target_id, metadata, session_id)
     except Exception as e:
         print(f"Errore nel tracciamento attività: {e}")
         # Non bloccare l'app se il tracciamento fallisce
@@ -1820,17 +2150,15 @@ def get_recent_documents(user_id: int, limit: int = 5) -> list:
         list: Lista di documenti con metadati di accesso
     """
     try:
+        activity_logger.flush()
         with db_connect() as conn:
             cursor = conn.cursor()
             cursor.execute("""
-                SELECT DISTINCT p.*, ua.timestamp as last_accessed, ua.action_type as last_action
-                FROM papers p
-                JOIN user_activity ua ON (
-                    (ua.target_type = 'document' AND ua.target_id = p.file_name) OR
-                    (ua.action_type IN ('view_doc', 'edit_doc') AND ua.metadata LIKE '%' || p.file_name || '%')
-                )
-                WHERE ua.user_id = ?
-                ORDER BY ua.timestamp DESC
+                SELECT p.*, r.last_accessed, r.last_action
+                FROM user_recent_documents r
+                JOIN papers p ON p.file_name = r.file_name
+                WHERE r.user_id = ?
+                ORDER BY r.last_accessed DESC
                 LIMIT ?
             """, (user_id, limit))
 
@@ -1857,14 +2185,15 @@ def get_recent_uploads(user_id: int, limit: int = 5) -> list:
         list: Lista di upload recenti con metadati
     """
     try:
+        activity_logger.flush()
         with db_connect() as conn:
             cursor = conn.cursor()
             cursor.execute("""
-                SELECT p.*, ua.timestamp as upload_date, ua.metadata as upload_metadata
-                FROM papers p
-                JOIN user_activity ua ON ua.target_id = p.file_name
-                WHERE ua.user_id = ? AND ua.action_type = 'create_doc'
-                ORDER BY ua.timestamp DESC
+                SELECT p.*, r.upload_date, r.upload_metadata
+                FROM user_recent_uploads r
+                JOIN papers p ON p.file_name = r.file_name
+                WHERE r.user_id = ?
+                ORDER BY r.upload_date DESC
                 LIMIT ?
             """, (user_id, limit))
 
@@ -1894,6 +2223,7 @@ def get_user_activity_summary(user_id: int, days: int = 7) -> dict:
         from datetime import datetime, timedelta
         cutoff_date = datetime.now() - timedelta(days=days)
 
+        activity_logger.flush()
         with db_connect() as conn:
             cursor = conn.cursor()
 
@@ -1953,6 +2283,7 @@ def get_most_accessed_documents(user_id: int, limit: int = 10) -> list:
         list: Documenti ordinati per numero di accessi
     """
     try:
+        activity_logger.flush()
         with db_connect() as conn:
             cursor = conn.cursor()
             cursor.execute("""
@@ -2009,22 +2340,31 @@ def mark_user_not_new(user_id: int):
 
 # --- FUNZIONI CACHE PER DASHBOARD ---
 
-@st.cache_data(ttl=30)  # Cache per 30 secondi
+# Il riepilogo copre "gli ultimi 7 giorni": scade anche senza scritture
+DASHBOARD_MAX_AGE_SECONDS = 300
+
+@versioned_data(db_connect, tables=['papers', 'user_activity', 'users'], max_age_seconds=DASHBOARD_MAX_AGE_SECONDS)
+def _load_dashboard_data(user_id: int) -> dict:
+    return {
+        'recent_documents': get_recent_documents(user_id, limit=5),
+        'recent_uploads': get_recent_uploads(user_id, limit=5),
+        'activity_summary': get_user_activity_summary(user_id, days=7),
+        'most_accessed': get_most_accessed_documents(user_id, limit=10),
+        'is_new_user': check_first_time_user(user_id)
+    }
+
 def get_dashboard_data(user_id: int) -> dict:
     """
     Recupera tutti i dati necessari per la dashboard in una sola chiamata.
 
+    Il risultato resta in cache finché l'utente non registra nuove attività,
+    l'archivio o il suo profilo non cambiano, o al massimo per DASHBOARD_MAX_AGE_SECONDS.
+
     Returns:
         dict: Dati aggregati per la dashboard
     """
     try:
-        return {
-            'recent_documents': get_recent_documents(user_id, limit=5),
-            'recent_uploads': get_recent_uploads(user_id, limit=5),
-            'activity_summary': get_user_activity_summary(user_id, days=7),
-            'most_accessed': get_most_accessed_documents(user_id, limit=10),
-            'is_new_user': check_first_time_user(user_id)
-        }
+        return _load_dashboard_data(user_id)
     except Exception as e:
         print(f"Errore nel recupero dati dashboard: {e}")
         return {
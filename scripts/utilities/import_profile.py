@@ -0,0 +1,224 @@
+# -*- coding: utf-8 -*-
+"""
+Profilo dei tempi di import dei punti di ingresso
+
+Esegue `python -X importtime -c "import <modulo>"` in un processo pulito per
+ogni punto di ingresso (app Streamlit, worker Celery, config), ricava il
+tempo totale, i pacchetti più costosi e quali dipendenze pesanti sono state
+caricate dal thread principale o da un thread in background (i servizi AI
+avviati da start_services_in_background), e salva il report in docs/performance/import_profile.json per
+confrontare l'avvio a freddo tra una modifica e l'altra. Il report va
+generato con tutte le dipendenze di requirements.txt installate: se un
+punto di ingresso non si importa non viene salvato (salvo --allow-errors),
+perché i tempi di un import fallito non misurano nulla.
+
+Con `--check` fallisce se un punto di ingresso carica nel thread principale,
+durante l'import, una dipendenza che deve restare differita (DEFERRED_IMPORTS).
+
+Uso:
+    python scripts/utilities/import_profile.py
+    python scripts/utilities/import_profile.py --check config archivista_processing
+"""
+import argparse
+import json
+import os
+import platform
+import re
+import subprocess
+import sys
+from datetime import datetime
+from typing import Dict, List, Optional
+
+# --- CONFIGURAZIONE ---
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+REPORT_PATH = os.path.join(PROJECT_ROOT, "docs", "performance", "import_profile.json")
+# Cartelle da cui i moduli si importano senza prefisso di pacchetto (es. `from file_utils import ...`)
+FLAT_IMPORT_DIRS = [".", "scripts/utilities", "scripts/operations", "tools"]
+ENTRY_POINTS = ["config", "main", "main_new_architecture", "archivista_processing", "file_utils"]
+TOP_MODULES = 15
+
+HEAVY_MODULES = [
+    "llama_index", "torch", "transformers", "sentence_transformers", "chromadb", "pandas",
+    "fitz", "pdfplumber", "pypdf", "pdfminer", "bs4", "chardet", "docx", "scipy", "sklearn",
+]
+# Dipendenze che un punto di ingresso non deve caricare all'import
+DEFERRED_IMPORTS = {
+    "config": ["llama_index", "torch", "transformers", "sentence_transformers"],
+    "main": ["llama_index", "torch", "transformers", "sentence_transformers", "chromadb"],
+    "main_new_architecture": ["llama_index", "torch", "transformers", "sentence_transformers", "chromadb"],
+    "archivista_processing": ["llama_index", "fitz", "pdfplumber", "pypdf", "pdfminer", "bs4", "chardet", "docx",
+                              "chromadb"],
+}
+
+IMPORTTIME_LINE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)$")
+# Separa gli import dell'avvio dell'interprete (site, encodings) da quelli del modulo
+START_MARKER = "--- import profile start ---"
+END_MARKER = "--- import profile end ---"
+# Riga con il thread che ha importato per primo ogni pacchetto (JSON dopo il marcatore)
+THREADS_MARKER = "--- import profile threads: "
+# Eseguito nel processo profilato: le app Streamlit avviano i servizi in un thread in
+# background durante l'import, e solo ciò che carica il thread principale pesa sull'avvio
+# (solo moduli builtin prima di START_MARKER, per non togliere costi al modulo profilato)
+PROBE_SCRIPT = """
+import _thread, sys
+class _ImportProbe:
+    def __init__(self):
+        self.main_ident = _thread.get_ident()
+        self.threads = {{}}
+    def find_spec(self, name, path=None, target=None):
+        thread = "main" if _thread.get_ident() == self.main_ident else "background"
+        self.threads.setdefault(name.split(".")[0], thread)
+        return None
+_probe = _ImportProbe()
+sys.meta_path.insert(0, _probe)
+print({start!r}, file=sys.stderr, flush=True)
+import {module}
+_threads = dict(_probe.threads)
+print({end!r}, file=sys.stderr, flush=True)
+import json
+print({threads!r} + json.dumps(_threads), file=sys.stderr, flush=True)
+"""
+
+
+def _marker_index(lines: List[str], marker: str) -> Optional[int]:
+    # I thread in background scrivono su stderr in parallelo: il marcatore può avere testo in coda
+    return next((i for i, line in enumerate(lines) if line.startswith(marker)), None)
+
+
+def parse_importtime(stderr: str) -> List[Dict]:
+    """Righe di `-X importtime` (tra START_MARKER e END_MARKER, se presenti) come {'module', 'self_us', 'cumulative_us', 'depth'}."""
+    lines = stderr.splitlines()
+    start = _marker_index(lines, START_MARKER)
+    if start is not None:
+        lines = lines[start + 1:]
+    end = _marker_index(lines, END_MARKER)
+    if end is not None:
+        lines = lines[:end]
+    entries = []
+    for line in lines:
+        match = IMPORTTIME_LINE.match(line.rstrip())
+        if match:
+            self_us, cumulative_us, indent, module = match.groups()
+            entries.append({
+                'module': module,
+                'self_us': int(self_us),
+                'cumulative_us': int(cumulative_us),
+                'depth': (len(indent) - 1) // 2,
+            })
+    return entries
+
+
+def _flat_pythonpath() -> str:
+    paths = [os.path.join(PROJECT_ROOT, directory) for directory in FLAT_IMPORT_DIRS]
+    existing = os.environ.get("PYTHONPATH")
+    return os.pathsep.join(paths + ([existing] if existing else []))
+
+
+def parse_import_threads(stderr: str) -> Optional[Dict[str, str]]:
+    """Pacchetto -> "main" o "background" (thread del primo import), o None se l'import è fallito."""
+    for line in stderr.splitlines():
+        if line.startswith(THREADS_MARKER):
+            threads, _ = json.JSONDecoder().raw_decode(line[len(THREADS_MARKER):])
+            return threads
+    return None
+
+
+def profile_import(module: str, timeout: int = 300) -> Dict:
+    """Profilo dell'import di `module` in un interprete nuovo."""
+    env = dict(os.environ, PYTHONPATH=_flat_pythonpath())
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c",
+         PROBE_SCRIPT.format(start=START_MARKER, end=END_MARKER, threads=THREADS_MARKER, module=module)],
+        cwd=PROJECT_ROOT, env=env, capture_output=True, text=True, timeout=timeout,
+    )
+    entries = parse_importtime(completed.stderr)
+    threads = parse_import_threads(completed.stderr)
+    if threads is None:
+        loaded, background = {entry['module'].split(".")[0] for entry in entries}, set()
+    else:
+        loaded = {name for name, thread in threads.items() if thread == "main"}
+        background = set(threads) - loaded
+    # Gli import dei thread in background sfasano l'indentazione di -X importtime: il tempo
+    # cumulativo della riga del modulo profilato resta comunque quello dell'intero import
+    own = [entry for entry in entries if entry['module'] == module]
+    top_level = own[-1:] or [entry for entry in entries if entry['depth'] == 0]
+    # Import diretti del modulo profilato, con il costo di tutto ciò che trascinano
+    direct = [entry for entry in entries if entry['depth'] == 1]
+
+    result = {
+        'module': module,
+        'ok': completed.returncode == 0,
+        'total_ms': round(sum(entry['cumulative_us'] for entry in top_level) / 1000, 1),
+        'modules_imported': len(entries),
+        'heavy_loaded': sorted(name for name in HEAVY_MODULES if name in loaded),
+        'heavy_background': sorted(name for name in HEAVY_MODULES if name in background),
+        'top': [
+            {'module': entry['module'], 'cumulative_ms': round(entry['cumulative_us'] / 1000, 1)}
+            for entry in sorted(direct, key=lambda e: e['cumulative_us'], reverse=True)[:TOP_MODULES]
+        ],
+    }
+    if not result['ok']:
+        errors = [line for line in completed.stderr.splitlines()
+                  if line and not line.startswith(("import time:", START_MARKER, END_MARKER, THREADS_MARKER))]
+        result['error'] = errors[-1] if errors else f"exit code {completed.returncode}"
+    return result
+
+
+def check_deferred(results: List[Dict]) -> List[str]:
+    """Violazioni di DEFERRED_IMPORTS; un import fallito non è verificabile e conta come violazione."""
+    violations = []
+    for result in results:
+        if not result['ok']:
+            violations.append(f"{result['module']}: import fallito ({result['error']})")
+            continue
+        for name in DEFERRED_IMPORTS.get(result['module'], []):
+            if name in result['heavy_loaded']:
+                violations.append(f"{result['module']}: {name} caricato all'import")
+    return violations
+
+
+def write_report(results: List[Dict], path: str = REPORT_PATH) -> str:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    report = {
+        'generated_at': datetime.now().isoformat(timespec="seconds"),
+        'python': platform.python_version(),
+        'entry_points': results,
+    }
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+        f.write("\n")
+    return path
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Profilo dei tempi di import dei punti di ingresso")
+    parser.add_argument("modules", nargs="*", default=ENTRY_POINTS, help="Moduli da profilare")
+    parser.add_argument("--output", default=REPORT_PATH, help="Percorso del report JSON")
+    parser.add_argument("--no-write", action="store_true", help="Non aggiornare il report")
+    parser.add_argument("--allow-errors", action="store_true",
+                        help="Salva il report anche se qualche punto di ingresso non si importa")
+    parser.add_argument("--check", action="store_true", help="Fallisce se una dipendenza differita viene caricata")
+    args = parser.parse_args(argv)
+
+    results = [profile_import(module) for module in args.modules]
+    for result in results:
+        status = "ok" if result['ok'] else f"ERRORE ({result['error']})"
+        print(f"{result['module']:<24} {result['total_ms']:>9.1f} ms  {result['modules_imported']:>5} moduli  "
+              f"pesanti: {', '.join(result['heavy_loaded']) or '-'}  "
+              f"in background: {', '.join(result['heavy_background']) or '-'}  {status}")
+    failed = [result['module'] for result in results if not result['ok']]
+    if failed and not args.allow_errors and not args.no_write:
+        print(f"⚠️ Report non salvato: import falliti per {', '.join(failed)} (ambiente incompleto?)")
+    elif not args.no_write:
+        print(f"Report salvato in {write_report(results, args.output)}")
+
+    if args.check:
+        violations = check_deferred(results)
+        for violation in violations:
+            print(f"❌ {violation}")
+        return 1 if violations else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
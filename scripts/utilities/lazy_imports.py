@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+"""
+Import differiti per le dipendenze pesanti
+
+`lazy_import("fitz")` restituisce un proxy che importa il modulo al primo
+accesso a un attributo; `lazy_callable("pypdf", "PdfReader")` fa lo stesso
+per una classe o funzione, così il codice che la usa resta invariato. Gli
+estrattori, gli stack ML e pandas vengono caricati solo quando servono
+(es. pdfplumber solo al primo PDF) e l'avvio di Streamlit e del worker
+Celery non li paga.
+
+È la controparte leggera di `src.core.performance.optimizer.LazyLoader`
+(stessa idea di registro con stato di caricamento): quel modulo non si può
+usare qui perché importare il pacchetto `src` carica tutta la UI e
+Streamlit, cioè proprio il costo che si vuole evitare.
+"""
+import importlib
+import threading
+import time
+from typing import Any, Dict
+
+_registry: Dict[str, "LazyModule"] = {}
+_registry_lock = threading.Lock()
+
+
+class LazyModule:
+    """Proxy di un modulo importato al primo accesso, thread-safe."""
+
+    def __init__(self, name: str):
+        object.__setattr__(self, "_name", name)
+        object.__setattr__(self, "_module", None)
+        object.__setattr__(self, "_load_ms", None)
+        object.__setattr__(self, "_lock", threading.Lock())
+
+    def _load(self):
+        module = self._module
+        if module is None:
+            with self._lock:
+                module = self._module
+                if module is None:
+                    start = time.perf_counter()
+                    module = importlib.import_module(self._name)
+                    object.__setattr__(self, "_load_ms", (time.perf_counter() - start) * 1000)
+                    object.__setattr__(self, "_module", module)
+        return module
+
+    @property
+    def loaded(self) -> bool:
+        return self._module is not None
+
+    def __getattr__(self, attribute: str) -> Any:
+        return getattr(self._load(), attribute)
+
+    def __setattr__(self, attribute: str, value: Any) -> None:
+        setattr(self._load(), attribute, value)
+
+    def __dir__(self):
+        return dir(self._load())
+
+    def __repr__(self) -> str:
+        state = "caricato" if self.loaded else "non caricato"
+        return f"<LazyModule {self._name} ({state})>"
+
+
+class LazyCallable:
+    """Classe o funzione di un modulo differito; si risolve alla prima chiamata."""
+
+    def __init__(self, module: LazyModule, attribute: str):
+        self._module = module
+        self._attribute = attribute
+
+    def resolve(self) -> Any:
+        return getattr(self._module, self._attribute)
+
+    def __call__(self, *args, **kwargs):
+        return self.resolve()(*args, **kwargs)
+
+    def __getattr__(self, attribute: str) -> Any:
+        if attribute.startswith("_"):
+            raise AttributeError(attribute)
+        return getattr(self.resolve(), attribute)
+
+    def __repr__(self) -> str:
+        return f"<LazyCallable {self._module._name}.{self._attribute}>"
+
+
+def lazy_import(name: str) -> LazyModule:
+    """Proxy condiviso del modulo `name` (un solo import per processo)."""
+    with _registry_lock:
+        module = _registry.get(name)
+        if module is None:
+            module = _registry[name] = LazyModule(name)
+        return module
+
+
+def lazy_callable(module_name: str, attribute: str) -> LazyCallable:
+    """Equivalente differito di `from module_name import attribute`."""
+    return LazyCallable(lazy_import(module_name), attribute)
+
+
+def get_loading_status() -> Dict[str, Dict[str, Any]]:
+    """Stato dei moduli differiti: caricato o no e tempo di import in ms."""
+    with _registry_lock:
+        modules = dict(_registry)
+    return {name: {'loaded': module.loaded, 'load_ms': module._load_ms} for name, module in modules.items()}
@@ -0,0 +1,588 @@
+"""
+Tiered cache backends.
+
+Provides the storage behind `optimizer.CacheManager`:
+- an in-process LRU tier bounded by entry count and approximate bytes,
+  with O(1) get/set/eviction and monotonic-clock TTLs;
+- optional shared tiers (Redis or SQLite) so Streamlit processes and
+  Celery workers reuse each other's results;
+- single-flight loading, so concurrent misses on the same key run the
+  expensive loader once;
+- hit/miss/eviction metrics per namespace.
+"""
+
+import logging
+import os
+import pickle
+import sqlite3
+import sys
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_NAMESPACE = "default"
+DEFAULT_MAX_ENTRIES = int(os.getenv("ARCHIVISTA_CACHE_MAX_ENTRIES", "10000"))
+DEFAULT_MAX_BYTES = int(os.getenv("ARCHIVISTA_CACHE_MAX_BYTES", str(128 * 1024 * 1024)))
+SHARED_BACKEND = os.getenv("ARCHIVISTA_CACHE_SHARED", "")  # '', 'redis' or 'sqlite'
+SHARED_SQLITE_PATH = os.getenv("ARCHIVISTA_CACHE_SQLITE", os.path.join("db_memoria", "shared_cache.sqlite"))
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+SIZE_SAMPLE = 100
+
+
+def estimate_size(value: Any, _depth: int = 0) -> int:
+    """Approximate memory footprint of a value in bytes.
+
+    Containers are walked two levels deep; large ones are sampled and
+    extrapolated so that sizing stays cheap.
+
+    Args:
+        value: Value to size
+
+    Returns:
+        Estimated size in bytes
+    """
+    size = sys.getsizeof(value)
+    if _depth >= 2:
+        return size
+    if isinstance(value, dict):
+        items = list(value.items()) if len(value) <= SIZE_SAMPLE else list(value.items())[:SIZE_SAMPLE]
+        sampled = sum(estimate_size(k, _depth + 1) + estimate_size(v, _depth + 1) for k, v in items)
+    elif isinstance(value, (list, tuple, set, frozenset)):
+        items = list(value) if len(value) <= SIZE_SAMPLE else list(value)[:SIZE_SAMPLE]
+        sampled = sum(estimate_size(v, _depth + 1) for v in items)
+    else:
+        return size
+    return size + (sampled * len(value) // len(items) if items else 0)
+
+
+class CacheTier:
+    """Base class for cache tiers.
+
+    Keys are `(namespace, key)` pairs. `get` returns `(found, value,
+    remaining_ttl_seconds)` so that a `None` value can be cached.
+    """
+
+    name = "tier"
+    shared = False
+
+    def get(self, namespace: str, key: Hashable) -> Tuple[bool, Any, Optional[float]]:
+        raise NotImplementedError
+
+    def set(self, namespace: str, key: Hashable, value: Any, ttl: Optional[float]) -> None:
+        raise NotImplementedError
+
+    def delete(self, namespace: str, key: Hashable) -> bool:
+        raise NotImplementedError
+
+    def clear(self, namespace: Optional[str] = None) -> int:
+        raise NotImplementedError
+
+    def cleanup_expired(self) -> int:
+        return 0
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {'name': self.name}
+
+
+class MemoryLRUTier(CacheTier):
+    """In-process LRU bounded by entry count and approximate bytes.
+
+    An OrderedDict keeps recency order, so lookups, inserts and evictions
+    are O(1). Expiry uses `time.monotonic()`, which wall-clock changes do
+    not affect. Expired entries are dropped when read or when they reach the
+    LRU end. `cleanup_expired` scans everything and is optional.
+    """
+
+    name = "memory"
+
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES, max_bytes: int = DEFAULT_MAX_BYTES,
+                 on_evict: Optional[Callable[[str, str], None]] = None, clock: Callable[[], float] = time.monotonic):
+        """Initialize memory tier.
+
+        Args:
+            max_entries: Maximum number of entries
+            max_bytes: Maximum approximate size of all values
+            on_evict: Callback `(namespace, reason)` for evicted or expired entries
+            clock: Monotonic clock (injectable for tests)
+        """
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.on_evict = on_evict
+        self.clock = clock
+        self._entries: "OrderedDict[Tuple[str, Hashable], Tuple[Any, Optional[float], int]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.RLock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _remove(self, full_key: Tuple[str, Hashable], reason: Optional[str]) -> None:
+        _, _, size = self._entries.pop(full_key)
+        self._bytes -= size
+        if reason and self.on_evict:
+            self.on_evict(full_key[0], reason)
+
+    def get(self, namespace: str, key: Hashable) -> Tuple[bool, Any, Optional[float]]:
+        full_key = (namespace, key)
+        with self._lock:
+            entry = self._entries.get(full_key)
+            if entry is None:
+                return False, None, None
+            value, expires_at, _ = entry
+            now = self.clock()
+            if expires_at is not None and now >= expires_at:
+                self._remove(full_key, "expired")
+                return False, None, None
+            self._entries.move_to_end(full_key)
+            return True, value, (expires_at - now) if expires_at is not None else None
+
+    def set(self, namespace: str, key: Hashable, value: Any, ttl: Optional[float]) -> None:
+        full_key = (namespace, key)
+        size = estimate_size(value)
+        if size > self.max_bytes:
+            return
+        expires_at = self.clock() + ttl if ttl else None
+        with self._lock:
+            if full_key in self._entries:
+                self._remove(full_key, None)
+            self._entries[full_key] = (value, expires_at, size)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                oldest_key, (_, oldest_expiry, _) = next(iter(self._entries.items()))
+                expired = oldest_expiry is not None and self.clock() >= oldest_expiry
+                self._remove(oldest_key, "expired" if expired else "evicted")
+
+    def delete(self, namespace: str, key: Hashable) -> bool:
+        with self._lock:
+            if (namespace, key) not in self._entries:
+                return False
+            self._remove((namespace, key), None)
+            return True
+
+    def clear(self, namespace: Optional[str] = None) -> int:
+        with self._lock:
+            if namespace is None:
+                count = len(self._entries)
+                self._entries.clear()
+                self._bytes = 0
+                return count
+            keys = [full_key for full_key in self._entries if full_key[0] == namespace]
+            for full_key in keys:
+                self._remove(full_key, None)
+            return len(keys)
+
+    def cleanup_expired(self) -> int:
+        now = self.clock()
+        with self._lock:
+            expired = [full_key for full_key, (_, expires_at, _) in self._entries.items()
+                       if expires_at is not None and now >= expires_at]
+            for full_key in expired:
+                self._remove(full_key, "expired")
+            return len(expired)
+
+    def get_stats(self) -> Dict[str, Any]:
+        now = self.clock()
+        with self._lock:
+            expired = sum(1 for _, expires_at, _ in self._entries.values()
+                          if expires_at is not None and now >= expires_at)
+            per_namespace: Dict[str, int] = defaultdict(int)
+            for namespace, _ in self._entries:
+                per_namespace[namespace] += 1
+            return {
+                'name': self.name,
+                'entries': len(self._entries),
+                'expired_entries': expired,
+                'bytes': self._bytes,
+                'max_entries': self.max_entries,
+                'max_bytes': self.max_bytes,
+                'entries_by_namespace': dict(per_namespace),
+            }
+
+
+def _shared_key(namespace: str, key: Hashable) -> str:
+    """Stable string form of a key for tiers shared between processes."""
+    return f"{namespace}:{key if isinstance(key, str) else repr(key)}"
+
+
+class SQLiteTier(CacheTier):
+    """Shared tier in a SQLite file (WAL), usable by every process on one host.
+
+    Expiry uses wall-clock time because monotonic clocks are not comparable
+    between processes. Values are pickled, and values that cannot be
+    pickled stay in memory only.
+    """
+
+    name = "sqlite"
+    shared = True
+
+    def __init__(self, path: str = SHARED_SQLITE_PATH, max_entries: int = DEFAULT_MAX_ENTRIES * 10):
+        """Initialize SQLite tier.
+
+        Args:
+            path: Database file
+            max_entries: Entries kept; the least recently written are pruned beyond this
+        """
+        self.path = path
+        self.max_entries = max_entries
+        self._writes = 0
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS cache_entries (
+                    cache_key TEXT PRIMARY KEY,
+                    namespace TEXT NOT NULL,
+                    value BLOB NOT NULL,
+                    expires_at REAL,
+                    written_at REAL NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_cache_entries_written ON cache_entries(written_at)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_cache_entries_namespace ON cache_entries(namespace)")
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=5)
+
+    def get(self, namespace: str, key: Hashable) -> Tuple[bool, Any, Optional[float]]:
+        conn = self._connect()
+        try:
+            row = conn.execute("SELECT value, expires_at FROM cache_entries WHERE cache_key = ?",
+                               (_shared_key(namespace, key),)).fetchone()
+        finally:
+            conn.close()
+        if row is None:
+            return False, None, None
+        now = time.time()
+        if row[1] is not None and now >= row[1]:
+            return False, None, None
+        return True, pickle.loads(row[0]), (row[1] - now) if row[1] is not None else None
+
+    def set(self, namespace: str, key: Hashable, value: Any, ttl: Optional[float]) -> None:
+        try:
+            payload = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        except Exception:
+            return
+        now = time.time()
+        conn = self._connect()
+        try:
+            with conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO cache_entries (cache_key, namespace, value, expires_at, written_at) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (_shared_key(namespace, key), namespace, payload, now + ttl if ttl else None, now)
+                )
+                self._writes += 1
+                if self._writes % 100 == 0:
+                    self._prune(conn, now)
+        finally:
+            conn.close()
+
+    def _prune(self, conn: sqlite3.Connection, now: float) -> None:
+        conn.execute("DELETE FROM cache_entries WHERE expires_at IS NOT NULL AND expires_at <= ?", (now,))
+        conn.execute("""
+            DELETE FROM cache_entries WHERE cache_key IN (
+                SELECT cache_key FROM cache_entries ORDER BY written_at DESC LIMIT -1 OFFSET ?
+            )
+        """, (self.max_entries,))
+
+    def delete(self, namespace: str, key: Hashable) -> bool:
+        conn = self._connect()
+        try:
+            with conn:
+                return conn.execute("DELETE FROM cache_entries WHERE cache_key = ?",
+                                    (_shared_key(namespace, key),)).rowcount > 0
+        finally:
+            conn.close()
+
+    def clear(self, namespace: Optional[str] = None) -> int:
+        conn = self._connect()
+        try:
+            with conn:
+                if namespace is None:
+                    return conn.execute("DELETE FROM cache_entries").rowcount
+                return conn.execute("DELETE FROM cache_entries WHERE namespace = ?", (namespace,)).rowcount
+        finally:
+            conn.close()
+
+    def cleanup_expired(self) -> int:
+        conn = self._connect()
+        try:
+            with conn:
+                return conn.execute("DELETE FROM cache_entries WHERE expires_at IS NOT NULL AND expires_at <= ?",
+                                    (time.time(),)).rowcount
+        finally:
+            conn.close()
+
+    def get_stats(self) -> Dict[str, Any]:
+        conn = self._connect()
+        try:
+            entries, size = conn.execute("SELECT COUNT(*), COALESCE(SUM(LENGTH(value)), 0) FROM cache_entries").fetchone()
+        finally:
+            conn.close()
+        return {'name': self.name, 'path': self.path, 'entries': entries, 'bytes': size}
+
+
+class RedisTier(CacheTier):
+    """Shared tier in Redis, for deployments with several hosts.
+
+    Redis enforces TTLs with PX, and memory is bounded by the server's
+    `maxmemory` policy.
+    """
+
+    name = "redis"
+    shared = True
+
+    def __init__(self, client, prefix: str = "archivista:cache:"):
+        """Initialize Redis tier.
+
+        Args:
+            client: redis.Redis client
+            prefix: Key prefix for cache entries
+        """
+        self.client = client
+        self.prefix = prefix
+
+    def _key(self, namespace: str, key: Hashable) -> str:
+        return self.prefix + _shared_key(namespace, key)
+
+    def get(self, namespace: str, key: Hashable) -> Tuple[bool, Any, Optional[float]]:
+        redis_key = self._key(namespace, key)
+        pipeline = self.client.pipeline()
+        pipeline.get(redis_key)
+        pipeline.pttl(redis_key)
+        payload, pttl = pipeline.execute()
+        if payload is None:
+            return False, None, None
+        return True, pickle.loads(payload), pttl / 1000 if pttl and pttl > 0 else None
+
+    def set(self, namespace: str, key: Hashable, value: Any, ttl: Optional[float]) -> None:
+        try:
+            payload = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        except Exception:
+            return
+        self.client.set(self._key(namespace, key), payload, px=int(ttl * 1000) if ttl else None)
+
+    def delete(self, namespace: str, key: Hashable) -> bool:
+        return bool(self.client.delete(self._key(namespace, key)))
+
+    def clear(self, namespace: Optional[str] = None) -> int:
+        pattern = self.prefix + (f"{namespace}:*" if namespace else "*")
+        count = 0
+        batch = []
+        for redis_key in self.client.scan_iter(match=pattern, count=500):
+            batch.append(redis_key)
+            if len(batch) >= 500:
+                count += self.client.delete(*batch)
+                batch = []
+        if batch:
+            count += self.client.delete(*batch)
+        return count
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {'name': self.name, 'prefix': self.prefix}
+
+
+class _Flight:
+    """In-progress load that concurrent callers wait on."""
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.value: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class TieredCache:
+    """Read-through cache over ordered tiers with single-flight loads.
+
+    Reads check tiers in order. A hit in a lower tier is copied into the
+    tiers above it with the remaining TTL. Writes go to every tier.
+    """
+
+    METRIC_NAMES = ('hits', 'misses', 'shared_hits', 'sets', 'loads', 'load_errors', 'load_time_ms',
+                    'coalesced', 'evictions', 'expirations', 'tier_errors')
+
+    def __init__(self, tiers: Optional[List[CacheTier]] = None, default_ttl: Optional[float] = 300):
+        """Initialize tiered cache.
+
+        Args:
+            tiers: Tiers from fastest to slowest; defaults to one memory tier
+            default_ttl: TTL in seconds when none is given (None = no expiry)
+        """
+        self.default_ttl = default_ttl
+        self._metrics: Dict[str, Dict[str, float]] = defaultdict(lambda: dict.fromkeys(self.METRIC_NAMES, 0))
+        self._metrics_lock = threading.Lock()
+        self._flights: Dict[Tuple[str, Hashable], _Flight] = {}
+        self._flights_lock = threading.Lock()
+        self.tiers = tiers if tiers is not None else [MemoryLRUTier()]
+        for tier in self.tiers:
+            if isinstance(tier, MemoryLRUTier) and tier.on_evict is None:
+                tier.on_evict = self._record_eviction
+
+    def _count(self, namespace: str, metric: str, amount: float = 1) -> None:
+        with self._metrics_lock:
+            self._metrics[namespace][metric] += amount
+
+    def _record_eviction(self, namespace: str, reason: str) -> None:
+        self._count(namespace, 'expirations' if reason == "expired" else 'evictions')
+
+    def _lookup(self, namespace: str, key: Hashable) -> Tuple[bool, Any]:
+        for index, tier in enumerate(self.tiers):
+            try:
+                found, value, remaining = tier.get(namespace, key)
+            except Exception as e:
+                self._count(namespace, 'tier_errors')
+                logger.warning(f"Cache tier {tier.name} read failed: {e}")
+                continue
+            if found:
+                if index:
+                    self._count(namespace, 'shared_hits')
+                    for upper in self.tiers[:index]:
+                        upper.set(namespace, key, value, remaining if remaining is not None else self.default_ttl)
+                return True, value
+        return False, None
+
+    def get(self, key: Hashable, default: Any = None, namespace: str = DEFAULT_NAMESPACE) -> Any:
+        found, value = self._lookup(namespace, key)
+        self._count(namespace, 'hits' if found else 'misses')
+        return value if found else default
+
+    def contains(self, key: Hashable, namespace: str = DEFAULT_NAMESPACE) -> bool:
+        return self._lookup(namespace, key)[0]
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None, namespace: str = DEFAULT_NAMESPACE) -> None:
+        ttl = self.default_ttl if ttl is None else ttl
+        self._count(namespace, 'sets')
+        for tier in self.tiers:
+            try:
+                tier.set(namespace, key, value, ttl)
+            except Exception as e:
+                self._count(namespace, 'tier_errors')
+                logger.warning(f"Cache tier {tier.name} write failed: {e}")
+
+    def delete(self, key: Hashable, namespace: str = DEFAULT_NAMESPACE) -> bool:
+        deleted = False
+        for tier in self.tiers:
+            try:
+                deleted = tier.delete(namespace, key) or deleted
+            except Exception as e:
+                logger.warning(f"Cache tier {tier.name} delete failed: {e}")
+        return deleted
+
+    def get_or_load(self, key: Hashable, loader: Callable[[], Any], ttl: Optional[float] = None,
+                    namespace: str = DEFAULT_NAMESPACE) -> Any:
+        """Return the cached value or compute it once for all concurrent callers.
+
+        Args:
+            key: Cache key
+            loader: Zero-argument function computing the value
+            ttl: TTL in seconds (default_ttl if None)
+            namespace: Metrics and invalidation namespace
+
+        Returns:
+            Cached or freshly loaded value; loader exceptions propagate to every waiter
+        """
+        found, value = self._lookup(namespace, key)
+        if found:
+            self._count(namespace, 'hits')
+            return value
+
+        flight_key = (namespace, key)
+        with self._flights_lock:
+            flight = self._flights.get(flight_key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[flight_key] = _Flight()
+
+        if not leader:
+            self._count(namespace, 'coalesced')
+            flight.event.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+
+        try:
+            # Another leader may have finished between the lookup and the election
+            found, value = self._lookup(namespace, key)
+            if found:
+                self._count(namespace, 'hits')
+            else:
+                self._count(namespace, 'misses')
+                start = time.perf_counter()
+                try:
+                    value = loader()
+                except BaseException:
+                    self._count(namespace, 'load_errors')
+                    raise
+                self._count(namespace, 'loads')
+                self._count(namespace, 'load_time_ms', (time.perf_counter() - start) * 1000)
+                self.set(key, value, ttl, namespace)
+            flight.value = value
+            return value
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._flights_lock:
+                self._flights.pop(flight_key, None)
+            flight.event.set()
+
+    def clear(self, namespace: Optional[str] = None) -> int:
+        cleared = 0
+        for tier in self.tiers:
+            try:
+                count = tier.clear(namespace)
+            except Exception as e:
+                logger.warning(f"Cache tier {tier.name} clear failed: {e}")
+                continue
+            cleared = max(cleared, count)
+        return cleared
+
+    def cleanup_expired(self) -> int:
+        return sum(tier.cleanup_expired() for tier in self.tiers)
+
+    def namespace_stats(self) -> Dict[str, Dict[str, float]]:
+        with self._metrics_lock:
+            stats = {namespace: dict(values) for namespace, values in self._metrics.items()}
+        for values in stats.values():
+            lookups = values['hits'] + values['misses']
+            values['hit_rate'] = values['hits'] / lookups if lookups else 0.0
+        return stats
+
+    def get_stats(self) -> Dict[str, Any]:
+        tiers = []
+        for tier in self.tiers:
+            try:
+                tiers.append(tier.get_stats())
+            except Exception as e:
+                tiers.append({'name': tier.name, 'error': str(e)})
+        return {'tiers': tiers, 'namespaces': self.namespace_stats()}
+
+
+def build_shared_tier(backend: str = SHARED_BACKEND) -> Optional[CacheTier]:
+    """Shared tier selected by ARCHIVISTA_CACHE_SHARED, or None if disabled or unreachable.
+
+    Args:
+        backend: 'redis', 'sqlite' or '' (memory only)
+
+    Returns:
+        Cache tier or None
+    """
+    if backend == "redis":
+        try:
+            import redis
+            client = redis.Redis.from_url(REDIS_URL, socket_connect_timeout=2, socket_timeout=2)
+            client.ping()
+            return RedisTier(client)
+        except Exception as e:
+            logger.warning(f"Redis cache tier unavailable, using memory only: {e}")
+            return None
+    if backend == "sqlite":
+        try:
+            return SQLiteTier(SHARED_SQLITE_PATH)
+        except Exception as e:
+            logger.warning(f"SQLite cache tier unavailable, using memory only: {e}")
+            return None
+    return None
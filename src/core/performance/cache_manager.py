@@ -125,9 +125,19 @@ class DocumentCacheManager:
             raise
 
     @handle_errors(operation="clear_streamlit_caches", component="cache_manager")
-    def clear_streamlit_caches(self) -> CacheOperationResult:
-        """Clear all Streamlit UI caches."""
-        return self._clear_streamlit_caches()
+    def clear_streamlit_caches(self, table: Optional[str] = None,
+                               user_id: Optional[int] = None) -> CacheOperationResult:
+        """
+        Clear Streamlit UI caches.
+
+        Args:
+            table: If given, only drop UI data-layer results that depend on this table
+            user_id: Restrict a table-targeted clear to one user's results
+
+        Returns:
+            Result of the operation
+        """
+        return self._clear_streamlit_caches(table, user_id)
 
     @handle_errors(operation="clear_performance_caches", component="cache_manager")
     def clear_performance_optimizer_caches(self) -> CacheOperationResult:
@@ -144,11 +154,45 @@ class DocumentCacheManager:
         """Clear knowledge graph caches."""
         return self._clear_knowledge_graph_caches()
 
-    def _clear_streamlit_caches(self) -> CacheOperationResult:
-        """Clear Streamlit UI caches."""
+    def _clear_ui_data_layer(self, table: Optional[str] = None, user_id: Optional[int] = None) -> int:
+        """Drop versioned UI data-layer results (tools.ui_data_layer); returns entries removed."""
+        try:
+            from tools.ui_data_layer import ui_data_cache
+        except ImportError:
+            return 0
+        return ui_data_cache.invalidate(table=table, user_id=user_id)
+
+    def _clear_streamlit_caches(self, table: Optional[str] = None,
+                                user_id: Optional[int] = None) -> CacheOperationResult:
+        """Clear Streamlit UI caches, or only the UI data-layer results of one table."""
         start_time = time.time()
 
+        if table is not None:
+            # Targeted clear: other pages' st.cache_data entries are left alone
+            try:
+                entries_cleared = self._clear_ui_data_layer(table, user_id)
+                execution_time = (time.time() - start_time) * 1000
+                self.logger.info(f"UI data caches for '{table}' cleared: {entries_cleared} entries "
+                                 f"in {execution_time:.1f}ms")
+                return CacheOperationResult(
+                    operation="clear_streamlit_caches",
+                    success=True,
+                    entries_cleared=entries_cleared,
+                    execution_time_ms=execution_time
+                )
+            except Exception as e:
+                error_msg = f"Error clearing UI data caches for '{table}': {str(e)}"
+                self.logger.error(error_msg)
+                return CacheOperationResult(
+                    operation="clear_streamlit_caches",
+                    success=False,
+                    error_message=error_msg,
+                    execution_time_ms=(time.time() - start_time) * 1000
+                )
+
         try:
+            ui_entries_cleared = self._clear_ui_data_layer()
+
             import streamlit as st
 
             # Clear all Streamlit cache data
@@ -163,7 +207,7 @@ class DocumentCacheManager:
             result = CacheOperationResult(
                 operation="clear_streamlit_caches",
                 success=True,
-                entries_cleared=1,  # Streamlit doesn't report count
+                entries_cleared=1 + ui_entries_cleared,  # Streamlit doesn't report count
                 execution_time_ms=execution_time
             )
 
@@ -176,7 +220,7 @@ class DocumentCacheManager:
             result = CacheOperationResult(
                 operation="clear_streamlit_caches",
                 success=True,
-                entries_cleared=0,
+                entries_cleared=ui_entries_cleared,
                 execution_time_ms=execution_time,
                 error_message="Streamlit not available"
             )
@@ -524,6 +568,23 @@ class DocumentCacheManager:
                     'error': str(e)
                 }
 
+            # Check versioned UI data-layer cache
+            try:
+                from tools.ui_data_layer import ui_data_cache
+                ui_stats = ui_data_cache.get_stats()
+                status.cache_systems['ui_data_layer'] = {
+                    'available': True,
+                    'entries': ui_stats['entries'],
+                    'bytes': ui_stats['bytes'],
+                    'format': ui_stats['format']
+                }
+                status.total_entries += ui_stats['entries']
+            except Exception as e:
+                status.cache_systems['ui_data_layer'] = {
+                    'available': False,
+                    'error': str(e)
+                }
+
             # Check knowledge graph cache
             try:
                 from ...services.ai.knowledge_graph import KnowledgeGraphService
@@ -669,10 +730,11 @@ def clear_all_document_caches(include_streamlit: bool = True) -> Dict[str, Cache
     return manager.clear_all_caches(include_streamlit)
 
 
-def clear_streamlit_document_caches() -> CacheOperationResult:
-    """Clear only Streamlit document caches."""
+def clear_streamlit_document_caches(table: Optional[str] = None,
+                                    user_id: Optional[int] = None) -> CacheOperationResult:
+    """Clear only Streamlit document caches, optionally just the UI data depending on `table`."""
     manager = get_document_cache_manager()
-    return manager.clear_streamlit_caches()
+    return manager.clear_streamlit_caches(table, user_id)
 
 
 def clear_performance_document_caches() -> CacheOperationResult:
@@ -6,7 +6,7 @@ Implements caching, lazy loading, and performance monitoring.
 import time
 import asyncio
 import functools
-from typing import Dict, List, Any, Optional, Callable, Union
+from typing import Dict, List, Any, Optional, Callable, Hashable, Union
 from dataclasses import dataclass
 from datetime import datetime, timedelta
 from collections import defaultdict
@@ -15,6 +15,15 @@ import hashlib
 import json
 
 from ..errors.error_handler import handle_errors
+from .cache_backends import (
+    DEFAULT_MAX_BYTES,
+    DEFAULT_MAX_ENTRIES,
+    DEFAULT_NAMESPACE,
+    CacheTier,
+    MemoryLRUTier,
+    TieredCache,
+    build_shared_tier,
+)
 
 
 @dataclass
@@ -196,84 +205,94 @@ class PerformanceMonitor:
 
 
 class CacheManager:
-    """Advanced caching system for performance optimization."""
+    """Advanced caching system for performance optimization.
 
-    def __init__(self, default_ttl: int = 300):
+    Backed by a `TieredCache`. The first tier is an in-process LRU bounded
+    by entry count and approximate bytes, with monotonic TTLs. A shared
+    Redis or SQLite tier is added when ARCHIVISTA_CACHE_SHARED selects one.
+    """
+
+    def __init__(self, default_ttl: int = 300, max_entries: int = DEFAULT_MAX_ENTRIES,
+                 max_bytes: int = DEFAULT_MAX_BYTES, shared_tier: Optional[CacheTier] = None,
+                 use_shared_tier: bool = True):
         """Initialize cache manager.
 
         Args:
             default_ttl: Default time-to-live in seconds
+            max_entries: Maximum entries in the in-process tier
+            max_bytes: Maximum approximate bytes in the in-process tier
+            shared_tier: Explicit shared tier (default: from ARCHIVISTA_CACHE_SHARED)
+            use_shared_tier: Whether to add a shared tier at all
         """
         self.default_ttl = default_ttl
-        self.cache: Dict[str, Dict[str, Any]] = {}
+        self.memory = MemoryLRUTier(max_entries=max_entries, max_bytes=max_bytes)
+        if shared_tier is None and use_shared_tier:
+            shared_tier = build_shared_tier()
+        tiers = [self.memory] + ([shared_tier] if shared_tier is not None else [])
+        self.backend = TieredCache(tiers, default_ttl=default_ttl)
         self.logger = logging.getLogger(__name__)
 
-    def get(self, key: str) -> Any:
+    def get(self, key: Hashable, default: Any = None, namespace: str = DEFAULT_NAMESPACE) -> Any:
         """Get value from cache.
 
         Args:
             key: Cache key
+            default: Value returned when the key is missing or expired
+            namespace: Cache namespace
 
         Returns:
-            Cached value or None if not found/expired
+            Cached value or default if not found/expired
         """
-        if key not in self.cache:
-            return None
-
-        entry = self.cache[key]
-
-        # Check expiration
-        if datetime.utcnow() > entry['expires_at']:
-            del self.cache[key]
-            return None
-
-        # Update access time
-        entry['last_accessed'] = datetime.utcnow()
+        return self.backend.get(key, default, namespace)
 
-        return entry['value']
-
-    def set(self, key: str, value: Any, ttl: Optional[int] = None) -> None:
+    def set(self, key: Hashable, value: Any, ttl: Optional[int] = None, namespace: str = DEFAULT_NAMESPACE) -> None:
         """Set value in cache.
 
         Args:
             key: Cache key
             value: Value to cache
             ttl: Time-to-live in seconds
+            namespace: Cache namespace
         """
-        if ttl is None:
-            ttl = self.default_ttl
-
-        self.cache[key] = {
-            'value': value,
-            'created_at': datetime.utcnow(),
-            'expires_at': datetime.utcnow() + timedelta(seconds=ttl),
-            'last_accessed': datetime.utcnow(),
-            'ttl': ttl
-        }
+        self.backend.set(key, value, self.default_ttl if ttl is None else ttl, namespace)
+
+    def get_or_load(self, key: Hashable, loader: Callable[[], Any], ttl: Optional[int] = None,
+                    namespace: str = DEFAULT_NAMESPACE) -> Any:
+        """Get value from cache or compute it once for all concurrent callers.
+
+        Args:
+            key: Cache key
+            loader: Zero-argument function computing the value
+            ttl: Time-to-live in seconds
+            namespace: Cache namespace
+
+        Returns:
+            Cached or loaded value
+        """
+        return self.backend.get_or_load(key, loader, self.default_ttl if ttl is None else ttl, namespace)
 
-    def delete(self, key: str) -> bool:
+    def delete(self, key: Hashable, namespace: str = DEFAULT_NAMESPACE) -> bool:
         """Delete key from cache.
 
         Args:
             key: Cache key to delete
+            namespace: Cache namespace
 
         Returns:
             True if key was deleted
         """
-        if key in self.cache:
-            del self.cache[key]
-            return True
-        return False
+        return self.backend.delete(key, namespace)
 
-    def clear(self) -> int:
-        """Clear all cache entries.
+    def clear(self, namespace: Optional[str] = None) -> int:
+        """Clear cache entries.
+
+        Args:
+            namespace: Only clear this namespace (all if None)
 
         Returns:
             Number of entries cleared
         """
-        count = len(self.cache)
-        self.cache.clear()
-        return count
+        return self.backend.clear(namespace)
 
     def cleanup_expired(self) -> int:
         """Remove expired entries.
@@ -281,52 +300,26 @@ class CacheManager:
         Returns:
             Number of entries removed
         """
-        current_time = datetime.utcnow()
-        expired_keys = [
-            key for key, entry in self.cache.items()
-            if current_time > entry['expires_at']
-        ]
-
-        for key in expired_keys:
-            del self.cache[key]
-
-        return len(expired_keys)
+        return self.backend.cleanup_expired()
 
     def get_stats(self) -> Dict[str, Any]:
         """Get cache statistics.
 
         Returns:
-            Cache statistics dictionary
+            Cache statistics dictionary with per-tier and per-namespace metrics
         """
-        current_time = datetime.utcnow()
-
-        total_entries = len(self.cache)
-        expired_entries = len([
-            key for key, entry in self.cache.items()
-            if current_time > entry['expires_at']
-        ])
-
-        valid_entries = total_entries - expired_entries
-
-        # Calculate hit rate (simplified)
-        total_accesses = sum(
-            entry.get('access_count', 0)
-            for entry in self.cache.values()
-        )
-
+        stats = self.backend.get_stats()
+        memory = stats['tiers'][0]
         return {
-            'total_entries': total_entries,
-            'valid_entries': valid_entries,
-            'expired_entries': expired_entries,
+            'total_entries': memory['entries'],
+            'valid_entries': memory['entries'] - memory['expired_entries'],
+            'expired_entries': memory['expired_entries'],
             'default_ttl_seconds': self.default_ttl,
-            'oldest_entry': (
-                min([entry['created_at'] for entry in self.cache.values()]).isoformat()
-                if self.cache else None
-            ),
-            'newest_entry': (
-                max([entry['created_at'] for entry in self.cache.values()]).isoformat()
-                if self.cache else None
-            )
+            'memory_bytes': memory['bytes'],
+            'max_entries': memory['max_entries'],
+            'max_bytes': memory['max_bytes'],
+            'tiers': stats['tiers'],
+            'namespaces': stats['namespaces'],
         }
 
 
@@ -886,43 +879,58 @@ def measure_performance(operation_name: str = "operation"):
     return decorator
 
 
-def cache_result(ttl_seconds: int = 300):
+def make_cache_key(args: tuple, kwargs: Dict[str, Any]) -> Hashable:
+    """Build a cache key from call arguments.
+
+    Hashable arguments are used as they are, with no serialization. Other
+    arguments fall back to a digest of their repr.
+
+    Args:
+        args: Positional arguments
+        kwargs: Keyword arguments
+
+    Returns:
+        Hashable cache key
+    """
+    key = (args, tuple(sorted(kwargs.items()))) if kwargs else args
+    try:
+        hash(key)
+        return key
+    except TypeError:
+        return hashlib.md5(repr(key).encode()).hexdigest()
+
+
+def cache_result(ttl_seconds: int = 300, namespace: Optional[str] = None):
     """Decorator to cache function results.
 
+    Concurrent calls with the same arguments share a single execution.
+
     Args:
         ttl_seconds: Cache TTL in seconds
+        namespace: Metrics/invalidation namespace (default: module.qualname)
     """
     def decorator(func):
+        cache_namespace = namespace or f"{func.__module__}.{func.__qualname__}"
+
         @functools.wraps(func)
         def wrapper(*args, **kwargs):
             optimizer = get_performance_optimizer()
+            executed = []
 
-            # Generate cache key
-            key_data = {
-                'func': func.__name__,
-                'args': args,
-                'kwargs': kwargs
-            }
-            cache_key = optimizer.create_cache_key(func.__name__, *args, **kwargs)
+            def loader():
+                executed.append(True)
+                return func(*args, **kwargs)
 
-            # Try cache first
-            cached_result = optimizer.cache.get(cache_key)
-            if cached_result is not None:
+            result = optimizer.cache.get_or_load(make_cache_key(args, kwargs), loader, ttl_seconds, cache_namespace)
+            if not executed:
                 optimizer.monitor.record_metrics(
                     operation_name=f"{func.__name__}_cached",
                     execution_time_ms=0,
                     cache_hit=True
                 )
-                return cached_result
-
-            # Execute function
-            result = func(*args, **kwargs)
-
-            # Cache result
-            optimizer.cache.set(cache_key, result, ttl_seconds)
-
             return result
 
+        wrapper.cache_namespace = cache_namespace
         return wrapper
     return decorator
 
@@ -970,7 +978,7 @@ def get_cache_stats() -> Dict[str, Any]:
     """Get cache statistics.
 
     Returns:
-        Cache statistics
+        Cache statistics, including hit/miss/eviction metrics per namespace
     """
     optimizer = get_performance_optimizer()
     return optimizer.cache.get_stats()
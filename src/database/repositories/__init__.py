@@ -10,6 +10,8 @@ from .user_repository import UserRepository
 from .chat_repository import ChatRepository
 from .project_repository import ProjectRepository
 from .career_repository import CareerRepository
+from .user_activity_repository import UserActivityRepository
+from .suggestion_cache_repository import SuggestionCacheRepository
 
 __all__ = [
     'BaseRepository',
@@ -17,5 +19,7 @@ __all__ = [
     'UserRepository',
     'ChatRepository',
     'ProjectRepository',
-    'CareerRepository'
+    'CareerRepository',
+    'UserActivityRepository',
+    'SuggestionCacheRepository'
 ]
@@ -0,0 +1,239 @@
+"""
+Suggestion Cache Repository.
+
+Repository per i suggerimenti precalcolati (tabella suggestion_cache),
+condivisi tra processi Streamlit e worker Celery sullo stesso database.
+"""
+
+import json
+import logging
+import sqlite3
+from typing import Dict, List, Optional, Any
+from datetime import datetime, timedelta
+
+from .base_repository import BaseRepository
+
+logger = logging.getLogger(__name__)
+
+# Durata predefinita di una voce in cache
+SUGGESTION_CACHE_TTL_SECONDS = 15 * 60
+
+# Numero massimo di voci (utente, contesto) conservate
+SUGGESTION_CACHE_MAX_ENTRIES = 5000
+
+
+class SuggestionCacheRepository(BaseRepository):
+    """Repository per la cache persistente dei suggerimenti."""
+
+    def __init__(self, db_path: str = "db_memoria/metadata.sqlite",
+                 ttl_seconds: int = SUGGESTION_CACHE_TTL_SECONDS,
+                 max_entries: int = SUGGESTION_CACHE_MAX_ENTRIES):
+        """Inizializza repository cache suggerimenti."""
+        super().__init__(db_path)
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._ensure_tables_exist()
+
+    def _ensure_tables_exist(self) -> None:
+        """Crea tabella e indici della cache se non esistono."""
+        try:
+            self.execute_update("""
+            CREATE TABLE IF NOT EXISTS suggestion_cache (
+                user_id TEXT NOT NULL,
+                context_key TEXT NOT NULL,
+                suggestions TEXT NOT NULL, -- JSON con la lista di Suggestion.to_dict()
+                computed_at TEXT NOT NULL,
+                expires_at TEXT NOT NULL,
+                PRIMARY KEY (user_id, context_key)
+            )
+            """)
+            self.execute_update(
+                "CREATE INDEX IF NOT EXISTS idx_suggestion_cache_expires ON suggestion_cache (expires_at)"
+            )
+            self.execute_update(
+                "CREATE INDEX IF NOT EXISTS idx_suggestion_cache_computed ON suggestion_cache (computed_at)"
+            )
+            # Generazione per utente: incrementata a ogni invalidazione, così un
+            # calcolo iniziato prima dell'invalidazione non può salvare risultati vecchi
+            self.execute_update("""
+            CREATE TABLE IF NOT EXISTS suggestion_cache_generations (
+                user_id TEXT PRIMARY KEY,
+                generation INTEGER NOT NULL DEFAULT 0
+            )
+            """)
+        except Exception as e:
+            logger.error(f"Errore creazione tabella suggestion_cache: {e}")
+            raise
+
+    def get_by_id(self, key: Any) -> Optional[List[Dict[str, Any]]]:
+        """Recupera suggerimenti per chiave (user_id, context_key)."""
+        user_id, context_key = key
+        return self.get_suggestions(user_id, context_key)
+
+    def get_all(self, filters: Dict[str, Any] = None) -> List[Dict[str, Any]]:
+        """Recupera tutte le voci in cache (filtri per colonna)."""
+        try:
+            query = "SELECT user_id, context_key, computed_at, expires_at FROM suggestion_cache WHERE 1 = 1"
+            params = []
+
+            if filters:
+                for key, value in filters.items():
+                    if value is not None:
+                        query += f" AND {key} = ?"
+                        params.append(value)
+
+            query += " ORDER BY computed_at DESC"
+
+            return self.execute_query(query, tuple(params))
+        except Exception as e:
+            logger.error(f"Errore recupero cache suggerimenti: {e}")
+            return []
+
+    def create(self, data: Dict[str, Any]) -> bool:
+        """Salva una voce con chiavi user_id, context_key e suggestions."""
+        return self.save_suggestions(data['user_id'], data['context_key'], data['suggestions'])
+
+    def update(self, key: Any, data: Dict[str, Any]) -> bool:
+        """Sostituisce i suggerimenti di una voce."""
+        user_id, context_key = key
+        return self.save_suggestions(user_id, context_key, data['suggestions'])
+
+    def delete(self, key: Any) -> bool:
+        """Elimina una voce (user_id, context_key)."""
+        user_id, context_key = key
+        return self.execute_update(
+            "DELETE FROM suggestion_cache WHERE user_id = ? AND context_key = ?", (str(user_id), context_key)
+        )
+
+    def get_suggestions(self, user_id: Any, context_key: str) -> Optional[List[Dict[str, Any]]]:
+        """
+        Suggerimenti validi per utente e contesto, o None se assenti o scaduti.
+
+        Args:
+            user_id: ID utente
+            context_key: Contesto (pagina) dei suggerimenti
+        """
+        try:
+            results = self.execute_query("""
+                SELECT suggestions FROM suggestion_cache
+                WHERE user_id = ? AND context_key = ? AND expires_at > ?
+            """, (str(user_id), context_key, datetime.utcnow().isoformat()))
+            return json.loads(results[0]['suggestions']) if results else None
+        except Exception as e:
+            logger.error(f"Errore lettura cache suggerimenti {user_id}/{context_key}: {e}")
+            return None
+
+    def get_generation(self, user_id: Any) -> int:
+        """Generazione corrente delle voci di un utente (0 se mai invalidate)."""
+        try:
+            results = self.execute_query(
+                "SELECT generation FROM suggestion_cache_generations WHERE user_id = ?", (str(user_id),)
+            )
+            return results[0]['generation'] if results else 0
+        except Exception as e:
+            logger.error(f"Errore lettura generazione suggerimenti {user_id}: {e}")
+            return 0
+
+    def save_suggestions(self, user_id: Any, context_key: str, suggestions: List[Dict[str, Any]],
+                         ttl_seconds: Optional[int] = None, generation: Optional[int] = None) -> bool:
+        """
+        Salva (o sostituisce) i suggerimenti di utente e contesto.
+
+        Args:
+            user_id: ID utente
+            context_key: Contesto (pagina) dei suggerimenti
+            suggestions: Suggerimenti serializzati
+            ttl_seconds: Durata della voce (default del repository se None)
+            generation: Generazione letta prima del calcolo; se nel frattempo
+                l'utente è stato invalidato la voce non viene salvata
+
+        Returns:
+            True se la voce è stata salvata
+        """
+        now = datetime.utcnow()
+        expires_at = now + timedelta(seconds=self.ttl_seconds if ttl_seconds is None else ttl_seconds)
+        values = (str(user_id), context_key, json.dumps(suggestions), now.isoformat(), expires_at.isoformat())
+        upsert = """
+            ON CONFLICT(user_id, context_key) DO UPDATE SET
+                suggestions = excluded.suggestions,
+                computed_at = excluded.computed_at,
+                expires_at = excluded.expires_at
+        """
+        if generation is None:
+            return self.execute_update(
+                "INSERT INTO suggestion_cache (user_id, context_key, suggestions, computed_at, expires_at) "
+                "VALUES (?, ?, ?, ?, ?)" + upsert, values
+            )
+
+        # Controllo e scrittura nella stessa istruzione: nessuna invalidazione può inserirsi tra i due
+        conn = self.get_connection()
+        try:
+            saved = conn.execute("""
+                INSERT INTO suggestion_cache (user_id, context_key, suggestions, computed_at, expires_at)
+                SELECT ?, ?, ?, ?, ?
+                WHERE COALESCE(
+                    (SELECT generation FROM suggestion_cache_generations WHERE user_id = ?), 0
+                ) = ?
+            """ + upsert, values + (str(user_id), generation)).rowcount
+            conn.commit()
+            return saved > 0
+        except Exception as e:
+            logger.error(f"Errore salvataggio cache suggerimenti {user_id}/{context_key}: {e}")
+            return False
+        finally:
+            if not isinstance(self.db_path, sqlite3.Connection):
+                conn.close()
+
+    def invalidate_user(self, user_id: Any) -> bool:
+        """Elimina tutte le voci di un utente e ne incrementa la generazione."""
+        conn = self.get_connection()
+        try:
+            conn.execute("""
+                INSERT INTO suggestion_cache_generations (user_id, generation) VALUES (?, 1)
+                ON CONFLICT(user_id) DO UPDATE SET generation = generation + 1
+            """, (str(user_id),))
+            conn.execute("DELETE FROM suggestion_cache WHERE user_id = ?", (str(user_id),))
+            conn.commit()
+            return True
+        except Exception as e:
+            logger.error(f"Errore invalidazione cache suggerimenti {user_id}: {e}")
+            return False
+        finally:
+            if not isinstance(self.db_path, sqlite3.Connection):
+                conn.close()
+
+    def evict(self) -> int:
+        """
+        Elimina le voci scadute e, oltre max_entries, quelle calcolate da più tempo.
+
+        Returns:
+            Numero di voci eliminate
+        """
+        conn = self.get_connection()
+        try:
+            removed = conn.execute(
+                "DELETE FROM suggestion_cache WHERE expires_at <= ?", (datetime.utcnow().isoformat(),)
+            ).rowcount
+            removed += conn.execute("""
+                DELETE FROM suggestion_cache WHERE rowid IN (
+                    SELECT rowid FROM suggestion_cache
+                    ORDER BY computed_at DESC
+                    LIMIT -1 OFFSET ?
+                )
+            """, (self.max_entries,)).rowcount
+            conn.commit()
+            return removed
+        except Exception as e:
+            logger.error(f"Errore pulizia cache suggerimenti: {e}")
+            return 0
+        finally:
+            if not isinstance(self.db_path, sqlite3.Connection):
+                conn.close()
+
+    def count(self) -> int:
+        """Numero di voci in cache."""
+        try:
+            return self.execute_query("SELECT COUNT(*) AS total FROM suggestion_cache")[0]['total']
+        except Exception as e:
+            logger.error(f"Errore conteggio cache suggerimenti: {e}")
+            return 0
@@ -0,0 +1,160 @@
+"""
+User Activity Repository.
+
+Repository per le attività utente (tabella user_activity) e per i contatori
+aggregati dei profili comportamentali (tabella user_behavior_profiles).
+"""
+
+import json
+import logging
+from typing import Dict, List, Optional, Any
+from datetime import datetime
+
+from .base_repository import BaseRepository
+
+logger = logging.getLogger(__name__)
+
+# Righe lette per ogni aggiornamento incrementale dei contatori
+ACTIVITY_BATCH_SIZE = 5000
+
+
+class UserActivityRepository(BaseRepository):
+    """Repository per attività utente e profili comportamentali."""
+
+    def __init__(self, db_path: str = "db_memoria/metadata.sqlite"):
+        """Inizializza repository attività."""
+        super().__init__(db_path)
+        self._ensure_tables_exist()
+
+    def _ensure_tables_exist(self) -> None:
+        """Crea tabelle attività e profili se non esistono."""
+        try:
+            self.execute_update("""
+            CREATE TABLE IF NOT EXISTS user_activity (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_id INTEGER NOT NULL,
+                action_type TEXT NOT NULL,
+                target_type TEXT,
+                target_id TEXT,
+                metadata TEXT,
+                timestamp TEXT NOT NULL,
+                session_id TEXT
+            )
+            """)
+            self.execute_update("""
+            CREATE TABLE IF NOT EXISTS user_behavior_profiles (
+                user_id TEXT PRIMARY KEY,
+                watermark INTEGER NOT NULL DEFAULT 0, -- ultimo user_activity.id aggregato
+                counters TEXT NOT NULL, -- JSON con contatori e istogrammi
+                updated_at TEXT NOT NULL
+            )
+            """)
+        except Exception as e:
+            logger.error(f"Errore creazione tabelle attività: {e}")
+            raise
+
+    def get_by_id(self, activity_id: Any) -> Optional[Dict[str, Any]]:
+        """Recupera attività per ID."""
+        try:
+            results = self.execute_query("SELECT * FROM user_activity WHERE id = ?", (activity_id,))
+            return self._parse_activity(results[0]) if results else None
+        except Exception as e:
+            logger.error(f"Errore recupero attività {activity_id}: {e}")
+            return None
+
+    def get_all(self, filters: Dict[str, Any] = None) -> List[Dict[str, Any]]:
+        """Recupera tutte le attività (filtri per colonna)."""
+        try:
+            query = "SELECT * FROM user_activity WHERE 1 = 1"
+            params = []
+
+            if filters:
+                for key, value in filters.items():
+                    if value is not None:
+                        query += f" AND {key} = ?"
+                        params.append(value)
+
+            query += " ORDER BY id DESC"
+
+            return [self._parse_activity(row) for row in self.execute_query(query, tuple(params))]
+        except Exception as e:
+            logger.error(f"Errore recupero attività: {e}")
+            return []
+
+    def create(self, data: Dict[str, Any]) -> bool:
+        """Registra nuova attività."""
+        metadata = data.get('metadata')
+        return self.execute_update("""
+            INSERT INTO user_activity (user_id, action_type, target_type, target_id, metadata, timestamp, session_id)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        """, (
+            data.get('user_id'), data.get('action_type'), data.get('target_type'), data.get('target_id'),
+            json.dumps(metadata) if metadata else None,
+            data.get('timestamp', datetime.now().isoformat()), data.get('session_id')
+        ))
+
+    def update(self, activity_id: Any, data: Dict[str, Any]) -> bool:
+        """Le attività sono un log append-only: non vengono modificate."""
+        return False
+
+    def delete(self, activity_id: Any) -> bool:
+        """Elimina attività."""
+        return self.execute_update("DELETE FROM user_activity WHERE id = ?", (activity_id,))
+
+    def get_activities_since(self, user_id: Any, after_id: int = 0,
+                             limit: int = ACTIVITY_BATCH_SIZE) -> List[Dict[str, Any]]:
+        """
+        Attività dell'utente con id maggiore del watermark, in ordine di id.
+
+        Args:
+            user_id: ID utente
+            after_id: Ultimo id già aggregato
+            limit: Numero massimo di righe
+        """
+        try:
+            results = self.execute_query("""
+                SELECT id, action_type, target_type, target_id, metadata, timestamp
+                FROM user_activity
+                WHERE user_id = ? AND id > ?
+                ORDER BY id
+                LIMIT ?
+            """, (user_id, after_id, limit))
+            return [self._parse_activity(row) for row in results]
+        except Exception as e:
+            logger.error(f"Errore recupero attività utente {user_id}: {e}")
+            return []
+
+    def get_behavior_counters(self, user_id: Any) -> Optional[Dict[str, Any]]:
+        """Contatori aggregati salvati per l'utente (con watermark), o None."""
+        try:
+            results = self.execute_query(
+                "SELECT watermark, counters FROM user_behavior_profiles WHERE user_id = ?", (str(user_id),)
+            )
+            if not results:
+                return None
+            counters = json.loads(results[0]['counters'])
+            counters['watermark'] = results[0]['watermark']
+            return counters
+        except Exception as e:
+            logger.error(f"Errore recupero profilo comportamentale {user_id}: {e}")
+            return None
+
+    def save_behavior_counters(self, user_id: Any, watermark: int, counters: Dict[str, Any]) -> bool:
+        """Salva contatori aggregati e watermark dell'utente."""
+        return self.execute_update("""
+            INSERT INTO user_behavior_profiles (user_id, watermark, counters, updated_at)
+            VALUES (?, ?, ?, ?)
+            ON CONFLICT(user_id) DO UPDATE SET
+                watermark = excluded.watermark, counters = excluded.counters, updated_at = excluded.updated_at
+        """, (str(user_id), watermark, json.dumps(counters), datetime.now().isoformat()))
+
+    @staticmethod
+    def _parse_activity(row: Dict[str, Any]) -> Dict[str, Any]:
+        """Decodifica i metadati JSON di una riga di attività."""
+        activity = dict(row)
+        try:
+            metadata = json.loads(activity['metadata']) if activity.get('metadata') else {}
+        except (TypeError, ValueError):
+            metadata = {}
+        activity['metadata'] = metadata if isinstance(metadata, dict) else {}
+        return activity
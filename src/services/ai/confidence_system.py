@@ -14,6 +14,7 @@ import numpy as np
 
 from ...database.models.base import Document, ConceptEntity, ConceptRelationship, BayesianEvidence
 from ...core.errors.error_handler import handle_errors
+from .document_stats import DocumentTermStats, get_document_stats_cache
 
 
 @dataclass
@@ -69,6 +70,9 @@ class ConfidenceCalculator:
             'domain_expertise': 0.05
         }
 
+        # Tokenized context documents, shared across responses
+        self.stats_cache = get_document_stats_cache()
+
     @handle_errors(operation="calculate_response_confidence", component="confidence_calculator")
     def calculate_response_confidence(
         self,
@@ -95,13 +99,11 @@ class ConfidenceCalculator:
         # Text quality factor
         factors['text_quality'] = self._calculate_text_quality(response_text)
 
-        # Context relevance factor
-        factors['context_relevance'] = self._calculate_context_relevance(
-            response_text, context_documents, query
-        )
-
-        # Source reliability factor
-        factors['source_reliability'] = self._calculate_source_reliability(context_documents)
+        # Context relevance, source reliability and temporal freshness factors
+        document_stats = [self.stats_cache.get(doc) for doc in context_documents]
+        context_factors = self._calculate_context_factors(response_text, document_stats, query)
+        factors['context_relevance'] = context_factors['context_relevance']
+        factors['source_reliability'] = context_factors['source_reliability']
 
         # Response consistency factor
         factors['response_consistency'] = self._calculate_response_consistency(
@@ -112,7 +114,7 @@ class ConfidenceCalculator:
         factors['user_history'] = self._calculate_user_history_factor(user_id)
 
         # Temporal freshness factor
-        factors['temporal_freshness'] = self._calculate_temporal_freshness(context_documents)
+        factors['temporal_freshness'] = context_factors['temporal_freshness']
 
         # Domain expertise factor
         factors['domain_expertise'] = self._calculate_domain_expertise(
@@ -181,84 +183,86 @@ class ConfidenceCalculator:
 
         return min(score, 1.0)
 
-    def _calculate_context_relevance(self, response: str, documents: List[Document], query: str) -> float:
-        """Calculate context relevance factor."""
-        if not documents:
-            return 0.3  # Base score without context
+    def _calculate_context_factors(
+        self,
+        response: str,
+        document_stats: List[DocumentTermStats],
+        query: str
+    ) -> Dict[str, float]:
+        """Calculate context relevance, source reliability and temporal freshness.
+
+        All three factors are computed in one pass over the cached
+        per-document statistics.
+
+        Args:
+            response: Generated response text
+            document_stats: Term statistics of the context documents
+            query: Original user query
+
+        Returns:
+            Factor values keyed by factor name
+        """
+        if not document_stats:
+            # Base scores without context
+            return {'context_relevance': 0.3, 'source_reliability': 0.5, 'temporal_freshness': 0.5}
 
-        score = 0.0
         query_terms = set(query.lower().split())
 
         # Check if response addresses query terms
         response_lower = response.lower()
         query_matches = sum(1 for term in query_terms if term in response_lower)
         query_coverage = query_matches / len(query_terms) if query_terms else 0
-        score += query_coverage * 0.4
+        relevance = query_coverage * 0.4
 
-        # Check document content relevance
+        current_time = datetime.utcnow()
         total_relevance = 0
-        for doc in documents:
-            doc_relevance = 0
+        total_reliability = 0.0
+        total_freshness = 0.0
 
-            # Title relevance
-            if doc.title:
-                title_terms = set(doc.title.lower().split())
-                title_overlap = len(query_terms & title_terms) / len(query_terms) if query_terms else 0
+        for stats in document_stats:
+            # Title, content and keyword relevance
+            doc_relevance = 0
+            if stats.has_title:
+                title_overlap = len(query_terms & stats.title_terms) / len(query_terms) if query_terms else 0
                 doc_relevance += title_overlap * 0.3
-
-            # Content relevance
-            if doc.formatted_preview:
-                content_terms = set(doc.formatted_preview.lower().split())
-                content_overlap = len(query_terms & content_terms) / len(query_terms) if query_terms else 0
+            if stats.content_terms:
+                content_overlap = len(query_terms & stats.content_terms) / len(query_terms) if query_terms else 0
                 doc_relevance += content_overlap * 0.2
-
-            # Keyword relevance
-            if doc.keywords:
-                keyword_terms = set(' '.join(doc.keywords).lower().split())
-                keyword_overlap = len(query_terms & keyword_terms) / len(query_terms) if query_terms else 0
+            if stats.has_keywords:
+                keyword_overlap = len(query_terms & stats.keyword_terms) / len(query_terms) if query_terms else 0
                 doc_relevance += keyword_overlap * 0.5
-
             total_relevance += doc_relevance
 
-        # Average relevance across documents
-        if documents:
-            score += (total_relevance / len(documents)) * 0.6
-
-        return min(score, 1.0)
-
-    def _calculate_source_reliability(self, documents: List[Document]) -> float:
-        """Calculate source reliability factor."""
-        if not documents:
-            return 0.5  # Neutral score
-
-        total_reliability = 0.0
-
-        for doc in documents:
+            # Reliability: processed documents with good metadata
             reliability = 0.5  # Base reliability
-
-            # Boost for processed documents
-            if doc.processing_status.value == 'completed':
+            if stats.is_processed:
                 reliability += 0.2
-
-            # Boost for documents with good metadata
-            if doc.title:
+            if stats.has_title:
                 reliability += 0.1
-            if doc.keywords:
+            if stats.has_keywords:
                 reliability += 0.1
-            if doc.content_hash:
+            if stats.has_content_hash:
                 reliability += 0.1
 
-            # Boost for recent documents
-            if doc.created_at:
-                days_old = (datetime.utcnow() - doc.created_at).days
+            # Boost for recent documents, exponential freshness decay over a year
+            days_old = stats.age_days(current_time)
+            if days_old is not None:
                 if days_old < 30:
                     reliability += 0.1
                 elif days_old < 365:
                     reliability += 0.05
+                total_freshness += math.exp(-days_old / 365)
 
             total_reliability += min(reliability, 1.0)
 
-        return total_reliability / len(documents)
+        # Average across documents
+        relevance += (total_relevance / len(document_stats)) * 0.6
+
+        return {
+            'context_relevance': min(relevance, 1.0),
+            'source_reliability': total_reliability / len(document_stats),
+            'temporal_freshness': total_freshness / len(document_stats)
+        }
 
     def _calculate_response_consistency(self, response: str, query: str) -> float:
         """Calculate response consistency factor."""
@@ -286,23 +290,6 @@ class ConfidenceCalculator:
         # For now, return neutral score
         return 0.5
 
-    def _calculate_temporal_freshness(self, documents: List[Document]) -> float:
-        """Calculate temporal freshness factor."""
-        if not documents:
-            return 0.5
-
-        current_time = datetime.utcnow()
-        total_freshness = 0.0
-
-        for doc in documents:
-            if doc.created_at:
-                days_old = (current_time - doc.created_at).days
-                # Exponential decay: newer documents get higher score
-                freshness = math.exp(-days_old / 365)  # Decay over a year
-                total_freshness += freshness
-
-        return total_freshness / len(documents)
-
     def _calculate_domain_expertise(self, response: str, documents: List[Document]) -> float:
         """Calculate domain expertise factor."""
         # Analyze if response shows domain knowledge
@@ -375,7 +362,7 @@ class ConfidenceVisualizer:
                 font-size: 0.8rem;
             ">
                 <span style="color: #666;">{factor.replace('_', ' ').title()}</span>
-                <span style="color: {factor_color};">{value".2f"}</span>
+                <span style="color: {factor_color};">{value:.2f}</span>
             </div>
             """
 
@@ -407,7 +394,7 @@ class ConfidenceVisualizer:
                     font-size: 0.9rem;
                     font-weight: 600;
                     color: {color};
-                ">{confidence.value".1%"}</span>
+                ">{confidence.value:.1%}</span>
             </div>
 
             {progress_html}
@@ -474,7 +461,7 @@ class ConfidenceVisualizer:
             border-radius: 10px;
             font-size: 0.7rem;
             font-weight: 500;
-        ">{text} ({confidence".0%"})</span>
+        ">{text} ({confidence:.0%})</span>
         """
 
 
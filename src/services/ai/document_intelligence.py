@@ -3,14 +3,20 @@ Document Intelligence System for Archivista AI.
 Implements entity extraction, topic modeling, sentiment analysis, and similarity detection.
 """
 
+import os
 import re
 import json
-from typing import Dict, List, Any, Optional, Tuple
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, Iterable, Iterator, List, Any, Optional, Set, Tuple
 from dataclasses import dataclass, field
 from datetime import datetime
-from collections import Counter, defaultdict
+from collections import Counter, defaultdict, deque
 import logging
 import math
+from bisect import bisect_right
 
 from ...database.models.base import Document, ConceptEntity, ConceptRelationship
 from ...core.errors.error_handler import handle_errors
@@ -57,32 +63,63 @@ class DocumentSimilarity:
     matching_sections: List[Dict[str, Any]] = field(default_factory=list)
 
 
+# Entity patterns, compiled once at import and shared by every extractor
+ENTITY_PATTERNS = {
+    'person': re.compile(r'\b[A-Z][a-z]+ [A-Z][a-z]+\b'),  # Simple person names
+    'organization': re.compile(r'\b[A-Z][a-zA-Z\s&]+\b'),  # Organizations
+    'location': re.compile(r'\b[A-Z][a-z]+(?:\s+[A-Z][a-z]+)*\b'),  # Locations
+    'date': re.compile(r'\b\d{1,2}[/-]\d{1,2}[/-]\d{2,4}\b|\b\d{4}[/-]\d{1,2}[/-]\d{1,2}\b'),
+    'email': re.compile(r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b'),
+    'url': re.compile(r'https?://[^\s]+'),
+    'phone': re.compile(r'\b\d{3}[-.]?\d{3}[-.]?\d{4}\b'),
+    'academic_term': re.compile(r'\b[A-Z][a-z]+(?:ology|ics|ment|tion|sis|ing)\b'),
+    'technical_term': re.compile(r'\b[A-Za-z]+[0-9]+[A-Za-z]*\b|\b[A-Z]{2,}\b'),
+}
+
+ENTITY_STOP_WORDS = frozenset({
+    'the', 'a', 'an', 'and', 'or', 'but', 'in', 'on', 'at', 'to', 'for',
+    'of', 'with', 'by', 'is', 'are', 'was', 'were', 'be', 'been', 'have',
+    'has', 'had', 'do', 'does', 'did', 'will', 'would', 'could', 'should'
+})
+
+MIN_ENTITY_CONFIDENCE = 0.3
+# Below this total text size a process pool costs more than it saves
+BATCH_PARALLEL_MIN_CHARS = 200_000
+
+
 class EntityExtractor:
-    """Advanced entity extraction system."""
+    """Advanced entity extraction system.
+
+    Patterns are compiled once per process. Matches are scanned into typed
+    spans and processed in a single pass that deduplicates before computing
+    confidence and context, so repeated mentions cost a set lookup.
+    """
 
     def __init__(self):
         """Initialize entity extractor."""
         self.logger = logging.getLogger(__name__)
 
         # Entity patterns
-        self.entity_patterns = {
-            'person': re.compile(r'\b[A-Z][a-z]+ [A-Z][a-z]+\b'),  # Simple person names
-            'organization': re.compile(r'\b[A-Z][a-zA-Z\s&]+\b'),  # Organizations
-            'location': re.compile(r'\b[A-Z][a-z]+(?:\s+[A-Z][a-z]+)*\b'),  # Locations
-            'date': re.compile(r'\b\d{1,2}[/-]\d{1,2}[/-]\d{2,4}\b|\b\d{4}[/-]\d{1,2}[/-]\d{1,2}\b'),
-            'email': re.compile(r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b'),
-            'url': re.compile(r'https?://[^\s]+'),
-            'phone': re.compile(r'\b\d{3}[-.]?\d{3}[-.]?\d{4}\b'),
-            'academic_term': re.compile(r'\b[A-Z][a-z]+(?:ology|ics|ment|tion|sis|ing)\b'),
-            'technical_term': re.compile(r'\b[A-Za-z]+[0-9]+[A-Za-z]*\b|\b[A-Z]{2,}\b'),
-        }
+        self.entity_patterns = ENTITY_PATTERNS
 
         # Stop words for filtering
-        self.stop_words = {
-            'the', 'a', 'an', 'and', 'or', 'but', 'in', 'on', 'at', 'to', 'for',
-            'of', 'with', 'by', 'is', 'are', 'was', 'were', 'be', 'been', 'have',
-            'has', 'had', 'do', 'does', 'did', 'will', 'would', 'could', 'should'
-        }
+        self.stop_words = ENTITY_STOP_WORDS
+
+    def scan(self, text: str) -> Iterator[Tuple[str, str, int, int]]:
+        """Scan text into typed spans.
+
+        Each type keeps its own non-overlapping matches (types may overlap
+        each other), in type order and then by position.
+
+        Args:
+            text: Text to scan
+
+        Yields:
+            (entity_type, matched_text, start, end)
+        """
+        for entity_type, pattern in self.entity_patterns.items():
+            for match in pattern.finditer(text):
+                yield entity_type, match.group(), match.start(), match.end()
 
     @handle_errors(operation="extract_entities", component="entity_extractor")
     def extract_entities(self, document: Document) -> List[Entity]:
@@ -94,42 +131,106 @@ class EntityExtractor:
         Returns:
             List of extracted entities
         """
-        entities = []
-        text = document.formatted_preview or ""
+        return self.extract_from_text(document.formatted_preview or "")
+
+    def extract_from_text(self, text: str) -> List[Entity]:
+        """Extract entities from raw text.
 
+        Args:
+            text: Text to analyze
+
+        Returns:
+            List of extracted entities, highest confidence first
+        """
+        entities = []
         if not text:
             return entities
 
-        # Extract entities by type
-        for entity_type, pattern in self.entity_patterns.items():
-            matches = pattern.finditer(text)
-
-            for match in matches:
-                entity_text = match.group().strip()
-
-                # Skip if too short or in stop words
-                if len(entity_text) < 3 or entity_text.lower() in self.stop_words:
-                    continue
-
-                # Calculate confidence based on context
-                confidence = self._calculate_entity_confidence(
-                    entity_text, match.span(), text, entity_type
-                )
-
-                if confidence > 0.3:  # Minimum confidence threshold
-                    entity = Entity(
-                        text=entity_text,
-                        type=entity_type,
-                        confidence=confidence,
-                        start_pos=match.start(),
-                        end_pos=match.end(),
-                        context=self._extract_context(text, match.span())
-                    )
-                    entities.append(entity)
-
-        # Remove duplicates and sort by confidence
-        unique_entities = self._deduplicate_entities(entities)
-        return sorted(unique_entities, key=lambda x: x.confidence, reverse=True)
+        seen = set()
+        for entity_type, matched, start, end in self.scan(text):
+            entity_text = matched.strip()
+
+            # Skip if too short or in stop words
+            if len(entity_text) < 3 or entity_text.lower() in self.stop_words:
+                continue
+
+            # Only the first mention of each entity is kept
+            key = (entity_text.lower(), entity_type)
+            if key in seen:
+                continue
+
+            # Calculate confidence based on context
+            confidence = self._calculate_entity_confidence(
+                entity_text, (start, end), text, entity_type
+            )
+
+            if confidence > MIN_ENTITY_CONFIDENCE:
+                seen.add(key)
+                entities.append(Entity(
+                    text=entity_text,
+                    type=entity_type,
+                    confidence=confidence,
+                    start_pos=start,
+                    end_pos=end,
+                    context=self._extract_context(text, (start, end))
+                ))
+
+        return sorted(entities, key=lambda x: x.confidence, reverse=True)
+
+    def extract_entities_batch(
+        self,
+        documents: List[Document],
+        max_workers: Optional[int] = None
+    ) -> List[List[Entity]]:
+        """Extract entities from many documents, in parallel for large batches.
+
+        A document that fails is logged and yields no entities; the others
+        are unaffected. Daemonic processes (Celery prefork workers) cannot
+        start a pool and extract in-process.
+
+        Args:
+            documents: Documents to analyze
+            max_workers: Worker processes (default: CPU count); 1 disables the pool
+
+        Returns:
+            One entity list per document, in input order
+        """
+        texts = [document.formatted_preview or "" for document in documents]
+
+        total_chars = sum(len(text) for text in texts if isinstance(text, str))
+        if (max_workers == 1 or len(texts) < 2 or total_chars < BATCH_PARALLEL_MIN_CHARS
+                or multiprocessing.current_process().daemon):
+            results = [self.extract_isolated(text) for text in texts]
+        else:
+            workers = min(max_workers or os.cpu_count() or 1, len(texts))
+            try:
+                with ProcessPoolExecutor(max_workers=workers) as pool:
+                    results = list(pool.map(_extract_entities_worker, texts,
+                                            chunksize=max(1, len(texts) // (workers * 4))))
+            except (OSError, BrokenProcessPool) as e:
+                self.logger.warning(f"Process pool unavailable, extracting sequentially: {e}")
+                results = [self.extract_isolated(text) for text in texts]
+
+        entities = []
+        for document, (doc_entities, error) in zip(documents, results):
+            if error is not None:
+                self.logger.error(f"Error extracting entities from {document.file_name}: {error}")
+            entities.append(doc_entities)
+        return entities
+
+    def extract_isolated(self, text: str) -> Tuple[List[Entity], Optional[str]]:
+        """Extract entities from one text, returning the error instead of raising.
+
+        Args:
+            text: Text to analyze
+
+        Returns:
+            Entities (empty on failure) and the error message, or None
+        """
+        try:
+            return self.extract_from_text(text), None
+        except Exception as e:
+            return [], f"{type(e).__name__}: {e}"
 
     def _calculate_entity_confidence(
         self,
@@ -189,20 +290,210 @@ class EntityExtractor:
 
         return context
 
-    def _deduplicate_entities(self, entities: List[Entity]) -> List[Entity]:
-        """Remove duplicate entities."""
-        seen = set()
-        unique_entities = []
 
-        for entity in entities:
-            # Create unique key
-            key = (entity.text.lower(), entity.type)
+_shared_entity_extractor: Optional[EntityExtractor] = None
+_shared_extractor_lock = threading.Lock()
 
-            if key not in seen:
-                seen.add(key)
-                unique_entities.append(entity)
 
-        return unique_entities
+def get_entity_extractor() -> EntityExtractor:
+    """Get the process-wide shared entity extractor.
+
+    Returns:
+        Shared EntityExtractor instance
+    """
+    global _shared_entity_extractor
+    if _shared_entity_extractor is None:
+        with _shared_extractor_lock:
+            if _shared_entity_extractor is None:
+                _shared_entity_extractor = EntityExtractor()
+    return _shared_entity_extractor
+
+
+def _extract_entities_worker(text: str) -> Tuple[List[Entity], Optional[str]]:
+    """Process pool entry point for batch extraction."""
+    return get_entity_extractor().extract_isolated(text)
+
+
+# Topic and sentiment lexicons, matched together by the shared KeywordMatcher
+TOPIC_KEYWORDS = {
+    'machine_learning': [
+        'algorithm', 'neural network', 'deep learning', 'classification',
+        'regression', 'clustering', 'supervised', 'unsupervised', 'training',
+        'validation', 'accuracy', 'precision', 'recall', 'model'
+    ],
+    'statistics': [
+        'probability', 'distribution', 'hypothesis', 'significance',
+        'correlation', 'regression', 'anova', 'chi-square', 'p-value',
+        'confidence interval', 'sample', 'population', 'mean', 'median'
+    ],
+    'programming': [
+        'function', 'variable', 'class', 'object', 'method', 'loop',
+        'condition', 'array', 'string', 'integer', 'boolean', 'syntax',
+        'compile', 'debug', 'algorithm', 'data structure'
+    ],
+    'research': [
+        'study', 'experiment', 'analysis', 'methodology', 'conclusion',
+        'finding', 'result', 'evidence', 'theory', 'hypothesis', 'data',
+        'sample', 'population', 'variable', 'control', 'treatment'
+    ],
+    'mathematics': [
+        'equation', 'function', 'variable', 'constant', 'theorem', 'proof',
+        'geometry', 'algebra', 'calculus', 'matrix', 'vector', 'set',
+        'number', 'operation', 'solve', 'calculate', 'formula'
+    ]
+}
+
+POSITIVE_WORDS = frozenset({
+    'good', 'excellent', 'amazing', 'wonderful', 'fantastic', 'great',
+    'outstanding', 'superb', 'brilliant', 'positive', 'successful',
+    'effective', 'efficient', 'valuable', 'important', 'significant'
+})
+
+NEGATIVE_WORDS = frozenset({
+    'bad', 'terrible', 'awful', 'horrible', 'worst', 'poor', 'negative',
+    'failure', 'problem', 'issue', 'error', 'flaw', 'defect', 'weak',
+    'inadequate', 'insufficient', 'unsatisfactory', 'disappointing'
+})
+
+EMOTION_WORDS = {
+    'happy': ['joy', 'happiness', 'pleasure', 'delight', 'excited'],
+    'sad': ['sorrow', 'grief', 'sadness', 'depression', 'unhappy'],
+    'angry': ['anger', 'rage', 'fury', 'irritation', 'annoyance'],
+    'fear': ['fear', 'terror', 'anxiety', 'worry', 'panic'],
+    'surprise': ['surprise', 'shock', 'amazement', 'astonishment']
+}
+
+
+@dataclass
+class KeywordScan:
+    """Keyword hits of one document.
+
+    ``text`` is the lowercased title and content joined by a space, as
+    analyzed by the topic modeler; the content starts at ``content_start``.
+    ``hits`` holds ``(start, keyword)`` pairs ordered by end position.
+    """
+    text: str
+    content_start: int
+    hits: List[Tuple[int, str]]
+
+    def keywords(self, start: int = 0, end: Optional[int] = None) -> Set[str]:
+        """Distinct keywords found entirely within ``text[start:end]``."""
+        end = len(self.text) if end is None else end
+        return {
+            keyword for position, keyword in self.hits
+            if position >= start and position + len(keyword) <= end
+        }
+
+    def sentence_breaks(self) -> List[int]:
+        """Positions of the '.' separators used to split sentences."""
+        return [match.start() for match in re.finditer(r'\.', self.text)]
+
+
+class KeywordMatcher:
+    """Aho-Corasick matcher for a fixed keyword set.
+
+    The automaton is compiled into a full transition table (trie edges plus
+    failure links), so scanning costs one lookup per character whatever the
+    number of keywords, and reports every occurrence, overlaps included.
+    """
+
+    def __init__(self, keywords: Iterable[str]):
+        """Build the automaton.
+
+        Args:
+            keywords: Keywords to match (empty strings and duplicates are ignored)
+        """
+        self.keywords: Tuple[str, ...] = tuple(dict.fromkeys(k for k in keywords if k))
+        self._lengths = [len(keyword) for keyword in self.keywords]
+
+        # Trie
+        trie: List[Dict[str, int]] = [{}]
+        outputs: List[Tuple[int, ...]] = [()]
+        for index, keyword in enumerate(self.keywords):
+            state = 0
+            for char in keyword:
+                child = trie[state].get(char)
+                if child is None:
+                    child = len(trie)
+                    trie.append({})
+                    outputs.append(())
+                    trie[state][char] = child
+                state = child
+            outputs[state] += (index,)
+
+        # Failure links in breadth-first order; each state inherits the
+        # transitions of its failure state so the scan never backtracks
+        fail = [0] * len(trie)
+        transitions: List[Dict[str, int]] = [dict(trie[0])] + [{} for _ in trie[1:]]
+        queue = deque(trie[0].values())
+        while queue:
+            state = queue.popleft()
+            table = dict(transitions[fail[state]])
+            table.update(trie[state])
+            transitions[state] = table
+            for char, child in trie[state].items():
+                fail[child] = transitions[fail[state]].get(char, 0)
+                outputs[child] += outputs[fail[child]]
+                queue.append(child)
+
+        self._step = [table.get for table in transitions]
+        self._outputs = outputs
+
+    def find_all(self, text: str) -> List[Tuple[int, str]]:
+        """Find every keyword occurrence in one pass.
+
+        Args:
+            text: Text to scan (match is case sensitive)
+
+        Returns:
+            List of (start, keyword) pairs ordered by end position
+        """
+        step = self._step
+        outputs = self._outputs
+        keywords = self.keywords
+        lengths = self._lengths
+        hits = []
+        state = 0
+        for end, char in enumerate(text, 1):
+            state = step[state](char, 0)
+            if outputs[state]:
+                for index in outputs[state]:
+                    hits.append((end - lengths[index], keywords[index]))
+        return hits
+
+    def scan_document(self, document: Document) -> KeywordScan:
+        """Scan lowercased title and content of a document in one pass.
+
+        Args:
+            document: Document to scan
+
+        Returns:
+            Keyword hits for the document
+        """
+        title = (document.title or "").lower()
+        text = f"{title} {(document.formatted_preview or '').lower()}"
+        return KeywordScan(text=text, content_start=len(title) + 1, hits=self.find_all(text))
+
+
+_shared_keyword_matcher: Optional[KeywordMatcher] = None
+_shared_matcher_lock = threading.Lock()
+
+
+def get_keyword_matcher() -> KeywordMatcher:
+    """Get the process-wide matcher for all topic and sentiment lexicons.
+
+    Returns:
+        Shared KeywordMatcher instance
+    """
+    global _shared_keyword_matcher
+    if _shared_keyword_matcher is None:
+        with _shared_matcher_lock:
+            if _shared_keyword_matcher is None:
+                keywords = [k for keywords in TOPIC_KEYWORDS.values() for k in keywords]
+                keywords += [k for keywords in EMOTION_WORDS.values() for k in keywords]
+                keywords += sorted(POSITIVE_WORDS | NEGATIVE_WORDS)
+                _shared_keyword_matcher = KeywordMatcher(keywords)
+    return _shared_keyword_matcher
 
 
 class TopicModeler:
@@ -213,41 +504,22 @@ class TopicModeler:
         self.logger = logging.getLogger(__name__)
 
         # Academic topic keywords
-        self.topic_keywords = {
-            'machine_learning': [
-                'algorithm', 'neural network', 'deep learning', 'classification',
-                'regression', 'clustering', 'supervised', 'unsupervised', 'training',
-                'validation', 'accuracy', 'precision', 'recall', 'model'
-            ],
-            'statistics': [
-                'probability', 'distribution', 'hypothesis', 'significance',
-                'correlation', 'regression', 'anova', 'chi-square', 'p-value',
-                'confidence interval', 'sample', 'population', 'mean', 'median'
-            ],
-            'programming': [
-                'function', 'variable', 'class', 'object', 'method', 'loop',
-                'condition', 'array', 'string', 'integer', 'boolean', 'syntax',
-                'compile', 'debug', 'algorithm', 'data structure'
-            ],
-            'research': [
-                'study', 'experiment', 'analysis', 'methodology', 'conclusion',
-                'finding', 'result', 'evidence', 'theory', 'hypothesis', 'data',
-                'sample', 'population', 'variable', 'control', 'treatment'
-            ],
-            'mathematics': [
-                'equation', 'function', 'variable', 'constant', 'theorem', 'proof',
-                'geometry', 'algebra', 'calculus', 'matrix', 'vector', 'set',
-                'number', 'operation', 'solve', 'calculate', 'formula'
-            ]
-        }
+        self.topic_keywords = TOPIC_KEYWORDS
+        self.keyword_matcher = get_keyword_matcher()
 
     @handle_errors(operation="extract_topics", component="topic_modeler")
-    def extract_topics(self, document: Document, max_topics: int = 5) -> List[Topic]:
+    def extract_topics(
+        self,
+        document: Document,
+        max_topics: int = 5,
+        scan: Optional[KeywordScan] = None
+    ) -> List[Topic]:
         """Extract topics from document.
 
         Args:
             document: Document to analyze
             max_topics: Maximum number of topics to extract
+            scan: Keyword hits of the document, scanned here when not given
 
         Returns:
             List of extracted topics
@@ -258,14 +530,17 @@ class TopicModeler:
         if not text and not title:
             return []
 
-        # Combine title and content for analysis
-        full_text = f"{title} {text}".lower()
+        # Title and content are matched together in one pass
+        if scan is None:
+            scan = self.keyword_matcher.scan_document(document)
+        found = scan.keywords()
+        title_found = scan.keywords(end=scan.content_start - 1)
 
         # Calculate topic relevance
         topic_scores = {}
 
         for topic_name, keywords in self.topic_keywords.items():
-            score = self._calculate_topic_score(full_text, keywords, title)
+            score = self._calculate_topic_score(found, keywords, title_found)
             if score > 0.1:  # Minimum relevance threshold
                 topic_scores[topic_name] = score
 
@@ -274,36 +549,28 @@ class TopicModeler:
 
         # Create topic objects
         topics = []
+        sentence_breaks = scan.sentence_breaks() if sorted_topics else []
         for topic_name, score in sorted_topics[:max_topics]:
             topic = Topic(
                 name=topic_name,
                 keywords=self.topic_keywords[topic_name],
                 relevance_score=score,
-                document_sections=self._identify_relevant_sections(full_text, topic_name)
+                document_sections=self._identify_relevant_sections(scan, topic_name, sentence_breaks)
             )
             topics.append(topic)
 
         return topics
 
-    def _calculate_topic_score(self, text: str, keywords: List[str], title: str) -> float:
+    def _calculate_topic_score(self, found: Set[str], keywords: List[str], title_found: Set[str]) -> float:
         """Calculate relevance score for topic."""
-        score = 0.0
-        text_words = set(text.split())
-
         # Count keyword matches
-        keyword_matches = 0
-        for keyword in keywords:
-            if keyword in text:
-                keyword_matches += 1
+        keyword_matches = sum(1 for keyword in keywords if keyword in found)
 
         # Normalize by total keywords
         keyword_score = keyword_matches / len(keywords)
 
         # Boost for title matches
-        title_matches = 0
-        for keyword in keywords:
-            if keyword in title.lower():
-                title_matches += 1
+        title_matches = sum(1 for keyword in keywords if keyword in title_found)
 
         title_boost = title_matches / len(keywords) * 0.3
 
@@ -311,16 +578,33 @@ class TopicModeler:
 
         return min(score, 1.0)
 
-    def _identify_relevant_sections(self, text: str, topic_name: str) -> List[str]:
+    def _identify_relevant_sections(
+        self,
+        scan: KeywordScan,
+        topic_name: str,
+        sentence_breaks: List[int]
+    ) -> List[str]:
         """Identify relevant sections for topic."""
+        keywords = set(self.topic_keywords[topic_name])
         sections = []
-        sentences = text.split('.')
-
-        for sentence in sentences:
-            if any(keyword in sentence for keyword in self.topic_keywords[topic_name]):
-                sections.append(sentence.strip())
-
-        return sections[:3]  # Return top 3 relevant sections
+        last_sentence = -1
+
+        # Hits are ordered by position and never span a '.', so the sentence
+        # index of consecutive hits is non-decreasing
+        for start, keyword in scan.hits:
+            if keyword not in keywords:
+                continue
+            sentence = bisect_right(sentence_breaks, start)
+            if sentence == last_sentence:
+                continue
+            last_sentence = sentence
+            begin = sentence_breaks[sentence - 1] + 1 if sentence else 0
+            end = sentence_breaks[sentence] if sentence < len(sentence_breaks) else len(scan.text)
+            sections.append(scan.text[begin:end].strip())
+            if len(sections) == 3:  # Return top 3 relevant sections
+                break
+
+        return sections
 
 
 class SentimentAnalyzer:
@@ -331,32 +615,18 @@ class SentimentAnalyzer:
         self.logger = logging.getLogger(__name__)
 
         # Sentiment word lists
-        self.positive_words = {
-            'good', 'excellent', 'amazing', 'wonderful', 'fantastic', 'great',
-            'outstanding', 'superb', 'brilliant', 'positive', 'successful',
-            'effective', 'efficient', 'valuable', 'important', 'significant'
-        }
-
-        self.negative_words = {
-            'bad', 'terrible', 'awful', 'horrible', 'worst', 'poor', 'negative',
-            'failure', 'problem', 'issue', 'error', 'flaw', 'defect', 'weak',
-            'inadequate', 'insufficient', 'unsatisfactory', 'disappointing'
-        }
-
-        self.emotion_words = {
-            'happy': ['joy', 'happiness', 'pleasure', 'delight', 'excited'],
-            'sad': ['sorrow', 'grief', 'sadness', 'depression', 'unhappy'],
-            'angry': ['anger', 'rage', 'fury', 'irritation', 'annoyance'],
-            'fear': ['fear', 'terror', 'anxiety', 'worry', 'panic'],
-            'surprise': ['surprise', 'shock', 'amazement', 'astonishment']
-        }
+        self.positive_words = POSITIVE_WORDS
+        self.negative_words = NEGATIVE_WORDS
+        self.emotion_words = EMOTION_WORDS
+        self.keyword_matcher = get_keyword_matcher()
 
     @handle_errors(operation="analyze_sentiment", component="sentiment_analyzer")
-    def analyze_sentiment(self, document: Document) -> SentimentResult:
+    def analyze_sentiment(self, document: Document, scan: Optional[KeywordScan] = None) -> SentimentResult:
         """Analyze sentiment of document content.
 
         Args:
             document: Document to analyze
+            scan: Keyword hits of the document, scanned here when not given
 
         Returns:
             Sentiment analysis result
@@ -370,12 +640,29 @@ class SentimentAnalyzer:
                 confidence=0.0
             )
 
-        text_lower = text.lower()
-        words = text_lower.split()
-
-        # Count sentiment words
-        positive_count = sum(1 for word in words if word in self.positive_words)
-        negative_count = sum(1 for word in words if word in self.negative_words)
+        if scan is None:
+            scan = self.keyword_matcher.scan_document(document)
+        text_lower = scan.text
+        content_start = scan.content_start
+        word_count = len(text_lower[content_start:].split())
+
+        # Count sentiment words: lexicon hits that are whole whitespace tokens
+        positive_count = 0
+        negative_count = 0
+        opinion_count = 0
+        for start, keyword in scan.hits:
+            if start < content_start:
+                continue
+            is_positive = keyword in self.positive_words
+            is_negative = keyword in self.negative_words
+            if not (is_positive or is_negative):
+                continue
+            end = start + len(keyword)
+            if not text_lower[start - 1].isspace() or (end < len(text_lower) and not text_lower[end].isspace()):
+                continue
+            positive_count += is_positive
+            negative_count += is_negative
+            opinion_count += 1
 
         # Calculate polarity
         total_sentiment_words = positive_count + negative_count
@@ -385,18 +672,18 @@ class SentimentAnalyzer:
             polarity = (positive_count - negative_count) / total_sentiment_words
 
         # Calculate subjectivity (presence of opinion words)
-        opinion_words = self.positive_words | self.negative_words
-        opinion_count = sum(1 for word in words if word in opinion_words)
-        subjectivity = min(opinion_count / len(words), 1.0) if words else 0.0
+        subjectivity = min(opinion_count / word_count, 1.0) if word_count else 0.0
 
         # Calculate confidence based on sentiment word density
-        confidence = min(total_sentiment_words / len(words) * 5, 1.0) if words else 0.0
+        confidence = min(total_sentiment_words / word_count * 5, 1.0) if word_count else 0.0
+
+        content_found = scan.keywords(start=content_start)
 
         # Determine dominant emotion
-        dominant_emotion = self._determine_dominant_emotion(text_lower)
+        dominant_emotion = self._determine_dominant_emotion(content_found)
 
         # Calculate emotion scores
-        emotion_scores = self._calculate_emotion_scores(text_lower)
+        emotion_scores = self._calculate_emotion_scores(content_found, word_count)
 
         return SentimentResult(
             polarity=polarity,
@@ -406,12 +693,12 @@ class SentimentAnalyzer:
             emotion_scores=emotion_scores
         )
 
-    def _determine_dominant_emotion(self, text: str) -> Optional[str]:
-        """Determine dominant emotion in text."""
+    def _determine_dominant_emotion(self, found: Set[str]) -> Optional[str]:
+        """Determine dominant emotion from the keywords found in the text."""
         emotion_scores = {}
 
         for emotion, keywords in self.emotion_words.items():
-            matches = sum(1 for keyword in keywords if keyword in text)
+            matches = sum(1 for keyword in keywords if keyword in found)
             if matches > 0:
                 emotion_scores[emotion] = matches
 
@@ -420,15 +707,15 @@ class SentimentAnalyzer:
 
         return None
 
-    def _calculate_emotion_scores(self, text: str) -> Dict[str, float]:
-        """Calculate emotion scores."""
+    def _calculate_emotion_scores(self, found: Set[str], word_count: int) -> Dict[str, float]:
+        """Calculate emotion scores from the keywords found in the text."""
         emotion_scores = {}
 
         for emotion, keywords in self.emotion_words.items():
-            matches = sum(1 for keyword in keywords if keyword in text)
+            matches = sum(1 for keyword in keywords if keyword in found)
             if matches > 0:
                 # Normalize by text length
-                emotion_scores[emotion] = min(matches / len(text.split()) * 10, 1.0)
+                emotion_scores[emotion] = min(matches / word_count * 10, 1.0)
 
         return emotion_scores
 
@@ -638,10 +925,11 @@ class DocumentIntelligenceEngine:
         self.logger = logging.getLogger(__name__)
 
         # Initialize components
-        self.entity_extractor = EntityExtractor()
+        self.entity_extractor = get_entity_extractor()
         self.topic_modeler = TopicModeler()
         self.sentiment_analyzer = SentimentAnalyzer()
         self.similarity_engine = DocumentSimilarityEngine()
+        self.keyword_matcher = get_keyword_matcher()
 
     @handle_errors(operation="analyze_document", component="document_intelligence")
     def analyze_document(self, document: Document) -> Dict[str, Any]:
@@ -677,8 +965,11 @@ class DocumentIntelligenceEngine:
                 for entity in entities
             ]
 
+            # One keyword pass shared by topic modeling and sentiment analysis
+            scan = self.keyword_matcher.scan_document(document)
+
             # Extract topics
-            topics = self.topic_modeler.extract_topics(document)
+            topics = self.topic_modeler.extract_topics(document, scan=scan)
             analysis_results['topics'] = [
                 {
                     'name': topic.name,
@@ -690,7 +981,7 @@ class DocumentIntelligenceEngine:
             ]
 
             # Analyze sentiment
-            sentiment = self.sentiment_analyzer.analyze_sentiment(document)
+            sentiment = self.sentiment_analyzer.analyze_sentiment(document, scan=scan)
             analysis_results['sentiment'] = {
                 'polarity': sentiment.polarity,
                 'subjectivity': sentiment.subjectivity,
@@ -896,6 +1187,9 @@ class DocumentIntelligenceEngine:
     def batch_analyze_documents(self, documents: List[Document]) -> List[Dict[str, Any]]:
         """Analyze multiple documents in batch.
 
+        Each document is scanned once by the shared keyword matcher, so the
+        cost grows linearly with the total text size.
+
         Args:
             documents: List of documents to analyze
 
@@ -1050,8 +1344,7 @@ def extract_entities_from_document(document: Document) -> List[Entity]:
     Returns:
         List of extracted entities
     """
-    engine = DocumentIntelligenceEngine()
-    return engine.entity_extractor.extract_entities(document)
+    return get_entity_extractor().extract_entities(document)
 
 
 def analyze_document_sentiment(document: Document) -> SentimentResult:
@@ -0,0 +1,164 @@
+"""
+Per-document token statistics for Archivista AI.
+
+Context documents are tokenized once per (id, updated_at) and the resulting
+term sets and metadata flags are shared by every response scored against them.
+"""
+
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Any, FrozenSet, Hashable, Optional
+
+from ...database.models.base import Document
+
+# Maximum number of documents kept in the shared cache
+DOCUMENT_STATS_CACHE_SIZE = 4096
+
+
+def _parse_timestamp(value: Any) -> Optional[datetime]:
+    """Parse a datetime or ISO string into a naive UTC datetime."""
+    if not value:
+        return None
+    if isinstance(value, str):
+        try:
+            value = datetime.fromisoformat(value)
+        except ValueError:
+            return None
+    if not isinstance(value, datetime):
+        return None
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+@dataclass(frozen=True)
+class DocumentTermStats:
+    """Pre-tokenized terms and metadata flags of a document."""
+    title_terms: FrozenSet[str]
+    content_terms: FrozenSet[str]
+    keyword_terms: FrozenSet[str]
+    content_term_count: int
+    is_processed: bool
+    has_title: bool
+    has_keywords: bool
+    has_content_hash: bool
+    created_at: Optional[datetime]
+
+    @classmethod
+    def from_document(cls, document: Document) -> "DocumentTermStats":
+        """Tokenize title, preview and keywords of a document.
+
+        Args:
+            document: Document to tokenize
+
+        Returns:
+            Term statistics for the document
+        """
+        title = getattr(document, 'title', None)
+        preview = getattr(document, 'formatted_preview', None)
+        keywords = getattr(document, 'keywords', None)
+        status = getattr(document, 'processing_status', None)
+
+        content_tokens = preview.lower().split() if preview else []
+        return cls(
+            title_terms=frozenset(title.lower().split()) if title else frozenset(),
+            content_terms=frozenset(content_tokens),
+            keyword_terms=frozenset(' '.join(keywords).lower().split()) if keywords else frozenset(),
+            content_term_count=len(content_tokens),
+            is_processed=getattr(status, 'value', status) == 'completed',
+            has_title=bool(title),
+            has_keywords=bool(keywords),
+            has_content_hash=bool(getattr(document, 'content_hash', None)),
+            created_at=_parse_timestamp(getattr(document, 'created_at', None))
+        )
+
+    def age_days(self, now: datetime) -> Optional[int]:
+        """Age of the document in whole days, or None without a creation date."""
+        if self.created_at is None:
+            return None
+        return (now - self.created_at).days
+
+
+class DocumentStatsCache:
+    """LRU cache of DocumentTermStats keyed by document id and updated_at.
+
+    Documents without an id are tokenized on every call, since there is
+    no key that would detect a change to their content.
+    """
+
+    def __init__(self, max_size: int = DOCUMENT_STATS_CACHE_SIZE):
+        """Initialize the cache.
+
+        Args:
+            max_size: Maximum number of cached documents
+        """
+        self.max_size = max_size
+        self._entries: "OrderedDict[Hashable, DocumentTermStats]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def cache_key(document: Document) -> Optional[Hashable]:
+        """Cache key of a document: (id, updated_at), or None when uncacheable."""
+        document_id = getattr(document, 'id', None)
+        if document_id is None:
+            return None
+        return document_id, str(getattr(document, 'updated_at', None))
+
+    def get(self, document: Document) -> DocumentTermStats:
+        """Get the term statistics of a document, tokenizing it on a miss.
+
+        Args:
+            document: Context document
+
+        Returns:
+            Cached or freshly computed term statistics
+        """
+        key = self.cache_key(document)
+        if key is not None:
+            with self._lock:
+                stats = self._entries.get(key)
+                if stats is not None:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return stats
+
+        stats = DocumentTermStats.from_document(document)
+        with self._lock:
+            self.misses += 1
+            if key is not None:
+                self._entries[key] = stats
+                while len(self._entries) > self.max_size:
+                    self._entries.popitem(last=False)
+        return stats
+
+    def clear(self) -> None:
+        """Drop every cached entry."""
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+_shared_stats_cache: Optional[DocumentStatsCache] = None
+_shared_stats_lock = threading.Lock()
+
+
+def get_document_stats_cache() -> DocumentStatsCache:
+    """Get the process-wide document statistics cache.
+
+    Returns:
+        Shared DocumentStatsCache instance
+    """
+    global _shared_stats_cache
+    if _shared_stats_cache is None:
+        with _shared_stats_lock:
+            if _shared_stats_cache is None:
+                _shared_stats_cache = DocumentStatsCache()
+    return _shared_stats_cache
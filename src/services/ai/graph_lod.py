@@ -0,0 +1,420 @@
+"""
+Level-of-detail support for rendering large knowledge graphs.
+
+Layout coordinates are computed server-side once per graph version: clusters
+are placed first, then their members around each cluster centre. Nodes are
+indexed in a uniform grid, so viewport and tile queries only touch the cells
+that are visible. At low zoom clusters collapse into super-nodes. Payloads
+stay bounded regardless of graph size.
+"""
+
+import hashlib
+import math
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import networkx as nx
+import numpy as np
+
+
+# Tile zoom levels below this render clusters as super-nodes
+CLUSTER_ZOOM_THRESHOLD = 2
+# Graphs up to this size are rendered in full, without tiling
+FULL_RENDER_LIMIT = 500
+MAX_VIEWPORT_NODES = 1500
+MAX_VIEWPORT_EDGES = 4000
+GRID_RESOLUTION = 128
+LAYOUT_CACHE_SIZE = 8
+CLUSTER_LAYOUT_ITERATIONS = 50
+MEMBER_LAYOUT_ITERATIONS = 30
+# Larger clusters are laid out on a spiral (hubs at the centre) instead of a spring layout
+MAX_SPRING_CLUSTER_SIZE = 100
+LAYOUT_SEED = 42
+UNCLUSTERED_ID = "cluster_unassigned"
+
+_GOLDEN_ANGLE = math.pi * (3 - math.sqrt(5))
+
+
+def graph_fingerprint(graph: nx.Graph) -> str:
+    """Stable version identifier of a graph's content.
+
+    Covers everything a layout copies from the graph: node ids with their
+    `label`, `type` and `confidence`, and edges with their weight.
+
+    Args:
+        graph: NetworkX graph
+
+    Returns:
+        Hex digest that changes whenever nodes, edges or their attributes change
+    """
+    digest = hashlib.sha1()
+    nodes = sorted((str(node), data) for node, data in graph.nodes(data=True))
+    for node_id, data in nodes:
+        for value in (node_id, data.get('label', node_id), data.get('type', 'concept'), data.get('confidence')):
+            digest.update(repr(value).encode("utf-8"))
+            digest.update(b"\x00")
+    digest.update(b"\x01")
+    edges = sorted(
+        ("\x00".join(sorted((str(u), str(v)))), repr(data.get('confidence', data.get('weight', 1.0))))
+        for u, v, data in graph.edges(data=True)
+    )
+    for edge, weight in edges:
+        digest.update(edge.encode("utf-8"))
+        digest.update(b"\x00")
+        digest.update(weight.encode("utf-8"))
+        digest.update(b"\x01")
+    return digest.hexdigest()
+
+
+@dataclass
+class GraphLayout:
+    """Precomputed layout of one graph version with a grid spatial index.
+
+    Positions are normalised to the unit square; tile (z, x, y) covers
+    [x / 2^z, (x + 1) / 2^z) horizontally and likewise vertically.
+    """
+    version: str
+    node_ids: List[str]
+    labels: List[str]
+    types: List[str]
+    confidence: np.ndarray
+    positions: np.ndarray
+    degree: np.ndarray
+    node_cluster: np.ndarray
+    edge_src: np.ndarray
+    edge_dst: np.ndarray
+    edge_weight: np.ndarray
+    cluster_ids: List[str]
+    cluster_names: List[str]
+    cluster_centers: np.ndarray
+    cluster_radius: np.ndarray
+    cluster_sizes: np.ndarray
+    cluster_edge_src: np.ndarray
+    cluster_edge_dst: np.ndarray
+    cluster_edge_weight: np.ndarray
+    cell_order: np.ndarray
+    cell_ptr: np.ndarray
+    _index: Dict[str, int] = field(init=False, repr=False)
+
+    def __post_init__(self):
+        self._index = {node: i for i, node in enumerate(self.node_ids)}
+
+    @property
+    def node_count(self) -> int:
+        return len(self.node_ids)
+
+    def position_of(self, node_id: str) -> Optional[Tuple[float, float]]:
+        """Layout position of a node, if present."""
+        i = self._index.get(node_id)
+        return None if i is None else (float(self.positions[i, 0]), float(self.positions[i, 1]))
+
+    def query_viewport(
+        self,
+        bounds: Tuple[float, float, float, float] = (0.0, 0.0, 1.0, 1.0),
+        zoom: int = 0,
+        max_nodes: int = MAX_VIEWPORT_NODES,
+        max_edges: int = MAX_VIEWPORT_EDGES
+    ) -> Dict[str, Any]:
+        """Return only what is visible in a viewport at a given zoom level.
+
+        Args:
+            bounds: (x0, y0, x1, y1) in layout coordinates
+            zoom: Tile zoom level; below CLUSTER_ZOOM_THRESHOLD clusters collapse
+            max_nodes: Maximum nodes (or super-nodes) returned, highest degree first
+            max_edges: Maximum edges returned, highest weight first
+
+        Returns:
+            JSON-serialisable payload with level, nodes and edges
+        """
+        x0, y0, x1, y1 = bounds
+        if zoom < CLUSTER_ZOOM_THRESHOLD and len(self.cluster_ids) > 1:
+            return self._query_clusters(x0, y0, x1, y1, zoom, max_nodes, max_edges)
+
+        visible = self._nodes_in_bounds(x0, y0, x1, y1)
+        truncated = visible.size > max_nodes
+        if truncated:
+            visible = visible[np.argpartition(-self.degree[visible], max_nodes - 1)[:max_nodes]]
+
+        member = np.zeros(self.node_count, dtype=bool)
+        member[visible] = True
+        edges = np.nonzero(member[self.edge_src] & member[self.edge_dst])[0]
+        if edges.size > max_edges:
+            edges = edges[np.argpartition(-self.edge_weight[edges], max_edges - 1)[:max_edges]]
+            truncated = True
+
+        return {
+            'level': 'nodes',
+            'version': self.version,
+            'zoom': zoom,
+            'bounds': [x0, y0, x1, y1],
+            'truncated': bool(truncated),
+            'nodes': [
+                {
+                    'id': self.node_ids[i],
+                    'label': self.labels[i],
+                    'type': self.types[i],
+                    'confidence': float(self.confidence[i]),
+                    'x': float(self.positions[i, 0]),
+                    'y': float(self.positions[i, 1]),
+                    'degree': int(self.degree[i]),
+                    'cluster': self.cluster_ids[self.node_cluster[i]],
+                }
+                for i in visible.tolist()
+            ],
+            'edges': [
+                {
+                    'source': self.node_ids[self.edge_src[e]],
+                    'target': self.node_ids[self.edge_dst[e]],
+                    'weight': float(self.edge_weight[e]),
+                }
+                for e in edges.tolist()
+            ],
+        }
+
+    def query_tile(self, z: int, x: int, y: int, max_nodes: int = MAX_VIEWPORT_NODES) -> Dict[str, Any]:
+        """Return the payload of tile (z, x, y)."""
+        size = 1.0 / (1 << z)
+        payload = self.query_viewport((x * size, y * size, (x + 1) * size, (y + 1) * size), z, max_nodes)
+        payload['tile'] = [z, x, y]
+        return payload
+
+    def _nodes_in_bounds(self, x0: float, y0: float, x1: float, y1: float) -> np.ndarray:
+        """Node indices inside the bounds, reading only the overlapping grid cells."""
+        g = GRID_RESOLUTION
+        gx0, gx1 = (int(np.clip(v * g, 0, g - 1)) for v in (x0, x1))
+        gy0, gy1 = (int(np.clip(v * g, 0, g - 1)) for v in (y0, y1))
+        # Cells of one grid row between gx0 and gx1 are contiguous in cell_order
+        chunks = [
+            self.cell_order[self.cell_ptr[row * g + gx0]:self.cell_ptr[row * g + gx1 + 1]]
+            for row in range(gy0, gy1 + 1)
+        ]
+        candidates = np.concatenate(chunks) if chunks else np.zeros(0, dtype=np.int64)
+        pos = self.positions[candidates]
+        inside = (pos[:, 0] >= x0) & (pos[:, 0] <= x1) & (pos[:, 1] >= y0) & (pos[:, 1] <= y1)
+        return candidates[inside]
+
+    def _query_clusters(self, x0, y0, x1, y1, zoom, max_nodes, max_edges) -> Dict[str, Any]:
+        """Super-node view: one node per cluster, edges aggregated between clusters."""
+        centers, radius = self.cluster_centers, self.cluster_radius
+        visible = np.nonzero(
+            (centers[:, 0] + radius >= x0) & (centers[:, 0] - radius <= x1) &
+            (centers[:, 1] + radius >= y0) & (centers[:, 1] - radius <= y1)
+        )[0]
+        truncated = visible.size > max_nodes
+        if truncated:
+            visible = visible[np.argpartition(-self.cluster_sizes[visible], max_nodes - 1)[:max_nodes]]
+
+        member = np.zeros(len(self.cluster_ids), dtype=bool)
+        member[visible] = True
+        edges = np.nonzero(member[self.cluster_edge_src] & member[self.cluster_edge_dst])[0]
+        if edges.size > max_edges:
+            edges = edges[np.argpartition(-self.cluster_edge_weight[edges], max_edges - 1)[:max_edges]]
+
+        return {
+            'level': 'clusters',
+            'version': self.version,
+            'zoom': zoom,
+            'bounds': [x0, y0, x1, y1],
+            'truncated': bool(truncated),
+            'nodes': [
+                {
+                    'id': self.cluster_ids[c],
+                    'label': self.cluster_names[c],
+                    'type': 'cluster',
+                    'size': int(self.cluster_sizes[c]),
+                    'x': float(centers[c, 0]),
+                    'y': float(centers[c, 1]),
+                    'radius': float(radius[c]),
+                }
+                for c in visible.tolist()
+            ],
+            'edges': [
+                {
+                    'source': self.cluster_ids[self.cluster_edge_src[e]],
+                    'target': self.cluster_ids[self.cluster_edge_dst[e]],
+                    'weight': float(self.cluster_edge_weight[e]),
+                }
+                for e in edges.tolist()
+            ],
+        }
+
+
+def _normalise_to_disk(coords: np.ndarray) -> np.ndarray:
+    """Centre coordinates and scale them into the unit disk."""
+    coords = coords - coords.mean(axis=0)
+    extent = np.sqrt((coords ** 2).sum(axis=1)).max()
+    return coords / extent if extent > 0 else coords
+
+
+def _spiral(count: int) -> np.ndarray:
+    """Evenly spread points in the unit disk (phyllotaxis), densest first."""
+    i = np.arange(count)
+    r = np.sqrt((i + 0.5) / count)
+    theta = i * _GOLDEN_ANGLE
+    return np.column_stack([r * np.cos(theta), r * np.sin(theta)])
+
+
+def compute_layout(graph: nx.Graph, clusters: Dict[str, Any], version: str) -> GraphLayout:
+    """Compute a cluster-first layout and its spatial index.
+
+    Node `label`, `type` and `confidence` attributes are copied into the
+    layout so viewport payloads do not need the graph.
+
+    Args:
+        graph: NetworkX graph
+        clusters: Mapping cluster_id -> object with `name` and `nodes`
+        version: Graph version the layout belongs to
+
+    Returns:
+        GraphLayout for the given version
+    """
+    node_ids = [str(n) for n in graph.nodes()]
+    index = {node: i for i, node in enumerate(node_ids)}
+    n = len(node_ids)
+
+    edge_list = [(index[str(u)], index[str(v)], data.get('confidence', data.get('weight', 1.0)) or 0.0)
+                 for u, v, data in graph.edges(data=True)]
+    edge_src = np.asarray([e[0] for e in edge_list], dtype=np.int64)
+    edge_dst = np.asarray([e[1] for e in edge_list], dtype=np.int64)
+    edge_weight = np.asarray([e[2] for e in edge_list], dtype=np.float64)
+    degree = np.bincount(np.concatenate([edge_src, edge_dst]), minlength=n) if edge_list else np.zeros(n, dtype=np.int64)
+
+    # Cluster assignment: first cluster wins, leftovers go to a shared bucket
+    cluster_ids: List[str] = []
+    cluster_names: List[str] = []
+    node_cluster = np.full(n, -1, dtype=np.int64)
+    for cluster_id in sorted(clusters):
+        members = [index[str(m)] for m in clusters[cluster_id].nodes if str(m) in index]
+        members = [m for m in members if node_cluster[m] < 0]
+        if members:
+            node_cluster[members] = len(cluster_ids)
+            cluster_ids.append(cluster_id)
+            cluster_names.append(clusters[cluster_id].name)
+    if (node_cluster < 0).any() or not cluster_ids:
+        node_cluster[node_cluster < 0] = len(cluster_ids)
+        cluster_ids.append(UNCLUSTERED_ID)
+        cluster_names.append("Unclustered")
+
+    c = len(cluster_ids)
+    cluster_sizes = np.bincount(node_cluster, minlength=c)
+
+    # Aggregated edges between clusters
+    cs, cd = node_cluster[edge_src], node_cluster[edge_dst]
+    cross = cs != cd
+    pair_keys = np.minimum(cs[cross], cd[cross]) * c + np.maximum(cs[cross], cd[cross])
+    unique_pairs, pair_counts = np.unique(pair_keys, return_counts=True)
+    cluster_edge_src, cluster_edge_dst = unique_pairs // c, unique_pairs % c
+    cluster_edge_weight = pair_counts.astype(np.float64)
+
+    # Cluster centres
+    if c == 1:
+        cluster_centers = np.full((1, 2), 0.5)
+    else:
+        cluster_graph = nx.Graph()
+        cluster_graph.add_nodes_from(range(c))
+        cluster_graph.add_weighted_edges_from(zip(cluster_edge_src.tolist(), cluster_edge_dst.tolist(),
+                                                  cluster_edge_weight.tolist()))
+        pos = nx.spring_layout(cluster_graph, weight='weight', iterations=CLUSTER_LAYOUT_ITERATIONS, seed=LAYOUT_SEED)
+        cluster_centers = 0.5 + 0.4 * _normalise_to_disk(np.asarray([pos[i] for i in range(c)], dtype=np.float64))
+    cluster_radius = 0.4 * np.sqrt(cluster_sizes / max(n, 1)) if c > 1 else np.full(1, 0.45)
+
+    # Members around their cluster centre
+    positions = np.zeros((n, 2), dtype=np.float64)
+    for cluster in range(c):
+        members = np.nonzero(node_cluster == cluster)[0]
+        if members.size == 1:
+            local = np.zeros((1, 2))
+        elif members.size <= MAX_SPRING_CLUSTER_SIZE:
+            subgraph = graph.subgraph([node_ids[m] for m in members])
+            pos = nx.spring_layout(subgraph, iterations=MEMBER_LAYOUT_ITERATIONS, seed=LAYOUT_SEED)
+            local = _normalise_to_disk(np.asarray([pos[node_ids[m]] for m in members], dtype=np.float64))
+        else:
+            members = members[np.argsort(-degree[members], kind='stable')]
+            local = _spiral(members.size)
+        positions[members] = cluster_centers[cluster] + cluster_radius[cluster] * local
+    np.clip(positions, 0.0, 1.0, out=positions)
+
+    # Grid index: nodes sorted by cell, highest degree first inside each cell
+    g = GRID_RESOLUTION
+    cells = (np.minimum((positions[:, 1] * g).astype(np.int64), g - 1) * g
+             + np.minimum((positions[:, 0] * g).astype(np.int64), g - 1))
+    cell_order = np.lexsort((-degree, cells))
+    cell_ptr = np.zeros(g * g + 1, dtype=np.int64)
+    np.cumsum(np.bincount(cells, minlength=g * g), out=cell_ptr[1:])
+
+    attributes = [graph.nodes[node] for node in graph.nodes()]
+    return GraphLayout(
+        version=version,
+        node_ids=node_ids,
+        labels=[str(data.get('label', node)) for node, data in zip(node_ids, attributes)],
+        types=[data.get('type', 'concept') for data in attributes],
+        confidence=np.asarray([data.get('confidence') or 0.0 for data in attributes], dtype=np.float64),
+        positions=positions,
+        degree=degree,
+        node_cluster=node_cluster,
+        edge_src=edge_src,
+        edge_dst=edge_dst,
+        edge_weight=edge_weight,
+        cluster_ids=cluster_ids,
+        cluster_names=cluster_names,
+        cluster_centers=cluster_centers,
+        cluster_radius=cluster_radius,
+        cluster_sizes=cluster_sizes,
+        cluster_edge_src=cluster_edge_src,
+        cluster_edge_dst=cluster_edge_dst,
+        cluster_edge_weight=cluster_edge_weight,
+        cell_order=cell_order,
+        cell_ptr=cell_ptr,
+    )
+
+
+class GraphLayoutCache:
+    """LRU cache of layouts keyed by graph version."""
+
+    def __init__(self, max_versions: int = LAYOUT_CACHE_SIZE):
+        """Initialize layout cache.
+
+        Args:
+            max_versions: Number of graph versions kept in memory
+        """
+        self.max_versions = max_versions
+        self._layouts: "OrderedDict[str, GraphLayout]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'computes': 0}
+
+    def get_or_compute(self, version: str, compute: Callable[[], GraphLayout]) -> GraphLayout:
+        """Return the cached layout for a version, computing it on a miss.
+
+        Args:
+            version: Graph version (see graph_fingerprint)
+            compute: Factory invoked only on a cache miss
+
+        Returns:
+            Layout of the requested version
+        """
+        with self._lock:
+            layout = self._layouts.get(version)
+            if layout is not None:
+                self._layouts.move_to_end(version)
+                self.stats['hits'] += 1
+                return layout
+
+        layout = compute()
+        with self._lock:
+            self._layouts[version] = layout
+            self._layouts.move_to_end(version)
+            while len(self._layouts) > self.max_versions:
+                self._layouts.popitem(last=False)
+            self.stats['computes'] += 1
+        return layout
+
+    def clear(self) -> None:
+        """Drop all cached layouts."""
+        with self._lock:
+            self._layouts.clear()
+
+
+# Global layout cache
+graph_layout_cache = GraphLayoutCache()
@@ -17,6 +17,14 @@ import base64
 
 from ...database.models.base import Document, ConceptEntity, ConceptRelationship
 from ...core.errors.error_handler import handle_errors
+from .graph_lod import (
+    CLUSTER_ZOOM_THRESHOLD,
+    FULL_RENDER_LIMIT,
+    GraphLayout,
+    graph_fingerprint,
+    graph_layout_cache,
+    compute_layout,
+)
 
 
 @dataclass
@@ -55,6 +63,8 @@ class GraphCluster:
 class KnowledgeGraphBuilder:
     """Builds and maintains knowledge graph from documents."""
 
+    BETWEENNESS_PIVOTS = 64
+
     def __init__(self, document_repository):
         """Initialize knowledge graph builder.
 
@@ -71,6 +81,8 @@ class KnowledgeGraphBuilder:
 
         # Graph analysis
         self.graph = nx.Graph()
+        self._centrality_cache: Optional[Dict[str, Dict[str, float]]] = None
+        self.graph_version: Optional[str] = None
 
     @handle_errors(operation="build_knowledge_graph", component="knowledge_graph_builder")
     def build_knowledge_graph(self, project_id: str, user_id: str = None) -> Dict[str, Any]:
@@ -105,6 +117,7 @@ class KnowledgeGraphBuilder:
                 'edges': [edge.__dict__ for edge in self.edges.values()],
                 'clusters': [cluster.__dict__ for cluster in self.clusters.values()],
                 'metrics': metrics,
+                'graph_version': self.graph_version,
                 'build_timestamp': datetime.utcnow().isoformat(),
                 'document_count': len(documents),
                 'entity_count': len(entities),
@@ -119,17 +132,23 @@ class KnowledgeGraphBuilder:
         """Extract all entities from documents."""
         entities = []
 
-        for document in documents:
-            # Extract entities using document intelligence
-            try:
-                from .document_intelligence import EntityExtractor
-                extractor = EntityExtractor()
-
-                doc_entities = extractor.extract_entities(document)
-                entities.extend(doc_entities)
+        # Extract entities using document intelligence (shared extractor, batched);
+        # a failing document is logged by the extractor and contributes no entities
+        from .document_intelligence import get_entity_extractor
+        extractor = get_entity_extractor()
+        try:
+            batches = extractor.extract_entities_batch(documents)
+        except Exception as e:
+            self.logger.error(f"Batch entity extraction failed, extracting per document: {e}")
+            batches = []
+            for document in documents:
+                try:
+                    batches.append(extractor.extract_entities(document))
+                except Exception as doc_error:
+                    self.logger.error(f"Error extracting entities from {document.file_name}: {doc_error}")
 
-            except Exception as e:
-                self.logger.error(f"Error extracting entities from {document.file_name}: {e}")
+        for doc_entities in batches:
+            entities.extend(doc_entities)
 
         return entities
 
@@ -178,6 +197,7 @@ class KnowledgeGraphBuilder:
         self.nodes.clear()
         self.edges.clear()
         self.graph.clear()
+        self._centrality_cache = None
 
         # Add nodes
         for entity in entities:
@@ -221,6 +241,9 @@ class KnowledgeGraphBuilder:
                 self.edges[edge_id] = edge
                 self.graph.add_edge(source_id, target_id, **edge.__dict__)
 
+        # Layouts are cached per structural version of the graph
+        self.graph_version = graph_fingerprint(self.graph)
+
     def _identify_clusters(self) -> None:
         """Identify clusters in the knowledge graph."""
         self.clusters.clear()
@@ -354,16 +377,58 @@ class KnowledgeGraphBuilder:
         else:
             raise ValueError(f"Unsupported format: {format}")
 
+    def get_layout(self) -> GraphLayout:
+        """Get the server-side layout of the current graph version.
+
+        The layout is computed once per version (clusters first, then their
+        members) and shared through the layout cache.
+
+        Returns:
+            Cached GraphLayout
+        """
+        if self.graph_version is None:
+            self.graph_version = graph_fingerprint(self.graph)
+        return graph_layout_cache.get_or_compute(
+            self.graph_version,
+            lambda: compute_layout(self.graph, self.clusters, self.graph_version)
+        )
+
+    def get_viewport(
+        self,
+        bounds: Tuple[float, float, float, float] = (0.0, 0.0, 1.0, 1.0),
+        zoom: int = 0
+    ) -> Dict[str, Any]:
+        """Get the nodes and edges visible in a viewport.
+
+        Args:
+            bounds: (x0, y0, x1, y1) in layout coordinates (unit square)
+            zoom: Zoom level; low levels return cluster super-nodes
+
+        Returns:
+            Bounded viewport payload
+        """
+        return self.get_layout().query_viewport(bounds, zoom)
+
+    def get_tile(self, z: int, x: int, y: int) -> Dict[str, Any]:
+        """Get the payload of map tile (z, x, y).
+
+        Args:
+            z: Zoom level (2^z x 2^z tiles)
+            x: Tile column
+            y: Tile row
+
+        Returns:
+            Bounded tile payload
+        """
+        return self.get_layout().query_tile(z, x, y)
+
     def _get_json_visualization(self) -> str:
         """Get JSON visualization data."""
-        # Calculate node positions using spring layout
+        # Positions come from the cached server-side layout
         if self.graph.nodes():
-            pos = nx.spring_layout(self.graph, k=2, iterations=50)
-
-            # Update node positions
-            for node_id, position in pos.items():
-                if node_id in self.nodes:
-                    self.nodes[node_id].position = (float(position[0]), float(position[1]))
+            layout = self.get_layout()
+            for node_id, node in self.nodes.items():
+                node.position = layout.position_of(node_id)
 
         # Convert to JSON
         visualization_data = {
@@ -405,45 +470,54 @@ class KnowledgeGraphBuilder:
         return json.dumps(visualization_data, indent=2)
 
     def _get_image_visualization(self, format: str = "png") -> str:
-        """Get image visualization."""
+        """Get image visualization.
+
+        Graphs larger than FULL_RENDER_LIMIT are drawn at cluster level
+        (one super-node per cluster) using the cached layout.
+        """
         try:
             plt.figure(figsize=(12, 8))
 
             # Draw graph
             if self.graph.nodes():
-                pos = nx.spring_layout(self.graph, k=2, iterations=50)
-
-                # Draw nodes by type
-                node_types = set(node.type for node in self.nodes.values())
-
-                for node_type in node_types:
-                    type_nodes = [
-                        node_id for node_id, node in self.nodes.items()
-                        if node.type == node_type
-                    ]
+                layout = self.get_layout()
+
+                if layout.node_count > FULL_RENDER_LIMIT:
+                    self._draw_cluster_overview(layout)
+                else:
+                    pos = {node_id: layout.position_of(node_id) for node_id in self.graph.nodes()}
+
+                    # Draw nodes by type
+                    node_types = set(node.type for node in self.nodes.values())
+
+                    for node_type in node_types:
+                        type_nodes = [
+                            node_id for node_id, node in self.nodes.items()
+                            if node.type == node_type
+                        ]
+
+                        nx.draw_networkx_nodes(
+                            self.graph, pos,
+                            nodelist=type_nodes,
+                            node_color=self._get_node_color(node_type),
+                            node_size=300,
+                            alpha=0.7
+                        )
 
-                    nx.draw_networkx_nodes(
+                    # Draw edges
+                    nx.draw_networkx_edges(
                         self.graph, pos,
-                        nodelist=type_nodes,
-                        node_color=self._get_node_color(node_type),
-                        node_size=300,
-                        alpha=0.7
+                        edge_color='gray',
+                        alpha=0.5,
+                        width=1
                     )
 
-                # Draw edges
-                nx.draw_networkx_edges(
-                    self.graph, pos,
-                    edge_color='gray',
-                    alpha=0.5,
-                    width=1
-                )
-
-                # Draw labels
-                nx.draw_networkx_labels(
-                    self.graph, pos,
-                    {node_id: node.label for node_id, node in self.nodes.items()},
-                    font_size=8
-                )
+                    # Draw labels
+                    nx.draw_networkx_labels(
+                        self.graph, pos,
+                        {node_id: node.label for node_id, node in self.nodes.items()},
+                        font_size=8
+                    )
 
             plt.title("Knowledge Graph Visualization")
             plt.axis('off')
@@ -464,6 +538,23 @@ class KnowledgeGraphBuilder:
             self.logger.error(f"Error creating graph visualization: {e}")
             return ""
 
+    def _draw_cluster_overview(self, layout: GraphLayout) -> None:
+        """Draw clusters as super-nodes sized by member count."""
+        overview = layout.query_viewport(zoom=0)
+        positions = {node['id']: (node['x'], node['y']) for node in overview['nodes']}
+
+        for edge in overview['edges']:
+            (x0, y0), (x1, y1) = positions[edge['source']], positions[edge['target']]
+            plt.plot([x0, x1], [y0, y1], color='gray', alpha=0.4,
+                     linewidth=min(0.5 + math.log1p(edge['weight']), 6))
+
+        for node in overview['nodes']:
+            size = node.get('size', 1)
+            plt.scatter(node['x'], node['y'], s=100 + 40 * math.sqrt(size),
+                        color=self._get_node_color('concept'), alpha=0.7)
+            plt.annotate(f"{node['label']} ({size})", (node['x'], node['y']),
+                         fontsize=8, ha='center', va='center')
+
     def _get_node_color(self, node_type: str) -> str:
         """Get color for node type."""
         colors = {
@@ -578,6 +669,9 @@ class KnowledgeGraphBuilder:
     def get_node_importance(self, node_id: str) -> Dict[str, float]:
         """Get importance metrics for node.
 
+        Centralities are computed once for the whole graph and reused until
+        the graph structure is rebuilt.
+
         Args:
             node_id: Node ID
 
@@ -587,18 +681,33 @@ class KnowledgeGraphBuilder:
         if node_id not in self.graph:
             return {}
 
-        # Calculate centrality measures
-        degree_centrality = nx.degree_centrality(self.graph).get(node_id, 0)
-        betweenness_centrality = nx.betweenness_centrality(self.graph).get(node_id, 0)
-        closeness_centrality = nx.closeness_centrality(self.graph).get(node_id, 0)
+        centralities = self._get_centralities()
 
         return {
-            'degree_centrality': degree_centrality,
-            'betweenness_centrality': betweenness_centrality,
-            'closeness_centrality': closeness_centrality,
+            'degree_centrality': centralities['degree_centrality'].get(node_id, 0),
+            'betweenness_centrality': centralities['betweenness_centrality'].get(node_id, 0),
+            'closeness_centrality': centralities['closeness_centrality'].get(node_id, 0),
             'degree': self.graph.degree(node_id)
         }
 
+    def _get_centralities(self) -> Dict[str, Dict[str, float]]:
+        """Compute (or return cached) centrality measures for all nodes.
+
+        Betweenness is approximated from a fixed-seed sample of pivot nodes
+        on large graphs.
+
+        Returns:
+            Mapping of measure name to per-node scores
+        """
+        if self._centrality_cache is None:
+            sample_size = self.BETWEENNESS_PIVOTS if self.graph.number_of_nodes() > self.BETWEENNESS_PIVOTS else None
+            self._centrality_cache = {
+                'degree_centrality': nx.degree_centrality(self.graph),
+                'betweenness_centrality': nx.betweenness_centrality(self.graph, k=sample_size, seed=42),
+                'closeness_centrality': nx.closeness_centrality(self.graph),
+            }
+        return self._centrality_cache
+
     def update_graph_with_feedback(self, user_id: str, feedback: Dict[str, Any]) -> None:
         """Update graph based on user feedback.
 
@@ -839,7 +948,7 @@ class GraphBasedRecommender:
                     'document_id': similar.target_document.id,
                     'title': similar.target_document.title or similar.target_document.file_name,
                     'similarity_score': similar.similarity_score,
-                    'reason': f"Similar content ({similar.similarity_score".2f"} similarity)",
+                    'reason': f"Similar content ({similar.similarity_score:.2f} similarity)",
                     'confidence': similar.similarity_score
                 })
 
@@ -939,17 +1048,31 @@ class KnowledgeGraphVisualizer:
         self.knowledge_graph = knowledge_graph
         self.logger = logging.getLogger(__name__)
 
-    def create_interactive_visualization(self) -> str:
+    def create_interactive_visualization(self, tile_endpoint: Optional[str] = None) -> str:
         """Create interactive visualization HTML.
 
+        Coordinates come from the cached server-side layout, so the browser
+        only draws. Small graphs are embedded in full. Larger ones embed the
+        cluster overview plus a bounded detail level (the highest-degree
+        nodes, see MAX_VIEWPORT_NODES) shown when zooming in; when
+        `tile_endpoint` is given, the visible tiles (`?z=&x=&y=`, see
+        KnowledgeGraphBuilder.get_tile) are fetched instead.
+
+        Args:
+            tile_endpoint: Optional URL serving tile payloads as JSON
+
         Returns:
             HTML string for interactive visualization
         """
         try:
-            # Get graph data
-            graph_data = json.loads(self.knowledge_graph.get_graph_visualization("json"))
+            layout = self.knowledge_graph.get_layout()
+            if layout.node_count <= FULL_RENDER_LIMIT:
+                initial = layout.query_viewport(zoom=CLUSTER_ZOOM_THRESHOLD)
+                detail = None
+            else:
+                initial = layout.query_viewport(zoom=0)
+                detail = None if tile_endpoint else layout.query_viewport(zoom=CLUSTER_ZOOM_THRESHOLD)
 
-            # Create interactive HTML
             html_template = """
             <!DOCTYPE html>
             <html>
@@ -957,15 +1080,7 @@ class KnowledgeGraphVisualizer:
                 <title>Knowledge Graph Visualization</title>
                 <script src="https://d3js.org/d3.v7.min.js"></script>
                 <style>
-                    body { margin: 0; font-family: Arial, sans-serif; }
-                    .node { cursor: pointer; stroke: #fff; stroke-width: 2px; }
-                    .node.academic { fill: #1f77b4; }
-                    .node.person { fill: #ff7f0e; }
-                    .node.organization { fill: #2ca02c; }
-                    .node.location { fill: #d62728; }
-                    .node.term { fill: #9467bd; }
-                    .node.concept { fill: #8c564b; }
-                    .link { stroke: #999; stroke-opacity: 0.6; }
+                    body { margin: 0; font-family: Arial, sans-serif; overflow: hidden; }
                     .tooltip { position: absolute; padding: 10px; background: rgba(0,0,0,0.8);
                               color: white; border-radius: 5px; pointer-events: none; }
                     .controls { position: absolute; top: 10px; right: 10px; background: white;
@@ -974,139 +1089,212 @@ class KnowledgeGraphVisualizer:
             </head>
             <body>
                 <div class="controls">
-                    <button onclick="restartSimulation()">Restart</button>
+                    <button onclick="resetZoom()">Reset</button>
                     <button onclick="toggleLabels()">Labels</button>
                     <select id="colorScheme" onchange="changeColorScheme()">
                         <option value="type">By Type</option>
                         <option value="confidence">By Confidence</option>
                         <option value="cluster">By Cluster</option>
                     </select>
+                    <span id="status"></span>
                 </div>
-
                 <div id="tooltip" class="tooltip" style="display: none;"></div>
+                <canvas id="graph"></canvas>
 
                 <script>
                     const width = window.innerWidth;
                     const height = window.innerHeight;
+                    const size = Math.min(width, height);
+                    const canvas = document.getElementById("graph");
+                    canvas.width = width;
+                    canvas.height = height;
+                    const ctx = canvas.getContext("2d");
+
+                    const overview = __INITIAL_PAYLOAD__;
+                    const detail = __DETAIL_PAYLOAD__;
+                    const tileEndpoint = __TILE_ENDPOINT__;
+                    const clusterZoom = __CLUSTER_ZOOM__;
+                    const colors = {concept: "#8c564b", person: "#ff7f0e", organization: "#2ca02c",
+                                    location: "#d62728", term: "#9467bd", academic: "#1f77b4", cluster: "#1f77b4"};
+                    const clusterColors = d3.scaleOrdinal(d3.schemeTableau10);
+
+                    const tiles = new Map();
+                    // Positions of dragged nodes, kept across tile reloads
+                    const moved = new Map();
+                    let transform = d3.zoomIdentity;
+                    let showLabels = true;
+                    let colorScheme = "type";
+                    let current = overview;
+
+                    function position(node) {
+                        return moved.get(node.id) || node;
+                    }
+
+                    function colorOf(node) {
+                        if (colorScheme === "confidence" && node.confidence !== undefined)
+                            return d3.interpolateViridis(node.confidence);
+                        if (colorScheme === "cluster")
+                            return clusterColors(node.cluster || node.id);
+                        return colors[node.type] || "#7f7f7f";
+                    }
+
+                    function visibleTiles(z) {
+                        const n = 1 << z;
+                        const x0 = transform.invertX(0) / size, x1 = transform.invertX(width) / size;
+                        const y0 = transform.invertY(0) / size, y1 = transform.invertY(height) / size;
+                        const keys = [];
+                        for (let x = Math.max(0, Math.floor(x0 * n)); x <= Math.min(n - 1, Math.floor(x1 * n)); x++)
+                            for (let y = Math.max(0, Math.floor(y0 * n)); y <= Math.min(n - 1, Math.floor(y1 * n)); y++)
+                                keys.push(`${z}/${x}/${y}`);
+                        return keys;
+                    }
+
+                    function update() {
+                        const z = Math.max(0, Math.floor(Math.log2(transform.k)));
+                        const status = document.getElementById("status");
+                        if (overview.level === "nodes" || z < clusterZoom) {
+                            current = overview;
+                            status.textContent = overview.level === "clusters" ? "Click a cluster to zoom in" : "";
+                            return draw();
+                        }
+                        if (!tileEndpoint) {
+                            // No tile server: the embedded detail level holds the most connected nodes
+                            current = detail;
+                            status.textContent = detail.truncated
+                                ? `${detail.nodes.length} most connected nodes` : `${detail.nodes.length} nodes`;
+                            return draw();
+                        }
+                        const keys = visibleTiles(z);
+                        keys.filter(key => !tiles.has(key)).forEach(key => {
+                            const [tz, tx, ty] = key.split("/");
+                            tiles.set(key, null);
+                            fetch(`${tileEndpoint}?z=${tz}&x=${tx}&y=${ty}`)
+                                .then(r => r.json()).then(payload => { tiles.set(key, payload); update(); });
+                        });
+                        const nodes = new Map(), edges = [];
+                        keys.map(key => tiles.get(key)).filter(Boolean).forEach(tile => {
+                            tile.nodes.forEach(node => nodes.set(node.id, node));
+                            edges.push(...tile.edges);
+                        });
+                        current = {level: "nodes", nodes: [...nodes.values()], edges: edges};
+                        status.textContent = `${nodes.size} nodes`;
+                        draw();
+                    }
+
+                    function radius(node) {
+                        return current.level === "clusters"
+                            ? Math.max(6, node.radius * size * 0.5)
+                            : (4 + (node.confidence || 0) * 6) / transform.k;
+                    }
+
+                    function draw() {
+                        ctx.save();
+                        ctx.clearRect(0, 0, width, height);
+                        ctx.translate(transform.x, transform.y);
+                        ctx.scale(transform.k, transform.k);
+                        const byId = new Map(current.nodes.map(node => [node.id, position(node)]));
+
+                        ctx.strokeStyle = "rgba(150,150,150,0.6)";
+                        current.edges.forEach(edge => {
+                            const s = byId.get(edge.source), t = byId.get(edge.target);
+                            if (!s || !t) return;
+                            ctx.lineWidth = (current.level === "clusters" ? 1 + Math.log1p(edge.weight) : 1) / transform.k;
+                            ctx.beginPath();
+                            ctx.moveTo(s.x * size, s.y * size);
+                            ctx.lineTo(t.x * size, t.y * size);
+                            ctx.stroke();
+                        });
+
+                        current.nodes.forEach(node => {
+                            const p = position(node), r = radius(node);
+                            ctx.fillStyle = colorOf(node);
+                            ctx.globalAlpha = current.level === "clusters" ? 0.5 : 0.9;
+                            ctx.beginPath();
+                            ctx.arc(p.x * size, p.y * size, r, 0, 2 * Math.PI);
+                            ctx.fill();
+                            ctx.globalAlpha = 1;
+                            if (showLabels) {
+                                ctx.fillStyle = "#333";
+                                ctx.font = `${11 / transform.k}px Arial`;
+                                const text = node.size ? `${node.label} (${node.size})` : node.label;
+                                ctx.fillText(text, p.x * size + r + 2 / transform.k, p.y * size);
+                            }
+                        });
+                        ctx.restore();
+                    }
+
+                    function findNode(event) {
+                        const [mx, my] = transform.invert(d3.pointer(event, canvas));
+                        return current.nodes.find(node => {
+                            const p = position(node);
+                            return Math.hypot(p.x * size - mx, p.y * size - my) < Math.max(radius(node), 8 / transform.k);
+                        });
+                    }
 
-                    const svg = d3.select("body").append("svg")
-                        .attr("width", width)
-                        .attr("height", height);
-
-                    const graphData = {graph_data_placeholder};
-
-                    // Create simulation
-                    const simulation = d3.forceSimulation(graphData.nodes)
-                        .force("link", d3.forceLink(graphData.edges).id(d => d.id).distance(50))
-                        .force("charge", d3.forceManyBody().strength(-300))
-                        .force("center", d3.forceCenter(width / 2, height / 2))
-                        .force("collision", d3.forceCollide().radius(20));
-
-                    // Create links
-                    const link = svg.append("g")
-                        .selectAll("line")
-                        .data(graphData.edges)
-                        .enter().append("line")
-                        .attr("class", "link")
-                        .attr("stroke-width", d => Math.sqrt(d.weight) * 2);
-
-                    // Create nodes
-                    const node = svg.append("g")
-                        .selectAll("circle")
-                        .data(graphData.nodes)
-                        .enter().append("circle")
-                        .attr("class", d => `node ${d.type}`)
-                        .attr("r", d => 5 + (d.confidence * 10))
-                        .call(d3.drag()
-                            .on("start", dragstarted)
-                            .on("drag", dragged)
-                            .on("end", dragended));
-
-                    // Add labels
-                    const label = svg.append("g")
-                        .selectAll("text")
-                        .data(graphData.nodes)
-                        .enter().append("text")
-                        .text(d => d.label)
-                        .attr("font-size", 10)
-                        .attr("dx", 12)
-                        .attr("dy", ".35em");
-
-                    // Add tooltips
-                    node.on("mouseover", function(event, d) {{
-                        d3.select("#tooltip")
-                            .style("display", "block")
-                    .html(`<strong>${d.label}</strong><br/>Type: ${d.type}<br/>Confidence: ${d.confidence.toFixed(2)}`);
-                    }})
-                    .on("mousemove", function(event) {{
-                        d3.select("#tooltip")
+                    const zoom = d3.zoom().scaleExtent([0.5, 64]).on("zoom", event => {
+                        transform = event.transform;
+                        draw();
+                    }).on("end", update);
+
+                    // Dragging a node moves it; dragging the background pans (drag only starts on a node)
+                    const drag = d3.drag()
+                        .subject(event => {
+                            const node = findNode(event.sourceEvent);
+                            return node && current.level === "nodes" ? node : null;
+                        })
+                        .on("drag", event => {
+                            const [mx, my] = transform.invert(d3.pointer(event.sourceEvent, canvas));
+                            moved.set(event.subject.id, {x: mx / size, y: my / size});
+                            draw();
+                        });
+                    d3.select(canvas).call(drag).call(zoom);
+
+                    d3.select(canvas).on("click", event => {
+                        const hit = findNode(event);
+                        if (!hit || current.level !== "clusters") return;
+                        const k = 1 << clusterZoom;
+                        d3.select(canvas).transition().duration(500).call(zoom.transform,
+                            d3.zoomIdentity.translate(width / 2, height / 2).scale(k).translate(-hit.x * size, -hit.y * size));
+                    });
+
+                    d3.select(canvas).on("mousemove", event => {
+                        const hit = findNode(event);
+                        const tooltip = d3.select("#tooltip");
+                        if (!hit) return tooltip.style("display", "none");
+                        tooltip.style("display", "block")
                             .style("left", (event.pageX + 10) + "px")
-                            .style("top", (event.pageY - 10) + "px");
-                    }})
-                    .on("mouseout", function() {{
-                        d3.select("#tooltip").style("display", "none");
-                    }});
-
-                    // Simulation tick
-                    simulation.on("tick", function() {{
-                        link
-                            .attr("x1", d => d.source.x)
-                            .attr("y1", d => d.source.y)
-                            .attr("x2", d => d.target.x)
-                            .attr("y2", d => d.target.y);
-
-                        node
-                            .attr("cx", d => d.x)
-                            .attr("cy", d => d.y);
-
-                        label
-                            .attr("x", d => d.x)
-                            .attr("y", d => d.y);
-                    }});
-
-                    // Drag functions
-                    function dragstarted(event, d) {{
-                        if (!event.active) simulation.alphaTarget(0.3).restart();
-                        d.fx = d.x;
-                        d.fy = d.y;
-                    }}
-
-                    function dragged(event, d) {{
-                        d.fx = event.x;
-                        d.fy = event.y;
-                    }}
-
-                    function dragended(event, d) {{
-                        if (!event.active) simulation.alphaTarget(0);
-                        d.fx = null;
-                        d.fy = null;
-                    }}
-
-                    // Control functions
-                    function restartSimulation() {{
-                        simulation.alpha(1).restart();
-                    }}
-
-                    function toggleLabels() {{
-                        label.style("display", label.style("display") === "none" ? "block" : "none");
-                    }}
-
-                    function changeColorScheme() {{
-                        const scheme = document.getElementById("colorScheme").value;
-                        // Color scheme change logic would go here
-                    }}
+                            .style("top", (event.pageY - 10) + "px")
+                            .html(hit.size
+                                ? `<strong>${hit.label}</strong><br/>Nodes: ${hit.size}`
+                                : `<strong>${hit.label}</strong><br/>Type: ${hit.type}<br/>Confidence: ${hit.confidence.toFixed(2)}`);
+                    });
+
+                    function resetZoom() {
+                        d3.select(canvas).call(zoom.transform, d3.zoomIdentity);
+                    }
+
+                    function toggleLabels() {
+                        showLabels = !showLabels;
+                        draw();
+                    }
+
+                    function changeColorScheme() {
+                        colorScheme = document.getElementById("colorScheme").value;
+                        draw();
+                    }
+
+                    update();
                 </script>
             </body>
             </html>
             """
 
-            # Replace placeholder with actual data
-            html_template = html_template.replace(
-                "{graph_data_placeholder}",
-                json.dumps(graph_data)
-            )
-
-            return html_template
+            # Replace placeholders with the bounded payloads
+            return (html_template
+                    .replace("__INITIAL_PAYLOAD__", json.dumps(initial))
+                    .replace("__DETAIL_PAYLOAD__", json.dumps(detail))
+                    .replace("__TILE_ENDPOINT__", json.dumps(tile_endpoint))
+                    .replace("__CLUSTER_ZOOM__", str(CLUSTER_ZOOM_THRESHOLD)))
 
         except Exception as e:
             self.logger.error(f"Error creating interactive visualization: {e}")
@@ -1142,7 +1330,7 @@ class KnowledgeGraphVisualizer:
                 ">
                     <h3>{cluster.name}</h3>
                     <p><strong>Nodes:</strong> {len(cluster.nodes)}</p>
-                    <p><strong>Cohesion:</strong> {cluster.cohesion_score".2f"}</p>
+                    <p><strong>Cohesion:</strong> {cluster.cohesion_score:.2f}</p>
                     <p><strong>Center Node:</strong> {cluster.center_node}</p>
                 </div>
                 """
@@ -1268,11 +1456,12 @@ class KnowledgeGraphSystem:
 
         return self.graph_builder.get_graph_visualization(format)
 
-    def get_interactive_visualization(self, project_id: str) -> str:
+    def get_interactive_visualization(self, project_id: str, tile_endpoint: Optional[str] = None) -> str:
         """Get interactive visualization.
 
         Args:
             project_id: Project ID
+            tile_endpoint: Optional URL serving get_graph_tile payloads
 
         Returns:
             Interactive HTML visualization
@@ -1280,7 +1469,43 @@ class KnowledgeGraphSystem:
         # Build graph if needed
         self.get_or_build_graph(project_id)
 
-        return self.visualizer.create_interactive_visualization()
+        return self.visualizer.create_interactive_visualization(tile_endpoint)
+
+    def get_graph_viewport(
+        self,
+        project_id: str,
+        bounds: Tuple[float, float, float, float] = (0.0, 0.0, 1.0, 1.0),
+        zoom: int = 0
+    ) -> Dict[str, Any]:
+        """Get the visible part of the graph for a viewport.
+
+        Args:
+            project_id: Project ID
+            bounds: (x0, y0, x1, y1) in layout coordinates (unit square)
+            zoom: Zoom level; low levels return cluster super-nodes
+
+        Returns:
+            Bounded viewport payload
+        """
+        self.get_or_build_graph(project_id)
+
+        return self.graph_builder.get_viewport(bounds, zoom)
+
+    def get_graph_tile(self, project_id: str, z: int, x: int, y: int) -> Dict[str, Any]:
+        """Get one level-of-detail tile of the graph.
+
+        Args:
+            project_id: Project ID
+            z: Zoom level
+            x: Tile column
+            y: Tile row
+
+        Returns:
+            Bounded tile payload
+        """
+        self.get_or_build_graph(project_id)
+
+        return self.graph_builder.get_tile(z, x, y)
 
     def traverse_from_node(
         self,
@@ -1456,6 +1681,7 @@ class KnowledgeGraphSystem:
     def clear_graph_cache(self) -> None:
         """Clear graph cache."""
         self.graph_cache.clear()
+        graph_layout_cache.clear()
         self.logger.info("Knowledge graph cache cleared")
 
 
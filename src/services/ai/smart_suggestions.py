@@ -5,6 +5,8 @@ Implements context-aware suggestions, user behavior learning, and proactive assi
 
 import json
 import math
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from typing import Dict, List, Any, Optional, Tuple
 from dataclasses import dataclass, field
 from datetime import datetime, timedelta
@@ -12,7 +14,10 @@ from collections import defaultdict, Counter
 import logging
 import re
 
-from ...database.models.base import Document, User, UserActivity
+from ...database.models.base import Document, User
+from ...database.repositories.document_repository import DocumentRepository
+from ...database.repositories.suggestion_cache_repository import SuggestionCacheRepository
+from ...database.repositories.user_activity_repository import UserActivityRepository
 from ...core.errors.error_handler import handle_errors
 from ...core.performance.optimizer import cache_result
 
@@ -54,6 +59,41 @@ class Suggestion:
             'project_id': self.project_id
         }
 
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'Suggestion':
+        """Rebuild a suggestion from its to_dict() form."""
+        return cls(
+            id=data['id'],
+            type=data['type'],
+            title=data['title'],
+            description=data['description'],
+            confidence=data['confidence'],
+            action_data=data.get('action_data') or {},
+            context=data.get('context') or {},
+            created_at=datetime.fromisoformat(data['created_at']),
+            expires_at=datetime.fromisoformat(data['expires_at']) if data.get('expires_at') else None,
+            user_id=data.get('user_id'),
+            project_id=data.get('project_id')
+        )
+
+
+# Seconds a profile is served from memory before checking for new activity
+PROFILE_REFRESH_SECONDS = 60
+
+WEEKDAY_NAMES = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+
+# Page contexts whose suggestions are precomputed after relevant events
+PRECOMPUTE_PAGES = ('dashboard', 'archive', 'chat')
+
+# Events that invalidate a user's cached suggestions and trigger precomputation
+PRECOMPUTE_EVENTS = frozenset({'document_processed', 'task_completed', 'session_started'})
+
+# Suggestions stored per (user, page), so lookups with a larger limit still hit
+CACHED_SUGGESTIONS_LIMIT = 10
+
+# Cache writes between two eviction passes on the shared store
+EVICTION_INTERVAL = 100
+
 
 @dataclass
 class UserBehaviorProfile:
@@ -65,9 +105,81 @@ class UserBehaviorProfile:
     skill_level: str = "beginner"  # beginner, intermediate, advanced
     learning_goals: List[str] = field(default_factory=list)
     preferred_content_types: List[str] = field(default_factory=list)
+    hour_histogram: List[int] = field(default_factory=lambda: [0] * 24)
+    weekday_histogram: List[int] = field(default_factory=lambda: [0] * 7)
+    activity_count: int = 0
     last_updated: datetime = field(default_factory=datetime.utcnow)
 
 
+@dataclass
+class BehaviorCounters:
+    """Activity counters behind a behavior profile, updated incrementally.
+
+    ``watermark`` is the id of the last user_activity row applied, so each
+    refresh only reads rows recorded after it.
+    """
+    watermark: int = 0
+    activity_count: int = 0
+    action_counts: Dict[str, int] = field(default_factory=dict)
+    hour_histogram: List[int] = field(default_factory=lambda: [0] * 24)
+    weekday_histogram: List[int] = field(default_factory=lambda: [0] * 7)
+    document_type_counts: Dict[str, int] = field(default_factory=dict)
+    content_type_counts: Dict[str, int] = field(default_factory=dict)
+    category_counts: Dict[str, int] = field(default_factory=dict)
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'BehaviorCounters':
+        """Rebuild counters from their persisted form."""
+        known = {name for name in cls.__dataclass_fields__}
+        return cls(**{key: value for key, value in data.items() if key in known})
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Convert to a JSON-serializable dictionary (watermark excluded)."""
+        return {
+            'activity_count': self.activity_count,
+            'action_counts': self.action_counts,
+            'hour_histogram': self.hour_histogram,
+            'weekday_histogram': self.weekday_histogram,
+            'document_type_counts': self.document_type_counts,
+            'content_type_counts': self.content_type_counts,
+            'category_counts': self.category_counts
+        }
+
+    def apply(self, activities: List[Dict[str, Any]]) -> None:
+        """Add activity rows (ordered by id) to the counters.
+
+        Args:
+            activities: Rows with id, action_type, target_type, metadata and timestamp
+        """
+        for activity in activities:
+            self.watermark = max(self.watermark, activity.get('id') or 0)
+            self.activity_count += 1
+
+            action_type = activity.get('action_type') or 'unknown'
+            self.action_counts[action_type] = self.action_counts.get(action_type, 0) + 1
+
+            timestamp = activity.get('timestamp')
+            if isinstance(timestamp, str):
+                try:
+                    timestamp = datetime.fromisoformat(timestamp)
+                except ValueError:
+                    timestamp = None
+            if isinstance(timestamp, datetime):
+                self.hour_histogram[timestamp.hour] += 1
+                self.weekday_histogram[timestamp.weekday()] += 1
+
+            metadata = activity.get('metadata') or {}
+            file_type = metadata.get('file_type')
+            if activity.get('target_type') == 'document':
+                document_type = file_type or 'unknown'
+                self.document_type_counts[document_type] = self.document_type_counts.get(document_type, 0) + 1
+            if file_type:
+                self.content_type_counts[file_type] = self.content_type_counts.get(file_type, 0) + 1
+            category = metadata.get('category')
+            if category:
+                self.category_counts[category] = self.category_counts.get(category, 0) + 1
+
+
 class UserBehaviorAnalyzer:
     """Analyzes user behavior to create personalized profiles."""
 
@@ -76,18 +188,23 @@ class UserBehaviorAnalyzer:
 
         Args:
             user_activity_repository: Repository for user activity data
+                (e.g. UserActivityRepository); without one profiles stay empty
         """
         self.user_activity_repository = user_activity_repository
         self.logger = logging.getLogger(__name__)
         self.profiles: Dict[str, UserBehaviorProfile] = {}
+        self.counters: Dict[str, BehaviorCounters] = {}
 
     @handle_errors(operation="analyze_user_behavior", component="behavior_analyzer")
     def analyze_user_behavior(self, user_id: str, days: int = 30) -> UserBehaviorProfile:
         """Analyze user behavior and create/update profile.
 
+        Persisted counters are updated with the activity recorded since their
+        watermark, so the cost depends on new activity only, not on history.
+
         Args:
             user_id: User ID to analyze
-            days: Days to look back for analysis
+            days: Kept for compatibility; counters cover the whole history
 
         Returns:
             Updated user behavior profile
@@ -99,28 +216,8 @@ class UserBehaviorAnalyzer:
         profile = self.profiles[user_id]
 
         try:
-            # Get user activity data
-            activities = self._get_user_activities(user_id, days)
-
-            # Analyze document preferences
-            profile.document_preferences = self._analyze_document_preferences(activities)
-
-            # Analyze action frequencies
-            profile.action_frequencies = self._analyze_action_frequencies(activities)
-
-            # Analyze time patterns
-            profile.time_patterns = self._analyze_time_patterns(activities)
-
-            # Update skill level
-            profile.skill_level = self._assess_skill_level(activities)
-
-            # Update learning goals
-            profile.learning_goals = self._extract_learning_goals(activities)
-
-            # Update preferred content types
-            profile.preferred_content_types = self._get_preferred_content_types(activities)
-
-            profile.last_updated = datetime.utcnow()
+            counters = self._refresh_counters(user_id)
+            self._update_profile(profile, counters)
 
             self.logger.info(f"Updated behavior profile for user {user_id}")
             return profile
@@ -129,120 +226,90 @@ class UserBehaviorAnalyzer:
             self.logger.error(f"Error analyzing user behavior for {user_id}: {e}")
             return profile
 
-    def _get_user_activities(self, user_id: str, days: int) -> List[Dict[str, Any]]:
-        """Get user activities for analysis."""
-        # This would query the user_activity table
-        # For now, return mock data
-        return [
-            {
-                'action_type': 'document_upload',
-                'target_type': 'document',
-                'timestamp': datetime.utcnow() - timedelta(days=i),
-                'metadata': {'file_type': 'pdf', 'category': 'academic'}
-            }
-            for i in range(min(days, 10))
-        ]
+    def get_profile(self, user_id: str, max_age_seconds: int = PROFILE_REFRESH_SECONDS) -> UserBehaviorProfile:
+        """Get a ready profile, refreshing it only when older than max_age_seconds.
 
-    def _analyze_document_preferences(self, activities: List[Dict[str, Any]]) -> Dict[str, float]:
-        """Analyze document type preferences."""
-        preferences = defaultdict(int)
-
-        for activity in activities:
-            if activity['target_type'] == 'document':
-                file_type = activity.get('metadata', {}).get('file_type', 'unknown')
-                preferences[file_type] += 1
-
-        # Convert to normalized scores
-        total = sum(preferences.values())
-        if total > 0:
-            return {k: v/total for k, v in preferences.items()}
-
-        return {}
-
-    def _analyze_action_frequencies(self, activities: List[Dict[str, Any]]) -> Dict[str, int]:
-        """Analyze action frequencies."""
-        frequencies = Counter()
+        Args:
+            user_id: User ID
+            max_age_seconds: Maximum age of an in-memory profile
 
-        for activity in activities:
-            frequencies[activity['action_type']] += 1
+        Returns:
+            User behavior profile
+        """
+        profile = self.profiles.get(user_id)
+        if profile is not None and (datetime.utcnow() - profile.last_updated).total_seconds() < max_age_seconds:
+            return profile
+        return self.analyze_user_behavior(user_id) or UserBehaviorProfile(user_id=user_id)
+
+    def _refresh_counters(self, user_id: str) -> BehaviorCounters:
+        """Load counters and apply activity rows newer than their watermark."""
+        repository = self.user_activity_repository
+        counters = self.counters.get(user_id)
+
+        if repository is None:
+            return counters or BehaviorCounters()
+
+        if counters is None:
+            stored = repository.get_behavior_counters(user_id)
+            counters = BehaviorCounters.from_dict(stored) if stored else BehaviorCounters()
+            self.counters[user_id] = counters
+
+        applied = 0
+        while True:
+            activities = repository.get_activities_since(user_id, counters.watermark)
+            if not activities:
+                break
+            counters.apply(activities)
+            applied += len(activities)
+
+        if applied:
+            repository.save_behavior_counters(user_id, counters.watermark, counters.to_dict())
+
+        return counters
+
+    def _update_profile(self, profile: UserBehaviorProfile, counters: BehaviorCounters) -> None:
+        """Derive every profile dimension from the counters."""
+        # Document preferences, normalized
+        total = sum(counters.document_type_counts.values())
+        profile.document_preferences = (
+            {k: v / total for k, v in counters.document_type_counts.items()} if total > 0 else {}
+        )
 
-        return dict(frequencies)
+        profile.action_frequencies = dict(counters.action_counts)
 
-    def _analyze_time_patterns(self, activities: List[Dict[str, Any]]) -> Dict[str, List[str]]:
-        """Analyze time patterns."""
-        patterns = {
-            'active_hours': [],
-            'active_days': [],
+        profile.hour_histogram = list(counters.hour_histogram)
+        profile.weekday_histogram = list(counters.weekday_histogram)
+        profile.time_patterns = {
+            'active_hours': [hour for hour, count in enumerate(counters.hour_histogram) if count],
+            'active_days': [WEEKDAY_NAMES[day] for day, count in enumerate(counters.weekday_histogram) if count],
             'session_duration': []
         }
 
-        for activity in activities:
-            timestamp = activity.get('timestamp', datetime.utcnow())
-            if isinstance(timestamp, str):
-                timestamp = datetime.fromisoformat(timestamp)
-
-            # Active hours
-            hour = timestamp.hour
-            if hour not in patterns['active_hours']:
-                patterns['active_hours'].append(hour)
-
-            # Active days
-            day = timestamp.strftime('%A')
-            if day not in patterns['active_days']:
-                patterns['active_days'].append(day)
-
-        return patterns
-
-    def _assess_skill_level(self, activities: List[Dict[str, Any]]) -> str:
-        """Assess user skill level."""
-        if not activities:
-            return 'beginner'
-
         # Simple skill assessment based on activity diversity
-        unique_actions = set(a['action_type'] for a in activities)
-
-        if len(unique_actions) >= 5:
-            return 'advanced'
-        elif len(unique_actions) >= 3:
-            return 'intermediate'
+        unique_actions = len(counters.action_counts)
+        if unique_actions >= 5:
+            profile.skill_level = 'advanced'
+        elif unique_actions >= 3:
+            profile.skill_level = 'intermediate'
         else:
-            return 'beginner'
+            profile.skill_level = 'beginner'
 
-    def _extract_learning_goals(self, activities: List[Dict[str, Any]]) -> List[str]:
-        """Extract learning goals from activities."""
-        # Analyze patterns to infer learning goals
+        # Learning goals inferred from academic content and organization actions
         goals = []
-
-        # Check for academic content
-        academic_activities = [
-            a for a in activities
-            if a.get('metadata', {}).get('category') == 'academic'
-        ]
-
-        if len(academic_activities) > 5:
+        if counters.category_counts.get('academic', 0) > 5:
             goals.append('academic_research')
-
-        # Check for document organization
-        organization_activities = [
-            a for a in activities
-            if 'organize' in a['action_type']
-        ]
-
-        if len(organization_activities) > 3:
+        organize_count = sum(
+            count for action, count in counters.action_counts.items() if 'organize' in action
+        )
+        if organize_count > 3:
             goals.append('document_organization')
+        profile.learning_goals = goals
 
-        return goals
-
-    def _get_preferred_content_types(self, activities: List[Dict[str, Any]]) -> List[str]:
-        """Get preferred content types."""
-        content_types = []
-
-        for activity in activities:
-            file_type = activity.get('metadata', {}).get('file_type')
-            if file_type and file_type not in content_types:
-                content_types.append(file_type)
-
-        return content_types
+        profile.preferred_content_types = sorted(
+            counters.content_type_counts, key=counters.content_type_counts.get, reverse=True
+        )
+        profile.activity_count = counters.activity_count
+        profile.last_updated = datetime.utcnow()
 
 
 class ContextAwareSuggestionEngine:
@@ -260,14 +327,6 @@ class ContextAwareSuggestionEngine:
         self.behavior_analyzer = UserBehaviorAnalyzer(user_activity_repository)
         self.logger = logging.getLogger(__name__)
 
-        # Suggestion generators
-        self.suggestion_generators = {
-            'document': self._generate_document_suggestions,
-            'action': self._generate_action_suggestions,
-            'learning': self._generate_learning_suggestions,
-            'organization': self._generate_organization_suggestions
-        }
-
     @handle_errors(operation="generate_suggestions", component="suggestion_engine")
     def generate_suggestions(
         self,
@@ -286,8 +345,8 @@ class ContextAwareSuggestionEngine:
             List of personalized suggestions
         """
         try:
-            # Get user behavior profile
-            profile = self.behavior_analyzer.analyze_user_behavior(user_id)
+            # Get user behavior profile (kept up to date incrementally)
+            profile = self.behavior_analyzer.get_profile(user_id)
 
             # Get current context
             current_page = context.get('current_page', 'unknown')
@@ -820,14 +879,22 @@ class SuggestionPerformanceTracker:
 
 
 class SmartSuggestionSystem:
-    """Main smart suggestion system."""
+    """Main smart suggestion system.
 
-    def __init__(self, document_repository, user_activity_repository):
+    Suggestions are precomputed per (user, page) after relevant events and
+    kept in a SQLite table shared by every Streamlit process and Celery
+    worker; requests read them from there and only generate on a miss.
+    """
+
+    def __init__(self, document_repository, user_activity_repository,
+                 suggestion_cache: Optional[SuggestionCacheRepository] = None):
         """Initialize smart suggestion system.
 
         Args:
             document_repository: Document repository
             user_activity_repository: User activity repository
+            suggestion_cache: Shared suggestion store; defaults to the
+                suggestion_cache table of the activity database
         """
         self.document_repository = document_repository
         self.user_activity_repository = user_activity_repository
@@ -840,8 +907,31 @@ class SmartSuggestionSystem:
         self.proactive_engine = ProactiveAssistanceEngine(self.suggestion_engine)
         self.performance_tracker = SuggestionPerformanceTracker()
 
-        # Active suggestions cache
-        self.active_suggestions: Dict[str, List[Suggestion]] = {}
+        # Shared suggestions cache
+        if suggestion_cache is None:
+            db_path = getattr(user_activity_repository, 'db_path', None)
+            suggestion_cache = SuggestionCacheRepository(
+                db_path if isinstance(db_path, str) else "db_memoria/metadata.sqlite"
+            )
+        self.suggestion_cache = suggestion_cache
+        self.cache_stats = {'hits': 0, 'misses': 0, 'precomputed': 0, 'evicted': 0}
+        self._stats_lock = threading.Lock()
+        self._writes_since_eviction = 0
+
+        # Background precomputation (one worker, one pending job per user)
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._pending_users: set = set()
+        self._pending_lock = threading.Lock()
+
+    @staticmethod
+    def _context_key(context: Dict[str, Any]) -> str:
+        """Cache key of a context: the page the suggestions are shown on."""
+        return context.get('current_page', 'unknown')
+
+    def _count(self, stat: str, amount: int = 1) -> None:
+        """Increment a cache statistic."""
+        with self._stats_lock:
+            self.cache_stats[stat] += amount
 
     @handle_errors(operation="get_personalized_suggestions", component="smart_suggestions")
     def get_personalized_suggestions(
@@ -852,6 +942,9 @@ class SmartSuggestionSystem:
     ) -> List[Suggestion]:
         """Get personalized suggestions for user.
 
+        Reads the precomputed suggestions for the user and page; on a miss
+        they are generated on demand and stored for the next lookup.
+
         Args:
             user_id: User ID
             context: Current context
@@ -860,40 +953,144 @@ class SmartSuggestionSystem:
         Returns:
             List of personalized suggestions
         """
-        # Check cache first
-        cache_key = f"{user_id}_{context.get('current_page', 'unknown')}"
-        cached_suggestions = self._get_cached_suggestions(cache_key)
-
-        if cached_suggestions:
-            return cached_suggestions[:limit]
+        context_key = self._context_key(context)
+        suggestions = self._get_cached_suggestions(user_id, context_key)
 
-        # Generate new suggestions
-        suggestions = self.suggestion_engine.generate_suggestions(user_id, context, limit * 2)
+        if suggestions is not None:
+            self._count('hits')
+        else:
+            self._count('misses')
+            suggestions = self._compute_suggestions(user_id, context, max(limit * 2, CACHED_SUGGESTIONS_LIMIT))
 
         # Track suggestions shown
-        for suggestion in suggestions:
+        for suggestion in suggestions[:limit]:
             self.performance_tracker.track_suggestion_shown(suggestion)
 
-        # Cache suggestions
-        self.active_suggestions[cache_key] = suggestions
-
         return suggestions[:limit]
 
-    def _get_cached_suggestions(self, cache_key: str) -> Optional[List[Suggestion]]:
-        """Get cached suggestions if still valid."""
-        if cache_key in self.active_suggestions:
-            suggestions = self.active_suggestions[cache_key]
+    def _get_cached_suggestions(self, user_id: str, context_key: str) -> Optional[List[Suggestion]]:
+        """Get stored suggestions if the entry exists, is fresh and none has expired."""
+        stored = self.suggestion_cache.get_suggestions(user_id, context_key)
+        if stored is None:
+            return None
+
+        try:
+            suggestions = [Suggestion.from_dict(data) for data in stored]
+        except (KeyError, TypeError, ValueError) as e:
+            self.logger.warning(f"Discarding unreadable cached suggestions for {user_id}/{context_key}: {e}")
+            return None
+
+        if any(suggestion.is_expired() for suggestion in suggestions):
+            return None
+        return suggestions
+
+    def _compute_suggestions(
+        self,
+        user_id: str,
+        context: Dict[str, Any],
+        limit: int,
+        generation: Optional[int] = None
+    ) -> List[Suggestion]:
+        """Generate suggestions for a context and store them in the shared cache.
+
+        The user's cache generation is read before generating; if the user is
+        invalidated meanwhile, the result is returned but not stored.
+        """
+        if generation is None:
+            generation = self.suggestion_cache.get_generation(user_id)
+        suggestions = self.suggestion_engine.generate_suggestions(user_id, context, limit) or []
+        context_key = self._context_key(context)
+        stored = self.suggestion_cache.save_suggestions(
+            user_id, context_key, [suggestion.to_dict() for suggestion in suggestions], generation=generation
+        )
+        if not stored:
+            self.logger.debug(f"Not storing suggestions for {user_id}/{context_key}: invalidated during computation")
+            return suggestions
+
+        with self._stats_lock:
+            self._writes_since_eviction += 1
+            evict = self._writes_since_eviction >= EVICTION_INTERVAL
+            if evict:
+                self._writes_since_eviction = 0
+        if evict:
+            self._count('evicted', self.suggestion_cache.evict())
+
+        return suggestions
+
+    @handle_errors(operation="precompute_suggestions", component="smart_suggestions")
+    def precompute_suggestions(self, user_id: str, pages: Tuple[str, ...] = PRECOMPUTE_PAGES) -> int:
+        """Compute and store suggestions for each page context of a user.
+
+        The behavior profile is refreshed first, so the stored suggestions
+        reflect the activity that triggered the precomputation.
+
+        Args:
+            user_id: User ID
+            pages: Page contexts to precompute
+
+        Returns:
+            Number of page contexts computed
+        """
+        # Read before the profile refresh: results computed after a later
+        # invalidation of the user are stale and are not stored
+        generation = self.suggestion_cache.get_generation(user_id)
+        self.suggestion_engine.behavior_analyzer.analyze_user_behavior(user_id)
+        for page in pages:
+            self._compute_suggestions(user_id, {'current_page': page}, CACHED_SUGGESTIONS_LIMIT, generation)
+        self._count('precomputed', len(pages))
+        return len(pages)
+
+    def notify_event(self, user_id: str, event_type: str, wait: bool = False) -> bool:
+        """Invalidate and recompute a user's suggestions after a relevant event.
+
+        Precomputation runs on a background thread; events for a user whose
+        recomputation is still queued are coalesced into it. Celery tasks
+        can pass ``wait=True`` to recompute synchronously in the worker.
+
+        Args:
+            user_id: User ID
+            event_type: Event name, e.g. 'document_processed', 'task_completed'
+                or 'session_started'
+            wait: Block until the suggestions are stored
+
+        Returns:
+            True if a recomputation was scheduled
+        """
+        if event_type not in PRECOMPUTE_EVENTS:
+            return False
+
+        self.suggestion_cache.invalidate_user(user_id)
 
-            # Check if any suggestion is expired
-            valid_suggestions = [s for s in suggestions if not s.is_expired()]
+        if wait:
+            self.precompute_suggestions(user_id)
+            return True
 
-            if len(valid_suggestions) == len(suggestions):
-                return suggestions
-            else:
-                # Remove expired suggestions
-                self.active_suggestions[cache_key] = valid_suggestions
+        with self._pending_lock:
+            if user_id in self._pending_users:
+                return True
+            self._pending_users.add(user_id)
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="suggestions")
 
-        return None
+        self._executor.submit(self._run_precompute, user_id)
+        return True
+
+    def _run_precompute(self, user_id: str) -> None:
+        """Background job: precompute suggestions for a queued user."""
+        with self._pending_lock:
+            self._pending_users.discard(user_id)
+        try:
+            self.precompute_suggestions(user_id)
+        except Exception as e:
+            self.logger.error(f"Error precomputing suggestions for user {user_id}: {e}")
+
+    def wait_for_precomputation(self) -> None:
+        """Block until queued precomputation jobs have finished."""
+        with self._pending_lock:
+            executor = self._executor
+            self._executor = None
+        if executor is not None:
+            executor.shutdown(wait=True)
 
     def track_suggestion_interaction(
         self,
@@ -942,60 +1139,105 @@ class SmartSuggestionSystem:
         Returns:
             Analytics data
         """
+        with self._stats_lock:
+            cache_stats = dict(self.cache_stats)
+        lookups = cache_stats['hits'] + cache_stats['misses']
+
         return {
             'performance_summary': {
                 'top_performing': self.performance_tracker.get_top_performing_suggestions(5),
-                'total_suggestions': len(self.suggestion_stats),
+                'total_suggestions': len(self.performance_tracker.suggestion_stats),
                 'avg_engagement_rate': 0.0  # Would calculate from data
             },
             'user_engagement': {
-                'total_users': len(self.user_engagement),
+                'total_users': len(self.performance_tracker.user_engagement),
                 'avg_engagements_per_user': 0.0  # Would calculate from data
             },
             'system_health': {
-                'cache_size': len(self.active_suggestions),
+                'cache_size': self.suggestion_cache.count(),
+                'cache_hit_rate': cache_stats['hits'] / lookups if lookups else 0.0,
+                **cache_stats,
                 'last_cleanup': datetime.utcnow().isoformat()
             }
         }
 
     def cleanup_expired_suggestions(self) -> int:
-        """Clean up expired suggestions.
+        """Evict expired entries and enforce the size bound of the shared cache.
 
         Returns:
-            Number of suggestions removed
+            Number of cache entries removed
         """
-        removed_count = 0
-
-        for cache_key in list(self.active_suggestions.keys()):
-            original_count = len(self.active_suggestions[cache_key])
-            self.active_suggestions[cache_key] = [
-                s for s in self.active_suggestions[cache_key]
-                if not s.is_expired()
-            ]
-            new_count = len(self.active_suggestions[cache_key])
-            removed_count += original_count - new_count
-
-            # Remove empty caches
-            if new_count == 0:
-                del self.active_suggestions[cache_key]
-
-        self.logger.info(f"Cleaned up {removed_count} expired suggestions")
+        removed_count = self.suggestion_cache.evict()
+        self._count('evicted', removed_count)
+
+        self.logger.info(f"Cleaned up {removed_count} expired suggestion cache entries")
         return removed_count
 
 
 # Factory function
 
-def create_smart_suggestion_system(document_repository, user_activity_repository) -> SmartSuggestionSystem:
+def create_smart_suggestion_system(
+    document_repository,
+    user_activity_repository,
+    suggestion_cache: Optional[SuggestionCacheRepository] = None
+) -> SmartSuggestionSystem:
     """Create complete smart suggestion system.
 
     Args:
         document_repository: Document repository
         user_activity_repository: User activity repository
+        suggestion_cache: Shared suggestion store (optional)
 
     Returns:
         Configured smart suggestion system
     """
-    return SmartSuggestionSystem(document_repository, user_activity_repository)
+    return SmartSuggestionSystem(document_repository, user_activity_repository, suggestion_cache)
+
+
+_shared_suggestion_system: Optional[SmartSuggestionSystem] = None
+_shared_system_lock = threading.Lock()
+
+
+def get_smart_suggestion_system(db_path: str = "db_memoria/metadata.sqlite") -> SmartSuggestionSystem:
+    """Get the process-wide suggestion system used by event hooks.
+
+    Args:
+        db_path: Database holding activity, documents and the suggestion cache
+
+    Returns:
+        Shared SmartSuggestionSystem instance
+    """
+    global _shared_suggestion_system
+    if _shared_suggestion_system is None:
+        with _shared_system_lock:
+            if _shared_suggestion_system is None:
+                _shared_suggestion_system = create_smart_suggestion_system(
+                    DocumentRepository(db_path),
+                    UserActivityRepository(db_path),
+                    SuggestionCacheRepository(db_path)
+                )
+    return _shared_suggestion_system
+
+
+def notify_suggestion_event(user_id: Any, event_type: str, wait: bool = False) -> bool:
+    """Forward an event to the shared suggestion system without raising.
+
+    Called from the processing tasks, task completion and login, which must
+    not fail because suggestions could not be refreshed.
+
+    Args:
+        user_id: User ID
+        event_type: Event name (see PRECOMPUTE_EVENTS)
+        wait: Recompute synchronously (Celery workers)
+
+    Returns:
+        True if a recomputation was scheduled
+    """
+    try:
+        return get_smart_suggestion_system().notify_event(str(user_id), event_type, wait=wait)
+    except Exception as e:
+        logging.getLogger(__name__).warning(f"Suggestion refresh after {event_type} failed for user {user_id}: {e}")
+        return False
 
 
 # Integration with existing system
@@ -40,12 +40,13 @@ class GraphVisualization(BaseComponent):
         """Inizializza servizi per grafo della conoscenza."""
         try:
             # Import servizi necessari
-            from file_utils import get_user_knowledge_graph, get_entity_neighbors
+            from file_utils import get_user_knowledge_graph, get_entity_neighbors, get_influential_entities
             from knowledge_structure import get_confidence_color, get_confidence_label
 
             # Salva riferimenti per uso successivo
             self._get_user_knowledge_graph = get_user_knowledge_graph
             self._get_entity_neighbors = get_entity_neighbors
+            self._get_influential_entities = get_influential_entities
             self._get_confidence_color = get_confidence_color
             self._get_confidence_label = get_confidence_label
 
@@ -340,7 +341,7 @@ class GraphVisualization(BaseComponent):
             if influential_entities:
                 st.write("**🌟 Entità più influenti:**")
 
-                for entity_name, influence_score, avg_confidence in influential_entities[:10]:
+                for entity_name, influence_score, avg_confidence in influential_entities:
                     confidence_emoji = self._get_confidence_emoji(avg_confidence)
                     st.write(f"• **{entity_name}** {confidence_emoji} - Influenza: {influence_score:.2f}")
 
@@ -482,39 +483,26 @@ class GraphVisualization(BaseComponent):
         except Exception as e:
             st.error(f"Errore dettagli entità: {e}")
 
-    def _calculate_influential_entities(self) -> List[tuple]:
-        """Calcola entità più influenti."""
+    def _calculate_influential_entities(self, k: int = 10) -> List[tuple]:
+        """Entità più influenti dalle centralità precalcolate per versione del grafo.
+
+        Args:
+            k: Numero di entità da restituire
+
+        Returns:
+            Lista di tuple (nome, influenza, confidenza media) in ordine decrescente
+        """
         try:
-            entity_connections = {}
-            entity_confidence_sum = {}
-
-            for rel in self.filtered_relationships:
-                source_name = rel.get('source_name', '')
-                target_name = rel.get('target_name', '')
-                rel_confidence = rel.get('confidence_score', 0.5)
-
-                # Pondera connessioni per confidenza
-                entity_connections[source_name] = entity_connections.get(source_name, 0) + rel_confidence
-                entity_connections[target_name] = entity_connections.get(target_name, 0) + rel_confidence
-
-                # Somma confidenza per media
-                if source_name not in entity_confidence_sum:
-                    entity_confidence_sum[source_name] = []
-                if target_name not in entity_confidence_sum:
-                    entity_confidence_sum[target_name] = []
-
-                entity_confidence_sum[source_name].append(rel_confidence)
-                entity_confidence_sum[target_name].append(rel_confidence)
-
-            # Calcola entità più influenti
-            influential_entities = []
-            for entity_name, total_weight in entity_connections.items():
-                if entity_name in [e.get('entity_name') for e in self.filtered_entities]:
-                    avg_confidence = sum(entity_confidence_sum[entity_name]) / len(entity_confidence_sum[entity_name])
-                    influential_entities.append((entity_name, total_weight, avg_confidence))
-
-            influential_entities.sort(key=lambda x: x[1], reverse=True)
-            return influential_entities
+            if 'user_id' not in st.session_state:
+                return []
+
+            influential = self._get_influential_entities(
+                st.session_state['user_id'],
+                k=k,
+                min_confidence=self.min_confidence,
+                entity_type=getattr(self, 'selected_entity_type', None)
+            )
+            return [(e['entity_name'], e['score'], e['avg_confidence']) for e in influential]
 
         except Exception as e:
             logger.error(f"Errore calcolo entità influenti: {e}")
@@ -0,0 +1,155 @@
+"""
+Tests for the declarative achievement engine (tools.achievements).
+Covers single-query evaluation, chained XP bonuses and adding rules without extra queries.
+"""
+
+import sqlite3
+from types import SimpleNamespace
+
+import pytest
+
+from tools.achievements import ACHIEVEMENT_BONUS_XP, ACHIEVEMENT_RULES, evaluate_achievements
+
+
+SCHEMA = """
+    CREATE TABLE papers (file_name TEXT PRIMARY KEY, title TEXT);
+    CREATE TABLE courses (id INTEGER PRIMARY KEY AUTOINCREMENT, user_id INTEGER NOT NULL, course_name TEXT);
+    CREATE TABLE tasks (id INTEGER PRIMARY KEY AUTOINCREMENT, user_id INTEGER NOT NULL,
+        status TEXT DEFAULT 'pending');
+    CREATE TABLE user_xp (id INTEGER PRIMARY KEY AUTOINCREMENT, user_id INTEGER NOT NULL,
+        xp_amount INTEGER NOT NULL, xp_source TEXT NOT NULL, xp_description TEXT, source_id INTEGER,
+        created_at TEXT NOT NULL);
+    CREATE TABLE user_achievements (id INTEGER PRIMARY KEY AUTOINCREMENT, user_id INTEGER NOT NULL,
+        achievement_type TEXT NOT NULL, achievement_title TEXT NOT NULL, achievement_description TEXT,
+        earned_at TEXT NOT NULL, UNIQUE(user_id, achievement_type));
+    CREATE INDEX idx_user_xp_user ON user_xp(user_id);
+    CREATE INDEX idx_courses_user ON courses(user_id);
+    CREATE INDEX idx_tasks_user_status ON tasks(user_id, status);
+"""
+
+
+def make_db(courses: int = 0, tasks_completed: int = 0, tasks_pending: int = 0,
+            documents: int = 0, xp: int = 0) -> sqlite3.Connection:
+    """In-memory database with the given progress for user 1 and noise for user 2."""
+    conn = sqlite3.connect(":memory:")
+    conn.row_factory = sqlite3.Row
+    conn.executescript(SCHEMA)
+    for user_id, factor in ((1, 1), (2, 3)):
+        conn.executemany("INSERT INTO courses (user_id, course_name) VALUES (?, 'c')", [(user_id,)] * courses * factor)
+        conn.executemany("INSERT INTO tasks (user_id, status) VALUES (?, 'completed')", [(user_id,)] * tasks_completed * factor)
+        conn.executemany("INSERT INTO tasks (user_id, status) VALUES (?, 'pending')", [(user_id,)] * tasks_pending * factor)
+        if xp:
+            conn.execute("INSERT INTO user_xp (user_id, xp_amount, xp_source, created_at) VALUES (?, ?, 'task_completed', 'now')",
+                         (user_id, xp * factor))
+    conn.executemany("INSERT INTO papers VALUES (?, 't')", [(f"doc{i}.pdf",) for i in range(documents)])
+    return conn
+
+
+def earned_types(conn: sqlite3.Connection, user_id: int = 1) -> set:
+    rows = conn.execute("SELECT achievement_type FROM user_achievements WHERE user_id = ?", (user_id,))
+    return {row[0] for row in rows}
+
+
+class RacingConnection:
+    """Connection where another session awards an achievement right after the progress SELECT."""
+
+    def __init__(self, conn: sqlite3.Connection, achievement_type: str):
+        self.conn = conn
+        self.achievement_type = achievement_type
+
+    def execute(self, sql, *args):
+        cursor = self.conn.execute(sql, *args)
+        if not sql.lstrip().upper().startswith('SELECT'):
+            return cursor
+        row = cursor.fetchone()
+        self.conn.execute(
+            "INSERT INTO user_achievements (user_id, achievement_type, achievement_title, earned_at) VALUES (1, ?, 'x', 'now')",
+            (self.achievement_type,))
+        return SimpleNamespace(fetchone=lambda: row)
+
+    def executemany(self, sql, params):
+        return self.conn.executemany(sql, params)
+
+
+class TestAchievementEngine:
+    """Declarative rules evaluated with one aggregate query."""
+
+    @pytest.mark.database
+    def test_awards_reached_rules_once(self) -> None:
+        """Reached thresholds are awarded with their XP bonus, and never twice."""
+        conn = make_db(courses=1, tasks_completed=25, tasks_pending=40, documents=3)
+
+        awarded = evaluate_achievements(conn, 1)
+        assert {rule['type'] for rule in awarded} == {'first_steps', 'task_master'}
+        assert earned_types(conn) == {'first_steps', 'task_master'}
+        assert earned_types(conn, 2) == set()
+        bonus = conn.execute(
+            "SELECT SUM(xp_amount) FROM user_xp WHERE user_id = 1 AND xp_source = 'achievement_unlocked'"
+        ).fetchone()[0]
+        assert bonus == 2 * ACHIEVEMENT_BONUS_XP
+
+        assert evaluate_achievements(conn, 1) == []
+        assert conn.execute("SELECT COUNT(*) FROM user_xp WHERE user_id = 1").fetchone()[0] == 2
+
+    @pytest.mark.database
+    def test_bonus_xp_unlocks_xp_rule_in_same_call(self) -> None:
+        """Bonuses that cross the XP threshold unlock xp_hunter without another evaluation."""
+        conn = make_db(courses=5, documents=10, xp=500 - 3 * ACHIEVEMENT_BONUS_XP)
+
+        awarded = [rule['type'] for rule in evaluate_achievements(conn, 1)]
+        assert awarded[-1] == 'xp_hunter'
+        assert set(awarded) == {'first_steps', 'knowledge_builder', 'scholar', 'xp_hunter'}
+
+    @pytest.mark.database
+    def test_new_rules_do_not_add_queries(self) -> None:
+        """Evaluation issues a single SELECT however many rules share the metrics."""
+        conn = make_db(courses=2)
+        statements = []
+        conn.set_trace_callback(statements.append)
+
+        rules = list(ACHIEVEMENT_RULES) + [
+            {'type': f'courses_{n}', 'title': f'{n} corsi', 'description': '', 'metric': 'courses_count', 'threshold': n}
+            for n in range(2, 40)
+        ]
+        evaluate_achievements(conn, 1, rules)
+
+        selects = [s for s in statements if s.lstrip().upper().startswith('SELECT')]
+        assert len(selects) == 1
+        assert earned_types(conn) == {'first_steps', 'courses_2'}
+
+        with pytest.raises(ValueError):
+            evaluate_achievements(conn, 1, [{'type': 'x', 'title': 'x', 'description': '', 'metric': 'unknown', 'threshold': 1}])
+
+    @pytest.mark.database
+    def test_concurrently_awarded_achievement_gets_no_bonus(self) -> None:
+        """An achievement written by another session between the SELECT and the INSERT earns no second bonus."""
+        conn = make_db(courses=1, tasks_completed=25)
+
+        awarded = evaluate_achievements(RacingConnection(conn, 'task_master'), 1)
+        assert [rule['type'] for rule in awarded] == ['first_steps']
+        assert earned_types(conn) == {'first_steps', 'task_master'}
+        bonuses = conn.execute(
+            "SELECT xp_description FROM user_xp WHERE user_id = 1 AND xp_source = 'achievement_unlocked'"
+        ).fetchall()
+        assert [row[0] for row in bonuses] == ["Achievement sbloccato: Primi Passi"]
+
+    @pytest.mark.performance
+    def test_benchmark_against_full_reload(self) -> None:
+        """The engine reads one aggregate row where a full reload materialises every course, task and paper."""
+        conn = make_db(courses=20, tasks_completed=300, tasks_pending=3000, documents=5000, xp=100)
+        statements = []
+        conn.set_trace_callback(statements.append)
+
+        reloaded_rows = sum(
+            len(conn.execute(sql).fetchall())
+            for sql in ("SELECT * FROM courses WHERE user_id = 1",
+                        "SELECT * FROM tasks WHERE user_id = 1",
+                        "SELECT * FROM papers")
+        )
+        assert reloaded_rows == 20 + 3300 + 5000
+
+        evaluate_achievements(conn, 1)
+        statements.clear()
+        assert evaluate_achievements(conn, 1) == []
+        # Re-checking a user with nothing new to award is one SELECT returning one row
+        assert len(statements) == 1 and statements[0].lstrip().upper().startswith('SELECT')
@@ -0,0 +1,138 @@
+"""
+Tests for the buffered user-activity writer (tools.activity_logger).
+Covers batched flushes, the derived recent-documents/uploads tables, retries of
+failed batches and the background thread.
+"""
+
+import sqlite3
+import time
+
+import pytest
+
+import tools.activity_logger as activity_module
+from tools.activity_logger import ActivityLogger
+
+
+SCHEMA = """
+    CREATE TABLE papers (file_name TEXT PRIMARY KEY, title TEXT);
+    CREATE TABLE user_activity (id INTEGER PRIMARY KEY AUTOINCREMENT, user_id INTEGER NOT NULL,
+        action_type TEXT NOT NULL, target_type TEXT, target_id TEXT, metadata TEXT,
+        timestamp TEXT NOT NULL, session_id TEXT);
+    CREATE TABLE user_recent_documents (user_id INTEGER NOT NULL, file_name TEXT NOT NULL,
+        last_accessed TEXT NOT NULL, last_action TEXT, PRIMARY KEY (user_id, file_name));
+    CREATE TABLE user_recent_uploads (user_id INTEGER NOT NULL, file_name TEXT NOT NULL,
+        upload_date TEXT NOT NULL, upload_metadata TEXT, PRIMARY KEY (user_id, file_name));
+"""
+
+
+@pytest.fixture
+def connect(tmp_path):
+    db_file = tmp_path / "activity.sqlite"
+
+    def _connect() -> sqlite3.Connection:
+        conn = sqlite3.connect(db_file)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    with _connect() as conn:
+        conn.executescript(SCHEMA)
+        conn.executemany("INSERT INTO papers VALUES (?, ?)",
+                         [('a.pdf', 'A'), ('b.pdf', 'B'), ('c.pdf', 'C')])
+    return _connect
+
+
+class TestActivityLogger:
+    """Batched writes and derived tables."""
+
+    @pytest.mark.database
+    def test_flush_writes_batches_and_recent_tables(self, connect) -> None:
+        """Events land in user_activity; recent tables keep the latest action per document."""
+        writer = ActivityLogger(flush_interval=60, batch_size=3)
+        writer.record(connect, 1, 'view_doc', 'document', 'a.pdf', timestamp='2024-01-01T10:00')
+        writer.record(connect, 1, 'create_doc', 'document', 'b.pdf', {'size': 10}, timestamp='2024-01-01T11:00')
+        writer.record(connect, 1, 'edit_doc', 'document', 'a.pdf', timestamp='2024-01-01T12:00')
+        writer.record(connect, 1, 'view_doc', 'search', 'q', {'file_name': 'c.pdf'}, timestamp='2024-01-01T13:00')
+        writer.record(connect, 1, 'view_doc', 'search', 'q', {'file_name': 'missing.pdf'}, timestamp='2024-01-01T14:00')
+        writer.record(connect, 2, 'view_doc', 'document', 'b.pdf', timestamp='2024-01-01T09:00')
+
+        writer.flush()
+        assert writer.pending() == 0
+        assert writer.stats['flushed'] == 6 and writer.stats['errors'] == 0
+
+        with connect() as conn:
+            assert conn.execute("SELECT COUNT(*) FROM user_activity").fetchone()[0] == 6
+            recent = conn.execute("""
+                SELECT file_name, last_accessed, last_action FROM user_recent_documents
+                WHERE user_id = 1 ORDER BY last_accessed DESC
+            """).fetchall()
+            uploads = conn.execute("SELECT file_name, upload_metadata FROM user_recent_uploads WHERE user_id = 1").fetchall()
+
+        assert [tuple(row) for row in recent] == [
+            ('c.pdf', '2024-01-01T13:00', 'view_doc'),
+            ('a.pdf', '2024-01-01T12:00', 'edit_doc'),
+            ('b.pdf', '2024-01-01T11:00', 'create_doc'),
+        ]
+        assert [tuple(row) for row in uploads] == [('b.pdf', '{"size": 10}')]
+
+    @pytest.mark.database
+    def test_older_events_do_not_overwrite_and_tables_are_pruned(self, connect, monkeypatch) -> None:
+        """A late, older event keeps the newer row; only the most recent rows per user survive."""
+        monkeypatch.setattr(activity_module, 'RECENT_ITEMS_PER_USER', 2)
+        writer = ActivityLogger(flush_interval=60)
+        writer.record(connect, 1, 'edit_doc', 'document', 'a.pdf', timestamp='2024-01-02')
+        writer.flush()
+        writer.record(connect, 1, 'view_doc', 'document', 'a.pdf', timestamp='2024-01-01')
+        writer.record(connect, 1, 'view_doc', 'document', 'b.pdf', timestamp='2024-01-03')
+        writer.record(connect, 1, 'view_doc', 'document', 'c.pdf', timestamp='2024-01-04')
+        writer.flush()
+
+        with connect() as conn:
+            rows = conn.execute("""
+                SELECT file_name, last_action FROM user_recent_documents ORDER BY last_accessed DESC
+            """).fetchall()
+        assert [tuple(row) for row in rows] == [('c.pdf', 'view_doc'), ('b.pdf', 'view_doc')]
+
+    @pytest.mark.database
+    def test_failed_batches_are_retried_then_dropped(self, connect, monkeypatch) -> None:
+        """A batch that fails to write is kept for the next flush, up to MAX_WRITE_ATTEMPTS times."""
+        monkeypatch.setattr(activity_module, 'MAX_WRITE_ATTEMPTS', 2)
+        writer = ActivityLogger(flush_interval=60, batch_size=10)
+        locked = [True]
+
+        def flaky_connect():
+            if locked[0]:
+                raise sqlite3.OperationalError("database is locked")
+            return connect()
+
+        for name in ('a.pdf', 'b.pdf', 'c.pdf'):
+            writer.record(flaky_connect, 1, 'view_doc', 'document', name, timestamp='2024-01-01')
+        assert writer.flush() == 0
+        assert writer.pending() == 3 and writer.stats['errors'] == 1
+
+        locked[0] = False
+        assert writer.flush() == 3
+        assert writer.pending() == 0 and writer.stats['dropped'] == 0
+        with connect() as conn:
+            assert conn.execute("SELECT COUNT(*) FROM user_activity").fetchone()[0] == 3
+
+        locked[0] = True
+        writer.record(flaky_connect, 1, 'view_doc', 'document', 'a.pdf', timestamp='2024-01-02')
+        writer.flush()
+        writer.flush()
+        assert writer.pending() == 0 and writer.stats['dropped'] == 1
+
+    @pytest.mark.database
+    def test_background_thread_flushes_without_caller(self, connect) -> None:
+        """record() returns immediately and the writer thread persists the events."""
+        writer = ActivityLogger(flush_interval=0.05, batch_size=50)
+        for i in range(500):
+            writer.record(connect, 1, 'view_doc', 'document', 'a.pdf', timestamp=f'2024-01-01T10:{i:04d}')
+
+        deadline = time.time() + 5
+        while writer.stats['flushed'] < 500 and time.time() < deadline:
+            time.sleep(0.02)
+
+        assert writer.stats['flushed'] == 500
+        assert writer.stats['batches'] < 500
+        with connect() as conn:
+            assert conn.execute("SELECT COUNT(*) FROM user_activity").fetchone()[0] == 500
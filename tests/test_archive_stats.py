@@ -0,0 +1,187 @@
+"""
+Tests for the SQL archive statistics engine (tools.archive_stats).
+Compares the aggregate queries with the previous pandas implementation and checks the per-version cache.
+"""
+
+import json
+import random
+import sqlite3
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+
+import pandas as pd
+import pytest
+
+from tools.archive_stats import ArchiveStatisticsEngine, compute_archive_stats
+from tools.ui_data_layer import create_data_version_schema
+
+
+SCHEMA = """
+    CREATE TABLE papers (file_name TEXT PRIMARY KEY, title TEXT, authors TEXT, publication_year INTEGER,
+        category_id TEXT, category_name TEXT, formatted_preview TEXT, processed_at TEXT);
+    CREATE TABLE concept_entities (id INTEGER PRIMARY KEY, user_id INTEGER);
+    CREATE TABLE concept_relationships (id INTEGER PRIMARY KEY, user_id INTEGER);
+    CREATE TABLE user_activity (id INTEGER PRIMARY KEY, user_id INTEGER);
+    CREATE TABLE users (id INTEGER PRIMARY KEY);
+"""
+
+AUTHORS = ["Rossi", "Bianchi", " Verdi ", "Neri", "Gallo", "Costa", "Fontana", "Conti"]
+CATEGORIES = [("C01", "Cosmologia"), ("C02", "Biologia"), ("C03", "Filosofia"), (None, None)]
+
+
+def make_papers(count: int, seed: int = 3) -> list:
+    """Synthetic papers with missing fields, malformed author JSON and mixed dates."""
+    rng = random.Random(seed)
+    now = datetime.now()
+    rows = []
+    for i in range(count):
+        roll = rng.random()
+        if roll < 0.1:
+            authors = None
+        elif roll < 0.15:
+            authors = "not json"
+        elif roll < 0.2:
+            authors = json.dumps(["  "])
+        else:
+            authors = json.dumps(rng.sample(AUTHORS, rng.randint(1, 3)))
+        category_id, category_name = rng.choice(CATEGORIES)
+        processed = now - timedelta(days=rng.randint(0, 400), hours=rng.randint(0, 23))
+        rows.append((
+            f"doc_{i}.pdf", f"Titolo {i}", authors,
+            rng.choice([None, 1990, 2015, 2023]), category_id, category_name,
+            rng.choice([None, "", "anteprima " * 50]),
+            None if rng.random() < 0.05 else processed.isoformat()
+        ))
+    return rows
+
+
+@pytest.fixture
+def connect(tmp_path):
+    db_file = tmp_path / "archive.sqlite"
+
+    def _connect() -> sqlite3.Connection:
+        conn = sqlite3.connect(db_file)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    with _connect() as conn:
+        conn.executescript(SCHEMA)
+        create_data_version_schema(conn.cursor())
+        conn.executemany("INSERT INTO papers VALUES (?, ?, ?, ?, ?, ?, ?, ?)", make_papers(600))
+    return _connect
+
+
+def reference_stats(conn: sqlite3.Connection) -> dict:
+    """Previous implementation: load the table in pandas and parse authors row by row."""
+    df = pd.read_sql_query("SELECT * FROM papers ORDER BY category_id, title", conn)
+    parsed = []
+    for authors_json in df['authors'].dropna():
+        try:
+            parsed.append(json.loads(authors_json))
+        except ValueError:
+            continue
+
+    dates = pd.to_datetime(df['processed_at'], errors='coerce', format='ISO8601')
+    total_cats = df['category_id'].nunique()
+    categories = df.groupby(['category_id', 'category_name']).size().reset_index(name='count')
+    categories['percentage'] = ((categories['count'] / categories['count'].sum()) * 100).round(1)
+    monthly = df.groupby(dates.dt.to_period('M')).size()
+
+    with_preview = len(df[df['formatted_preview'].notna() & (df['formatted_preview'] != '')])
+    with_year = len(df[df['publication_year'].notna()])
+    with_authors = sum(1 for authors in parsed if authors and any(a.strip() for a in authors))
+    total = len(df)
+
+    return {
+        'basic_stats': {
+            'total_documents': total,
+            'total_categories': total_cats,
+            'total_authors': len({a for authors in parsed for a in authors}),
+            'avg_documents_per_category': round(total / total_cats, 1),
+            'recent_documents': int((dates >= datetime.now() - timedelta(days=7)).sum()),
+            'oldest_document': dates.min().strftime('%Y-%m-%d'),
+            'newest_document': dates.max().strftime('%Y-%m-%d')
+        },
+        'categories': {(r['category_id'], r['category_name']): (r['count'], r['percentage'])
+                       for r in categories.to_dict('records')},
+        'authors': Counter(a.strip() for authors in parsed for a in authors),
+        'trend': {str(period): count for period, count in monthly.items()},
+        'data_quality': {
+            'total_documents': total,
+            'docs_with_preview': with_preview,
+            'docs_with_year': with_year,
+            'docs_with_authors': with_authors,
+            'completeness_score': round(with_preview / total * 40 + with_year / total * 30 + with_authors / total * 30, 1)
+        }
+    }
+
+
+class TestArchiveStatistics:
+    """Aggregate SQL statistics and version-based caching."""
+
+    @pytest.mark.database
+    def test_matches_pandas_implementation(self, connect) -> None:
+        """Every section equals the pandas computation on messy data."""
+        with connect() as conn:
+            stats = compute_archive_stats(conn)
+            expected = reference_stats(conn)
+
+        assert stats['basic_stats'] == expected['basic_stats']
+        assert stats['data_quality'] == expected['data_quality']
+        assert {(c['category_id'], c['category_name']): (c['count'], c['percentage'])
+                for c in stats['category_distribution']} == expected['categories']
+        counts = [c['count'] for c in stats['category_distribution']]
+        assert counts == sorted(counts, reverse=True)
+        assert {row['period']: row['count'] for row in stats['temporal_trend']} == expected['trend']
+        assert [(a['author'], a['document_count']) for a in stats['author_stats']] == \
+            sorted(expected['authors'].items(), key=lambda item: (-item[1], item[0]))[:20]
+        assert len(stats['recent_activity']) == stats['basic_stats']['recent_documents']
+
+    @pytest.mark.database
+    def test_cache_follows_archive_version(self, connect) -> None:
+        """Repeated requests reuse the result until papers changes, tracked by its data_versions counter only."""
+        engine = ArchiveStatisticsEngine()
+        first = engine.get_stats(connect)
+        assert engine.get_stats(connect) is first
+        assert engine.stats == {'hits': 1, 'computations': 1}
+
+        with connect() as conn:
+            conn.execute("UPDATE papers SET publication_year = 2024 WHERE file_name = 'doc_1.pdf'")
+        updated = engine.get_stats(connect)
+        assert updated is not first and engine.stats['computations'] == 2
+
+        with connect() as conn:
+            conn.execute("INSERT INTO concept_entities (user_id) VALUES (1)")
+            triggers = [row[0] for row in conn.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'trigger' AND tbl_name = 'papers'")]
+        assert engine.get_stats(connect) is updated
+        assert len(triggers) == 3
+
+        engine.invalidate()
+        engine.get_stats(connect)
+        assert engine.stats['computations'] == 3
+
+    @pytest.mark.performance
+    def test_benchmark_dashboard(self, connect) -> None:
+        """Five pandas loads per dashboard versus aggregate queries and cached lookups."""
+        with connect() as conn:
+            conn.executemany("INSERT INTO papers VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                             [(f"extra_{row[0]}",) + row[1:] for row in make_papers(4400, seed=8)])
+            start = time.perf_counter()
+            for _ in range(5):
+                reference_stats(conn)
+            reference_time = time.perf_counter() - start
+
+        engine = ArchiveStatisticsEngine()
+        start = time.perf_counter()
+        engine.get_stats(connect)
+        sql_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        for _ in range(100):
+            engine.get_stats(connect)
+        cached_time = (time.perf_counter() - start) / 100
+
+        assert sql_time < reference_time
+        assert cached_time < sql_time
@@ -0,0 +1,146 @@
+"""
+Tests for the set-based batch metadata executor (tools.batch_metadata).
+Compares each operation with the previous row-by-row rules, and covers preview, undo and 10k selections.
+"""
+
+import json
+import random
+import sqlite3
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from tools.batch_metadata import execute_operation, get_operation_history, preview_operation, undo_operation
+
+
+SCHEMA = """
+    CREATE TABLE papers (file_name TEXT PRIMARY KEY, title TEXT, authors TEXT, publication_year INTEGER,
+        category_id TEXT, category_name TEXT, formatted_preview TEXT, processed_at TEXT);
+    CREATE TABLE batch_operation_history (id INTEGER PRIMARY KEY AUTOINCREMENT, operation_type TEXT NOT NULL,
+        field TEXT NOT NULL, value TEXT, file_count INTEGER NOT NULL, affected_count INTEGER NOT NULL DEFAULT 0,
+        created_at TEXT NOT NULL, undone_at TEXT);
+    CREATE TABLE batch_operation_before_images (operation_id INTEGER NOT NULL, file_name TEXT NOT NULL,
+        old_value, PRIMARY KEY (operation_id, file_name));
+"""
+
+AUTHOR_VALUES = [None, "", "not json", '"Rossi"', '[1, "Rossi"]', '[]', '["Rossi"]', '[" Rossi ", "Bianchi"]',
+                 '["Bianchi", "Verdi"]', '["Verdi", "Rossi", "Neri"]']
+
+
+def make_connection(count: int, seed: int = 4) -> sqlite3.Connection:
+    rng = random.Random(seed)
+    conn = sqlite3.connect(":memory:")
+    conn.executescript(SCHEMA)
+    conn.executemany("INSERT INTO papers (file_name, title, authors, publication_year, category_id) VALUES (?, ?, ?, ?, ?)", [
+        (f"doc_{i:05d}.pdf", f"Titolo {i}", AUTHOR_VALUES[i % len(AUTHOR_VALUES)],
+         rng.choice([None, 2001, 2019]), rng.choice(["C01", "C02"]))
+        for i in range(count)
+    ])
+    conn.commit()
+    return conn
+
+
+def parse_authors(authors) -> list:
+    """Author list of a row; valid JSON that is not an array counts as unreadable."""
+    current = json.loads(authors) if authors else []
+    if not isinstance(current, list):
+        raise ValueError("not an array")
+    return current
+
+
+def reference_authors(operation_type: str, value: str, authors):
+    """Previous row-by-row rules from execute_batch_operation, as a parsed list (None = unchanged)."""
+    if operation_type == 'set':
+        return [value] if value else []
+    if operation_type == 'append':
+        try:
+            current = parse_authors(authors)
+            if value and value.strip() not in current:
+                current.append(value.strip())
+            return current
+        except Exception:
+            return [value] if value else []
+    try:
+        current = parse_authors(authors)
+        return [a for a in current if a.strip() != value.strip()]
+    except Exception:
+        return None
+
+
+def operation(operation_type: str, field: str, value, file_names):
+    return SimpleNamespace(operation_type=operation_type, field=field, value=value, file_names=file_names)
+
+
+def snapshot(conn: sqlite3.Connection) -> list:
+    return conn.execute("SELECT * FROM papers ORDER BY file_name").fetchall()
+
+
+class TestBatchMetadata:
+    """Compiled SQL operations, preview diff and undo."""
+
+    @pytest.mark.database
+    @pytest.mark.parametrize("operation_type,value", [("append", " Rossi "), ("remove", "Rossi"), ("set", "Gallo")])
+    def test_author_operations_match_row_by_row_rules(self, operation_type, value) -> None:
+        """The JSON1 expressions produce the same author lists as the previous Python loop."""
+        conn = make_connection(len(AUTHOR_VALUES))
+        before = dict(conn.execute("SELECT file_name, authors FROM papers"))
+
+        execute_operation(conn, operation(operation_type, 'authors', value, list(before)))
+
+        for file_name, authors in conn.execute("SELECT file_name, authors FROM papers"):
+            expected = reference_authors(operation_type, value, before[file_name])
+            if expected is None:
+                assert authors == before[file_name], file_name
+            else:
+                assert json.loads(authors) == expected, file_name
+
+    @pytest.mark.database
+    def test_preview_execute_and_undo(self) -> None:
+        """Preview reports the diff, execution is atomic and undo restores the before-image."""
+        conn = make_connection(50)
+        original = snapshot(conn)
+        selection = [f"doc_{i:05d}.pdf" for i in range(0, 50, 2)]
+        set_year = operation('set', 'publication_year', 2020, selection)
+
+        preview = preview_operation(conn, set_year, limit=3)
+        assert [row['file_name'] for row in preview['rows']] == selection[:3]
+        assert all(row['new_year'] == 2020 for row in preview['rows'])
+        expected_changes = sum(1 for row in original if row[0] in selection and row[3] != 2020)
+        assert preview['changed_count'] == expected_changes
+        assert snapshot(conn) == original
+
+        operation_id, affected = execute_operation(conn, set_year)
+        assert affected == expected_changes
+        assert conn.execute("SELECT COUNT(*) FROM papers WHERE publication_year = 2020").fetchone()[0] == len(selection)
+
+        with pytest.raises(ValueError):
+            execute_operation(conn, operation('set', 'title', 'X', selection + ['missing.pdf']))
+        assert conn.execute("SELECT COUNT(*) FROM papers WHERE title = 'X'").fetchone()[0] == 0
+
+        assert undo_operation(conn, operation_id) == expected_changes
+        assert snapshot(conn) == original
+        assert undo_operation(conn, operation_id) == 0
+        assert get_operation_history(conn)[0]['undone_at'] is not None
+
+    @pytest.mark.performance
+    def test_benchmark_10k_selection(self) -> None:
+        """10k-document selection: compiled statements versus one connection and commit per file."""
+        conn = make_connection(10000)
+        selection = [f"doc_{i:05d}.pdf" for i in range(10000)]
+
+        start = time.perf_counter()
+        for file_name in selection[:1000]:
+            row = conn.execute("SELECT authors FROM papers WHERE file_name = ?", (file_name,)).fetchone()
+            authors = reference_authors('append', 'Gallo', row[0])
+            conn.execute("UPDATE papers SET authors = ? WHERE file_name = ?", (json.dumps(authors), file_name))
+            conn.commit()
+        row_time = (time.perf_counter() - start) * 10
+
+        start = time.perf_counter()
+        _, affected = execute_operation(conn, operation('append', 'authors', 'Neri', selection))
+        batch_time = time.perf_counter() - start
+
+        # Only the lists that already contain "Neri" are left unchanged
+        assert affected == 9000
+        assert batch_time < row_time
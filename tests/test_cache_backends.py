@@ -0,0 +1,185 @@
+"""
+Tests for the tiered cache behind CacheManager and cache_result
+(src/core/performance/cache_backends.py).
+"""
+
+import hashlib
+import json
+import threading
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+from src.core.performance.cache_backends import MemoryLRUTier, SQLiteTier, TieredCache
+from src.core.performance.optimizer import CacheManager, cache_result, get_cache_stats, make_cache_key
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestTieredCache:
+    """Bounded LRU, monotonic TTLs, single-flight loads, shared tiers and metrics."""
+
+    @pytest.mark.unit
+    def test_lru_bounded_by_entries_and_bytes(self) -> None:
+        """Least recently used entries are evicted first; evictions are counted per namespace."""
+        cache = TieredCache([MemoryLRUTier(max_entries=3, max_bytes=10_000)])
+        for key in "abc":
+            cache.set(key, key.upper(), namespace="ricerca")
+        assert cache.get("a", namespace="ricerca") == "A"
+        cache.set("d", "D", namespace="ricerca")
+        assert cache.get("b", namespace="ricerca") is None
+        assert [cache.get(key, namespace="ricerca") for key in "acd"] == ["A", "C", "D"]
+
+        cache.set("grande", "x" * 6000, namespace="anteprime")
+        cache.set("enorme", "y" * 6000, namespace="anteprime")
+        memory = cache.get_stats()['tiers'][0]
+        assert memory['bytes'] <= 10_000 and cache.get("grande", namespace="anteprime") is None
+
+        namespaces = cache.namespace_stats()
+        assert namespaces['ricerca']['evictions'] >= 1
+        assert namespaces['ricerca']['misses'] == 1 and namespaces['ricerca']['hits'] == 4
+        assert namespaces['anteprime']['evictions'] >= 1
+
+    @pytest.mark.unit
+    def test_monotonic_ttl_and_cached_none(self) -> None:
+        """Entries expire on the monotonic clock; None is a cacheable value."""
+        clock = FakeClock()
+        cache = TieredCache([MemoryLRUTier(clock=clock)], default_ttl=10)
+        cache.set("vuoto", None)
+        cache.set("breve", 1, ttl=2)
+        assert cache.contains("vuoto") and cache.get("vuoto", default="assente") is None
+
+        clock.now += 5
+        assert cache.get("breve", default="scaduto") == "scaduto"
+        assert cache.contains("vuoto")
+        clock.now += 6
+        assert cache.cleanup_expired() == 1
+        assert cache.namespace_stats()['default']['expirations'] == 2
+
+    @pytest.mark.unit
+    def test_single_flight_loads_once(self) -> None:
+        """Concurrent misses run the loader once; failures reach every waiter and are not cached."""
+        cache = TieredCache()
+        calls = []
+
+        def slow_loader():
+            calls.append(1)
+            time.sleep(0.1)
+            return "risultato"
+
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(cache.get_or_load("k", slow_loader)))
+                   for _ in range(10)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert results == ["risultato"] * 10 and len(calls) == 1
+        assert cache.namespace_stats()['default']['coalesced'] == 9
+
+        errors = []
+
+        def failing_loader():
+            time.sleep(0.05)
+            raise ValueError("backend non disponibile")
+
+        def call():
+            try:
+                cache.get_or_load("errore", failing_loader)
+            except ValueError as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=call) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert len(errors) == 4 and not cache.contains("errore")
+        assert cache.namespace_stats()['default']['load_errors'] == 1
+
+    @pytest.mark.database
+    def test_sqlite_tier_shared_between_processes(self, tmp_path) -> None:
+        """A second cache (another process) finds the value in the shared tier and promotes it."""
+        path = str(tmp_path / "shared_cache.sqlite")
+        worker = TieredCache([MemoryLRUTier(), SQLiteTier(path)])
+        streamlit = TieredCache([MemoryLRUTier(), SQLiteTier(path)])
+
+        worker.get_or_load(("statistiche", 2024), lambda: {"documenti": 42}, namespace="stats")
+        assert streamlit.get_or_load(("statistiche", 2024), lambda: pytest.fail("loaded twice"),
+                                     namespace="stats") == {"documenti": 42}
+        assert streamlit.namespace_stats()['stats']['shared_hits'] == 1
+        assert streamlit.tiers[0].get("stats", ("statistiche", 2024))[0]
+
+        assert streamlit.clear(namespace="stats") == 1
+        assert not worker.tiers[1].get("stats", ("statistiche", 2024))[0]
+
+    @pytest.mark.unit
+    def test_cache_manager_and_cache_result(self) -> None:
+        """CacheManager keeps its API; cache_result metrics appear in get_cache_stats by namespace."""
+        manager = CacheManager(default_ttl=60, max_entries=100, use_shared_tier=False)
+        manager.set("chiave", [1, 2, 3])
+        assert manager.get("chiave") == [1, 2, 3] and manager.get("mancante", 7) == 7
+        assert manager.delete("chiave") and manager.get_stats()['total_entries'] == 0
+
+        calls = []
+
+        @cache_result(ttl_seconds=60)
+        def expensive(x, unhashable=None):
+            calls.append(x)
+            return x * 2
+
+        assert expensive(4) == expensive(4) == 8
+        assert expensive(5, unhashable={"a": [1]}) == 10
+        assert calls == [4, 5]
+        namespace = get_cache_stats()['namespaces'][expensive.cache_namespace]
+        assert namespace['hits'] == 1 and namespace['misses'] == 2
+
+    @pytest.mark.performance
+    def test_benchmark_hit_overhead_and_stampede(self) -> None:
+        """Previous json+md5 keys with datetime entries versus tuple keys; stampede with a 50ms loader."""
+        legacy = {}
+
+        def legacy_lookup(args, kwargs):
+            key = hashlib.md5(json.dumps({'operation': 'f', 'args': args, 'kwargs': kwargs},
+                                         sort_keys=True).encode()).hexdigest()
+            entry = legacy.get(key)
+            if entry is None or datetime.utcnow() > entry['expires_at']:
+                legacy[key] = {'value': 1, 'expires_at': datetime.utcnow() + timedelta(seconds=300),
+                               'last_accessed': datetime.utcnow()}
+                return 1
+            entry['last_accessed'] = datetime.utcnow()
+            return entry['value']
+
+        cache = TieredCache()
+        calls = 20_000
+        start = time.perf_counter()
+        for i in range(calls):
+            legacy_lookup((i % 100, "documento"), {'limit': 10})
+        legacy_time = time.perf_counter() - start
+        start = time.perf_counter()
+        for i in range(calls):
+            cache.get_or_load(make_cache_key((i % 100, "documento"), {'limit': 10}), lambda: 1)
+        tiered_time = time.perf_counter() - start
+
+        loads = []
+
+        def loader():
+            loads.append(1)
+            time.sleep(0.05)
+            return 1
+
+        threads = [threading.Thread(target=cache.get_or_load, args=("pagina", loader)) for _ in range(20)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert tiered_time < legacy_time
+        assert len(loads) == 1
@@ -0,0 +1,224 @@
+"""
+Tests for the embedding nearest-centroid pre-classifier (tools.category_classifier).
+Uses an offline hashing embedder and a fake LLM classifier.
+"""
+
+import random
+import sqlite3
+import time
+
+import numpy as np
+import pytest
+
+from tools.category_classifier import CentroidClassifier, chapter_descriptions
+from tools.rag_benchmark import HashingEmbedder
+
+
+SCHEMA = """
+    CREATE TABLE papers (file_name TEXT PRIMARY KEY, title TEXT, authors TEXT, publication_year INTEGER,
+        category_id TEXT, category_name TEXT, formatted_preview TEXT, processed_at TEXT);
+    CREATE TABLE category_centroid_members (file_name TEXT PRIMARY KEY, category_id TEXT NOT NULL,
+        embedding_model TEXT NOT NULL, vector BLOB NOT NULL, updated_at TEXT NOT NULL);
+    CREATE TABLE classification_log (id INTEGER PRIMARY KEY AUTOINCREMENT, file_name TEXT,
+        centroid_category TEXT NOT NULL, similarity REAL NOT NULL, margin REAL NOT NULL, confident INTEGER NOT NULL,
+        llm_category TEXT, final_category TEXT NOT NULL, decided_by TEXT NOT NULL, embedding_model TEXT NOT NULL,
+        created_at TEXT NOT NULL);
+"""
+
+STRUCTURE = {
+    "P1": {"name": "Cosmo", "chapters": {"C01": "Stelle galassie universo cosmologia", "C02": "Cellule geni evoluzione biologia"}},
+    "P2": {"name": "Società", "chapters": {"C03": "Guerre imperi rivoluzioni storia", "C04": "Mente emozioni memoria psicologia"}},
+}
+
+VOCABULARY = {
+    "P1/C01": "stelle galassie universo cosmologia pianeti buchi neri radiazione".split(),
+    "P1/C02": "cellule geni evoluzione biologia proteine specie mutazioni".split(),
+    "P2/C03": "guerre imperi rivoluzioni storia sovrani trattati battaglie".split(),
+    "P2/C04": "mente emozioni memoria psicologia percezione attenzione cognizione".split(),
+}
+COMMON = "studio analisi risultati metodo dati ricerca articolo".split()
+
+
+class FakeEmbedModel:
+    """LlamaIndex-style embedding model backed by the hashing embedder; counts embedded texts."""
+
+    model_name = "fake-hashing"
+
+    def __init__(self):
+        self.embedder = HashingEmbedder(256)
+        self.embedded = 0
+
+    def get_text_embedding(self, text):
+        return self.get_text_embedding_batch([text])[0]
+
+    def get_text_embedding_batch(self, texts):
+        self.embedded += len(texts)
+        return self.embedder.embed(texts).tolist()
+
+
+def make_text(category_id: str, rng: random.Random, purity: float = 0.6, words: int = 80) -> str:
+    """Document text with `purity` share of topic words, the rest generic or from other topics."""
+    others = [w for c, vocabulary in VOCABULARY.items() if c != category_id for w in vocabulary]
+    return " ".join(
+        rng.choice(VOCABULARY[category_id]) if rng.random() < purity else rng.choice(COMMON + others)
+        for _ in range(words)
+    )
+
+
+@pytest.fixture
+def connect(tmp_path):
+    db_file = tmp_path / "classifier.sqlite"
+    rng = random.Random(1)
+    with sqlite3.connect(db_file) as conn:
+        conn.executescript(SCHEMA)
+        conn.executemany("INSERT INTO papers (file_name, title, category_id, formatted_preview) VALUES (?, ?, ?, ?)", [
+            (f"{category_id.replace('/', '_')}_{i}.pdf", f"Documento {i}", category_id, make_text(category_id, rng))
+            for category_id in VOCABULARY for i in range(10)
+        ])
+    return lambda: sqlite3.connect(db_file)
+
+
+def llm_oracle(calls: list):
+    """Fake LLM classifier that knows the true category from the text's dominant vocabulary."""
+    def classify(text):
+        calls.append(text)
+        words = text.split()
+        return max(VOCABULARY, key=lambda c: sum(w in VOCABULARY[c] for w in words))
+    return classify
+
+
+class TestCentroidClassifier:
+    """Direct assignment, LLM fallback, incremental centroids and agreement metrics."""
+
+    @pytest.mark.database
+    def test_confident_documents_skip_the_llm(self, connect) -> None:
+        """Clear documents are assigned from centroids; ambiguous ones go to the LLM."""
+        classifier = CentroidClassifier(FakeEmbedModel(), STRUCTURE, connect, audit_rate=0.0)
+        assert set(classifier.category_ids) == set(chapter_descriptions(STRUCTURE)) == set(VOCABULARY)
+        calls = []
+        rng = random.Random(7)
+
+        clear = make_text("P2/C04", rng, purity=0.8)
+        assert classifier.classify(clear, llm_oracle(calls), "chiaro.pdf") == "P2/C04"
+        assert calls == []
+
+        ambiguous = " ".join(VOCABULARY["P1/C01"][:4] + VOCABULARY["P1/C02"][:4] + COMMON)
+        prediction = classifier.predict(classifier.embed_document(ambiguous))
+        assert not prediction.confident
+        classifier.classify(ambiguous, llm_oracle(calls), "ambiguo.pdf")
+        assert len(calls) == 1
+
+        metrics = classifier.agreement_metrics()
+        assert metrics['classifications'] == 2 and metrics['direct_assignments'] == 1 and metrics['llm_calls'] == 1
+
+    @pytest.mark.database
+    def test_centroids_refresh_incrementally(self, connect) -> None:
+        """Only new papers are embedded; reclassified and deleted papers move existing vectors."""
+        model = FakeEmbedModel()
+        classifier = CentroidClassifier(model, STRUCTURE, connect, refresh_interval=0)
+        assert classifier.refresh(force=True) == 40
+        embedded = model.embedded
+        centroids = classifier._centroids.copy()
+
+        assert classifier.refresh(force=True) == 0
+        assert model.embedded == embedded
+
+        rng = random.Random(3)
+        with connect() as conn:
+            conn.execute("INSERT INTO papers (file_name, title, category_id, formatted_preview) VALUES (?, ?, ?, ?)",
+                         ("nuovo.pdf", "Nuovo", "P1/C01", make_text("P1/C01", rng)))
+            conn.execute("UPDATE papers SET category_id = 'P2/C03' WHERE file_name = 'P2_C04_0.pdf'")
+            conn.execute("DELETE FROM papers WHERE file_name = 'P1_C02_0.pdf'")
+        assert classifier.refresh(force=True) == 3
+        assert model.embedded == embedded + 1
+        assert list(classifier._counts) == [11, 9, 11, 9]
+
+        # A fresh process rebuilds the same centroids from stored vectors, without embedding papers
+        fresh_model = FakeEmbedModel()
+        fresh = CentroidClassifier(fresh_model, STRUCTURE, connect)
+        assert fresh_model.embedded == len(VOCABULARY)
+        assert np.allclose(fresh._centroids, classifier._centroids, atol=1e-5)
+        assert not np.allclose(centroids, classifier._centroids)
+
+    @pytest.mark.database
+    def test_refresh_embeds_a_bounded_batch(self, connect) -> None:
+        """The first classify embeds at most refresh_limit papers; the backlog drains on later calls."""
+        model = FakeEmbedModel()
+        classifier = CentroidClassifier(model, STRUCTURE, connect, audit_rate=0.0, refresh_limit=15)
+        chapters = model.embedded
+        calls = []
+        text = make_text("P1/C01", random.Random(9), purity=0.8)
+
+        classifier.classify(text, llm_oracle(calls), "primo.pdf")
+        assert model.embedded - chapters == 15 + 1
+        # Still behind: the refresh interval does not throttle the next batch
+        assert classifier.refresh() == 15
+        assert classifier.refresh() == 10
+        assert classifier.refresh() == 0
+        assert sum(classifier._counts) == 40
+
+    @pytest.mark.database
+    def test_embedding_failure_falls_back_to_the_llm(self, connect) -> None:
+        """If the embedding model fails, the LLM decides and nothing is logged."""
+        model = FakeEmbedModel()
+        classifier = CentroidClassifier(model, STRUCTURE, connect)
+
+        def unavailable(texts):
+            raise ConnectionError("embedding endpoint unreachable")
+
+        model.get_text_embedding_batch = unavailable
+        calls = []
+        text = make_text("P2/C03", random.Random(4), purity=0.8)
+        assert classifier.classify(text, llm_oracle(calls), "offline.pdf") == "P2/C03"
+        assert len(calls) == 1
+        assert classifier.agreement_metrics()['classifications'] == 0
+
+    @pytest.mark.database
+    def test_agreement_metrics_from_audits(self, connect) -> None:
+        """With audit_rate=1 every confident case is checked against the LLM."""
+        classifier = CentroidClassifier(FakeEmbedModel(), STRUCTURE, connect, audit_rate=1.0)
+        classifier.refresh(force=True)
+        rng = random.Random(11)
+        calls = []
+        for category_id in VOCABULARY:
+            for i in range(5):
+                classifier.classify(make_text(category_id, rng), llm_oracle(calls), f"{category_id}_{i}")
+
+        metrics = classifier.agreement_metrics()
+        assert len(calls) == metrics['classifications'] == 20
+        assert metrics['audited'] + metrics['ambiguous'] == 20
+        assert metrics['confident_agreement'] == 1.0
+
+    @pytest.mark.performance
+    def test_benchmark_llm_calls_avoided(self, connect) -> None:
+        """LLM-only classification (20ms per call) versus centroid pre-classification."""
+        rng = random.Random(5)
+        documents = [(category_id, make_text(category_id, rng, purity=rng.uniform(0.3, 0.8)))
+                     for category_id in VOCABULARY for _ in range(50)]
+
+        def slow_llm(calls):
+            oracle = llm_oracle(calls)
+
+            def classify(text):
+                time.sleep(0.02)
+                return oracle(text)
+            return classify
+
+        start = time.perf_counter()
+        llm_calls = []
+        for _, text in documents:
+            slow_llm(llm_calls)(text)
+        llm_time = time.perf_counter() - start
+
+        classifier = CentroidClassifier(FakeEmbedModel(), STRUCTURE, connect, audit_rate=0.0)
+        classifier.refresh(force=True)
+        start = time.perf_counter()
+        fallback_calls = []
+        # Agreement with the LLM's own answer, which is the reference for the pipeline
+        oracle = llm_oracle([])
+        correct = sum(classifier.classify(text, slow_llm(fallback_calls)) == oracle(text) for _, text in documents)
+        hybrid_time = time.perf_counter() - start
+
+        assert hybrid_time < llm_time
+        assert len(fallback_calls) < len(llm_calls) / 2
+        assert correct / len(documents) >= 0.95
@@ -0,0 +1,180 @@
+"""
+Tests for the map-reduce document summarizer (tools.document_summarizer).
+Uses a fake LLM that records prompts; no index or model is needed.
+"""
+
+import random
+import sqlite3
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from tools.document_summarizer import DocumentSummarizer, SummaryCache, group_chunks
+
+
+SCHEMA = """
+    CREATE TABLE summary_cache (content_hash TEXT PRIMARY KEY, stage TEXT NOT NULL, summary TEXT NOT NULL,
+        created_at TEXT NOT NULL, last_used_at TEXT NOT NULL);
+"""
+
+
+class FakeLLM:
+    """Returns a short digest of each prompt and tracks prompt sizes and concurrency."""
+
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay
+        self.prompts = []
+        self.active = self.peak = 0
+        self._lock = threading.Lock()
+
+    def complete(self, prompt):
+        with self._lock:
+            self.prompts.append(prompt)
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+        time.sleep(self.delay)
+        with self._lock:
+            self.active -= 1
+        return SimpleNamespace(text=f"sintesi[{len(prompt)}:{hash(prompt) % 10000}]")
+
+
+def make_chunks(count: int, seed: int = 2) -> list:
+    rng = random.Random(seed)
+    words = "energia materia universo cellula etica storia placche luce".split()
+    return [f"Chunk {i}: " + " ".join(rng.choices(words, k=150)) for i in range(count)]
+
+
+@pytest.fixture
+def cache(tmp_path):
+    db_file = tmp_path / "summaries.sqlite"
+    with sqlite3.connect(db_file) as conn:
+        conn.executescript(SCHEMA)
+    return SummaryCache(lambda: sqlite3.connect(db_file))
+
+
+class TestDocumentSummarizer:
+    """Bounded prompts, hierarchical reduce and hash-based reuse."""
+
+    @pytest.mark.unit
+    def test_prompts_stay_within_budget(self) -> None:
+        """Long documents never produce a prompt above the group budget plus the template."""
+        llm = FakeLLM()
+        summarizer = DocumentSummarizer(llm, max_group_chars=3000, reduce_fan_in=3)
+        summary = summarizer.summarize("lungo.pdf", make_chunks(120))
+
+        assert summary.startswith("sintesi[")
+        assert max(len(prompt) for prompt in llm.prompts) < 3000 + 400
+        assert sum("riassunti parziali" in prompt for prompt in llm.prompts) >= 2
+        assert "riassunto dettagliato" in llm.prompts[-1]
+
+    @pytest.mark.unit
+    def test_short_document_uses_single_prompt(self) -> None:
+        """A document that fits in one group is summarized with one call, as before."""
+        llm = FakeLLM()
+        DocumentSummarizer(llm).summarize("breve.pdf", make_chunks(3))
+        assert len(llm.prompts) == 1 and "riassunto dettagliato" in llm.prompts[0]
+
+    @pytest.mark.unit
+    def test_grouping_is_local_to_edits(self) -> None:
+        """Editing one chunk changes at most the groups around it."""
+        chunks = make_chunks(200)
+        edited = list(chunks)
+        edited[100] = edited[100] + " modifica"
+        before = group_chunks(chunks, 4000)
+        after = group_chunks(edited, 4000)
+
+        assert [c for group in after for c in group] == edited
+        unchanged = sum(1 for group in after if group in before)
+        assert unchanged >= len(after) - 2
+
+    @pytest.mark.database
+    def test_resummarize_after_small_edit_reuses_cache(self, cache) -> None:
+        """The second run only regenerates the edited group and the reduce path above it."""
+        chunks = make_chunks(150)
+        first = DocumentSummarizer(FakeLLM(), cache, max_group_chars=3000)
+        original = first.summarize("doc.pdf", chunks)
+
+        repeat = DocumentSummarizer(FakeLLM(), cache, max_group_chars=3000)
+        assert repeat.summarize("doc.pdf", chunks) == original
+        assert repeat.stats['llm_calls'] == 0
+
+        edited = list(chunks)
+        edited[75] = edited[75].replace("energia", "entropia", 1)
+        incremental = DocumentSummarizer(FakeLLM(), cache, max_group_chars=3000)
+        assert incremental.summarize("doc.pdf", edited) != original
+        assert incremental.stats['cache_hits'] > 0
+        assert incremental.stats['llm_calls'] <= 2 + 4
+        assert incremental.stats['llm_calls'] < first.stats['llm_calls'] / 4
+
+    @pytest.mark.database
+    def test_reduce_terminates_with_long_partial_summaries(self, cache) -> None:
+        """Summaries longer than half the budget are truncated so every reduce level shrinks the list."""
+        class VerboseLLM(FakeLLM):
+            def complete(self, prompt):
+                super().complete(prompt)
+                return SimpleNamespace(text=f"{hash(prompt) % 10000} " + "parola " * 1000)
+
+        chunks = ["Sezione " + "testo " * 1500 for _ in range(12)]
+        for _ in range(2):  # the second run is served by the cache and must terminate too
+            llm = VerboseLLM()
+            summarizer = DocumentSummarizer(llm, cache)
+            summarizer.summarize("verboso.pdf", chunks)
+            assert summarizer.stats['reduce_levels'] <= 4
+            assert summarizer.stats['llm_calls'] + summarizer.stats['cache_hits'] <= 12 + 6 + 3 + 2 + 1
+            assert all(len(prompt) < 12_000 + 400 for prompt in llm.prompts if "riassunti parziali" in prompt)
+        assert summarizer.stats['llm_calls'] == 0
+
+    @pytest.mark.unit
+    def test_reduce_level_limit_ends_with_truncated_final_prompt(self) -> None:
+        """Past max_reduce_levels the remaining summaries share one truncated final prompt."""
+        llm = FakeLLM()
+        summarizer = DocumentSummarizer(llm, max_group_chars=3000, reduce_fan_in=2, max_reduce_levels=1)
+        summarizer.summarize("lungo.pdf", make_chunks(120))
+        assert summarizer.stats['reduce_levels'] == 1
+        assert "riassunto dettagliato" in llm.prompts[-1] and len(llm.prompts[-1]) < 3000 + 400
+
+    @pytest.mark.database
+    def test_cache_key_includes_model(self, cache) -> None:
+        """Switching model does not reuse summaries generated by another model."""
+        chunks = make_chunks(40)
+        first = FakeLLM()
+        first.metadata = SimpleNamespace(model_name="modello-a")
+        DocumentSummarizer(first, cache, max_group_chars=3000).summarize("doc.pdf", chunks)
+
+        other = FakeLLM()
+        other.metadata = SimpleNamespace(model_name="modello-b")
+        summarizer = DocumentSummarizer(other, cache, max_group_chars=3000)
+        summarizer.summarize("doc.pdf", chunks)
+        assert summarizer.stats['cache_hits'] == 0 and summarizer.stats['llm_calls'] == len(first.prompts)
+
+    @pytest.mark.unit
+    def test_map_runs_in_parallel_and_cache_skips_llm(self, cache) -> None:
+        """Map calls overlap up to max_workers; a cached re-run makes no LLM calls."""
+        chunks = make_chunks(200)
+        llm = FakeLLM(delay=0.01)
+        parallel = DocumentSummarizer(llm, cache, max_group_chars=3000, max_workers=8)
+        summary = parallel.summarize("doc.pdf", chunks)
+        assert 1 < llm.peak <= 8
+
+        cached = DocumentSummarizer(FakeLLM(), cache, max_group_chars=3000)
+        assert cached.summarize("doc.pdf", chunks) == summary
+        assert cached.stats['llm_calls'] == 0 and cached.stats['cache_hits'] > 0
+
+    @pytest.mark.performance
+    def test_benchmark_parallel_map(self) -> None:
+        """Parallel map with a 10ms LLM versus sequential calls."""
+        chunks = make_chunks(200)
+
+        sequential = DocumentSummarizer(FakeLLM(delay=0.01), max_group_chars=3000, max_workers=1)
+        start = time.perf_counter()
+        sequential.summarize("doc.pdf", chunks)
+        sequential_time = time.perf_counter() - start
+
+        parallel = DocumentSummarizer(FakeLLM(delay=0.01), max_group_chars=3000, max_workers=8)
+        start = time.perf_counter()
+        parallel.summarize("doc.pdf", chunks)
+        parallel_time = time.perf_counter() - start
+
+        assert parallel_time < sequential_time
@@ -0,0 +1,171 @@
+"""
+Tests for sentence-embedding reuse in chunking (tools.embedding_chunker).
+Uses the offline hashing embedder from the RAG benchmark harness.
+"""
+
+import random
+import time
+
+import numpy as np
+import pytest
+
+from tools.embedding_chunker import (
+    EmbeddingCache,
+    FixedWindowChunker,
+    SemanticChunker,
+    chunking_strategy_for,
+    get_chunker,
+    split_sentences,
+)
+from tools.rag_benchmark import HashingEmbedder
+
+
+TOPICS = {
+    "cosmo": "stelle galassie universo pianeti radiazione orbite telescopi nebulose".split(),
+    "biologia": "cellule geni proteine evoluzione specie mutazioni enzimi tessuti".split(),
+    "storia": "imperi sovrani trattati battaglie rivoluzioni dinastie guerre confini".split(),
+    "mente": "memoria emozioni percezione attenzione coscienza apprendimento sogni linguaggio".split(),
+}
+COMMON = "lo studio mostra che i dati della ricerca".split()
+
+
+class FakeEmbedModel:
+    """LlamaIndex-style embedding model; `cost` seconds per embedded word simulates CPU inference."""
+
+    model_name = "fake-hashing"
+
+    def __init__(self, cost: float = 0.0):
+        self.embedder = HashingEmbedder(256)
+        self.cost = cost
+        self.embedded = 0
+        self.words = 0
+
+    def get_text_embedding_batch(self, texts):
+        words = sum(len(text.split()) for text in texts)
+        self.embedded += len(texts)
+        self.words += words
+        if self.cost:
+            time.sleep(self.cost * words)
+        return self.embedder.embed(texts).tolist()
+
+
+def sentence(topic: str, rng: random.Random) -> str:
+    words = rng.choices(COMMON, k=3) + rng.choices(TOPICS[topic], k=8)
+    return " ".join(words).capitalize() + "."
+
+
+def make_document(topics, rng: random.Random, sentences_per_section: int = 8) -> str:
+    """Sections of consecutive sentences on one topic each."""
+    return " ".join(sentence(topic, rng) for topic in topics for _ in range(sentences_per_section))
+
+
+class TestEmbeddingChunker:
+    """Semantic split with pooled chunk embeddings, fixed windows and per-type selection."""
+
+    @pytest.mark.unit
+    def test_semantic_split_reuses_sentence_embeddings(self) -> None:
+        """Topic shifts become chunk boundaries and chunk vectors come from sentence vectors."""
+        rng = random.Random(1)
+        text = make_document(["cosmo", "storia", "biologia"], rng)
+        spans = split_sentences(text)
+        assert len(spans) == 24 and "".join(text[a:b] for a, b in spans) == text
+
+        model = FakeEmbedModel()
+        chunker = SemanticChunker(model, breakpoint_percentile=90)
+        chunks = chunker.split(text)
+        assert len(chunks) >= 3
+        # One embedding per sentence, without neighbours; cohesive chunks are not embedded again
+        assert model.embedded == 24 + chunker.stats['reembedded_chunks']
+        assert chunker.stats['reused_chunks'] == len(chunks)
+        assert all(text[chunk.start:chunk.end] == chunk.text for chunk in chunks)
+
+        # Chunk vectors pool only the chunk's own sentences, not the buffered windows
+        # that reach across its boundaries
+        embedder = HashingEmbedder(256)
+        for chunk in chunks:
+            sentences = [text[a:b] for a, b in spans if chunk.start <= a and b <= chunk.end]
+            pooled = embedder.embed(sentences).mean(axis=0)
+            assert np.allclose(chunk.embedding, pooled / np.linalg.norm(pooled), atol=1e-5)
+
+    @pytest.mark.unit
+    def test_reuse_policies_and_cache(self) -> None:
+        """'reembed' embeds every chunk again, 'auto' only incoherent ones; retries hit the cache."""
+        rng = random.Random(2)
+        text = make_document(["mente", "cosmo"], rng, sentences_per_section=6)
+
+        reembed = SemanticChunker(FakeEmbedModel(), reuse="reembed")
+        chunks = reembed.split(text)
+        # Single-sentence chunks hit the cache of the sentence embeddings
+        assert reembed.stats['embedded_texts'] <= 12 + len(chunks)
+        assert reembed.stats['reembedded_chunks'] == len(chunks)
+
+        auto = SemanticChunker(FakeEmbedModel(), reuse="auto", min_cohesion=1.01)
+        auto.split(text)
+        multi_sentence = auto.stats['reembedded_chunks']
+        assert 0 < multi_sentence <= auto.stats['chunks']
+
+        cache = EmbeddingCache()
+        model = FakeEmbedModel()
+        first = SemanticChunker(model, cache).split(text)
+        embedded = model.embedded
+        again = SemanticChunker(model, cache).split(text)
+        assert model.embedded == embedded
+        assert [chunk.text for chunk in again] == [chunk.text for chunk in first]
+        assert cache.hits >= 12
+
+    @pytest.mark.unit
+    def test_fixed_windows_and_selection_by_extension(self) -> None:
+        """Windows cover the text with overlap, cut on spaces; strategies are chosen per file type."""
+        text = " ".join(f"parola{i}" for i in range(600))
+        model = FakeEmbedModel()
+        chunks = FixedWindowChunker(model, window_chars=500, overlap=100).split(text)
+        assert model.embedded == len(chunks) > 1
+        assert chunks[0].start == 0 and chunks[-1].end == len(text)
+        for previous, current in zip(chunks, chunks[1:]):
+            assert current.start < previous.end
+            assert text[current.start - 1] == " " and (previous.end == len(text) or text[previous.end] == " ")
+
+        assert chunking_strategy_for("Articolo.PDF") == "semantic"
+        assert chunking_strategy_for("note.md") == "fixed"
+        assert get_chunker("note.md", model).strategy == "fixed"
+        assert get_chunker("note.md", model, strategy="semantic").strategy == "semantic"
+        with pytest.raises(ValueError):
+            get_chunker("note.md", model, strategy="paragrafi")
+
+    @pytest.mark.performance
+    def test_benchmark_ingest_throughput_and_recall(self) -> None:
+        """Splitter + index re-embedding versus pooled reuse versus fixed windows (20us per embedded word)."""
+        rng = random.Random(3)
+        names = list(TOPICS)
+        documents = {f"doc_{i}": make_document(rng.sample(names, 2), rng) for i in range(40)}
+        topics_of = {}
+        for name, text in documents.items():
+            topics_of[name] = {topic for topic in names if any(word in text for word in TOPICS[topic][:3])}
+
+        results = {}
+        for label, factory in {
+            "split + re-embed": lambda model: SemanticChunker(model, reuse="reembed"),
+            "split + reuse": lambda model: SemanticChunker(model, reuse="auto"),
+            "fixed window": lambda model: FixedWindowChunker(model, window_chars=600, overlap=100),
+        }.items():
+            model = FakeEmbedModel(cost=0.00002)
+            chunker = factory(model)
+            start = time.perf_counter()
+            index = [(name, chunk.embedding) for name, text in documents.items() for chunk in chunker.split(text)]
+            elapsed = time.perf_counter() - start
+
+            matrix = np.stack([vector for _, vector in index])
+            hits = total = 0
+            for topic in names:
+                query = HashingEmbedder(256).embed([" ".join(TOPICS[topic])])[0]
+                relevant = {name for name, topics in topics_of.items() if topic in topics}
+                top = {index[i][0] for i in np.argsort(-(matrix @ query))[:10]}
+                hits += len(top & relevant)
+                total += min(10, len(relevant))
+            results[label] = (len(documents) / elapsed, model.words, hits / total)
+
+        assert results["split + reuse"][1] < results["split + re-embed"][1] * 0.85
+        # Each sentence is embedded once, while windows embed their overlap twice
+        assert results["split + reuse"][1] <= results["fixed window"][1]
+        assert results["split + reuse"][0] > results["split + re-embed"][0]
+        assert results["split + reuse"][2] >= results["split + re-embed"][2] - 0.05
@@ -0,0 +1,157 @@
+"""
+Tests for the precomputed centrality service (tools.graph_centrality).
+Covers agreement with NetworkX, versioned caching/persistence and a 100k-edge benchmark.
+"""
+
+import sqlite3
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from tools.graph_engine import CSRKnowledgeGraph, KnowledgeGraphEngineRegistry
+from tools.graph_centrality import (
+    CentralityScores,
+    GraphCentralityService,
+    approximate_betweenness,
+    compute_centrality,
+    weighted_pagerank,
+)
+from tests.test_graph_engine import make_graph_rows
+
+
+def simple_graph_rows(num_nodes: int, num_edges: int, seed: int = 7):
+    """Random rows without self-loops or parallel edges (NetworkX Graph semantics)."""
+    entities, relationships = make_graph_rows(num_nodes, num_edges * 2, seed)
+    seen = set()
+    unique = []
+    for rel in relationships:
+        pair = frozenset((rel['source_entity_id'], rel['target_entity_id']))
+        if len(pair) == 2 and pair not in seen:
+            seen.add(pair)
+            unique.append(rel)
+    return entities, unique[:num_edges]
+
+
+class TestCentralityMetrics:
+    """Vectorized metrics against the NetworkX reference implementations."""
+
+    @pytest.mark.unit
+    def test_pagerank_and_betweenness_match_networkx(self) -> None:
+        """Weighted PageRank and exact (n <= pivots) betweenness agree with NetworkX."""
+        nx = pytest.importorskip("networkx")
+        pytest.importorskip("scipy")  # networkx.pagerank
+        entities, relationships = simple_graph_rows(60, 150)
+        graph = CSRKnowledgeGraph.from_rows(entities, relationships)
+
+        reference = nx.Graph()
+        reference.add_nodes_from(e['id'] for e in entities)
+        reference.add_weighted_edges_from(
+            (r['source_entity_id'], r['target_entity_id'], r['confidence_score']) for r in relationships
+        )
+        expected_pagerank = nx.pagerank(reference, weight='weight', tol=1e-10)
+        expected_betweenness = nx.betweenness_centrality(reference)
+
+        pagerank = weighted_pagerank(graph, tol=1e-10)
+        betweenness = approximate_betweenness(graph, pivots=100)
+        for node, entity_id in enumerate(graph.entity_ids):
+            assert pagerank[node] == pytest.approx(expected_pagerank[int(entity_id)], abs=1e-6)
+            assert betweenness[node] == pytest.approx(expected_betweenness[int(entity_id)], abs=1e-9)
+
+    @pytest.mark.unit
+    def test_sampled_betweenness_ranks_hubs_first(self) -> None:
+        """With few pivots the bridge of a two-star graph is still ranked first."""
+        entities = [{'id': i, 'entity_name': f'n{i}', 'entity_type': 'concept',
+                     'confidence_score': 0.9, 'source_file_name': 'a.pdf'} for i in range(1, 42)]
+        relationships = [{'id': i, 'source_entity_id': 1 if i <= 20 else 2, 'target_entity_id': i + 2,
+                          'relationship_type': 'related_to', 'confidence_score': 0.8} for i in range(1, 40)]
+        relationships.append({'id': 40, 'source_entity_id': 1, 'target_entity_id': 2,
+                              'relationship_type': 'related_to', 'confidence_score': 0.8})
+        graph = CSRKnowledgeGraph.from_rows(entities, relationships)
+
+        betweenness = approximate_betweenness(graph, pivots=8)
+        assert set(graph.entity_ids[graph.top_k(betweenness, 2)].tolist()) == {1, 2}
+
+
+class TestGraphCentralityService:
+    """Versioned caching and persistence through SQLite."""
+
+    @staticmethod
+    def _create_schema(conn: sqlite3.Connection) -> None:
+        conn.executescript("""
+            CREATE TABLE concept_entities (id INTEGER PRIMARY KEY, user_id INTEGER, entity_type TEXT,
+                entity_name TEXT, source_file_name TEXT, confidence_score REAL);
+            CREATE TABLE concept_relationships (id INTEGER PRIMARY KEY, user_id INTEGER,
+                source_entity_id INTEGER, target_entity_id INTEGER, relationship_type TEXT, confidence_score REAL);
+            CREATE TABLE knowledge_graph_changes (id INTEGER PRIMARY KEY AUTOINCREMENT, user_id INTEGER,
+                entity_kind TEXT, row_id INTEGER, operation TEXT, changed_at TEXT DEFAULT CURRENT_TIMESTAMP);
+            CREATE TRIGGER r_ins AFTER INSERT ON concept_relationships BEGIN
+                INSERT INTO knowledge_graph_changes (user_id, entity_kind, row_id, operation) VALUES (NEW.user_id, 'relationship', NEW.id, 'upsert'); END;
+            CREATE TABLE graph_centrality_runs (user_id INTEGER PRIMARY KEY, graph_version INTEGER NOT NULL,
+                node_count INTEGER NOT NULL, edge_count INTEGER NOT NULL, duration_ms REAL, computed_at TEXT NOT NULL);
+            CREATE TABLE graph_centrality_scores (user_id INTEGER NOT NULL, entity_id INTEGER NOT NULL,
+                weighted_degree REAL NOT NULL DEFAULT 0, pagerank REAL NOT NULL DEFAULT 0,
+                betweenness REAL NOT NULL DEFAULT 0, PRIMARY KEY (user_id, entity_id));
+        """)
+
+    @pytest.mark.database
+    def test_scores_refresh_only_when_graph_changes(self, tmp_path, monkeypatch) -> None:
+        """Reruns hit memory, other processes load from SQLite, graph changes recompute."""
+        import tools.graph_centrality as graph_centrality
+        monkeypatch.setattr(graph_centrality, 'knowledge_graph_registry', KnowledgeGraphEngineRegistry())
+        db_file = tmp_path / "graph.sqlite"
+
+        def connect() -> sqlite3.Connection:
+            conn = sqlite3.connect(db_file)
+            conn.row_factory = sqlite3.Row
+            return conn
+
+        with connect() as conn:
+            self._create_schema(conn)
+            conn.executemany("INSERT INTO concept_entities VALUES (?, 1, ?, ?, 'a.pdf', 0.8)",
+                             [(1, 'concept', 'hub'), (2, 'concept', 'a'), (3, 'author', 'b'), (4, 'concept', 'c')])
+            conn.executemany("INSERT INTO concept_relationships VALUES (?, 1, ?, ?, 'related_to', ?)",
+                             [(1, 1, 2, 0.9), (2, 1, 3, 0.7), (3, 1, 4, 0.4)])
+
+        service = GraphCentralityService()
+        top = service.top_entities(1, connect, k=2)
+        assert [e['entity_name'] for e in top] == ['hub', 'a']
+        assert top[0]['score'] == pytest.approx(2.0)
+        assert top[0]['avg_confidence'] == pytest.approx(2.0 / 3)
+        assert [e['entity_name'] for e in service.top_entities(1, connect, min_confidence=0.5)] == ['hub', 'a', 'b']
+        assert [e['entity_name'] for e in service.top_entities(1, connect, entity_type='author')] == ['b']
+        assert service.top_entities(1, connect, metric='betweenness', k=1)[0]['entity_name'] == 'hub'
+        assert service.stats == {'hits': 3, 'loads': 0, 'computes': 1}
+
+        other_process = GraphCentralityService()
+        assert other_process.top_entities(1, connect, metric='pagerank', k=1)[0]['entity_name'] == 'hub'
+        assert other_process.stats['loads'] == 1
+
+        with connect() as conn:
+            conn.execute("INSERT INTO concept_relationships VALUES (4, 1, 3, 4, 'extends', 0.9)")
+            conn.execute("INSERT INTO concept_relationships VALUES (5, 1, 3, 2, 'extends', 0.9)")
+        assert service.top_entities(1, connect, k=1)[0]['entity_name'] == 'b'
+        assert service.stats['computes'] == 2
+        with connect() as conn:
+            run = conn.execute("SELECT graph_version, edge_count FROM graph_centrality_runs WHERE user_id = 1").fetchone()
+        assert tuple(run) == (5, 5)
+
+
+class TestGraphCentralityBenchmark:
+    """Benchmark on a 100k-edge graph."""
+
+    @pytest.mark.performance
+    def test_100k_edges_benchmark(self) -> None:
+        """Whole-graph centrality in one pass, then O(k) ranked reads."""
+        entities, relationships = make_graph_rows(20_000, 100_000)
+        graph = CSRKnowledgeGraph.from_rows(entities, relationships)
+
+        scores = compute_centrality(graph)
+        cached = CentralityScores(GraphCentralityService.graph_version(graph), scores)
+        nodes, values, _, _ = cached.ranking(graph, 'pagerank', 0.5, 'concept')
+        top = nodes[:10]
+
+        assert len(top) == 10
+        assert np.all(np.diff(values) <= 0)
+        # Reads after the first reuse the cached ranking instead of sorting the graph again
+        assert cached.ranking(graph, 'pagerank', 0.5, 'concept')[0] is nodes
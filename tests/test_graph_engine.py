@@ -0,0 +1,256 @@
+"""
+Tests for the CSR knowledge graph engine (tools.graph_engine).
+Covers vectorized queries, incremental patches and a 100k-edge benchmark.
+"""
+
+import random
+import sqlite3
+import time
+from collections import deque
+from typing import Any, Dict, List, Tuple
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from tools.graph_engine import CSRKnowledgeGraph, KnowledgeGraphEngineRegistry
+
+
+def make_graph_rows(num_nodes: int, num_edges: int, seed: int = 42) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """Generate random concept_entities / concept_relationships rows."""
+    rng = random.Random(seed)
+    types = ['concept', 'theory', 'author', 'formula', 'technique', 'method']
+    entities = [
+        {
+            'id': i + 1,
+            'entity_name': f'entity_{i}',
+            'entity_type': types[i % len(types)],
+            'confidence_score': rng.random(),
+            'source_file_name': f'doc_{i % 50}.pdf',
+        }
+        for i in range(num_nodes)
+    ]
+    relationships = [
+        {
+            'id': j + 1,
+            'source_entity_id': rng.randint(1, num_nodes),
+            'target_entity_id': rng.randint(1, num_nodes),
+            'relationship_type': 'related_to',
+            'confidence_score': rng.random(),
+        }
+        for j in range(num_edges)
+    ]
+    return entities, relationships
+
+
+def reference_k_hop(relationships: List[Dict[str, Any]], start_id: int, k: int, min_confidence: float = 0.0) -> Dict[int, int]:
+    """Plain BFS over entity ids, used as the expected result."""
+    adjacency: Dict[int, List[int]] = {}
+    for rel in relationships:
+        if rel['confidence_score'] < min_confidence:
+            continue
+        adjacency.setdefault(rel['source_entity_id'], []).append(rel['target_entity_id'])
+        adjacency.setdefault(rel['target_entity_id'], []).append(rel['source_entity_id'])
+
+    depths = {start_id: 0}
+    queue = deque([start_id])
+    while queue:
+        current = queue.popleft()
+        if depths[current] == k:
+            continue
+        for neighbor in adjacency.get(current, []):
+            if neighbor not in depths:
+                depths[neighbor] = depths[current] + 1
+                queue.append(neighbor)
+    return depths
+
+
+class TestCSRKnowledgeGraph:
+    """Unit tests for vectorized graph queries."""
+
+    @pytest.mark.unit
+    def test_k_hop_matches_reference_bfs(self) -> None:
+        """k-hop depths match a plain BFS, with and without confidence filter."""
+        entities, relationships = make_graph_rows(500, 1500)
+        graph = CSRKnowledgeGraph.from_rows(entities, relationships)
+
+        for min_confidence in (0.0, 0.5):
+            nodes, depths = graph.k_hop(graph.node_index('entity_0'), 3, min_confidence)
+            result = {int(graph.entity_ids[n]): int(d) for n, d in zip(nodes, depths)}
+            assert result == reference_k_hop(relationships, 1, 3, min_confidence)
+
+    @pytest.mark.unit
+    def test_degree_and_confidence_filters(self) -> None:
+        """Degrees, weighted degrees and masks are consistent with the raw rows."""
+        entities, relationships = make_graph_rows(200, 800)
+        graph = CSRKnowledgeGraph.from_rows(entities, relationships)
+
+        expected = np.zeros(200, dtype=np.int64)
+        for rel in relationships:
+            expected[rel['source_entity_id'] - 1] += 1
+            expected[rel['target_entity_id'] - 1] += 1
+        assert np.array_equal(graph.degree(), expected)
+        assert graph.num_edges == len(relationships)
+        assert np.isclose(graph.weighted_degree().sum(), 2 * sum(r['confidence_score'] for r in relationships), rtol=1e-4)
+
+        summary = graph.summary(min_confidence=0.5)
+        assert summary['entities'] == sum(1 for e in entities if e['confidence_score'] >= 0.5)
+        assert summary['relationships'] == sum(1 for r in relationships if r['confidence_score'] >= 0.5)
+        assert summary['entity_types'] == 6
+
+    @pytest.mark.unit
+    def test_incremental_patch_matches_rebuild(self) -> None:
+        """Patching inserts, updates and deletes yields the same graph as a rebuild."""
+        entities, relationships = make_graph_rows(300, 900)
+        graph = CSRKnowledgeGraph.from_rows(entities, relationships)
+
+        new_entity = {'id': 301, 'entity_name': 'entity_300', 'entity_type': 'concept',
+                      'confidence_score': 0.9, 'source_file_name': 'new.pdf'}
+        new_relationship = {'id': 901, 'source_entity_id': 301, 'target_entity_id': 1,
+                            'relationship_type': 'extends', 'confidence_score': 0.7}
+        updated_relationship = dict(relationships[0], confidence_score=0.01)
+
+        assert graph.apply_changes([new_entity], [new_relationship, updated_relationship],
+                                   deleted_relationship_ids=[2])
+
+        expected_relationships = [updated_relationship] + relationships[2:] + [new_relationship]
+        rebuilt = CSRKnowledgeGraph.from_rows(entities + [new_entity], expected_relationships)
+        node = graph.node_index('entity_300')
+        assert np.array_equal(np.sort(graph.neighbors(node)), np.sort(rebuilt.neighbors(rebuilt.node_index('entity_300'))))
+        assert np.array_equal(graph.degree(0.5), rebuilt.degree(0.5))
+
+    @pytest.mark.unit
+    def test_patch_with_unknown_endpoint_requests_rebuild(self) -> None:
+        """A relationship to an entity that is not loaded forces a rebuild."""
+        entities, relationships = make_graph_rows(10, 20)
+        graph = CSRKnowledgeGraph.from_rows(entities, relationships)
+        orphan = {'id': 99, 'source_entity_id': 1, 'target_entity_id': 999,
+                  'relationship_type': 'related_to', 'confidence_score': 0.5}
+        assert graph.apply_changes([], [orphan]) is False
+
+
+class TestKnowledgeGraphEngineRegistry:
+    """Registry synchronisation through the knowledge_graph_changes log."""
+
+    @staticmethod
+    def _create_schema(conn: sqlite3.Connection) -> None:
+        conn.executescript("""
+            CREATE TABLE concept_entities (id INTEGER PRIMARY KEY, user_id INTEGER, entity_type TEXT,
+                entity_name TEXT, source_file_name TEXT, confidence_score REAL);
+            CREATE TABLE concept_relationships (id INTEGER PRIMARY KEY, user_id INTEGER,
+                source_entity_id INTEGER, target_entity_id INTEGER, relationship_type TEXT, confidence_score REAL);
+            CREATE TABLE knowledge_graph_changes (id INTEGER PRIMARY KEY AUTOINCREMENT, user_id INTEGER,
+                entity_kind TEXT, row_id INTEGER, operation TEXT, changed_at TEXT DEFAULT CURRENT_TIMESTAMP);
+            CREATE TRIGGER e_ins AFTER INSERT ON concept_entities BEGIN
+                INSERT INTO knowledge_graph_changes (user_id, entity_kind, row_id, operation) VALUES (NEW.user_id, 'entity', NEW.id, 'upsert'); END;
+            CREATE TRIGGER e_upd AFTER UPDATE ON concept_entities BEGIN
+                INSERT INTO knowledge_graph_changes (user_id, entity_kind, row_id, operation) VALUES (NEW.user_id, 'entity', NEW.id, 'upsert'); END;
+            CREATE TRIGGER r_upd AFTER UPDATE ON concept_relationships BEGIN
+                INSERT INTO knowledge_graph_changes (user_id, entity_kind, row_id, operation) VALUES (NEW.user_id, 'relationship', NEW.id, 'upsert'); END;
+            CREATE TRIGGER r_ins AFTER INSERT ON concept_relationships BEGIN
+                INSERT INTO knowledge_graph_changes (user_id, entity_kind, row_id, operation) VALUES (NEW.user_id, 'relationship', NEW.id, 'upsert'); END;
+            CREATE TRIGGER r_del AFTER DELETE ON concept_relationships BEGIN
+                INSERT INTO knowledge_graph_changes (user_id, entity_kind, row_id, operation) VALUES (OLD.user_id, 'relationship', OLD.id, 'delete'); END;
+        """)
+
+    @pytest.mark.database
+    def test_registry_patches_instead_of_rebuilding(self, tmp_path) -> None:
+        """Small changes are applied as patches; unchanged graphs are served from cache."""
+        db_file = tmp_path / "graph.sqlite"
+
+        def connect() -> sqlite3.Connection:
+            conn = sqlite3.connect(db_file)
+            conn.row_factory = sqlite3.Row
+            return conn
+
+        with connect() as conn:
+            self._create_schema(conn)
+            conn.executemany("INSERT INTO concept_entities VALUES (?, 1, 'concept', ?, 'a.pdf', 0.8)",
+                             [(i, f'e{i}') for i in range(1, 6)])
+            conn.executemany("INSERT INTO concept_relationships VALUES (?, 1, ?, ?, 'related_to', 0.9)",
+                             [(1, 1, 2), (2, 2, 3)])
+
+        registry = KnowledgeGraphEngineRegistry()
+        graph = registry.get(1, connect)
+        assert graph.num_edges == 2
+        assert registry.get(1, connect) is graph
+        assert registry.stats['hits'] == 1
+
+        with connect() as conn:
+            conn.execute("INSERT INTO concept_relationships VALUES (3, 1, 4, 5, 'extends', 0.6)")
+            conn.execute("DELETE FROM concept_relationships WHERE id = 1")
+
+        graph = registry.get(1, connect)
+        assert registry.stats == {'hits': 1, 'patches': 1, 'rebuilds': 1}
+        assert graph.num_edges == 2
+        assert graph.neighbors(graph.node_index('e1')).size == 0
+        assert graph.names[graph.neighbors(graph.node_index('e4'))].tolist() == ['e5']
+
+    @pytest.mark.database
+    def test_patch_does_not_modify_graph_held_by_readers(self, tmp_path) -> None:
+        """A reader's graph stays consistent while the registry swaps in a patched copy."""
+        db_file = tmp_path / "graph.sqlite"
+
+        def connect() -> sqlite3.Connection:
+            conn = sqlite3.connect(db_file)
+            conn.row_factory = sqlite3.Row
+            return conn
+
+        with connect() as conn:
+            self._create_schema(conn)
+            conn.executemany("INSERT INTO concept_entities VALUES (?, 1, 'concept', ?, 'a.pdf', 0.8)",
+                             [(i, f'e{i}') for i in range(1, 4)])
+            conn.execute("INSERT INTO concept_relationships VALUES (1, 1, 1, 2, 'related_to', 0.9)")
+
+        registry = KnowledgeGraphEngineRegistry()
+        before = registry.get(1, connect)
+        snapshot = {name: getattr(before, name).copy() for name in ('names', 'confidence', 'edge_conf', 'indptr')}
+
+        with connect() as conn:
+            conn.execute("UPDATE concept_entities SET entity_name = 'rinominata', confidence_score = 0.1 WHERE id = 1")
+            conn.execute("UPDATE concept_relationships SET confidence_score = 0.2 WHERE id = 1")
+            conn.execute("INSERT INTO concept_entities VALUES (4, 1, 'theory', 'e4', 'b.pdf', 0.5)")
+            conn.execute("INSERT INTO concept_relationships VALUES (2, 1, 3, 4, 'extends', 0.7)")
+
+        after = registry.get(1, connect)
+        assert after is not before and registry.stats['patches'] == 1
+        for name, values in snapshot.items():
+            assert np.array_equal(getattr(before, name), values), name
+        assert before.node_index('rinominata') is None and before.num_edges == 1 and 'theory' not in before.type_labels
+        assert after.node_index('rinominata') == 0 and after.num_edges == 2
+        assert float(after.edge_conf[0]) == pytest.approx(0.2)
+
+
+class TestGraphEngineBenchmark:
+    """Benchmark on a 100k-edge graph."""
+
+    @pytest.mark.performance
+    def test_100k_edges_benchmark(self) -> None:
+        """Build and query a 20k-node / 100k-edge graph within interactive budgets."""
+        entities, relationships = make_graph_rows(20_000, 100_000)
+
+        start = time.perf_counter()
+        graph = CSRKnowledgeGraph.from_rows(entities, relationships)
+        build_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        for i in range(100):
+            graph.k_hop(i, 2, min_confidence=0.3)
+        k_hop_time = (time.perf_counter() - start) / 100
+
+        start = time.perf_counter()
+        graph.weighted_degree(0.5)
+        graph.summary(0.5, 'concept')
+        top = graph.top_k(graph.degree_centrality(), 10)
+        aggregate_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        graph.with_changes([], [{'id': 100_001, 'source_entity_id': 1, 'target_entity_id': 2,
+                                  'relationship_type': 'related_to', 'confidence_score': 0.5}])
+        patch_time = time.perf_counter() - start
+
+        assert len(top) == 10
+        assert build_time < 5.0
+        assert k_hop_time < 0.05
+        assert aggregate_time < 0.5
+        assert patch_time < 1.0
@@ -0,0 +1,136 @@
+"""
+Tests for deferred imports (scripts/utilities/lazy_imports.py) and the
+import-time profiler used for the cold-start report (scripts/utilities/import_profile.py).
+"""
+
+import subprocess
+import sys
+import threading
+import time
+
+import pytest
+
+from scripts.utilities import import_profile
+from scripts.utilities.lazy_imports import LazyModule, get_loading_status, lazy_callable, lazy_import
+
+
+def write_module(directory, name: str, counter_file) -> None:
+    """Module that records each execution in `counter_file` and takes a little time to import."""
+    (directory / f"{name}.py").write_text(
+        "import time\n"
+        f"with open({str(counter_file)!r}, 'a') as f:\n"
+        "    f.write('x')\n"
+        "time.sleep(0.05)\n"
+        "VALUE = 42\n"
+        "def double(x):\n"
+        "    return 2 * x\n",
+        encoding="utf-8",
+    )
+
+
+class TestLazyImports:
+    """Deferred module loading, import profiling and deferred-dependency checks."""
+
+    @pytest.mark.unit
+    def test_module_is_imported_once_on_first_use(self, tmp_path, monkeypatch) -> None:
+        """Nothing runs until an attribute is read; concurrent first uses import once."""
+        counter = tmp_path / "count.txt"
+        write_module(tmp_path, "modulo_pesante", counter)
+        monkeypatch.syspath_prepend(str(tmp_path))
+
+        module = lazy_import("modulo_pesante")
+        double = lazy_callable("modulo_pesante", "double")
+        assert module is lazy_import("modulo_pesante")
+        assert not module.loaded and "modulo_pesante" not in sys.modules and not counter.exists()
+
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(double(21))) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert results == [42] * 8 and module.VALUE == 42
+        assert counter.read_text() == "x"
+        status = get_loading_status()["modulo_pesante"]
+        assert status['loaded'] and status['load_ms'] >= 40
+
+    @pytest.mark.unit
+    def test_missing_module_fails_on_use_not_on_import(self) -> None:
+        """A missing optional dependency only surfaces when the code path needs it."""
+        module = LazyModule("modulo_che_non_esiste")
+        assert "non caricato" in repr(module)
+        with pytest.raises(ModuleNotFoundError):
+            module.qualcosa
+
+    @pytest.mark.unit
+    def test_profile_parsing_and_deferred_check(self) -> None:
+        """importtime output is parsed after the start marker; config imports no ML stack."""
+        stderr = "\n".join([
+            "import time: self [us] | cumulative | imported package",
+            "import time:       100 |        100 | site",
+            import_profile.START_MARKER,
+            "import time:       300 |        300 |   numpy.core",
+            "import time:       200 |        500 | numpy",
+            "import time:        50 |        550 | pacchetto",
+        ])
+        entries = import_profile.parse_importtime(stderr)
+        assert [entry['module'] for entry in entries] == ["numpy.core", "numpy", "pacchetto"]
+        assert entries[0]['depth'] == 1 and entries[1]['depth'] == 0
+
+        result = import_profile.profile_import("config")
+        assert result['ok'], result.get('error')
+        assert import_profile.check_deferred([result]) == []
+        assert import_profile.check_deferred([dict(result, heavy_loaded=["llama_index"])]) == [
+            "config: llama_index caricato all'import"
+        ]
+
+    @pytest.mark.unit
+    def test_background_thread_imports_are_reported_apart(self, tmp_path, monkeypatch) -> None:
+        """A dependency loaded by a thread started at import is not on the startup path."""
+        (tmp_path / "bs4.py").write_text("import time\ntime.sleep(0.05)\n", encoding="utf-8")
+        (tmp_path / "avvio_background.py").write_text(
+            "import threading\n"
+            "thread = threading.Thread(target=lambda: __import__('bs4'))\n"
+            "thread.start()\n"
+            "thread.join()\n",
+            encoding="utf-8",
+        )
+        (tmp_path / "avvio_diretto.py").write_text("import bs4\n", encoding="utf-8")
+        monkeypatch.setenv("PYTHONPATH", str(tmp_path))
+        monkeypatch.setitem(import_profile.DEFERRED_IMPORTS, "avvio_background", ["bs4"])
+        monkeypatch.setitem(import_profile.DEFERRED_IMPORTS, "avvio_diretto", ["bs4"])
+
+        background = import_profile.profile_import("avvio_background")
+        direct = import_profile.profile_import("avvio_diretto")
+        assert background['heavy_loaded'] == [] and background['heavy_background'] == ["bs4"]
+        assert direct['heavy_loaded'] == ["bs4"] and direct['heavy_background'] == []
+        assert background['total_ms'] >= 40 and direct['total_ms'] >= 40
+        assert import_profile.check_deferred([background, direct]) == [
+            "avvio_diretto: bs4 caricato all'import"
+        ]
+
+    @pytest.mark.unit
+    def test_report_with_failed_imports_is_not_written(self, tmp_path) -> None:
+        """A profile from an incomplete environment does not overwrite the baseline report."""
+        report = tmp_path / "import_profile.json"
+        assert import_profile.main(["config", "modulo_inesistente", "--output", str(report)]) == 0
+        assert not report.exists()
+
+        assert import_profile.main(["config", "--output", str(report)]) == 0
+        assert report.exists()
+
+    @pytest.mark.performance
+    def test_benchmark_cold_start_with_deferred_pandas(self) -> None:
+        """Fresh interpreter importing pandas eagerly versus through a lazy proxy."""
+        def cold_start(code: str) -> float:
+            timings = []
+            for _ in range(3):
+                start = time.perf_counter()
+                subprocess.run([sys.executable, "-c", code], check=True, cwd=import_profile.PROJECT_ROOT)
+                timings.append(time.perf_counter() - start)
+            return min(timings)
+
+        eager = cold_start("import pandas as pd")
+        lazy = cold_start("from scripts.utilities.lazy_imports import lazy_import; pd = lazy_import('pandas')")
+        assert lazy < eager
@@ -0,0 +1,164 @@
+"""
+Tests for near-duplicate detection at ingest
+(scripts/operations/near_duplicate_detector.py): MinHash signatures, LSH
+candidate lookup, the similarity threshold, duplicate links and the backfill
+of papers archived before the index existed.
+"""
+
+import random
+import sys
+from pathlib import Path
+
+import pytest
+
+pytest.importorskip("streamlit")
+
+ROOT = Path(__file__).resolve().parent.parent
+for directory in ("scripts/utilities", "scripts/operations", "."):
+    if str(ROOT / directory) not in sys.path:
+        sys.path.insert(0, str(ROOT / directory))
+
+import file_utils  # noqa: E402
+import near_duplicate_detector as detector  # noqa: E402
+from near_duplicate_detector import (  # noqa: E402
+    NUM_PERM,
+    DuplicateMatch,
+    backfill_signatures,
+    compute_signature,
+    estimate_similarity,
+    find_near_duplicate,
+    get_duplicate_links,
+    record_duplicate_link,
+    register_signature,
+    remove_duplicate_link,
+    remove_signature,
+    shingle_hashes,
+)
+
+VOCABULARY = [f"parola{i}" for i in range(500)]
+
+
+def make_text(rng: random.Random, words: int = 600) -> str:
+    return " ".join(rng.choice(VOCABULARY) for _ in range(words))
+
+
+def edit_text(text: str, rng: random.Random, share: float) -> str:
+    """Replace a contiguous block covering `share` of the words, like a changed section."""
+    words = text.split()
+    length = int(len(words) * share)
+    start = rng.randrange(0, len(words) - length)
+    words[start:start + length] = [rng.choice(VOCABULARY) for _ in range(length)]
+    return " ".join(words)
+
+
+def jaccard(text_a: str, text_b: str) -> float:
+    a, b = shingle_hashes(text_a), shingle_hashes(text_b)
+    return len(a & b) / len(a | b)
+
+
+@pytest.fixture
+def database(tmp_path, monkeypatch):
+    """Full application schema in a temporary metadata database."""
+    monkeypatch.setattr(file_utils, "DB_STORAGE_DIR", str(tmp_path))
+    monkeypatch.setattr(file_utils, "METADATA_DB_FILE", str(tmp_path / "metadata.sqlite"))
+    file_utils.setup_database()
+    return tmp_path
+
+
+class TestNearDuplicateDetector:
+    """Signatures, LSH lookup, threshold and links."""
+
+    @pytest.mark.unit
+    def test_signature_estimates_jaccard(self) -> None:
+        """Signatures are deterministic and their agreement tracks the true shingle Jaccard."""
+        rng = random.Random(1)
+        original = make_text(rng)
+        signature = compute_signature(original)
+        assert len(signature) == NUM_PERM
+        assert compute_signature(original) == signature
+        # Case and punctuation do not change the shingles
+        assert compute_signature(original.upper().replace(" ", ", ")) == signature
+
+        for share in (0.05, 0.2, 0.5):
+            edited = edit_text(original, rng, share)
+            assert abs(estimate_similarity(signature, compute_signature(edited)) - jaccard(original, edited)) < 0.12
+
+        assert compute_signature("troppo corto per un confronto") is None
+        assert estimate_similarity(signature, signature[:10]) == 0.0
+
+    @pytest.mark.database
+    def test_lsh_lookup_respects_the_threshold(self, database) -> None:
+        """Near copies are found through the bands; less similar documents fall under the threshold."""
+        rng = random.Random(2)
+        original = make_text(rng)
+        register_signature("originale.pdf", "hash-originale", compute_signature(original))
+        for i in range(20):
+            register_signature(f"altro_{i}.pdf", f"hash-{i}", compute_signature(make_text(rng)))
+
+        near_copy = edit_text(original, rng, 0.02)
+        match = find_near_duplicate(compute_signature(near_copy))
+        assert match.file_name == "originale.pdf" and match.similarity >= detector.NEAR_DUP_THRESHOLD
+
+        revised = edit_text(original, rng, 0.15)
+        assert 0.6 < jaccard(original, revised) < detector.NEAR_DUP_THRESHOLD
+        assert find_near_duplicate(compute_signature(revised)) is None
+        assert find_near_duplicate(compute_signature(revised), threshold=0.5).file_name == "originale.pdf"
+
+        assert find_near_duplicate(compute_signature(make_text(rng))) is None
+        # Reprocessing the same file does not match itself
+        assert find_near_duplicate(compute_signature(original), exclude_file_name="originale.pdf") is None
+
+    @pytest.mark.database
+    def test_exact_hash_links_and_removal(self, database) -> None:
+        """Identical content matches by hash; links are recorded, undone for forced files and removed with the document."""
+        rng = random.Random(3)
+        register_signature("originale.pdf", "hash-originale", compute_signature(make_text(rng)))
+
+        match = find_near_duplicate(None, content_hash="hash-originale")
+        assert match == DuplicateMatch("originale.pdf", 1.0, "hash-originale")
+
+        record_duplicate_link("copia.pdf", match, "hash-originale")
+        record_duplicate_link("seconda_copia.pdf", match, "hash-originale")
+        assert {link['file_name'] for link in get_duplicate_links("originale.pdf")} == {"copia.pdf", "seconda_copia.pdf"}
+
+        # Processing forced by the user drops the wrong link
+        remove_duplicate_link("copia.pdf")
+        assert [link['file_name'] for link in get_duplicate_links()] == ["seconda_copia.pdf"]
+
+        remove_signature("originale.pdf")
+        assert find_near_duplicate(None, content_hash="hash-originale") is None
+        assert get_duplicate_links() == []
+
+    @pytest.mark.database
+    def test_backfill_signs_papers_archived_before_the_index(self, database) -> None:
+        """Existing papers get a signature once, so their near copies are detected; failed loads are retried."""
+        rng = random.Random(4)
+        texts = {f"archivio_{i}.pdf": make_text(rng) for i in range(5)}
+        texts["breve.pdf"] = "solo un titolo"
+        with file_utils.db_connect() as conn:
+            conn.executemany("INSERT INTO papers (file_name, title) VALUES (?, ?)", [(name, name) for name in texts])
+            conn.commit()
+        register_signature("archivio_0.pdf", "hash-gia-firmato", compute_signature(texts["archivio_0.pdf"]))
+
+        loaded = []
+        unavailable = {"archivio_3.pdf"}
+
+        def load_document(paper):
+            loaded.append(paper['file_name'])
+            if paper['file_name'] in unavailable:
+                raise OSError("archivio non montato")
+            return texts[paper['file_name']], f"hash-{paper['file_name']}"
+
+        stats = backfill_signatures(load_document, batch_size=2)
+        assert stats == {'registered': 3, 'too_short': 1, 'errors': 1}
+        assert "archivio_0.pdf" not in loaded
+
+        near_copy = edit_text(texts["archivio_2.pdf"], rng, 0.02)
+        assert find_near_duplicate(compute_signature(near_copy)).file_name == "archivio_2.pdf"
+        assert find_near_duplicate(None, content_hash="hash-breve.pdf").file_name == "breve.pdf"
+
+        loaded.clear()
+        unavailable.clear()
+        assert backfill_signatures(load_document) == {'registered': 1, 'too_short': 0, 'errors': 0}
+        assert loaded == ["archivio_3.pdf"]
+        assert backfill_signatures(load_document) == {'registered': 0, 'too_short': 0, 'errors': 0}
@@ -0,0 +1,158 @@
+"""
+Tests for the online backup subsystem in scripts/deployment/backup_strategy.py.
+Covers consistent SQLite copies under concurrent writes, deduplicated incremental
+snapshots, restore verification and the work saved by incremental snapshots.
+"""
+
+import os
+import random
+import sqlite3
+import threading
+import time
+
+import pytest
+
+from scripts.deployment.backup_strategy import SnapshotStore, online_sqlite_backup
+
+
+WORDS = "archivio documento capitolo indice vettore embedding sintesi ricerca metodo dati".split()
+
+
+def write_tree(root, files: int, size: int, seed: int = 1) -> None:
+    """Compressible text files under nested directories."""
+    rng = random.Random(seed)
+    for i in range(files):
+        path = os.path.join(root, f"cartella_{i % 5}", f"file_{i}.txt")
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(" ".join(rng.choices(WORDS, k=size // 8)))
+
+
+def read_tree(root) -> dict:
+    tree = {}
+    for dirpath, _, filenames in os.walk(root):
+        for filename in filenames:
+            path = os.path.join(dirpath, filename)
+            with open(path, "rb") as f:
+                tree[os.path.relpath(path, root)] = f.read()
+    return tree
+
+
+def make_database(path, rows: int = 20000) -> None:
+    with sqlite3.connect(path) as conn:
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("CREATE TABLE papers (id INTEGER PRIMARY KEY, body TEXT)")
+        conn.execute("CREATE TABLE papers_count (n INTEGER)")
+        conn.executemany("INSERT INTO papers (body) VALUES (?)", [("x" * 200,) for _ in range(rows)])
+        conn.execute("INSERT INTO papers_count VALUES (?)", (rows,))
+
+
+class TestOnlineBackup:
+    """Online SQLite copy, content-addressed snapshots and restore verification."""
+
+    @pytest.mark.database
+    def test_sqlite_backup_is_consistent_while_writers_run(self, tmp_path) -> None:
+        """Writers keep committing during a paged backup and the copy is a consistent state."""
+        source = str(tmp_path / "metadata.sqlite")
+        make_database(source)
+        stop = threading.Event()
+        commits = []
+
+        def writer():
+            conn = sqlite3.connect(source, timeout=10)
+            while not stop.is_set():
+                with conn:
+                    conn.execute("INSERT INTO papers (body) VALUES ('nuovo')")
+                    conn.execute("UPDATE papers_count SET n = n + 1")
+                commits.append(time.perf_counter())
+            conn.close()
+
+        thread = threading.Thread(target=writer)
+        thread.start()
+        time.sleep(0.05)
+        started = time.perf_counter()
+        stats = online_sqlite_backup(source, str(tmp_path / "copy.sqlite"), pages=16, sleep=0.001)
+        finished = time.perf_counter()
+        stop.set()
+        thread.join()
+
+        assert stats["steps"] > 1
+        assert any(started < commit < finished for commit in commits)
+        with sqlite3.connect(tmp_path / "copy.sqlite") as conn:
+            rows = conn.execute("SELECT COUNT(*) FROM papers").fetchone()[0]
+            assert conn.execute("SELECT n FROM papers_count").fetchone()[0] == rows
+            assert conn.execute("PRAGMA integrity_check").fetchone()[0] == "ok"
+
+    @pytest.mark.unit
+    def test_incremental_snapshot_restore_and_verify(self, tmp_path) -> None:
+        """Only changed files are read again; restore reproduces the tree; corruption is detected."""
+        uploads = tmp_path / "uploads"
+        write_tree(uploads, files=20, size=20000)
+        (uploads / "live.sqlite").write_bytes(b"ignored: copied through the backup API")
+        database = str(tmp_path / "metadata.sqlite")
+        make_database(database, rows=500)
+        store = SnapshotStore(str(tmp_path / "store"), chunk_size=8192)
+
+        first = store.create_snapshot({"uploads": str(uploads)}, {"metadata": database}, kind="full",
+                                      trust_metadata=False)
+        first_stats = store.load_manifest(first)["stats"]
+        assert first_stats["read_files"] == 21
+        assert not any(key.endswith("live.sqlite") for key in store.load_manifest(first)["files"])
+
+        with open(uploads / "cartella_0" / "file_0.txt", "a", encoding="utf-8") as f:
+            f.write(" modifica")
+        (uploads / "nuovo.txt").write_text("documento nuovo", encoding="utf-8")
+        second = store.create_snapshot({"uploads": str(uploads)}, {"metadata": database})
+        stats = store.load_manifest(second)["stats"]
+        assert stats["read_files"] == 1 + 2      # staged database + changed + new file
+        assert stats["reused_files"] == 19
+        assert stats["new_bytes"] < first_stats["new_bytes"] / 5
+
+        assert store.verify_snapshot(second)["ok"]
+        restored = tmp_path / "restored"
+        assert store.restore_snapshot(second, str(restored)) == 22
+        expected = {path: data for path, data in read_tree(uploads).items() if not path.endswith(".sqlite")}
+        assert read_tree(restored / str(uploads).lstrip(os.sep)) == expected
+        with sqlite3.connect(restored / database.lstrip(os.sep)) as conn:
+            assert conn.execute("SELECT COUNT(*) FROM papers").fetchone()[0] == 500
+
+        digest = store.load_manifest(second)["files"]["uploads/nuovo.txt"]["chunks"][0]
+        object_path = store._object_path(digest, store.compression)
+        with open(object_path, "wb") as f:
+            f.write(b"corrupted")
+        result = store.verify_snapshot(second)
+        assert not result["ok"] and "uploads/nuovo.txt" in result["errors"][0]
+
+    @pytest.mark.unit
+    def test_prune_removes_unreferenced_objects(self, tmp_path) -> None:
+        """Objects only referenced by pruned snapshots are garbage collected."""
+        uploads = tmp_path / "uploads"
+        write_tree(uploads, files=3, size=4000)
+        store = SnapshotStore(str(tmp_path / "store"))
+        store.create_snapshot({"uploads": str(uploads)})
+        (uploads / "cartella_0" / "file_0.txt").write_text("sostituito", encoding="utf-8")
+        latest = store.create_snapshot({"uploads": str(uploads)})
+
+        result = store.prune(keep_last=1)
+        assert result == {"removed_snapshots": 1, "deleted_objects": 1}
+        assert store.list_snapshots() == [latest]
+        assert store.verify_snapshot(latest)["ok"]
+
+    @pytest.mark.performance
+    def test_benchmark_incremental_snapshot_work(self, tmp_path) -> None:
+        """A full snapshot reads the whole 40MB tree; the next one reads only the changed file."""
+        uploads = tmp_path / "uploads"
+        write_tree(uploads, files=40, size=1_000_000)
+        store = SnapshotStore(str(tmp_path / "store"))
+
+        full = store.load_manifest(
+            store.create_snapshot({"uploads": str(uploads)}, kind="full", trust_metadata=False))["stats"]
+        assert full["read_files"] == 40 and full["read_bytes"] == full["total_bytes"]
+
+        changed = uploads / "cartella_1" / "file_1.txt"
+        with open(changed, "a", encoding="utf-8") as f:
+            f.write(" aggiornamento")
+        incremental = store.load_manifest(store.create_snapshot({"uploads": str(uploads)}))["stats"]
+        assert incremental["read_files"] == 1 and incremental["reused_files"] == 39
+        assert incremental["read_bytes"] == os.path.getsize(changed)
+        assert incremental["new_bytes"] <= os.path.getsize(changed)
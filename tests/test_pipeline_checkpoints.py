@@ -0,0 +1,123 @@
+"""
+Tests for the per-stage pipeline checkpoints
+(scripts/operations/pipeline_checkpoints.py): resuming at the first incomplete
+stage, skipping completed stages and keeping files with identical content apart.
+"""
+
+import sqlite3
+import sys
+from pathlib import Path
+
+import pytest
+
+pytest.importorskip("streamlit")
+
+ROOT = Path(__file__).resolve().parent.parent
+for directory in ("scripts/utilities", "scripts/operations", "."):
+    if str(ROOT / directory) not in sys.path:
+        sys.path.insert(0, str(ROOT / directory))
+
+import file_utils  # noqa: E402
+from pipeline_checkpoints import (  # noqa: E402
+    PIPELINE_STAGES,
+    PipelineCheckpointer,
+    find_checkpoint_hash,
+    get_resume_stage,
+)
+
+CONTENT_HASH = "a" * 64
+
+
+@pytest.fixture
+def database(tmp_path, monkeypatch):
+    """Full application schema in a temporary metadata database."""
+    monkeypatch.setattr(file_utils, "DB_STORAGE_DIR", str(tmp_path))
+    monkeypatch.setattr(file_utils, "METADATA_DB_FILE", str(tmp_path / "metadata.sqlite"))
+    file_utils.setup_database()
+    return tmp_path / "metadata.sqlite"
+
+
+def run_until(checkpointer: PipelineCheckpointer, failing_stage: str, calls: list) -> None:
+    """Run the stages in order until `failing_stage` raises."""
+    def stage_func(stage):
+        def run():
+            calls.append(stage)
+            if stage == failing_stage:
+                raise RuntimeError(f"{stage} interrotta")
+            return {'stage': stage}
+        return run
+
+    for stage in PIPELINE_STAGES:
+        checkpointer.run_stage(stage, stage_func(stage))
+
+
+class TestPipelineCheckpoints:
+    """Resume point, skipped stages and per-file keys."""
+
+    @pytest.mark.database
+    def test_retry_resumes_at_first_incomplete_stage(self, database) -> None:
+        """A failed run leaves its completed stages; the retry runs only from the failed one."""
+        calls = []
+        with pytest.raises(RuntimeError):
+            run_until(PipelineCheckpointer("a.pdf", CONTENT_HASH), "index", calls)
+        assert calls == ["extract", "classify", "metadata", "index"]
+        assert get_resume_stage("a.pdf") == "index"
+        assert find_checkpoint_hash("a.pdf") == CONTENT_HASH
+
+        calls.clear()
+        retry = PipelineCheckpointer("a.pdf", CONTENT_HASH)
+        assert retry.first_incomplete_stage() == "index"
+        run_until(retry, None, calls)
+        assert calls == PIPELINE_STAGES[PIPELINE_STAGES.index("index"):]
+        assert retry.first_incomplete_stage() is None
+
+    @pytest.mark.database
+    def test_completed_stages_return_their_saved_output(self, database) -> None:
+        """A completed stage is not executed again and returns the checkpointed output."""
+        first = PipelineCheckpointer("a.pdf", CONTENT_HASH)
+        assert first.run_stage("extract", lambda: "testo estratto") == "testo estratto"
+
+        retry = PipelineCheckpointer("a.pdf", CONTENT_HASH)
+        assert retry.is_completed("extract")
+        assert retry.run_stage("extract", lambda: pytest.fail("estrazione ripetuta")) == "testo estratto"
+        with sqlite3.connect(database) as conn:
+            resumed = conn.execute(
+                "SELECT COUNT(*) FROM pipeline_stage_metrics WHERE stage = 'extract' AND resumed = 1"
+            ).fetchone()[0]
+        assert resumed == 1
+
+    @pytest.mark.database
+    def test_files_with_same_content_keep_separate_checkpoints(self, database) -> None:
+        """A copy under another name runs every stage itself, and finishing one file leaves the other's checkpoints."""
+        original = PipelineCheckpointer("originale.pdf", CONTENT_HASH)
+        for stage in PIPELINE_STAGES:
+            original.run_stage(stage, lambda stage=stage: stage)
+
+        copy = PipelineCheckpointer("copia.pdf", CONTENT_HASH)
+        assert copy.completed == {} and copy.first_incomplete_stage() == "extract"
+        copy.run_stage("extract", lambda: "testo")
+
+        original.finalize()
+        assert get_resume_stage("originale.pdf") is None
+        assert get_resume_stage("copia.pdf") == "classify"
+
+    @pytest.mark.database
+    def test_old_key_is_migrated(self, database) -> None:
+        """A table keyed only by (content_hash, stage) is recreated with file_name in the key."""
+        with sqlite3.connect(database) as conn:
+            conn.execute("DROP TABLE pipeline_stage_checkpoints")
+            conn.execute("""
+                CREATE TABLE pipeline_stage_checkpoints (
+                    content_hash TEXT NOT NULL, stage TEXT NOT NULL, file_name TEXT NOT NULL,
+                    status TEXT NOT NULL, output TEXT, duration_ms REAL, attempts INTEGER DEFAULT 1,
+                    error_message TEXT, celery_task_id TEXT, updated_at TEXT NOT NULL,
+                    PRIMARY KEY (content_hash, stage)
+                )
+            """)
+        file_utils.setup_database()
+
+        with sqlite3.connect(database) as conn:
+            key = [row[1] for row in sorted(
+                (row for row in conn.execute("PRAGMA table_info(pipeline_stage_checkpoints)") if row[5]),
+                key=lambda row: row[5])]
+        assert key == ["content_hash", "file_name", "stage"]
@@ -0,0 +1,148 @@
+"""
+Tests for buffered processing-state transitions
+(scripts/operations/error_diagnosis_framework.py): coalescing per file,
+immediate flush of terminal states, flush on shutdown, re-queueing after a
+failed write and the per-state counts maintained by triggers.
+"""
+
+import sqlite3
+import sys
+from pathlib import Path
+
+import pytest
+
+pytest.importorskip("streamlit")
+
+ROOT = Path(__file__).resolve().parent.parent
+for directory in ("scripts/utilities", "scripts/operations", "."):
+    if str(ROOT / directory) not in sys.path:
+        sys.path.insert(0, str(ROOT / directory))
+
+import error_diagnosis_framework as framework  # noqa: E402
+import file_utils  # noqa: E402
+from error_diagnosis_framework import (  # noqa: E402
+    ProcessingPhase,
+    ProcessingState,
+    ProcessingStateBuffer,
+    _parse_processing_metadata,
+)
+
+
+@pytest.fixture
+def database(tmp_path, monkeypatch):
+    """Full application schema in a temporary metadata database."""
+    monkeypatch.setattr(file_utils, "DB_STORAGE_DIR", str(tmp_path))
+    monkeypatch.setattr(file_utils, "METADATA_DB_FILE", str(tmp_path / "metadata.sqlite"))
+    file_utils.setup_database()
+    return tmp_path / "metadata.sqlite"
+
+
+def status_rows(path) -> dict:
+    with sqlite3.connect(path) as conn:
+        conn.row_factory = sqlite3.Row
+        return {row['file_name']: dict(row) for row in conn.execute("SELECT * FROM document_processing_status")}
+
+
+def state_counts(path) -> dict:
+    with sqlite3.connect(path) as conn:
+        return dict(conn.execute("SELECT processing_state, count FROM processing_state_counts WHERE count > 0"))
+
+
+class TestProcessingStateBuffer:
+    """Coalescing, flush triggers and state counts."""
+
+    @pytest.mark.database
+    def test_transitions_of_a_file_coalesce_into_one_upsert(self, database) -> None:
+        """Intermediate transitions stay in memory; one flush writes the latest state per file."""
+        buffer = ProcessingStateBuffer(flush_interval=3600, max_pending=50)
+        try:
+            buffer.add("a.pdf", ProcessingState.PENDING, ProcessingPhase.PHASE_1, reset=True)
+            buffer.add("a.pdf", ProcessingState.PROCESSING, ProcessingPhase.PHASE_2)
+            buffer.add("a.pdf", ProcessingState.PROCESSING, ProcessingPhase.PHASE_3, error_message="lento")
+            buffer.add("b.pdf", ProcessingState.QUEUED)
+
+            assert buffer.has_pending("a.pdf") and status_rows(database) == {}
+            assert buffer.flush() == 2
+            assert buffer.flush() == 0
+        finally:
+            buffer.close()
+
+        rows = status_rows(database)
+        assert rows["a.pdf"]['processing_state'] == "PROCESSING"
+        assert rows["a.pdf"]['current_phase'] == ProcessingPhase.PHASE_3.value
+        assert rows["a.pdf"]['error_message'] == "lento"
+        assert rows["b.pdf"]['current_phase'] == ProcessingPhase.PHASE_1.value
+        assert buffer.stats['transitions'] == 4 and buffer.stats['rows_written'] == 2
+        assert buffer.stats['flushes'] == 1
+
+    @pytest.mark.database
+    def test_terminal_states_and_size_limit_flush_immediately(self, database) -> None:
+        """A terminal state or a full buffer is written without waiting for the periodic flush."""
+        buffer = ProcessingStateBuffer(flush_interval=3600, max_pending=3)
+        try:
+            buffer.add("a.pdf", ProcessingState.PROCESSING, ProcessingPhase.PHASE_2)
+            buffer.add("a.pdf", ProcessingState.COMPLETED)
+            assert not buffer.has_pending()
+            assert status_rows(database)["a.pdf"]['processing_state'] == "COMPLETED"
+
+            for name in ("b.pdf", "c.pdf", "d.pdf"):
+                buffer.add(name, ProcessingState.QUEUED)
+            assert not buffer.has_pending()
+            assert len(status_rows(database)) == 4
+        finally:
+            buffer.close()
+
+    @pytest.mark.database
+    def test_close_flushes_and_failed_writes_are_requeued(self, database, monkeypatch) -> None:
+        """Pending transitions survive a failed write without overriding newer ones, and close() writes them."""
+        buffer = ProcessingStateBuffer(flush_interval=3600, max_pending=50)
+        buffer.add("a.pdf", ProcessingState.PROCESSING, ProcessingPhase.PHASE_2)
+
+        def locked():
+            raise sqlite3.OperationalError("database is locked")
+
+        with monkeypatch.context() as patch:
+            patch.setattr(framework, "db_connect", locked)
+            with pytest.raises(sqlite3.OperationalError):
+                buffer.flush()
+            assert buffer.has_pending("a.pdf") and buffer.stats['flush_errors'] == 1
+            buffer.add("a.pdf", ProcessingState.PROCESSING, ProcessingPhase.PHASE_4)
+
+        buffer.close()
+        assert not buffer.has_pending()
+        assert status_rows(database)["a.pdf"]['current_phase'] == ProcessingPhase.PHASE_4.value
+
+    @pytest.mark.database
+    def test_triggers_keep_state_counts(self, database) -> None:
+        """Inserts, state changes and deletes keep processing_state_counts equal to a GROUP BY."""
+        buffer = ProcessingStateBuffer(flush_interval=3600, max_pending=50)
+        try:
+            for name in ("a.pdf", "b.pdf", "c.pdf"):
+                buffer.add(name, ProcessingState.PENDING, ProcessingPhase.PHASE_1, reset=True)
+            buffer.flush()
+            assert state_counts(database) == {"PENDING": 3}
+
+            buffer.add("a.pdf", ProcessingState.COMPLETED)
+            buffer.add("b.pdf", ProcessingState.FAILED_PARSING, error_message="pdf corrotto")
+            # Same state again: no double counting
+            buffer.add("c.pdf", ProcessingState.PENDING, ProcessingPhase.PHASE_1, reset=True)
+            buffer.flush()
+            assert state_counts(database) == {"PENDING": 1, "COMPLETED": 1, "FAILED_PARSING": 1}
+
+            with sqlite3.connect(database) as conn:
+                conn.execute("DELETE FROM document_processing_status WHERE file_name = 'b.pdf'")
+                grouped = dict(conn.execute(
+                    "SELECT processing_state, COUNT(*) FROM document_processing_status GROUP BY processing_state"))
+            assert state_counts(database) == grouped == {"PENDING": 1, "COMPLETED": 1}
+        finally:
+            buffer.close()
+
+    @pytest.mark.unit
+    def test_cached_metadata_is_read_only(self) -> None:
+        """The memoised parse is shared between callers, so it cannot be mutated."""
+        raw = '{"file_size": 10, "file_extension": ".pdf"}'
+        metadata = _parse_processing_metadata(raw)
+        assert metadata is _parse_processing_metadata(raw)
+        assert metadata['file_size'] == 10 and dict(_parse_processing_metadata(None)) == {}
+        with pytest.raises(TypeError):
+            metadata['file_size'] = 0
@@ -0,0 +1,194 @@
+"""
+Tests for the RAG evaluation and retrieval benchmark harness (tools.rag_benchmark).
+Runs fully offline: local retrievers, stub LLM and lexical faithfulness judge.
+"""
+
+import asyncio
+import random
+import time
+
+import pytest
+
+from tools.rag_benchmark import (
+    EvalQuestion, OverlapFaithfulnessJudge, RetrieverConfig, StubLLM, build_local_retriever, chunk_documents,
+    evaluate_questions, find_regressions, load_latest_report, percentile, run_benchmark, summarize_results,
+    write_report
+)
+
+
+TOPICS = {
+    "cosmologia.pdf": "La materia oscura e l'energia oscura dominano l'espansione dell'universo osservabile.",
+    "biologia.pdf": "La fotosintesi converte la luce solare in energia chimica nei cloroplasti delle piante.",
+    "filosofia.pdf": "L'etica kantiana fonda il dovere morale sull'imperativo categorico della ragione.",
+    "storia.pdf": "La rivoluzione industriale trasformò la produzione tessile e le città inglesi.",
+    "geologia.pdf": "La tettonica delle placche spiega terremoti, vulcani e la deriva dei continenti.",
+}
+
+FILLER = "testo generico di riempimento senza argomento specifico".split()
+
+
+def make_documents(extra: int = 0, seed: int = 5) -> dict:
+    """Topic documents padded with filler, plus `extra` filler-only documents."""
+    rng = random.Random(seed)
+    documents = {}
+    for name, sentence in TOPICS.items():
+        documents[name] = " ".join(rng.choices(FILLER, k=300)) + " " + sentence + " " + " ".join(rng.choices(FILLER, k=100))
+    for i in range(extra):
+        documents[f"altro_{i}.pdf"] = " ".join(rng.choices(FILLER, k=400))
+    return documents
+
+
+QUESTIONS = [
+    EvalQuestion("Cosa domina l'espansione dell'universo?", ["cosmologia.pdf"]),
+    EvalQuestion("Come la fotosintesi converte la luce solare?", ["biologia.pdf"]),
+    EvalQuestion("Su cosa si fonda il dovere morale kantiano?", ["filosofia.pdf"]),
+    EvalQuestion("Cosa spiega la tettonica delle placche?", ["geologia.pdf"]),
+]
+
+
+class SlowRetriever:
+    """Retriever wrapper that simulates I/O latency and tracks concurrent calls."""
+
+    def __init__(self, inner, delay: float):
+        self.inner, self.delay = inner, delay
+        self.active = self.peak = 0
+
+    def retrieve(self, query, top_k):
+        self.active += 1
+        self.peak = max(self.peak, self.active)
+        time.sleep(self.delay)
+        self.active -= 1
+        return self.inner.retrieve(query, top_k)
+
+
+class TestRagBenchmark:
+    """Retrieval metrics, bounded concurrency, config comparison and versioned reports."""
+
+    @pytest.mark.unit
+    @pytest.mark.parametrize("mode", ["keyword", "vector", "hybrid"])
+    def test_local_retrievers_find_relevant_documents(self, mode) -> None:
+        """Every retrieval mode ranks the topic document in the top 3, and answers stay grounded."""
+        documents = make_documents(extra=10)
+        config = RetrieverConfig(mode, mode=mode, top_k=3, chunk_size=80, chunk_overlap=20)
+        results = asyncio.run(evaluate_questions(
+            QUESTIONS, build_local_retriever(documents, config), config.top_k,
+            llm=StubLLM(), judge=OverlapFaithfulnessJudge()
+        ))
+
+        assert [result.recall_at_k for result in results] == [1.0] * len(QUESTIONS)
+        assert all(result.faithfulness == 1.0 for result in results)
+        assert all(result.error is None for result in results)
+
+    @pytest.mark.unit
+    def test_chunking_and_percentiles(self) -> None:
+        """Windows overlap as configured and percentiles interpolate linearly."""
+        chunks = chunk_documents({"a": " ".join(str(i) for i in range(10))}, chunk_size=4, chunk_overlap=1)
+        assert [chunk.text for chunk in chunks] == ["0 1 2 3", "3 4 5 6", "6 7 8 9"]
+        with pytest.raises(ValueError):
+            chunk_documents({"a": "x"}, chunk_size=4, chunk_overlap=4)
+
+        assert percentile([1, 2, 3, 4], 50) == 2.5
+        assert percentile([], 95) == 0.0
+
+    @pytest.mark.unit
+    def test_concurrency_is_bounded_and_errors_are_isolated(self) -> None:
+        """At most `concurrency` retrievals run at once; a failing question does not stop the others."""
+        documents = make_documents()
+        retriever = SlowRetriever(build_local_retriever(documents, RetrieverConfig("k", mode="keyword")), 0.02)
+        questions = QUESTIONS * 4 + [EvalQuestion("errore", ["x.pdf"])]
+
+        original = retriever.retrieve
+
+        def retrieve(query, top_k):
+            if query == "errore":
+                raise RuntimeError("boom")
+            return original(query, top_k)
+
+        retriever.retrieve = retrieve
+        results = asyncio.run(evaluate_questions(questions, retriever, 3, concurrency=3))
+
+        assert 1 < retriever.peak <= 3
+        assert results[-1].error == "boom"
+        summary = summarize_results(results)
+        assert summary['errors'] == 1 and summary['questions'] == len(questions)
+
+    @pytest.mark.unit
+    def test_versioned_reports_and_regressions(self, tmp_path) -> None:
+        """Reports get increasing versions and a worse configuration is flagged."""
+        documents = make_documents(extra=5)
+        configs = [RetrieverConfig("hybrid", mode="hybrid", top_k=3, chunk_size=80, chunk_overlap=20)]
+        report = asyncio.run(run_benchmark(documents, QUESTIONS, configs, StubLLM(), OverlapFaithfulnessJudge()))
+
+        assert load_latest_report(str(tmp_path)) is None
+        assert write_report(report, str(tmp_path)).endswith("rag_benchmark_v0001.json")
+        assert write_report(report, str(tmp_path)).endswith("rag_benchmark_v0002.json")
+        baseline = load_latest_report(str(tmp_path))
+        assert baseline['report_version'] == 2
+        assert find_regressions(baseline, report) == []
+
+        worse = asyncio.run(run_benchmark(documents, QUESTIONS, [RetrieverConfig(
+            "hybrid", mode="hybrid", top_k=1, chunk_size=80, chunk_overlap=20
+        )], StubLLM(), OverlapFaithfulnessJudge()))
+        worse['configurations']['hybrid']['summary']['recall_at_k'] = 0.5
+        assert any("recall@k" in regression for regression in find_regressions(baseline, worse))
+
+        other_dataset = asyncio.run(run_benchmark(make_documents(seed=9), QUESTIONS, configs))
+        assert find_regressions(baseline, other_dataset) == [
+            "Dataset diverso dal report di riferimento: confronto non significativo"
+        ]
+
+        # Documents outside the evaluation corpus do not change the fingerprint
+        grown_archive = asyncio.run(run_benchmark(make_documents(extra=50), QUESTIONS, configs))
+        assert grown_archive['dataset']['fingerprint'] == report['dataset']['fingerprint']
+        assert grown_archive['dataset']['documents'] == 55
+
+    @pytest.mark.unit
+    def test_extra_judges_are_summarized_and_compared(self) -> None:
+        """Relevancy-style judges add per-question scores, summary means and regressions."""
+        class ConstantJudge:
+            def __init__(self, score):
+                self.score = score
+
+            async def ascore(self, query, answer, contexts):
+                return self.score
+
+        documents = make_documents()
+        configs = [RetrieverConfig("hybrid", mode="hybrid", top_k=3, chunk_size=80, chunk_overlap=20)]
+
+        def run(relevancy):
+            return asyncio.run(run_benchmark(documents, QUESTIONS, configs, StubLLM(), OverlapFaithfulnessJudge(),
+                                             extra_judges={'answer_relevancy': ConstantJudge(relevancy),
+                                                           'context_relevancy': ConstantJudge(None)}))
+
+        baseline = run(0.9)
+        entry = baseline['configurations']['hybrid']
+        assert entry['questions'][0]['scores'] == {'answer_relevancy': 0.9, 'context_relevancy': None}
+        assert entry['summary']['scores'] == {'answer_relevancy': pytest.approx(0.9), 'context_relevancy': None}
+
+        assert find_regressions(baseline, run(0.88)) == []
+        assert find_regressions(baseline, run(0.6)) == ["hybrid: answer_relevancy 0.900 → 0.600"]
+
+    @pytest.mark.performance
+    def test_benchmark_parallel_evaluation(self) -> None:
+        """Sequential versus bounded-parallel evaluation with a simulated 20ms LLM."""
+        documents = make_documents(extra=200)
+        configs = [
+            RetrieverConfig("keyword_k5", mode="keyword", top_k=5),
+            RetrieverConfig("vector_k5", mode="vector", top_k=5),
+            RetrieverConfig("hybrid_k5", mode="hybrid", top_k=5),
+        ]
+        questions = QUESTIONS * 5
+
+        timings = {}
+        for concurrency in (1, 8):
+            start = time.perf_counter()
+            report = asyncio.run(run_benchmark(
+                documents, questions, configs, StubLLM(latency=0.02), OverlapFaithfulnessJudge(), concurrency
+            ))
+            timings[concurrency] = time.perf_counter() - start
+
+        summaries = {name: entry['summary'] for name, entry in report['configurations'].items()}
+        assert timings[8] < timings[1] / 2
+        # Long filler chunks dilute the bag-of-words vectors; fusion recovers the keyword recall
+        assert summaries['hybrid_k5']['recall_at_k'] == 1.0
+        assert summaries['hybrid_k5']['recall_at_k'] >= summaries['vector_k5']['recall_at_k']
@@ -0,0 +1,109 @@
+"""
+Test per i profili comportamentali incrementali di UserBehaviorAnalyzer.
+
+Verifica l'aggregazione dalla tabella user_activity a partire dal watermark,
+la persistenza dei contatori e il profilo servito dalla memoria.
+"""
+
+import json
+import random
+import sqlite3
+from collections import Counter
+from datetime import datetime, timedelta
+
+import pytest
+
+from src.database.repositories.user_activity_repository import UserActivityRepository
+from src.services.ai.smart_suggestions import UserBehaviorAnalyzer
+
+
+ACTIONS = ['view_doc', 'create_doc', 'search', 'organize_folder', 'start_chat', 'edit_doc']
+
+
+def insert_activities(db_path: str, user_id: int, count: int, seed: int = 1) -> list:
+    """Inserisce attività sintetiche e restituisce le righe inserite."""
+    rng = random.Random(seed)
+    start = datetime(2024, 3, 1, 8, 0)
+    rows = []
+    for i in range(count):
+        metadata = {'file_type': rng.choice(['pdf', 'docx', 'md']), 'category': rng.choice(['academic', 'notes'])}
+        rows.append((user_id, rng.choice(ACTIONS), rng.choice(['document', 'chat']), f"t{i}",
+                     json.dumps(metadata), (start + timedelta(hours=rng.randrange(400))).isoformat()))
+    with sqlite3.connect(db_path) as conn:
+        conn.executemany("""
+            INSERT INTO user_activity (user_id, action_type, target_type, target_id, metadata, timestamp)
+            VALUES (?, ?, ?, ?, ?, ?)
+        """, rows)
+    return rows
+
+
+class CountingRepository(UserActivityRepository):
+    """Repository che conta le righe di attività lette."""
+
+    rows_read = 0
+
+    def get_activities_since(self, user_id, after_id=0, limit=5000):
+        activities = super().get_activities_since(user_id, after_id, limit)
+        self.rows_read += len(activities)
+        return activities
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    return str(tmp_path / "activity.sqlite")
+
+
+class TestUserBehaviorAnalyzer:
+    """Test suite per l'aggregazione incrementale dei profili."""
+
+    @pytest.mark.database
+    def test_profile_matches_full_recomputation(self, db_path):
+        """I contatori incrementali coincidono con un ricalcolo completo sulle stesse righe."""
+        analyzer = UserBehaviorAnalyzer(UserActivityRepository(db_path))
+        rows = insert_activities(db_path, 1, 300)
+        insert_activities(db_path, 2, 50, seed=9)
+
+        profile = analyzer.analyze_user_behavior("1")
+
+        assert profile.activity_count == 300
+        assert profile.action_frequencies == dict(Counter(row[1] for row in rows))
+        hours = Counter(datetime.fromisoformat(row[5]).hour for row in rows)
+        assert profile.hour_histogram == [hours.get(h, 0) for h in range(24)]
+        documents = Counter(json.loads(row[4])['file_type'] for row in rows if row[2] == 'document')
+        assert profile.document_preferences == pytest.approx(
+            {k: v / sum(documents.values()) for k, v in documents.items()}
+        )
+        assert profile.skill_level == 'advanced'
+        assert profile.learning_goals == ['academic_research', 'document_organization']
+
+    @pytest.mark.database
+    def test_only_new_rows_are_read_and_counters_persist(self, db_path):
+        """Dopo il primo calcolo si leggono solo le righe oltre il watermark, anche da un altro processo."""
+        repository = CountingRepository(db_path)
+        analyzer = UserBehaviorAnalyzer(repository)
+        insert_activities(db_path, 1, 200)
+        analyzer.analyze_user_behavior("1")
+        assert repository.rows_read == 200
+
+        insert_activities(db_path, 1, 15, seed=2)
+        profile = analyzer.analyze_user_behavior("1")
+        assert repository.rows_read == 215
+        assert profile.activity_count == 215
+
+        other_repository = CountingRepository(db_path)
+        restored = UserBehaviorAnalyzer(other_repository).analyze_user_behavior("1")
+        assert other_repository.rows_read == 0
+        assert restored.action_frequencies == profile.action_frequencies
+
+    @pytest.mark.database
+    def test_get_profile_served_from_memory(self, db_path):
+        """Entro la finestra di refresh il profilo non interroga il database."""
+        repository = CountingRepository(db_path)
+        analyzer = UserBehaviorAnalyzer(repository)
+        insert_activities(db_path, 1, 20)
+        first = analyzer.get_profile("1")
+
+        insert_activities(db_path, 1, 5, seed=3)
+        assert analyzer.get_profile("1") is first and first.activity_count == 20
+        assert analyzer.get_profile("1", max_age_seconds=0).activity_count == 25
+        assert UserBehaviorAnalyzer(None).get_profile("1").skill_level == 'beginner'
@@ -0,0 +1,141 @@
+"""
+Test per il calcolo della confidenza con statistiche dei documenti in cache.
+
+Confronta i fattori di contesto con l'implementazione precedente (tokenizzazione
+di ogni documento a ogni risposta) e misura il costo per 5, 20 e 100 documenti.
+"""
+
+import math
+import random
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List
+
+import pytest
+
+from src.database.models.document import Document, ProcessingStatus
+from src.services.ai.confidence_system_fixed import ConfidenceCalculator
+from src.services.ai.document_stats import DocumentStatsCache
+
+
+VOCABULARY = (
+    "neural network training data model accuracy evaluation study analysis results "
+    "theory methodology evidence regression sample population variable experiment"
+).split()
+
+
+def make_documents(count: int, words: int = 400, seed: int = 5) -> List[Document]:
+    """Documenti di contesto con titolo, anteprima, keyword e date diverse."""
+    rng = random.Random(seed)
+    now = datetime.utcnow()
+    return [
+        Document(
+            id=i,
+            file_name=f"doc_{i}.pdf",
+            title=" ".join(rng.choice(VOCABULARY) for _ in range(5)).title(),
+            formatted_preview=" ".join(rng.choice(VOCABULARY) for _ in range(words)),
+            keywords=rng.sample(VOCABULARY, 4) if i % 3 else None,
+            processing_status=ProcessingStatus.COMPLETED if i % 2 else ProcessingStatus.PENDING,
+            content_hash=f"hash{i}" if i % 4 else None,
+            created_at=(now - timedelta(days=rng.choice([3, 100, 800]))).isoformat() if i % 5 else None,
+            updated_at=now.isoformat()
+        )
+        for i in range(count)
+    ]
+
+
+def reference_context_factors(response: str, documents: List[Document], query: str) -> Dict[str, float]:
+    """Implementazione precedente: ogni documento viene ritokenizzato a ogni risposta."""
+    if not documents:
+        return {'context_relevance': 0.3, 'source_reliability': 0.5, 'temporal_freshness': 0.5}
+    query_terms = set(query.lower().split())
+    response_lower = response.lower()
+    score = (sum(1 for t in query_terms if t in response_lower) / len(query_terms) if query_terms else 0) * 0.4
+
+    now = datetime.utcnow()
+    total_relevance, total_reliability, total_freshness = 0, 0.0, 0.0
+    for doc in documents:
+        doc_relevance = 0
+        if doc.title:
+            doc_relevance += (len(query_terms & set(doc.title.lower().split())) / len(query_terms)) * 0.3
+        if doc.formatted_preview:
+            doc_relevance += (len(query_terms & set(doc.formatted_preview.lower().split())) / len(query_terms)) * 0.2
+        if doc.keywords:
+            keyword_terms = set(' '.join(doc.keywords).lower().split())
+            doc_relevance += (len(query_terms & keyword_terms) / len(query_terms)) * 0.5
+        total_relevance += doc_relevance
+
+        reliability = 0.5
+        if doc.processing_status and doc.processing_status.value == 'completed':
+            reliability += 0.2
+        reliability += 0.1 * bool(doc.title) + 0.1 * bool(doc.keywords) + 0.1 * bool(doc.content_hash)
+        if doc.created_at:
+            days_old = (now - datetime.fromisoformat(doc.created_at)).days
+            reliability += 0.1 if days_old < 30 else 0.05 if days_old < 365 else 0
+            total_freshness += math.exp(-days_old / 365)
+        total_reliability += min(reliability, 1.0)
+
+    return {
+        'context_relevance': min(score + (total_relevance / len(documents)) * 0.6, 1.0),
+        'source_reliability': total_reliability / len(documents),
+        'temporal_freshness': total_freshness / len(documents)
+    }
+
+
+RESPONSE = "The study of neural network training shows that data quality drives model accuracy."
+QUERY = "how does training data affect neural network accuracy"
+
+
+class TestConfidenceScoring:
+    """Test suite per i fattori di contesto e la cache delle statistiche."""
+
+    @pytest.mark.unit
+    def test_context_factors_match_reference(self):
+        """Stessi valori dell'implementazione precedente, con e senza documenti."""
+        calculator = ConfidenceCalculator()
+        calculator.stats_cache = DocumentStatsCache()
+        for documents in (make_documents(12), []):
+            stats = [calculator.stats_cache.get(doc) for doc in documents]
+            factors = calculator._calculate_context_factors(RESPONSE, stats, QUERY)
+            expected = reference_context_factors(RESPONSE, documents, QUERY)
+            assert factors == pytest.approx(expected, abs=1e-12)
+
+        score = calculator.calculate_response_confidence(RESPONSE, make_documents(3), "user", QUERY)
+        assert list(score.factors) == list(calculator.weights)
+
+    @pytest.mark.unit
+    def test_cache_keyed_by_id_and_updated_at(self):
+        """Un documento modificato (nuovo updated_at) viene ritokenizzato; senza id non si usa la cache."""
+        cache = DocumentStatsCache(max_size=2)
+        document = make_documents(1)[0]
+        first = cache.get(document)
+        assert cache.get(document) is first and cache.hits == 1
+
+        edited = document.model_copy(update={'title': 'Totally New', 'updated_at': '2099-01-01T00:00:00'})
+        assert cache.get(edited).title_terms == {'totally', 'new'}
+
+        anonymous = document.model_copy(update={'id': None})
+        cache.get(anonymous)
+        assert len(cache) == 2 and cache.misses == 3
+
+    @pytest.mark.performance
+    @pytest.mark.parametrize("num_documents", [5, 20, 100])
+    def test_benchmark_scoring(self, num_documents):
+        """Punteggio di 50 risposte sugli stessi documenti di contesto: cache contro ritokenizzazione."""
+        documents = make_documents(num_documents)
+        calculator = ConfidenceCalculator()
+        calculator.stats_cache = DocumentStatsCache()
+
+        start = time.perf_counter()
+        for _ in range(50):
+            expected = reference_context_factors(RESPONSE, documents, QUERY)
+        reference_time = (time.perf_counter() - start) / 50
+
+        start = time.perf_counter()
+        for _ in range(50):
+            stats = [calculator.stats_cache.get(doc) for doc in documents]
+            factors = calculator._calculate_context_factors(RESPONSE, stats, QUERY)
+        cached_time = (time.perf_counter() - start) / 50
+
+        assert factors == pytest.approx(expected, abs=1e-12)
+        assert cached_time < reference_time
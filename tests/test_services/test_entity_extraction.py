@@ -0,0 +1,145 @@
+"""
+Test per l'estrazione di entità di EntityExtractor.
+
+Confronta l'estrattore condiviso con l'implementazione precedente (nove scansioni
+regex, confidenza e contesto per ogni match, deduplica finale) su un corpus fixture.
+"""
+
+import random
+import time
+from types import SimpleNamespace
+from typing import List
+
+import pytest
+
+from src.database.models.document import Document
+from src.services.ai import document_intelligence
+from src.services.ai.document_intelligence import (
+    Entity,
+    EntityExtractor,
+    get_entity_extractor,
+)
+
+
+CORPUS_WORDS = (
+    "the model uses Deep Learning with John Smith at Stanford University in New York "
+    "on 12/03/2021 or 2021-03-12 call 555-123-4567 email john.smith@example.com see "
+    "https://example.org/paper and GPT4 NASA Biology Methodology Classification Training "
+    "Maria Rossi Politecnico di Milano Thermodynamics R&D Lab analysis of Neural Networks"
+).split()
+
+
+def make_corpus(num_documents: int, words_per_document: int, seed: int = 11) -> List[Document]:
+    """Documenti sintetici con entità ripetute e sovrapposte tra tipi."""
+    rng = random.Random(seed)
+    return [
+        Document(
+            file_name=f"doc_{i}.pdf",
+            formatted_preview=" ".join(rng.choice(CORPUS_WORDS) for _ in range(words_per_document))
+        )
+        for i in range(num_documents)
+    ]
+
+
+def reference_extract(extractor: EntityExtractor, document: Document) -> List[Entity]:
+    """Implementazione precedente, usata come riferimento per l'output."""
+    entities = []
+    text = document.formatted_preview or ""
+    if not text:
+        return entities
+
+    for entity_type, pattern in extractor.entity_patterns.items():
+        for match in pattern.finditer(text):
+            entity_text = match.group().strip()
+            if len(entity_text) < 3 or entity_text.lower() in extractor.stop_words:
+                continue
+            confidence = extractor._calculate_entity_confidence(entity_text, match.span(), text, entity_type)
+            if confidence > 0.3:
+                entities.append(Entity(
+                    text=entity_text,
+                    type=entity_type,
+                    confidence=confidence,
+                    start_pos=match.start(),
+                    end_pos=match.end(),
+                    context=extractor._extract_context(text, match.span())
+                ))
+
+    seen = set()
+    unique_entities = []
+    for entity in entities:
+        key = (entity.text.lower(), entity.type)
+        if key not in seen:
+            seen.add(key)
+            unique_entities.append(entity)
+    return sorted(unique_entities, key=lambda x: x.confidence, reverse=True)
+
+
+class TestEntityExtractor:
+    """Test suite per l'estrattore di entità."""
+
+    @pytest.mark.unit
+    def test_output_identical_to_reference(self):
+        """Stesse entità, posizioni, confidenze, contesti e ordine dell'implementazione precedente."""
+        extractor = get_entity_extractor()
+        for document in make_corpus(20, 300):
+            assert extractor.extract_entities(document) == reference_extract(extractor, document)
+
+    @pytest.mark.unit
+    def test_shared_instance_and_empty_text(self):
+        """L'istanza condivisa è unica e il testo vuoto non produce entità."""
+        assert get_entity_extractor() is get_entity_extractor()
+        assert get_entity_extractor().extract_entities(Document(file_name="empty.pdf")) == []
+
+    @pytest.mark.unit
+    def test_batch_matches_single_document_extraction(self):
+        """L'estrazione batch (con e senza process pool) mantiene ordine e risultati."""
+        extractor = get_entity_extractor()
+        documents = make_corpus(8, 5000, seed=5)
+        expected = [extractor.extract_entities(document) for document in documents]
+
+        assert extractor.extract_entities_batch(documents, max_workers=1) == expected
+        assert extractor.extract_entities_batch(documents, max_workers=2) == expected
+
+    @pytest.mark.unit
+    def test_failing_document_does_not_drop_the_batch(self):
+        """Un documento che fa fallire l'estrazione produce una lista vuota; gli altri restano intatti."""
+        extractor = get_entity_extractor()
+        documents = make_corpus(6, 5000, seed=3)
+        expected = [extractor.extract_entities(document) for document in documents]
+        documents[2] = SimpleNamespace(file_name="corrotto.pdf", formatted_preview=12345)
+        expected[2] = []
+
+        assert extractor.extract_entities_batch(documents, max_workers=1) == expected
+        assert extractor.extract_entities_batch(documents, max_workers=2) == expected
+
+    @pytest.mark.unit
+    def test_daemon_process_extracts_in_process(self, monkeypatch):
+        """In un processo daemon (worker Celery prefork) non viene creato alcun process pool."""
+        def no_pool(*args, **kwargs):
+            raise AssertionError("daemonic processes are not allowed to have children")
+
+        monkeypatch.setattr(document_intelligence, 'ProcessPoolExecutor', no_pool)
+        monkeypatch.setattr(document_intelligence.multiprocessing, 'current_process',
+                            lambda: SimpleNamespace(daemon=True))
+
+        extractor = get_entity_extractor()
+        documents = make_corpus(4, 5000, seed=9)
+        assert extractor.extract_entities_batch(documents, max_workers=2) == \
+            [extractor.extract_entities(document) for document in documents]
+
+    @pytest.mark.performance
+    def test_benchmark_against_reference(self):
+        """L'estrattore condiviso è più veloce del riferimento sul corpus fixture."""
+        extractor = get_entity_extractor()
+        documents = make_corpus(50, 4000, seed=7)
+
+        start = time.perf_counter()
+        expected = [reference_extract(EntityExtractor(), document) for document in documents]
+        reference_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        results = [extractor.extract_entities(document) for document in documents]
+        single_pass_time = time.perf_counter() - start
+
+        assert results == expected
+        assert single_pass_time < reference_time
@@ -0,0 +1,136 @@
+"""
+Test per il rendering level-of-detail del grafo della conoscenza.
+
+Verifica layout per versione, super-nodi dei cluster e payload limitati per viewport/tile.
+"""
+
+import json
+import random
+from types import SimpleNamespace
+
+import pytest
+
+nx = pytest.importorskip("networkx")
+np = pytest.importorskip("numpy")
+
+from src.services.ai.graph_lod import (
+    CLUSTER_ZOOM_THRESHOLD,
+    GraphLayoutCache,
+    compute_layout,
+    graph_fingerprint,
+)
+
+
+def make_clustered_graph(num_clusters: int, cluster_size: int, seed: int = 3):
+    """Grafo con cluster densi e pochi archi tra cluster, come dopo _identify_clusters."""
+    rng = random.Random(seed)
+    graph = nx.Graph()
+    clusters = {}
+    for c in range(num_clusters):
+        members = [f"entity_{c}_{i}" for i in range(cluster_size)]
+        for node in members:
+            graph.add_node(node, label=node, type='concept', confidence=rng.random())
+        for i in range(1, cluster_size):
+            graph.add_edge(members[i], members[rng.randrange(i)], confidence=rng.random(), weight=1.0)
+        clusters[f"cluster_{c}"] = SimpleNamespace(name=f"Cluster {c}", nodes=members)
+    for c in range(1, num_clusters):
+        graph.add_edge(f"entity_{c}_0", f"entity_{rng.randrange(c)}_0", confidence=0.5, weight=1.0)
+    return graph, clusters
+
+
+class TestGraphLayout:
+    """Test suite per layout e query per viewport."""
+
+    @pytest.mark.unit
+    def test_fingerprint_tracks_structure(self):
+        """La versione cambia se cambiano nodi, archi o gli attributi copiati nel layout."""
+        graph, _ = make_clustered_graph(3, 10)
+        version = graph_fingerprint(graph)
+        assert graph_fingerprint(graph.copy()) == version
+
+        seen = {version}
+        graph.add_edge("entity_0_1", "entity_2_5")
+        seen.add(graph_fingerprint(graph))
+        for attribute, value in (('label', 'Entropia'), ('type', 'person'), ('confidence', 0.123)):
+            graph.nodes["entity_1_3"][attribute] = value
+            seen.add(graph_fingerprint(graph))
+        graph.edges["entity_0_1", "entity_2_5"]['confidence'] = 0.9
+        seen.add(graph_fingerprint(graph))
+        assert len(seen) == 6
+
+    @pytest.mark.unit
+    def test_low_zoom_collapses_clusters(self):
+        """A zoom basso ogni cluster diventa un super-nodo con archi aggregati."""
+        graph, clusters = make_clustered_graph(12, 40)
+        layout = compute_layout(graph, clusters, graph_fingerprint(graph))
+
+        overview = layout.query_viewport(zoom=0)
+        assert overview['level'] == 'clusters'
+        assert len(overview['nodes']) == 12
+        assert sum(node['size'] for node in overview['nodes']) == 480
+        assert sum(edge['weight'] for edge in overview['edges']) == 11
+
+    @pytest.mark.unit
+    def test_tiles_cover_graph_with_bounded_payload(self):
+        """Le tile ad alto zoom contengono solo i nodi visibili e insieme coprono il grafo."""
+        graph, clusters = make_clustered_graph(20, 250)
+        layout = compute_layout(graph, clusters, graph_fingerprint(graph))
+
+        z = CLUSTER_ZOOM_THRESHOLD + 1
+        seen = set()
+        for x in range(1 << z):
+            for y in range(1 << z):
+                tile = layout.query_tile(z, x, y, max_nodes=2000)
+                assert tile['level'] == 'nodes'
+                x0, y0, x1, y1 = tile['bounds']
+                assert all(x0 <= n['x'] <= x1 and y0 <= n['y'] <= y1 for n in tile['nodes'])
+                ids = {n['id'] for n in tile['nodes']}
+                assert all(e['source'] in ids and e['target'] in ids for e in tile['edges'])
+                seen |= ids
+        assert seen == set(graph.nodes())
+
+        full = layout.query_viewport(zoom=z, max_nodes=100)
+        assert full['truncated'] and len(full['nodes']) == 100
+        assert len(json.dumps(full)) < 50_000
+
+    @pytest.mark.unit
+    def test_layout_cached_per_version(self):
+        """Il layout viene calcolato una sola volta per versione del grafo."""
+        graph, clusters = make_clustered_graph(4, 20)
+        cache = GraphLayoutCache(max_versions=2)
+        version = graph_fingerprint(graph)
+
+        first = cache.get_or_compute(version, lambda: compute_layout(graph, clusters, version))
+        second = cache.get_or_compute(version, lambda: pytest.fail("layout ricalcolato"))
+        assert first is second
+        assert cache.stats == {'hits': 1, 'computes': 1}
+        assert first.position_of("entity_0_0") is not None
+
+
+class TestInteractiveVisualization:
+    """Pagina interattiva per grafi oltre FULL_RENDER_LIMIT."""
+
+    @pytest.mark.unit
+    def test_large_graph_is_navigable_without_tile_server(self):
+        """Senza tile_endpoint la pagina incorpora anche il livello di dettaglio, limitato."""
+        pytest.importorskip("matplotlib")
+        from src.services.ai.graph_lod import FULL_RENDER_LIMIT, MAX_VIEWPORT_NODES
+        from src.services.ai.knowledge_graph import KnowledgeGraphVisualizer
+
+        graph, clusters = make_clustered_graph(10, 200)
+        assert graph.number_of_nodes() > FULL_RENDER_LIMIT
+        layout = compute_layout(graph, clusters, graph_fingerprint(graph))
+        visualizer = KnowledgeGraphVisualizer(SimpleNamespace(get_layout=lambda: layout))
+
+        def embedded(html, name):
+            line = next(line for line in html.splitlines() if f"const {name} =" in line)
+            return json.loads(line.split("=", 1)[1].strip().rstrip(";"))
+
+        html = visualizer.create_interactive_visualization()
+        assert embedded(html, "overview")['level'] == 'clusters'
+        detail = embedded(html, "detail")
+        assert detail['level'] == 'nodes' and len(detail['nodes']) == MAX_VIEWPORT_NODES
+        assert 'id="colorScheme"' in html and "d3.drag()" in html
+
+        with_tiles = visualizer.create_interactive_visualization(tile_endpoint="/graph/tile")
+        assert embedded(with_tiles, "detail") is None
@@ -0,0 +1,165 @@
+"""
+Test per il matcher multi-keyword (Aho-Corasick) di topic e sentiment.
+
+Confronta TopicModeler e SentimentAnalyzer con l'implementazione precedente
+(una scansione per keyword, sezioni frase per frase) su un corpus fixture.
+"""
+
+import random
+import time
+from typing import Dict, List, Optional
+
+import pytest
+
+from src.database.models.document import Document
+from src.services.ai.document_intelligence import (
+    EMOTION_WORDS,
+    NEGATIVE_WORDS,
+    POSITIVE_WORDS,
+    TOPIC_KEYWORDS,
+    KeywordMatcher,
+    SentimentAnalyzer,
+    TopicModeler,
+    get_keyword_matcher,
+)
+
+
+CORPUS_WORDS = (
+    "the results of our study show a significant correlation between training data and model "
+    "accuracy. The neural network uses deep learning. we found no problem, only a minor issue. "
+    "good excellent bad poor fear joy surprise shock panic worry datasets meaning offset classes "
+    "Regression ANOVA p-value chi-square confidence interval. theorem proof. an error occurred. "
+    "Happiness and sadness, fury and terror. unhappy astonishment"
+).split()
+
+
+def make_corpus(num_documents: int, words_per_document: int, seed: int = 13) -> List[Document]:
+    """Documenti sintetici con keyword sovrapposte, maiuscole e punteggiatura."""
+    rng = random.Random(seed)
+    return [
+        Document(
+            file_name=f"doc_{i}.pdf",
+            title=" ".join(rng.choice(CORPUS_WORDS) for _ in range(rng.randrange(0, 6))),
+            formatted_preview=" ".join(rng.choice(CORPUS_WORDS) for _ in range(words_per_document))
+        )
+        for i in range(num_documents)
+    ]
+
+
+def reference_topics(document: Document, max_topics: int = 5) -> List[tuple]:
+    """Implementazione precedente di TopicModeler.extract_topics."""
+    text = document.formatted_preview or ""
+    title = document.title or ""
+    if not text and not title:
+        return []
+    full_text = f"{title} {text}".lower()
+
+    topic_scores = {}
+    for topic_name, keywords in TOPIC_KEYWORDS.items():
+        keyword_score = sum(1 for k in keywords if k in full_text) / len(keywords)
+        title_boost = sum(1 for k in keywords if k in title.lower()) / len(keywords) * 0.3
+        score = min(keyword_score * 0.7 + title_boost, 1.0)
+        if score > 0.1:
+            topic_scores[topic_name] = score
+
+    topics = []
+    for topic_name, score in sorted(topic_scores.items(), key=lambda x: x[1], reverse=True)[:max_topics]:
+        sections = [
+            sentence.strip() for sentence in full_text.split('.')
+            if any(k in sentence for k in TOPIC_KEYWORDS[topic_name])
+        ]
+        topics.append((topic_name, score, sections[:3]))
+    return topics
+
+
+def reference_sentiment(document: Document) -> Optional[tuple]:
+    """Implementazione precedente di SentimentAnalyzer.analyze_sentiment."""
+    text = document.formatted_preview or ""
+    if not text:
+        return (0.0, 0.0, 0.0, None, {})
+    text_lower = text.lower()
+    words = text_lower.split()
+
+    positive_count = sum(1 for word in words if word in POSITIVE_WORDS)
+    negative_count = sum(1 for word in words if word in NEGATIVE_WORDS)
+    total = positive_count + negative_count
+    polarity = 0.0 if total == 0 else (positive_count - negative_count) / total
+    opinion_count = sum(1 for word in words if word in POSITIVE_WORDS | NEGATIVE_WORDS)
+    subjectivity = min(opinion_count / len(words), 1.0) if words else 0.0
+    confidence = min(total / len(words) * 5, 1.0) if words else 0.0
+
+    matches: Dict[str, int] = {}
+    for emotion, keywords in EMOTION_WORDS.items():
+        count = sum(1 for k in keywords if k in text_lower)
+        if count > 0:
+            matches[emotion] = count
+    dominant = max(matches.items(), key=lambda x: x[1])[0] if matches else None
+    scores = {emotion: min(count / len(text_lower.split()) * 10, 1.0) for emotion, count in matches.items()}
+    return (polarity, subjectivity, confidence, dominant, scores)
+
+
+def as_tuples(topics) -> List[tuple]:
+    return [(t.name, t.relevance_score, t.document_sections) for t in topics]
+
+
+class TestKeywordMatcher:
+    """Test suite per il matcher condiviso."""
+
+    @pytest.mark.unit
+    def test_finds_every_overlapping_occurrence(self):
+        """Ogni occorrenza, anche sovrapposta o annidata, viene riportata con la sua posizione."""
+        matcher = KeywordMatcher(['he', 'she', 'his', 'hers', 'set', 'dataset'])
+        text = "ushers dataset his"
+        expected = sorted(
+            (start, keyword) for keyword in matcher.keywords
+            for start in range(len(text)) if text.startswith(keyword, start)
+        )
+        assert sorted(matcher.find_all(text)) == expected
+        assert KeywordMatcher([]).find_all(text) == []
+
+    @pytest.mark.unit
+    def test_topics_and_sentiment_identical_to_reference(self):
+        """Stessi topic, punteggi, sezioni ed emozioni dell'implementazione precedente."""
+        topic_modeler = TopicModeler()
+        sentiment_analyzer = SentimentAnalyzer()
+        for document in make_corpus(40, 200):
+            assert as_tuples(topic_modeler.extract_topics(document)) == reference_topics(document)
+
+            scan = get_keyword_matcher().scan_document(document)
+            result = sentiment_analyzer.analyze_sentiment(document, scan=scan)
+            assert (result.polarity, result.subjectivity, result.confidence,
+                    result.dominant_emotion, result.emotion_scores) == reference_sentiment(document)
+
+    @pytest.mark.unit
+    def test_empty_documents(self):
+        """Documenti vuoti o con solo titolo mantengono il comportamento precedente."""
+        title_only = Document(file_name="t.pdf", title="Deep Learning model training")
+        assert as_tuples(TopicModeler().extract_topics(title_only)) == reference_topics(title_only)
+        assert TopicModeler().extract_topics(Document(file_name="e.pdf")) == []
+        assert SentimentAnalyzer().analyze_sentiment(title_only).polarity == 0.0
+
+    @pytest.mark.performance
+    def test_benchmark_against_reference(self):
+        """Una sola passata per documento è più veloce delle scansioni per keyword."""
+        documents = make_corpus(20, 20_000, seed=3)
+        topic_modeler = TopicModeler()
+        sentiment_analyzer = SentimentAnalyzer()
+
+        start = time.perf_counter()
+        expected = [(reference_topics(d), reference_sentiment(d)) for d in documents]
+        reference_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        results = []
+        for document in documents:
+            scan = get_keyword_matcher().scan_document(document)
+            sentiment = sentiment_analyzer.analyze_sentiment(document, scan=scan)
+            results.append((
+                as_tuples(topic_modeler.extract_topics(document, scan=scan)),
+                (sentiment.polarity, sentiment.subjectivity, sentiment.confidence,
+                 sentiment.dominant_emotion, sentiment.emotion_scores)
+            ))
+        single_pass_time = time.perf_counter() - start
+
+        assert results == expected
+        assert single_pass_time < reference_time
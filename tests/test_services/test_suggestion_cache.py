@@ -0,0 +1,146 @@
+"""
+Test per la cache persistente dei suggerimenti di SmartSuggestionSystem.
+
+Verifica la condivisione tra istanze (processi) sullo stesso database, la
+precomputazione dopo gli eventi, le metriche hit/miss e l'eviction per TTL
+e dimensione.
+"""
+
+import time
+
+import pytest
+
+from src.database.repositories.suggestion_cache_repository import SuggestionCacheRepository
+from src.database.repositories.user_activity_repository import UserActivityRepository
+from src.services.ai.smart_suggestions import PRECOMPUTE_PAGES, SmartSuggestionSystem
+from tests.test_services.test_behavior_profile import insert_activities
+
+
+class CountingSystem(SmartSuggestionSystem):
+    """Sistema che conta le generazioni dei suggerimenti."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.generated = 0
+        generate = self.suggestion_engine.generate_suggestions
+
+        def counting_generate(*call_args, **call_kwargs):
+            self.generated += 1
+            return generate(*call_args, **call_kwargs)
+
+        self.suggestion_engine.generate_suggestions = counting_generate
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    return str(tmp_path / "suggestions.sqlite")
+
+
+def make_system(db_path: str, **cache_options) -> CountingSystem:
+    """Sistema con repository attività e cache sullo stesso database."""
+    cache = SuggestionCacheRepository(db_path, **cache_options)
+    return CountingSystem(None, UserActivityRepository(db_path), cache)
+
+
+class TestSuggestionCache:
+    """Test suite per lookup, precomputazione ed eviction."""
+
+    @pytest.mark.database
+    def test_lookup_is_shared_across_instances(self, db_path):
+        """Il primo lookup genera e salva; un'altra istanza sullo stesso database legge senza generare."""
+        first = make_system(db_path)
+        suggestions = first.get_personalized_suggestions("1", {'current_page': 'chat'}, limit=3)
+        assert first.generated == 1 and first.cache_stats['misses'] == 1
+        assert suggestions
+
+        other = make_system(db_path)
+        cached = other.get_personalized_suggestions("1", {'current_page': 'chat'}, limit=3)
+        assert other.generated == 0 and other.cache_stats['hits'] == 1
+        assert [s.to_dict() for s in cached] == [s.to_dict() for s in suggestions]
+
+        analytics = other.get_suggestion_analytics()['system_health']
+        assert analytics['cache_hit_rate'] == 1.0 and analytics['cache_size'] == 1
+
+    @pytest.mark.database
+    def test_event_precomputes_every_page_in_background(self, db_path):
+        """Un evento rilevante invalida la cache e la ricalcola per tutte le pagine."""
+        system = make_system(db_path)
+        system.get_personalized_suggestions("1", {'current_page': 'archive'})
+
+        assert system.notify_event("1", 'search_performed') is False
+        assert system.notify_event("1", 'document_processed') is True
+        system.notify_event("1", 'task_completed')
+        system.wait_for_precomputation()
+
+        assert system.cache_stats['precomputed'] in (len(PRECOMPUTE_PAGES), 2 * len(PRECOMPUTE_PAGES))
+        generated = system.generated
+        for page in PRECOMPUTE_PAGES:
+            system.get_personalized_suggestions("1", {'current_page': page})
+        assert system.generated == generated
+        assert system.cache_stats['hits'] == len(PRECOMPUTE_PAGES)
+
+    @pytest.mark.database
+    def test_invalidation_during_computation_discards_result(self, db_path):
+        """Un evento arrivato durante il calcolo impedisce di salvare suggerimenti ormai vecchi."""
+        system = make_system(db_path)
+        other_process = make_system(db_path)
+        generate = system.suggestion_engine.generate_suggestions
+
+        def generate_then_invalidate(*args, **kwargs):
+            suggestions = generate(*args, **kwargs)
+            other_process.suggestion_cache.invalidate_user("1")
+            return suggestions
+
+        system.suggestion_engine.generate_suggestions = generate_then_invalidate
+        assert system.precompute_suggestions("1", ('chat',)) == 1
+        assert system.suggestion_cache.get_suggestions("1", 'chat') is None
+        assert system.suggestion_cache.get_generation("1") == 1
+
+        system.suggestion_engine.generate_suggestions = generate
+        system.precompute_suggestions("1", ('chat',))
+        assert system.suggestion_cache.get_suggestions("1", 'chat') is not None
+
+        cache = system.suggestion_cache
+        assert cache.save_suggestions("1", 'archive', [], generation=0) is False
+        assert cache.save_suggestions("1", 'archive', [], generation=1) is True
+        assert cache.save_suggestions("2", 'archive', [], generation=0) is True
+
+    @pytest.mark.database
+    def test_ttl_and_size_bounded_eviction(self, db_path):
+        """Le voci scadute non vengono servite e la tabella resta entro max_entries."""
+        system = make_system(db_path, ttl_seconds=0)
+        system.get_personalized_suggestions("1", {'current_page': 'chat'})
+        system.get_personalized_suggestions("1", {'current_page': 'chat'})
+        assert system.cache_stats == {'hits': 0, 'misses': 2, 'precomputed': 0, 'evicted': 0}
+        assert system.cleanup_expired_suggestions() == 1
+
+        cache = SuggestionCacheRepository(db_path, max_entries=3)
+        for user_id in range(6):
+            cache.save_suggestions(str(user_id), 'chat', [])
+            time.sleep(0.001)
+        assert cache.evict() == 3
+        assert sorted(row['user_id'] for row in cache.get_all()) == ['3', '4', '5']
+
+    @pytest.mark.performance
+    def test_benchmark_cold_process_lookup(self, db_path):
+        """Primo suggerimento servito da un processo nuovo: generazione on-demand contro lookup precalcolato."""
+        activity_repository = UserActivityRepository(db_path)
+        cache = SuggestionCacheRepository(db_path)
+        insert_activities(db_path, 1, 2000)
+        SmartSuggestionSystem(None, activity_repository, cache).notify_event("1", 'session_started', wait=True)
+
+        start = time.perf_counter()
+        for _ in range(50):
+            worker = SmartSuggestionSystem(None, activity_repository, cache)
+            expected = worker.suggestion_engine.generate_suggestions("1", {'current_page': 'dashboard'}, 10)
+        generate_time = (time.perf_counter() - start) / 50
+
+        start = time.perf_counter()
+        for _ in range(50):
+            worker = SmartSuggestionSystem(None, activity_repository, cache)
+            suggestions = worker.get_personalized_suggestions("1", {'current_page': 'dashboard'})
+            assert worker.cache_stats['hits'] == 1
+        lookup_time = (time.perf_counter() - start) / 50
+
+        assert [s.title for s in suggestions] == [s.title for s in expected[:5]]
+        assert lookup_time < generate_time
@@ -0,0 +1,138 @@
+"""
+Tests for the document task locks (scripts.operations.task_locks): mutual
+exclusion, lost leases stopping side effects, and lock metrics shared by
+every process through the backend store.
+"""
+
+import pytest
+
+from scripts.operations.task_locks import (
+    FileLockBackend,
+    LockLostError,
+    RedisLockBackend,
+    TaskLockManager,
+)
+
+
+class FakeRedis:
+    """In-memory stand-in for the few Redis commands used by RedisLockBackend."""
+
+    def __init__(self):
+        self.values = {}
+        self.hashes = {}
+
+    def set(self, key, value, nx=False, px=None):
+        if nx and key in self.values:
+            return None
+        self.values[key] = value
+        return True
+
+    def get(self, key):
+        return self.values.get(key)
+
+    def register_script(self, script):
+        def run(keys, args):
+            if self.values.get(keys[0]) != args[0]:
+                return 0
+            if 'del' in script:
+                del self.values[keys[0]]
+            return 1
+        return run
+
+    def pipeline(self, transaction=False):
+        return self
+
+    def hincrbyfloat(self, key, field, delta):
+        counters = self.hashes.setdefault(key, {})
+        counters[field] = counters.get(field, 0.0) + delta
+
+    def execute(self):
+        return []
+
+    def hgetall(self, key):
+        return {field.encode(): str(value).encode() for field, value in self.hashes.get(key, {}).items()}
+
+
+@pytest.fixture
+def locks_dir(tmp_path):
+    return str(tmp_path / "locks")
+
+
+class TestTaskLocks:
+    """Exclusion, lost locks and shared metrics."""
+
+    @pytest.mark.unit
+    def test_file_locks_exclude_other_workers_until_released(self, locks_dir) -> None:
+        """A second worker cannot take a held document lock; it can after the release."""
+        worker_a = TaskLockManager(FileLockBackend(locks_dir))
+        worker_b = TaskLockManager(FileLockBackend(locks_dir))
+
+        handle = worker_a.acquire("process:a.pdf")
+        assert handle is not None
+        assert worker_b.acquire("process:a.pdf") is None
+        assert worker_b.acquire("delete:a.pdf") is not None
+
+        handle.release()
+        assert handle.release() is False
+        retry = worker_b.acquire("process:a.pdf")
+        assert retry is not None
+        worker_b.release_all()
+
+    @pytest.mark.unit
+    def test_dashboard_reads_metrics_published_by_workers(self, locks_dir) -> None:
+        """Counters of every worker are summed in the shared store, not kept in each process."""
+        worker_a = TaskLockManager(FileLockBackend(locks_dir))
+        worker_b = TaskLockManager(FileLockBackend(locks_dir))
+        dashboard = TaskLockManager(FileLockBackend(locks_dir))
+
+        handle = worker_a.acquire("process:a.pdf")
+        assert worker_b.acquire("process:a.pdf") is None
+        handle.release()
+        worker_b.acquire("delete:b.pdf").release()
+
+        shared = dashboard.get_shared_metrics()
+        assert shared['backend'] == "file"
+        assert shared['acquired'] == 2 and shared['released'] == 2
+        assert shared['contended'] == 1 and shared['timeouts'] == 1
+        assert shared['contention_by_prefix'] == {'process': 1}
+        assert shared['contention_rate'] == pytest.approx(1 / 3)
+
+        local = dashboard.get_metrics()
+        assert local['acquired'] == 0 and local['cluster']['acquired'] == 2
+
+    @pytest.mark.unit
+    def test_lost_lease_stops_side_effects(self) -> None:
+        """Once another worker owns the key, ensure_held raises and release leaves its lock alone."""
+        client = FakeRedis()
+        manager = TaskLockManager(RedisLockBackend(client))
+        handle = manager.acquire("process:a.pdf")
+        try:
+            handle.ensure_held()
+
+            # The lease expired and another worker took the document
+            client.values["archivista:lock:process:a.pdf"] = "other-worker"
+            with pytest.raises(LockLostError):
+                handle.ensure_held()
+            assert handle.lost is True
+
+            handle.release()
+            assert client.values["archivista:lock:process:a.pdf"] == "other-worker"
+            assert manager.get_shared_metrics()['lost'] == 1
+        finally:
+            manager.release_all()
+
+    @pytest.mark.unit
+    def test_released_or_lost_file_lock_is_not_held(self, locks_dir) -> None:
+        """The file backend never expires, but a released or flagged handle refuses side effects."""
+        manager = TaskLockManager(FileLockBackend(locks_dir))
+        handle = manager.acquire("bayesian_1:a.pdf")
+        handle.ensure_held()
+
+        handle.lost = True
+        with pytest.raises(LockLostError):
+            handle.ensure_held()
+
+        handle.lost = False
+        handle.release()
+        with pytest.raises(LockLostError):
+            handle.ensure_held()
@@ -0,0 +1,135 @@
+"""
+Tests for ingestion routing (scripts.operations.task_scheduler): queue choice
+by origin and document size, task routes, and the worker pools that consume
+each queue in the compose files and the Windows launcher.
+"""
+
+import re
+from pathlib import Path
+
+import pytest
+
+from scripts.operations import task_scheduler
+from scripts.operations.task_scheduler import (
+    DEFAULT_QUEUE,
+    INGEST_DEFAULT_QUEUE,
+    ORIGIN_BULK,
+    ORIGIN_INTERACTIVE,
+    QUEUE_PROFILES,
+    TASK_ROUTES,
+    WORKER_POOLS,
+    enqueue_document,
+    get_routing_options,
+    profile_document,
+)
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+class RecordingTask:
+    """Stand-in for a Celery task that records apply_async calls."""
+
+    def __init__(self):
+        self.calls = []
+
+    def apply_async(self, **options):
+        self.calls.append(options)
+        return options
+
+
+def write_file(path: Path, size: int) -> str:
+    path.write_bytes(b"a" * size)
+    return str(path)
+
+
+def worker_queue_lists(text: str):
+    """Queue lists passed with -Q to the celery workers in a launcher or compose file."""
+    return [match.split(',') for match in re.findall(r"worker -Q ([\w,]+)", text)]
+
+
+class TestTaskScheduler:
+    """Routing options and worker pool consistency."""
+
+    @pytest.mark.unit
+    def test_queue_follows_origin_and_size(self, tmp_path, monkeypatch) -> None:
+        """Small and large documents go to the queue of their origin with that queue's time limits."""
+        monkeypatch.setattr(task_scheduler, 'LARGE_FILE_BYTES', 50_000)
+        small = write_file(tmp_path / "appunti.txt", 1_000)
+        large = write_file(tmp_path / "manuale.txt", 60_000)
+        # Slides count as heavier than their byte size
+        slides = write_file(tmp_path / "lezione.xlsx", 20_000)
+
+        assert profile_document(small).is_large is False
+        assert profile_document(slides).is_large is True
+
+        routes = {
+            (name, origin): get_routing_options(path, origin)
+            for name, path in (('small', small), ('large', large))
+            for origin in (ORIGIN_INTERACTIVE, ORIGIN_BULK)
+        }
+        assert routes[('small', ORIGIN_INTERACTIVE)]['queue'] == "ingest_interactive_small"
+        assert routes[('large', ORIGIN_INTERACTIVE)]['queue'] == "ingest_interactive_large"
+        assert routes[('small', ORIGIN_BULK)]['queue'] == "ingest_bulk_small"
+        assert routes[('large', ORIGIN_BULK)] == {
+            'queue': "ingest_bulk_large",
+            'soft_time_limit': QUEUE_PROFILES["ingest_bulk_large"].soft_time_limit,
+            'time_limit': QUEUE_PROFILES["ingest_bulk_large"].time_limit,
+        }
+        assert get_routing_options(small, "sconosciuta")['queue'] == "ingest_bulk_small"
+
+    @pytest.mark.unit
+    def test_enqueue_passes_uploader_only_when_known(self, tmp_path) -> None:
+        """The uploader and the duplicate override travel as task keywords; folder scans send none."""
+        path = write_file(tmp_path / "appunti.txt", 1_000)
+        task = RecordingTask()
+
+        enqueue_document(task, path, ORIGIN_INTERACTIVE, user_id=7)
+        enqueue_document(task, path)
+        enqueue_document(task, path, ORIGIN_INTERACTIVE, user_id=7, allow_duplicate=True)
+
+        assert task.calls[0]['args'] == [path] and task.calls[0]['kwargs'] == {'user_id': 7}
+        assert task.calls[0]['queue'] == "ingest_interactive_small"
+        assert task.calls[1]['kwargs'] == {} and task.calls[1]['queue'] == "ingest_bulk_small"
+        # Forced uploads skip the near-duplicate check
+        assert task.calls[2]['kwargs'] == {'user_id': 7, 'allow_duplicate': True}
+        assert all('priority' not in call for call in task.calls)
+
+    @pytest.mark.unit
+    def test_every_queue_has_exactly_one_worker_pool(self) -> None:
+        """Routed, default and ingestion queues are each consumed by a single pool."""
+        pooled = [queue for queues in WORKER_POOLS.values() for queue in queues]
+        assert len(pooled) == len(set(pooled))
+        assert set(QUEUE_PROFILES) | set(TASK_ROUTES.values()) | {DEFAULT_QUEUE} == set(pooled)
+
+        # Maintenance tasks no longer share the default document queue
+        assert DEFAULT_QUEUE not in QUEUE_PROFILES
+        assert TASK_ROUTES['archivista.process_document'] == INGEST_DEFAULT_QUEUE
+        interactive = set(WORKER_POOLS['interactive'])
+        assert {TASK_ROUTES['archivista.delete_document'],
+                TASK_ROUTES['archivista.process_user_feedback_bayesian']} <= interactive
+
+    @pytest.mark.unit
+    @pytest.mark.parametrize("launcher", [
+        "docker-compose.yml",
+        "docker-compose.prod.yml",
+        "scripts/deployment/start_celery_worker.bat",
+    ])
+    def test_launchers_run_one_worker_per_pool(self, launcher) -> None:
+        """Each launcher starts one worker per pool, listening to exactly that pool's queues."""
+        text = (ROOT / launcher).read_text(encoding="utf-8")
+        assert sorted(sorted(queues) for queues in worker_queue_lists(text)) == \
+            sorted(sorted(queues) for queues in WORKER_POOLS.values())
+        # The solo pool enforces no time limits
+        assert not re.search(r"worker .*--pool=solo", text)
+
+    @pytest.mark.unit
+    def test_celery_config_declares_pool_queues_and_routes(self) -> None:
+        """The Celery configuration declares every pool queue and routes tasks by name."""
+        pytest.importorskip("kombu")
+        config = task_scheduler.get_celery_queue_config()
+
+        assert sorted(queue.name for queue in config['task_queues']) == \
+            sorted(queue for queues in WORKER_POOLS.values() for queue in queues)
+        assert config['task_default_queue'] == DEFAULT_QUEUE
+        assert config['task_routes']['archivista.delete_document'] == {'queue': TASK_ROUTES['archivista.delete_document']}
+        assert 'broker_transport_options' not in config
@@ -0,0 +1,279 @@
+"""
+Tests for the versioned UI data layer (tools.ui_data_layer): per-table, per-user
+data versions bumped by triggers, and pre-serialized cached results.
+"""
+
+import pickle
+import sqlite3
+import threading
+import time
+from types import SimpleNamespace
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from tools import ui_data_layer
+from tools.ui_data_layer import (
+    VersionedDataCache,
+    bump_data_version,
+    create_data_version_schema,
+    dependencies_for,
+    deserialize,
+    get_data_versions,
+    serialize,
+    versioned_data,
+)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def make_database(path: str) -> None:
+    """Minimal schema of the tables versioned by setup_database."""
+    conn = sqlite3.connect(path)
+    conn.executescript("""
+        CREATE TABLE users (id INTEGER PRIMARY KEY, username TEXT, is_new_user INTEGER DEFAULT 1);
+        CREATE TABLE papers (file_name TEXT PRIMARY KEY, title TEXT, category_id TEXT,
+                             publication_year INTEGER, formatted_preview TEXT);
+        CREATE TABLE concept_entities (id INTEGER PRIMARY KEY, user_id INTEGER, entity_name TEXT,
+                                       confidence_score REAL);
+        CREATE TABLE concept_relationships (id INTEGER PRIMARY KEY, user_id INTEGER,
+                                            source_entity_id INTEGER, target_entity_id INTEGER);
+        CREATE TABLE user_activity (id INTEGER PRIMARY KEY, user_id INTEGER, action_type TEXT, timestamp TEXT);
+    """)
+    create_data_version_schema(conn.cursor())
+    conn.commit()
+    conn.close()
+
+
+@pytest.fixture
+def database(tmp_path):
+    path = str(tmp_path / "metadata.sqlite")
+    make_database(path)
+
+    def connect():
+        conn = sqlite3.connect(path)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    return connect
+
+
+def write(connect, sql: str, params=()) -> None:
+    conn = connect()
+    conn.execute(sql, params)
+    conn.commit()
+    conn.close()
+
+
+def versions(connect, tables, user_id=None):
+    conn = connect()
+    try:
+        return get_data_versions(conn, dependencies_for(tables, user_id))
+    finally:
+        conn.close()
+
+
+class TestUIDataLayer:
+    """Data versions, versioned caching, compact serialization and targeted invalidation."""
+
+    @pytest.mark.database
+    def test_triggers_bump_only_the_written_table_and_user(self, database) -> None:
+        """Writes bump (table, user); shared tables use one global counter; owner changes bump both users."""
+        assert versions(database, ['concept_entities', 'papers'], 1) == (0, 0)
+
+        write(database, "INSERT INTO concept_entities (user_id, entity_name) VALUES (1, 'entropia')")
+        assert versions(database, ['concept_entities'], 1) == (1,)
+        assert versions(database, ['concept_entities', 'concept_relationships'], 2) == (0, 0)
+
+        write(database, "UPDATE concept_entities SET user_id = 2 WHERE entity_name = 'entropia'")
+        assert versions(database, ['concept_entities'], 1) == (2,)
+        assert versions(database, ['concept_entities'], 2) == (1,)
+
+        write(database, "INSERT INTO papers (file_name, title) VALUES ('a.pdf', 'A')")
+        write(database, "DELETE FROM papers")
+        assert versions(database, ['papers'], 1) == versions(database, ['papers'], 2) == (2,)
+
+        conn = database()
+        bump_data_version(conn, 'users', 7)
+        conn.close()
+        assert versions(database, ['users'], 7) == (1,)
+        with pytest.raises(ValueError):
+            dependencies_for(['tabella_sconosciuta'])
+
+    @pytest.mark.database
+    def test_versioned_results_recompute_only_after_relevant_writes(self, database) -> None:
+        """Reruns hit the cache; a write to another user's graph does not invalidate, one to ours does."""
+        cache = VersionedDataCache()
+        calls = []
+
+        @versioned_data(database, tables=['concept_entities', 'concept_relationships'], cache=cache)
+        def load_graph(user_id: int) -> dict:
+            calls.append(user_id)
+            conn = database()
+            try:
+                rows = conn.execute("SELECT * FROM concept_entities WHERE user_id = ?", (user_id,)).fetchall()
+                return {'entities': [dict(row) for row in rows], 'relationships': []}
+            finally:
+                conn.close()
+
+        write(database, "INSERT INTO concept_entities (user_id, entity_name, confidence_score) VALUES (1, 'gravità', 0.7)")
+        first = load_graph(1)
+        first['entities'].append({'entity_name': 'modificata dalla pagina'})
+        assert load_graph(1) == load_graph(user_id=1) == {
+            'entities': [{'id': 1, 'user_id': 1, 'entity_name': 'gravità', 'confidence_score': 0.7}],
+            'relationships': [],
+        }
+        assert calls == [1]
+
+        write(database, "INSERT INTO concept_entities (user_id, entity_name) VALUES (2, 'altro utente')")
+        load_graph(1)
+        assert calls == [1]
+
+        write(database, "INSERT INTO concept_relationships (user_id, source_entity_id, target_entity_id) VALUES (1, 1, 1)")
+        load_graph(1)
+        assert calls == [1, 1]
+
+        assert load_graph.clear() == 1
+        load_graph(1)
+        assert calls == [1, 1, 1]
+        sources = cache.get_stats()['sources'][load_graph.data_source]
+        assert sources['hits'] == 3 and sources['misses'] == 3
+
+    @pytest.mark.unit
+    def test_serialization_round_trip(self) -> None:
+        """DataFrames and homogeneous record lists are stored column-wise and rebuilt as new objects."""
+        df = pd.DataFrame({
+            'file_name': ['a.pdf', 'b.pdf', 'c.pdf'],
+            'publication_year': [2001, 2010, 2020],
+            'formatted_preview': ['testo', None, np.nan],
+            'confidence': [0.1, 0.5, 0.9],
+        })
+        value = {
+            'papers': df,
+            'records': [{'id': 1, 'name': 'x'}, {'id': 2, 'name': 'y'}],
+            'mixed': [{'id': 1}, {'other': 2}],
+            'count': 3,
+        }
+        payload = serialize(value)
+        restored = deserialize(payload)
+        pd.testing.assert_frame_equal(restored['papers'], df)
+        assert restored['papers'] is not deserialize(payload)['papers']
+        assert restored['records'] == value['records'] and restored['mixed'] == value['mixed']
+        assert restored['count'] == 3
+
+        # Columns are serialized once instead of once per row
+        records = [{'entity_name': f'concetto {i}', 'entity_type': 'concept', 'confidence_score': 0.5}
+                   for i in range(1000)]
+        assert len(serialize(records)) < len(pickle.dumps(records, protocol=pickle.HIGHEST_PROTOCOL))
+
+    @pytest.mark.unit
+    def test_mixed_type_columns_and_unserializable_results(self, database, monkeypatch) -> None:
+        """Columns Arrow cannot convert fall back to pickled arrays; unpicklable results are returned uncached."""
+        if ui_data_layer.pa is None:
+            class ArrowTypeError(Exception):
+                pass
+
+            def from_pandas(df, preserve_index=True):
+                raise ArrowTypeError("Expected bytes, got a 'int' object")
+
+            monkeypatch.setattr(ui_data_layer, 'pa', SimpleNamespace(
+                ArrowException=ArrowTypeError, Table=SimpleNamespace(from_pandas=from_pandas)))
+
+        papers = pd.DataFrame({
+            'file_name': ['a.pdf', 'b.pdf', 'c.pdf'],
+            'publication_year': [2001, '2010', None],
+        })
+        cache = VersionedDataCache()
+        loads = []
+
+        def load_papers():
+            loads.append(1)
+            return papers.copy()
+
+        for _ in range(2):
+            frame = cache.get(database, 'archivio', (), dependencies_for(['papers']), load_papers)
+            pd.testing.assert_frame_equal(frame, papers)
+        assert loads == [1]
+        assert cache.get_stats()['sources']['archivio']['hits'] == 1
+
+        lock = threading.Lock()
+        for _ in range(2):
+            assert cache.get(database, 'lock', (), dependencies_for(['papers']),
+                             lambda: {'lock': lock})['lock'] is lock
+        assert cache.get_stats()['sources']['lock']['uncached'] == 2
+
+    @pytest.mark.unit
+    def test_bounded_memory_max_age_and_targeted_invalidation(self, database) -> None:
+        """LRU by payload bytes, max age for time-relative results, invalidation by table and user."""
+        clock = FakeClock()
+        cache = VersionedDataCache(max_bytes=4000, clock=clock)
+        for user_id in (1, 2):
+            cache.get(database, 'grafo', (user_id,), dependencies_for(['concept_entities'], user_id),
+                      lambda: 'g' * 1000)
+        cache.get(database, 'archivio', (), dependencies_for(['papers']), lambda: 'p' * 1000)
+        cache.get(database, 'dashboard', (1,), dependencies_for(['user_activity'], 1),
+                  lambda: {'attività': 1}, max_age_seconds=60)
+        assert cache.get_stats()['entries'] == 4 and cache.get_stats()['bytes'] <= 4000
+
+        cache.get(database, 'grande', (), [], lambda: 'x' * 2500)
+        assert cache.get_stats()['bytes'] <= 4000
+        evicted = []
+        cache.get(database, 'grafo', (1,), dependencies_for(['concept_entities'], 1),
+                  lambda: evicted.append(1) or 'g' * 1000)
+        assert evicted == [1]
+
+        loads = []
+        clock.now += 61
+        cache.get(database, 'dashboard', (1,), dependencies_for(['user_activity'], 1),
+                  lambda: loads.append(1) or {'attività': 2}, max_age_seconds=60)
+        assert loads == [1]
+
+        cache = VersionedDataCache()
+        for user_id in (1, 2):
+            cache.get(database, 'grafo', (user_id,), dependencies_for(['concept_entities'], user_id), lambda: 1)
+        cache.get(database, 'archivio', (), dependencies_for(['papers']), lambda: 1)
+        assert cache.invalidate(table='concept_entities', user_id=2) == 1
+        assert cache.invalidate(table='papers') == 1
+        assert cache.get_stats()['entries'] == 1 and cache.clear() == 1
+
+    @pytest.mark.performance
+    def test_benchmark_rerun_cost(self, database) -> None:
+        """Reading papers on every rerun versus a version lookup plus rebuilding from the cached payload."""
+        conn = database()
+        conn.executemany(
+            "INSERT INTO papers (file_name, title, category_id, publication_year, formatted_preview) VALUES (?, ?, ?, ?, ?)",
+            [(f"doc_{i}.pdf", f"Titolo {i}", f"cat/{i % 40}", 1950 + i % 70, "anteprima " * 40)
+             for i in range(5000)])
+        conn.commit()
+        conn.close()
+
+        def read_papers():
+            conn = database()
+            try:
+                return pd.read_sql_query("SELECT * FROM papers ORDER BY category_id, title", conn)
+            finally:
+                conn.close()
+
+        cached = versioned_data(database, tables=['papers'], cache=VersionedDataCache())(read_papers)
+        reruns = 30
+
+        start = time.perf_counter()
+        for _ in range(reruns):
+            baseline = read_papers()
+        uncached_time = time.perf_counter() - start
+
+        cached()
+        start = time.perf_counter()
+        for _ in range(reruns):
+            frame = cached()
+        cached_time = time.perf_counter() - start
+
+        pd.testing.assert_frame_equal(frame, baseline)
+        assert cached_time < uncached_time
@@ -0,0 +1,136 @@
+# -*- coding: utf-8 -*-
+"""
+Motore degli achievement
+
+Le regole sono dati: ogni achievement indica una metrica e una soglia.
+Le metriche sono sottoquery scalari per utente, calcolate tutte in una
+sola SELECT insieme agli achievement già ottenuti; aggiungere una regola
+su una metrica esistente non aggiunge query. Le assegnazioni (achievement
+e XP bonus) avvengono sulla connessione del chiamante, nella sua
+transazione.
+"""
+import json
+import sqlite3
+from datetime import datetime
+from typing import Any, Dict, Iterable, List
+
+# --- METRICHE ---
+# Sottoquery scalari sul parametro :user_id
+ACHIEVEMENT_METRICS = {
+    'total_xp': "SELECT COALESCE(SUM(xp_amount), 0) FROM user_xp WHERE user_id = :user_id",
+    'courses_count': "SELECT COUNT(*) FROM courses WHERE user_id = :user_id",
+    'tasks_completed': "SELECT COUNT(*) FROM tasks WHERE user_id = :user_id AND status = 'completed'",
+    'documents_count': "SELECT COUNT(*) FROM papers",
+}
+
+# --- REGOLE ---
+ACHIEVEMENT_BONUS_XP = 50
+
+ACHIEVEMENT_RULES = (
+    {
+        'type': 'first_steps',
+        'title': 'Primi Passi',
+        'description': 'Hai creato il tuo primo corso!',
+        'metric': 'courses_count',
+        'threshold': 1
+    },
+    {
+        'type': 'knowledge_builder',
+        'title': 'Costruttore di Conoscenza',
+        'description': 'Hai caricato 10 documenti!',
+        'metric': 'documents_count',
+        'threshold': 10
+    },
+    {
+        'type': 'task_master',
+        'title': 'Maestro dei Task',
+        'description': 'Hai completato 25 attività!',
+        'metric': 'tasks_completed',
+        'threshold': 25
+    },
+    {
+        'type': 'xp_hunter',
+        'title': 'Cacciatore di XP',
+        'description': 'Hai guadagnato 500 XP!',
+        'metric': 'total_xp',
+        'threshold': 500
+    },
+    {
+        'type': 'scholar',
+        'title': 'Studioso',
+        'description': 'Hai creato 5 corsi diversi!',
+        'metric': 'courses_count',
+        'threshold': 5
+    },
+)
+
+
+# --- VALUTAZIONE ---
+
+def build_progress_query(metrics: Iterable[str]) -> str:
+    """SELECT unica con una colonna per metrica e la lista JSON degli achievement ottenuti."""
+    columns = []
+    for metric in metrics:
+        if metric not in ACHIEVEMENT_METRICS:
+            raise ValueError(f"Metrica achievement sconosciuta: {metric}")
+        columns.append(f"({ACHIEVEMENT_METRICS[metric]}) AS {metric}")
+    columns.append(
+        "(SELECT json_group_array(achievement_type) FROM user_achievements WHERE user_id = :user_id) AS earned"
+    )
+    return "SELECT " + ", ".join(columns)
+
+
+def evaluate_achievements(conn: sqlite3.Connection, user_id: int,
+                          rules: Iterable[Dict[str, Any]] = ACHIEVEMENT_RULES) -> List[Dict[str, Any]]:
+    """
+    Assegna gli achievement raggiunti e non ancora ottenuti dall'utente.
+
+    Una SELECT legge metriche e achievement ottenuti; gli XP bonus degli
+    achievement sbloccati vengono sommati in memoria alla metrica total_xp,
+    così un bonus che supera una soglia di XP sblocca la regola relativa
+    nella stessa chiamata. Il commit resta al chiamante.
+
+    Returns:
+        Regole degli achievement appena assegnati
+    """
+    rules = list(rules)
+    metrics = list(dict.fromkeys(rule['metric'] for rule in rules))
+
+    row = conn.execute(build_progress_query(metrics), {'user_id': user_id}).fetchone()
+    values = {metric: row[index] or 0 for index, metric in enumerate(metrics)}
+    earned = set(json.loads(row[len(metrics)] or '[]'))
+
+    now = datetime.now().isoformat()
+    awarded = []
+    while True:
+        unlocked = [
+            rule for rule in rules
+            if rule['type'] not in earned and values[rule['metric']] >= rule['threshold']
+        ]
+        if not unlocked:
+            break
+
+        # Il bonus spetta solo se l'INSERT ha scritto la riga: un'altra sessione
+        # può aver assegnato lo stesso achievement dopo la nostra SELECT
+        inserted = []
+        for rule in unlocked:
+            cursor = conn.execute(
+                "INSERT OR IGNORE INTO user_achievements (user_id, achievement_type, achievement_title, achievement_description, earned_at) VALUES (?, ?, ?, ?, ?)",
+                (user_id, rule['type'], rule['title'], rule['description'], now)
+            )
+            if cursor.rowcount == 1:
+                inserted.append(rule)
+
+        # Bonus XP per achievement
+        conn.executemany(
+            "INSERT INTO user_xp (user_id, xp_amount, xp_source, xp_description, source_id, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+            [(user_id, ACHIEVEMENT_BONUS_XP, 'achievement_unlocked', f"Achievement sbloccato: {rule['title']}", None, now)
+             for rule in inserted]
+        )
+
+        earned.update(rule['type'] for rule in unlocked)
+        if 'total_xp' in values:
+            values['total_xp'] += ACHIEVEMENT_BONUS_XP * len(inserted)
+        awarded.extend(inserted)
+
+    return awarded
@@ -0,0 +1,255 @@
+# -*- coding: utf-8 -*-
+"""
+Registro asincrono delle attività utente
+
+Le azioni della UI vengono accodate in memoria e scritte in batch da un
+thread in background: la richiesta Streamlit non apre connessioni né
+attende commit. A ogni flush, nella stessa transazione degli INSERT su
+`user_activity`, vengono aggiornate le tabelle derivate per utente
+`user_recent_documents` e `user_recent_uploads`, così la dashboard legge
+con lookup indicizzati invece di join con LIKE sui metadati.
+"""
+import json
+import queue
+import atexit
+import logging
+import threading
+from collections import OrderedDict, deque
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# --- CONFIGURAZIONE ---
+FLUSH_INTERVAL_SECONDS = 1.0    # attesa massima prima di scrivere gli eventi in coda
+FLUSH_BATCH_SIZE = 200          # eventi per transazione
+MAX_QUEUE_SIZE = 10_000         # oltre questa soglia il chiamante scrive il batch in linea
+MAX_WRITE_ATTEMPTS = 5          # tentativi di scrittura di un batch prima di scartarlo
+RECENT_ITEMS_PER_USER = 50      # righe tenute per utente nelle tabelle derivate
+RECENT_UPLOAD_ACTIONS = ('create_doc',)
+METADATA_ACCESS_ACTIONS = ('view_doc', 'edit_doc')
+
+
+# --- EVENTI ---
+
+def _metadata_strings(value: Any) -> List[str]:
+    """Tutte le stringhe contenute nei metadati (valori annidati compresi)."""
+    if isinstance(value, str):
+        return [value]
+    if isinstance(value, dict):
+        value = list(value.values())
+    if isinstance(value, (list, tuple)):
+        return [text for item in value for text in _metadata_strings(item)]
+    return []
+
+
+class ActivityLogger:
+    """
+    Scrittore bufferizzato della tabella user_activity.
+
+    `record` è non bloccante; il thread di flush parte al primo evento e
+    svuota la coda ogni FLUSH_INTERVAL_SECONDS o appena si accumulano
+    FLUSH_BATCH_SIZE eventi. `flush` forza la scrittura (letture che devono
+    vedere gli ultimi eventi, test, uscita del processo).
+
+    Un batch la cui scrittura fallisce (es. database bloccato) torna in testa
+    e viene ritentato ai flush successivi, al massimo MAX_WRITE_ATTEMPTS volte.
+    """
+
+    def __init__(self, flush_interval: float = FLUSH_INTERVAL_SECONDS,
+                 batch_size: int = FLUSH_BATCH_SIZE, max_queue_size: int = MAX_QUEUE_SIZE):
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self._queue: "queue.Queue[Tuple]" = queue.Queue(maxsize=max_queue_size)
+        self._connect: Optional[Callable] = None
+        self._write_lock = threading.RLock()
+        self._start_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        # Batch non scritti con i tentativi già fatti, protetti da _write_lock
+        self._retry: "deque[Tuple[int, List[Tuple]]]" = deque()
+        self.stats = {'recorded': 0, 'flushed': 0, 'batches': 0, 'errors': 0, 'dropped': 0}
+
+    def record(self, connect: Callable, user_id: int, action_type: str, target_type: str = None,
+               target_id: str = None, metadata: dict = None, session_id: str = None,
+               timestamp: str = None):
+        """
+        Accoda un evento di attività.
+
+        Args:
+            connect: Factory di connessioni SQLite (es. file_utils.db_connect)
+            user_id: ID utente
+            action_type: Tipo di azione ('view_doc', 'create_doc', ...)
+            target_type: Tipo di target ('document', 'chat', ...)
+            target_id: ID del target
+            metadata: Informazioni aggiuntive (serializzate in JSON)
+            session_id: Sessione della UI
+            timestamp: Istante dell'azione (default: adesso)
+        """
+        self._connect = connect
+        event = (user_id, action_type, target_type, target_id, metadata,
+                 timestamp or datetime.now().isoformat(), session_id)
+        try:
+            self._queue.put_nowait(event)
+        except queue.Full:
+            # Il writer non tiene il passo: il chiamante scrive un batch e riprova
+            self.flush()
+            try:
+                self._queue.put_nowait(event)
+            except queue.Full:
+                # Scritture ancora in errore: la coda resta limitata
+                self.stats['dropped'] += 1
+                logger.error(f"Activity queue full, event {action_type} of user {user_id} dropped")
+                return
+        self.stats['recorded'] += 1
+        self._ensure_thread()
+        if self._queue.qsize() >= self.batch_size:
+            self._wakeup.set()
+
+    def flush(self) -> int:
+        """
+        Scrive subito tutti gli eventi in coda. Restituisce il numero di eventi scritti.
+
+        Si ferma al primo batch non scritto, che resta in attesa del flush successivo.
+        """
+        written = 0
+        # Il lock copre anche il drain: un batch prelevato dal thread di flush
+        # è già su disco quando un flush esplicito restituisce il controllo
+        with self._write_lock:
+            while True:
+                attempts, batch = self._retry.popleft() if self._retry else (0, self._drain())
+                if not batch:
+                    return written
+                if self._write(batch):
+                    written += len(batch)
+                    continue
+                if attempts + 1 < MAX_WRITE_ATTEMPTS:
+                    self._retry.appendleft((attempts + 1, batch))
+                else:
+                    self.stats['dropped'] += len(batch)
+                    logger.error(f"Activity batch of {len(batch)} events dropped after {attempts + 1} attempts")
+                return written
+
+    def pending(self) -> int:
+        with self._write_lock:
+            return self._queue.qsize() + sum(len(batch) for _, batch in self._retry)
+
+    # --- THREAD DI FLUSH ---
+
+    def _ensure_thread(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._start_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="activity-logger", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"Activity flush failed: {e}")
+
+    def _drain(self) -> List[Tuple]:
+        batch = []
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    # --- SCRITTURA ---
+
+    def _write(self, batch: List[Tuple]) -> bool:
+        """Inserisce il batch e aggiorna le tabelle derivate in un'unica transazione."""
+        with self._write_lock:
+            try:
+                with self._connect() as conn:
+                    conn.executemany("""
+                        INSERT INTO user_activity (user_id, action_type, target_type, target_id, metadata, timestamp, session_id)
+                        VALUES (?, ?, ?, ?, ?, ?, ?)
+                    """, [
+                        (user_id, action_type, target_type, target_id,
+                         json.dumps(metadata) if metadata else None, timestamp, session_id)
+                        for user_id, action_type, target_type, target_id, metadata, timestamp, session_id in batch
+                    ])
+                    self._update_recent_tables(conn, batch)
+                    conn.commit()
+            except Exception as e:
+                # Come il tracciamento sincrono precedente: un errore non blocca l'app
+                self.stats['errors'] += 1
+                logger.error(f"Activity batch of {len(batch)} events not written: {e}")
+                return False
+        self.stats['flushed'] += len(batch)
+        self.stats['batches'] += 1
+        return True
+
+    @staticmethod
+    def _update_recent_tables(conn, batch: List[Tuple]):
+        accessed: Dict[Tuple[int, str], Tuple[str, str]] = OrderedDict()
+        uploads: Dict[Tuple[int, str], Tuple[str, Optional[str]]] = OrderedDict()
+        mentioned: List[Tuple[int, str, str, str]] = []
+
+        for user_id, action_type, target_type, target_id, metadata, timestamp, _ in batch:
+            if target_type == 'document' and target_id:
+                key = (user_id, target_id)
+                if key not in accessed or accessed[key][0] <= timestamp:
+                    accessed[key] = (timestamp, action_type)
+            if action_type in RECENT_UPLOAD_ACTIONS and target_id:
+                key = (user_id, target_id)
+                if key not in uploads or uploads[key][0] <= timestamp:
+                    uploads[key] = (timestamp, json.dumps(metadata) if metadata else None)
+            if action_type in METADATA_ACCESS_ACTIONS and metadata:
+                mentioned.extend((user_id, text, timestamp, action_type) for text in _metadata_strings(metadata))
+
+        # Documenti citati nei metadati: solo i nomi che esistono in papers (lookup per chiave primaria)
+        if mentioned:
+            names = sorted({text for _, text, _, _ in mentioned})
+            existing = set()
+            for start in range(0, len(names), 500):
+                chunk = names[start:start + 500]
+                rows = conn.execute(
+                    f"SELECT file_name FROM papers WHERE file_name IN ({','.join('?' * len(chunk))})", chunk
+                ).fetchall()
+                existing.update(row[0] for row in rows)
+            for user_id, file_name, timestamp, action_type in mentioned:
+                key = (user_id, file_name)
+                if file_name in existing and (key not in accessed or accessed[key][0] <= timestamp):
+                    accessed[key] = (timestamp, action_type)
+
+        if accessed:
+            conn.executemany("""
+                INSERT INTO user_recent_documents (user_id, file_name, last_accessed, last_action)
+                VALUES (?, ?, ?, ?)
+                ON CONFLICT(user_id, file_name) DO UPDATE SET
+                    last_accessed = excluded.last_accessed, last_action = excluded.last_action
+                WHERE excluded.last_accessed >= user_recent_documents.last_accessed
+            """, [(user_id, file_name, ts, action) for (user_id, file_name), (ts, action) in accessed.items()])
+        if uploads:
+            conn.executemany("""
+                INSERT INTO user_recent_uploads (user_id, file_name, upload_date, upload_metadata)
+                VALUES (?, ?, ?, ?)
+                ON CONFLICT(user_id, file_name) DO UPDATE SET
+                    upload_date = excluded.upload_date, upload_metadata = excluded.upload_metadata
+                WHERE excluded.upload_date >= user_recent_uploads.upload_date
+            """, [(user_id, file_name, ts, meta) for (user_id, file_name), (ts, meta) in uploads.items()])
+
+        # Potatura: solo le righe più recenti per ogni utente toccato dal batch
+        for table, column, keys in (('user_recent_documents', 'last_accessed', accessed),
+                                    ('user_recent_uploads', 'upload_date', uploads)):
+            for user_id in {user_id for user_id, _ in keys}:
+                conn.execute(f"""
+                    DELETE FROM {table} WHERE user_id = ? AND file_name NOT IN (
+                        SELECT file_name FROM {table} WHERE user_id = ?
+                        ORDER BY {column} DESC LIMIT ?
+                    )
+                """, (user_id, user_id, RECENT_ITEMS_PER_USER))
+
+
+# --- ISTANZA GLOBALE ---
+activity_logger = ActivityLogger()
+atexit.register(activity_logger.flush)
@@ -0,0 +1,203 @@
+# -*- coding: utf-8 -*-
+"""
+Motore delle statistiche dell'archivio
+
+Tutte le statistiche della dashboard vengono calcolate con poche query
+aggregate su `papers` (JSON1 per gli array di autori), senza caricare la
+tabella in pandas. Il risultato resta in cache finché non cambia la
+versione dell'archivio, cioè il contatore di `papers` in `data_versions`
+(tools.ui_data_layer) incrementato dai trigger creati in `setup_database`:
+la pagina delle statistiche costa un lookup della
+versione indipendentemente dalla dimensione dell'archivio.
+"""
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional
+
+from tools.ui_data_layer import dependencies_for, get_data_versions
+
+# --- CONFIGURAZIONE ---
+RECENT_DAYS = 7                  # finestra dei documenti recenti
+TOP_AUTHORS = 20                 # autori restituiti da author_stats
+TOP_CATEGORIES = 10              # categorie restituite da top_categories
+STATS_MAX_AGE_SECONDS = 3600     # i conteggi relativi a "adesso" scadono comunque dopo un'ora
+
+# Caratteri rimossi dai nomi degli autori (come str.strip)
+_WHITESPACE = "char(32, 9, 10, 13)"
+
+# Array di autori validi; un valore non JSON diventa un array vuoto invece di far fallire json_each
+_AUTHORS_ARRAY = "CASE WHEN json_valid(p.authors) AND json_type(p.authors) = 'array' THEN p.authors ELSE '[]' END"
+
+
+# --- QUERY ---
+
+SUMMARY_QUERY = f"""
+    SELECT
+        COUNT(*) AS total_documents,
+        COUNT(DISTINCT category_id) AS total_categories,
+        SUM(CASE WHEN julianday(processed_at) >= julianday(:recent_cutoff) THEN 1 ELSE 0 END) AS recent_documents,
+        date(MIN(datetime(processed_at))) AS oldest_document,
+        date(MAX(datetime(processed_at))) AS newest_document,
+        SUM(CASE WHEN formatted_preview IS NOT NULL AND formatted_preview != '' THEN 1 ELSE 0 END) AS docs_with_preview,
+        SUM(CASE WHEN publication_year IS NOT NULL THEN 1 ELSE 0 END) AS docs_with_year,
+        SUM(CASE WHEN EXISTS (
+            SELECT 1 FROM json_each({_AUTHORS_ARRAY}) a
+            WHERE a.type = 'text' AND TRIM(a.value, {_WHITESPACE}) != ''
+        ) THEN 1 ELSE 0 END) AS docs_with_authors,
+        (SELECT COUNT(DISTINCT a.value) FROM papers p, json_each({_AUTHORS_ARRAY}) a) AS total_authors
+    FROM papers p
+"""
+
+CATEGORY_QUERY = """
+    SELECT category_id, category_name, COUNT(*) AS count
+    FROM papers
+    WHERE category_id IS NOT NULL AND category_name IS NOT NULL
+    GROUP BY category_id, category_name
+    ORDER BY count DESC, category_id
+"""
+
+AUTHOR_QUERY = f"""
+    SELECT TRIM(a.value, {_WHITESPACE}) AS author, COUNT(*) AS document_count
+    FROM papers p, json_each({_AUTHORS_ARRAY}) a
+    WHERE a.type = 'text'
+    GROUP BY author
+    ORDER BY document_count DESC, author
+    LIMIT :limit
+"""
+
+TREND_QUERY = """
+    SELECT strftime('%Y-%m', processed_at) AS period, COUNT(*) AS count
+    FROM papers
+    WHERE strftime('%Y-%m', processed_at) IS NOT NULL
+    GROUP BY period
+    ORDER BY period
+"""
+
+RECENT_QUERY = """
+    SELECT file_name, title, category_name, processed_at
+    FROM papers
+    WHERE julianday(processed_at) >= julianday(:recent_cutoff)
+    ORDER BY julianday(processed_at) DESC
+"""
+
+
+# --- CALCOLO ---
+
+def completeness_score(total: int, with_preview: int, with_year: int, with_authors: int) -> float:
+    """Punteggio di completezza 0-100: anteprima 40%, anno 30%, autori 30%."""
+    if total <= 0:
+        return 0
+    return round((with_preview / total) * 40 + (with_year / total) * 30 + (with_authors / total) * 30, 1)
+
+
+def get_recent_documents(conn: sqlite3.Connection, days: int = RECENT_DAYS) -> List[Dict[str, Any]]:
+    """Documenti processati negli ultimi `days` giorni, dal più recente."""
+    cutoff = (datetime.now() - timedelta(days=days)).isoformat()
+    return [dict(row) for row in conn.execute(RECENT_QUERY, {'recent_cutoff': cutoff})]
+
+
+def compute_archive_stats(conn: sqlite3.Connection) -> Dict[str, Any]:
+    """Calcola tutte le statistiche dell'archivio con query aggregate."""
+    conn.row_factory = sqlite3.Row
+    cutoff = (datetime.now() - timedelta(days=RECENT_DAYS)).isoformat()
+
+    summary = dict(conn.execute(SUMMARY_QUERY, {'recent_cutoff': cutoff}).fetchone())
+    total_docs = summary['total_documents'] or 0
+    total_cats = summary['total_categories'] or 0
+
+    categories = [dict(row) for row in conn.execute(CATEGORY_QUERY)]
+    categorized = sum(category['count'] for category in categories)
+    for category in categories:
+        category['percentage'] = round(category['count'] / categorized * 100, 1)
+
+    trend = [
+        {'processed_at': row['period'], 'count': row['count'], 'period': row['period']}
+        for row in conn.execute(TREND_QUERY)
+    ]
+
+    with_preview = summary['docs_with_preview'] or 0
+    with_year = summary['docs_with_year'] or 0
+    with_authors = summary['docs_with_authors'] or 0
+
+    return {
+        'basic_stats': {
+            'total_documents': total_docs,
+            'total_categories': total_cats,
+            'total_authors': summary['total_authors'] or 0,
+            'avg_documents_per_category': round(total_docs / total_cats, 1) if total_cats > 0 else 0,
+            'recent_documents': summary['recent_documents'] or 0,
+            'oldest_document': summary['oldest_document'],
+            'newest_document': summary['newest_document']
+        },
+        'category_distribution': categories,
+        'author_stats': [dict(row) for row in conn.execute(AUTHOR_QUERY, {'limit': TOP_AUTHORS})],
+        'temporal_trend': trend,
+        'data_quality': {
+            'total_documents': total_docs,
+            'docs_with_preview': with_preview,
+            'docs_with_year': with_year,
+            'docs_with_authors': with_authors,
+            'completeness_score': completeness_score(total_docs, with_preview, with_year, with_authors)
+        },
+        'top_categories': categories[:TOP_CATEGORIES],
+        'recent_activity': get_recent_documents(conn),
+        'last_updated': datetime.now().isoformat()
+    }
+
+
+def get_archive_version(conn: sqlite3.Connection) -> Optional[int]:
+    """Versione corrente di `papers` in data_versions, o None se la tabella non esiste ancora."""
+    versions = get_data_versions(conn, dependencies_for(['papers']))
+    return None if versions is None else versions[0]
+
+
+# --- CACHE PER VERSIONE ---
+
+class ArchiveStatisticsEngine:
+    """
+    Statistiche dell'archivio in cache per versione.
+
+    Ogni richiesta legge solo la versione dell'archivio; le query aggregate
+    ripartono quando un INSERT/UPDATE/DELETE su `papers` la incrementa, o
+    dopo STATS_MAX_AGE_SECONDS per i conteggi relativi alla data corrente.
+    """
+
+    def __init__(self, max_age_seconds: float = STATS_MAX_AGE_SECONDS):
+        self.max_age_seconds = max_age_seconds
+        self._lock = threading.Lock()
+        self._version: Optional[int] = None
+        self._computed_at = 0.0
+        self._stats: Optional[Dict[str, Any]] = None
+        self.stats = {'hits': 0, 'computations': 0}
+
+    def get_stats(self, connect: Callable[[], sqlite3.Connection]) -> Dict[str, Any]:
+        """Statistiche complete, ricalcolate solo se l'archivio è cambiato."""
+        conn = connect()
+        try:
+            version = get_archive_version(conn)
+            with self._lock:
+                fresh = time.monotonic() - self._computed_at < self.max_age_seconds
+                if self._stats is not None and version is not None and version == self._version and fresh:
+                    self.stats['hits'] += 1
+                    return self._stats
+
+            stats = compute_archive_stats(conn)
+        finally:
+            conn.close()
+
+        with self._lock:
+            self._stats, self._version, self._computed_at = stats, version, time.monotonic()
+            self.stats['computations'] += 1
+        return stats
+
+    def invalidate(self) -> None:
+        """Scarta le statistiche in cache (pulsante "Aggiorna")."""
+        with self._lock:
+            self._stats = None
+            self._version = None
+
+
+# --- ISTANZA GLOBALE ---
+archive_statistics_engine = ArchiveStatisticsEngine()
@@ -0,0 +1,274 @@
+# -*- coding: utf-8 -*-
+"""
+Esecutore set-based delle operazioni batch sui metadati
+
+Un'operazione (set / append / remove) viene compilata in un'espressione
+SQL sul campo, con JSON1 per gli array di autori, e applicata con un solo
+UPDATE ai file della selezione, caricati in una tabella temporanea. Nella
+stessa transazione si salva la before-image dei soli documenti che
+cambiano, così l'operazione può essere annullata. Anteprima e conteggi
+non caricano la tabella papers in pandas.
+"""
+import json
+import sqlite3
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+# --- CONFIGURAZIONE ---
+BATCH_FIELDS = ('title', 'authors', 'publication_year', 'category_id')
+PREVIEW_LIMIT = 10            # documenti mostrati nell'anteprima
+UNDO_HISTORY_SIZE = 50        # operazioni di cui si conserva la before-image
+
+# Caratteri rimossi dai nomi degli autori (come str.strip)
+_WHITESPACE = "char(32, 9, 10, 13)"
+
+
+# --- COMPILAZIONE ---
+
+def compile_operation(operation_type: str, field: str, value: Any) -> Tuple[str, Dict[str, Any]]:
+    """
+    Espressione SQL del nuovo valore del campo, con i suoi parametri.
+
+    Le regole sono quelle della versione riga per riga: `set` sugli autori
+    sostituisce la lista con [valore]; `append` aggiunge l'autore se manca
+    (una lista non leggibile diventa [valore]); `remove` toglie gli autori
+    uguali al valore a meno degli spazi e lascia intatte le liste non
+    leggibili o con elementi non testuali.
+    """
+    if field not in BATCH_FIELDS:
+        raise ValueError(f"Campo non valido: {field}")
+
+    if operation_type == 'set':
+        if field == 'authors':
+            return ":authors", {'authors': json.dumps([value] if value else [])}
+        return ":value", {'value': value}
+
+    if field != 'authors':
+        raise ValueError(f"Operazione '{operation_type}' non supportata per il campo {field}")
+
+    if operation_type == 'append':
+        return """
+            CASE
+                WHEN authors IS NULL OR authors = '' THEN json_array(:author)
+                WHEN NOT json_valid(authors) OR json_type(authors) != 'array' THEN json_array(:raw_value)
+                WHEN EXISTS (SELECT 1 FROM json_each(authors) WHERE value = :author) THEN authors
+                ELSE json_insert(authors, '$[#]', :author)
+            END
+        """, {'author': value.strip(), 'raw_value': value}
+
+    if operation_type == 'remove':
+        return f"""
+            CASE
+                WHEN authors IS NULL OR authors = '' THEN '[]'
+                WHEN NOT json_valid(authors) OR json_type(authors) != 'array' THEN authors
+                WHEN EXISTS (SELECT 1 FROM json_each(authors) WHERE type != 'text') THEN authors
+                ELSE (
+                    SELECT json_group_array(value) FROM (
+                        SELECT value FROM json_each(authors)
+                        WHERE TRIM(value, {_WHITESPACE}) != :author
+                        ORDER BY key
+                    )
+                )
+            END
+        """, {'author': value.strip()}
+
+    raise ValueError(f"Tipo di operazione non valido: {operation_type}")
+
+
+# --- SELEZIONE ---
+
+def load_selection(conn: sqlite3.Connection, file_names: List[str]) -> None:
+    """Carica i file selezionati nella tabella temporanea temp.batch_selection."""
+    conn.execute("CREATE TEMP TABLE IF NOT EXISTS batch_selection (file_name TEXT PRIMARY KEY)")
+    conn.execute("DELETE FROM temp.batch_selection")
+    conn.executemany("INSERT OR IGNORE INTO temp.batch_selection (file_name) VALUES (?)",
+                     ((name,) for name in file_names))
+
+
+def find_missing_files(conn: sqlite3.Connection, limit: int = 5) -> List[str]:
+    """File della selezione che non esistono in papers."""
+    rows = conn.execute("""
+        SELECT s.file_name FROM temp.batch_selection s
+        LEFT JOIN papers p ON p.file_name = s.file_name
+        WHERE p.file_name IS NULL
+        ORDER BY s.file_name
+        LIMIT ?
+    """, (limit,))
+    return [row[0] for row in rows]
+
+
+# --- ANTEPRIMA ---
+
+def preview_operation(conn: sqlite3.Connection, operation, limit: int = PREVIEW_LIMIT) -> Dict[str, Any]:
+    """
+    Anteprima dell'operazione: primi `limit` documenti con valori attuali
+    e nuovi, e numero di documenti che cambierebbero.
+
+    Come le altre funzioni del modulo, usa una connessione senza
+    transazioni aperte dal chiamante.
+    """
+    expression, params = compile_operation(operation.operation_type, operation.field, operation.value)
+    field = operation.field
+    load_selection(conn, operation.file_names)
+
+    rows = conn.execute(f"""
+        SELECT p.file_name, p.title, p.authors, p.publication_year, p.category_id, {expression} AS new_value
+        FROM papers p JOIN temp.batch_selection s ON s.file_name = p.file_name
+        ORDER BY p.file_name
+        LIMIT :limit
+    """, {**params, 'limit': limit}).fetchall()
+
+    changed = conn.execute(f"""
+        SELECT COUNT(*) FROM papers p JOIN temp.batch_selection s ON s.file_name = p.file_name
+        WHERE p.{field} IS NOT ({expression})
+    """, params).fetchone()[0]
+
+    preview = []
+    for row in rows:
+        current = {'title': row[1], 'authors': row[2], 'publication_year': row[3], 'category_id': row[4]}
+        new = dict(current, **{field: row[5]})
+        preview.append({
+            'file_name': row[0],
+            'current_title': current['title'],
+            'new_title': new['title'],
+            'current_authors': current['authors'],
+            'new_authors': new['authors'],
+            'current_year': current['publication_year'],
+            'new_year': new['publication_year'],
+            'current_category': current['category_id'],
+            'new_category': new['category_id']
+        })
+
+    # Chiude la transazione implicita aperta dalla tabella temporanea
+    conn.commit()
+    return {'rows': preview, 'changed_count': changed}
+
+
+# --- ESECUZIONE E UNDO ---
+
+def execute_operation(conn: sqlite3.Connection, operation) -> Tuple[Optional[int], int]:
+    """
+    Applica l'operazione in un'unica transazione.
+
+    Returns:
+        (id dell'operazione nello storico, documenti modificati); l'id è
+        None se nessun documento cambia.
+
+    Raises:
+        ValueError: operazione non valida o file non presenti nell'archivio
+    """
+    expression, params = compile_operation(operation.operation_type, operation.field, operation.value)
+    field = operation.field
+    now = datetime.now().isoformat()
+
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        load_selection(conn, operation.file_names)
+
+        missing = find_missing_files(conn)
+        if missing:
+            raise ValueError(f"File non trovati nell'archivio: {', '.join(missing)}")
+
+        operation_id = conn.execute("""
+            INSERT INTO batch_operation_history (operation_type, field, value, file_count, created_at)
+            VALUES (?, ?, ?, ?, ?)
+        """, (operation.operation_type, field, json.dumps(operation.value), len(operation.file_names), now)).lastrowid
+
+        # Before-image dei soli documenti che cambiano
+        conn.execute(f"""
+            INSERT INTO batch_operation_before_images (operation_id, file_name, old_value)
+            SELECT :operation_id, p.file_name, p.{field}
+            FROM papers p JOIN temp.batch_selection s ON s.file_name = p.file_name
+            WHERE p.{field} IS NOT ({expression})
+        """, {**params, 'operation_id': operation_id})
+
+        affected = conn.execute(f"""
+            UPDATE papers SET {field} = ({expression})
+            WHERE file_name IN (
+                SELECT file_name FROM batch_operation_before_images WHERE operation_id = :operation_id
+            )
+        """, {**params, 'operation_id': operation_id}).rowcount
+
+        if affected:
+            conn.execute("UPDATE batch_operation_history SET affected_count = ? WHERE id = ?", (affected, operation_id))
+            _prune_history(conn)
+        else:
+            conn.execute("DELETE FROM batch_operation_history WHERE id = ?", (operation_id,))
+            operation_id = None
+
+        conn.commit()
+        return operation_id, affected
+
+    except Exception:
+        conn.rollback()
+        raise
+
+
+def undo_operation(conn: sqlite3.Connection, operation_id: int) -> int:
+    """
+    Ripristina i valori precedenti di un'operazione dalla before-image.
+
+    Le modifiche successive agli stessi campi vengono sovrascritte.
+
+    Returns:
+        Documenti ripristinati (0 se l'operazione non esiste o è già annullata)
+    """
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        operation = conn.execute(
+            "SELECT field FROM batch_operation_history WHERE id = ? AND undone_at IS NULL", (operation_id,)
+        ).fetchone()
+        if operation is None or operation[0] not in BATCH_FIELDS:
+            conn.rollback()
+            return 0
+
+        field = operation[0]
+        restored = conn.execute(f"""
+            UPDATE papers SET {field} = (
+                SELECT b.old_value FROM batch_operation_before_images b
+                WHERE b.operation_id = :operation_id AND b.file_name = papers.file_name
+            )
+            WHERE file_name IN (
+                SELECT file_name FROM batch_operation_before_images WHERE operation_id = :operation_id
+            )
+        """, {'operation_id': operation_id}).rowcount
+
+        conn.execute("UPDATE batch_operation_history SET undone_at = ? WHERE id = ?",
+                     (datetime.now().isoformat(), operation_id))
+        conn.commit()
+        return restored
+
+    except Exception:
+        conn.rollback()
+        raise
+
+
+def get_operation_history(conn: sqlite3.Connection, limit: int = 20) -> List[Dict[str, Any]]:
+    """Ultime operazioni batch, dalla più recente."""
+    rows = conn.execute("""
+        SELECT id, operation_type, field, value, file_count, affected_count, created_at, undone_at
+        FROM batch_operation_history
+        ORDER BY id DESC
+        LIMIT ?
+    """, (limit,))
+    columns = ('id', 'operation_type', 'field', 'value', 'file_count', 'affected_count', 'created_at', 'undone_at')
+    history = []
+    for row in rows:
+        entry = dict(zip(columns, row))
+        entry['value'] = json.loads(entry['value']) if entry['value'] else None
+        history.append(entry)
+    return history
+
+
+def _prune_history(conn: sqlite3.Connection) -> None:
+    """Mantiene le before-image delle ultime UNDO_HISTORY_SIZE operazioni."""
+    conn.execute("""
+        DELETE FROM batch_operation_before_images WHERE operation_id NOT IN (
+            SELECT id FROM batch_operation_history ORDER BY id DESC LIMIT ?
+        )
+    """, (UNDO_HISTORY_SIZE,))
+    conn.execute("""
+        DELETE FROM batch_operation_history WHERE id NOT IN (
+            SELECT id FROM batch_operation_history ORDER BY id DESC LIMIT ?
+        )
+    """, (UNDO_HISTORY_SIZE,))
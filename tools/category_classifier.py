@@ -0,0 +1,332 @@
+# -*- coding: utf-8 -*-
+"""
+Pre-classificatore dei documenti per centroidi di embedding
+
+Ogni capitolo di KNOWLEDGE_BASE_STRUCTURE ha un centroide: l'embedding
+della sua descrizione (parte e titolo del capitolo) più gli embedding dei
+documenti già classificati in quel capitolo. Un nuovo documento viene
+assegnato al capitolo più simile quando similarità e margine sul secondo
+sono sopra soglia; solo i casi ambigui passano alla classificazione LLM
+con il manuale completo.
+
+Gli embedding dei documenti già classificati sono salvati in
+`category_centroid_members` e i centroidi vengono aggiornati in modo
+incrementale (somme per capitolo): un refresh calcola l'embedding solo dei
+documenti nuovi o riclassificati, al massimo `REFRESH_BATCH_LIMIT` per
+volta, così il primo documento dopo un cambio di modello non paga il
+backfill dell'intero archivio. Se l'embedding fallisce decide l'LLM. Ogni decisione finisce in
+`classification_log`, da cui si ricavano tasso di fallback e accordo con
+l'LLM; una quota di casi sicuri viene comunque verificata con l'LLM
+(`audit_rate`) per misurare l'accordo anche su quelli.
+"""
+import logging
+import os
+import random
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+
+# --- CONFIGURAZIONE ---
+# Soglie tarabili con agreement_metrics() senza modificare il codice
+MIN_SIMILARITY = float(os.getenv('ARCHIVISTA_CLASSIFIER_MIN_SIMILARITY', 0.45))  # similarità coseno minima col centroide migliore
+MIN_MARGIN = float(os.getenv('ARCHIVISTA_CLASSIFIER_MIN_MARGIN', 0.05))          # distacco minimo dal secondo capitolo
+AUDIT_RATE = float(os.getenv('ARCHIVISTA_CLASSIFIER_AUDIT_RATE', 0.1))           # quota di casi sicuri verificati comunque con l'LLM
+DESCRIPTION_WEIGHT = 3.0      # peso della descrizione del capitolo, in "documenti"
+CLASSIFIER_TEXT_CHARS = 2000  # testo del documento usato per l'embedding
+REFRESH_INTERVAL_SECONDS = 60
+REFRESH_BATCH_LIMIT = int(os.getenv('ARCHIVISTA_CLASSIFIER_REFRESH_LIMIT', 256))  # documenti embeddati per refresh
+EMBED_BATCH_SIZE = 64
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class CentroidPrediction:
+    """Capitolo più vicino con similarità e margine sul secondo."""
+    category_id: str
+    similarity: float
+    margin: float
+    runner_up: Optional[str]
+    confident: bool
+
+
+def chapter_descriptions(structure: Dict[str, Any]) -> Dict[str, str]:
+    """Descrizione testuale di ogni capitolo: {'PARTE/CAPITOLO': 'Parte ... - Capitolo ...'}."""
+    return {
+        f"{part_id}/{chapter_id}": f"{part['name']}. {chapter_name}"
+        for part_id, part in structure.items()
+        for chapter_id, chapter_name in part['chapters'].items()
+    }
+
+
+def paper_text(title: Optional[str], preview: Optional[str]) -> str:
+    """Testo di un documento già archiviato usato per il suo embedding."""
+    return f"{title or ''}. {preview or ''}"[:CLASSIFIER_TEXT_CHARS]
+
+
+def _normalize(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    return matrix / np.where(norms == 0, 1.0, norms)
+
+
+class CentroidClassifier:
+    """
+    Classificatore nearest-centroid con aggiornamento incrementale.
+
+    `embed_model` espone `get_text_embedding(text)` e
+    `get_text_embedding_batch(texts)` (interfaccia LlamaIndex, es.
+    Settings.embed_model). Gli embedding salvati sono legati al nome del
+    modello: cambiando modello vengono ricalcolati.
+    """
+
+    def __init__(self, embed_model, structure: Dict[str, Any], connect: Callable[[], sqlite3.Connection],
+                 min_similarity: float = MIN_SIMILARITY, min_margin: float = MIN_MARGIN,
+                 audit_rate: float = AUDIT_RATE, description_weight: float = DESCRIPTION_WEIGHT,
+                 refresh_interval: float = REFRESH_INTERVAL_SECONDS, refresh_limit: int = REFRESH_BATCH_LIMIT):
+        """
+        Args:
+            embed_model: Modello di embedding
+            structure: Struttura della conoscenza (KNOWLEDGE_BASE_STRUCTURE)
+            connect: Factory di connessioni SQLite (es. file_utils.db_connect)
+            min_similarity: Soglia di similarità per l'assegnazione diretta
+            min_margin: Soglia di margine sul secondo capitolo
+            audit_rate: Quota di casi sicuri inviati comunque all'LLM
+            description_weight: Peso della descrizione rispetto a un documento
+            refresh_interval: Intervallo minimo tra due refresh dai papers
+            refresh_limit: Documenti senza vettore embeddati al massimo per refresh
+        """
+        self.embed_model = embed_model
+        self.model_name = str(getattr(embed_model, 'model_name', None) or type(embed_model).__name__)
+        self.connect = connect
+        self.min_similarity = min_similarity
+        self.min_margin = min_margin
+        self.audit_rate = audit_rate
+        self.refresh_interval = refresh_interval
+        self.refresh_limit = refresh_limit
+        self._lock = threading.Lock()
+        self._last_refresh: Optional[float] = None
+        self._backlog = False
+        self._random = random.Random()
+
+        descriptions = chapter_descriptions(structure)
+        self.category_ids: List[str] = list(descriptions)
+        self._positions = {category_id: i for i, category_id in enumerate(self.category_ids)}
+        description_vectors = _normalize(np.asarray(
+            embed_model.get_text_embedding_batch(list(descriptions.values())), dtype=np.float32
+        ))
+        # Somme per capitolo: descrizione pesata + embedding normalizzati dei documenti
+        self._description_sums = description_vectors * description_weight
+        self._sums = self._description_sums.copy()
+        self._counts = np.zeros(len(self.category_ids), dtype=np.int64)
+        self._centroids = _normalize(self._sums)
+        self._load_members()
+
+    # --- CENTROIDI ---
+
+    def _load_members(self) -> None:
+        """Somme dei centroidi dagli embedding già salvati (nessun nuovo embedding)."""
+        conn = self.connect()
+        try:
+            rows = conn.execute(
+                "SELECT category_id, vector FROM category_centroid_members WHERE embedding_model = ?",
+                (self.model_name,)
+            ).fetchall()
+        finally:
+            conn.close()
+        with self._lock:
+            for category_id, blob in rows:
+                self._add_vector(category_id, np.frombuffer(blob, dtype=np.float32), 1)
+            self._centroids = _normalize(self._sums)
+
+    def _add_vector(self, category_id: str, vector: np.ndarray, sign: int) -> None:
+        position = self._positions.get(category_id)
+        if position is None or vector.shape[0] != self._sums.shape[1]:
+            return
+        self._sums[position] += sign * vector
+        self._counts[position] += sign
+
+    def refresh(self, force: bool = False) -> int:
+        """
+        Allinea i centroidi alla tabella papers.
+
+        Calcola l'embedding solo dei documenti senza vettore (nuovi o
+        salvati con un altro modello), al massimo `refresh_limit`: i
+        restanti sono presi dai refresh successivi, che finché resta
+        arretrato non attendono `refresh_interval`. I riclassificati e gli
+        eliminati spostano o tolgono il vettore già salvato.
+
+        Returns:
+            Documenti aggiunti, spostati o rimossi
+        """
+        if not force and not self._backlog and self._last_refresh is not None \
+                and time.monotonic() - self._last_refresh < self.refresh_interval:
+            return 0
+        self._last_refresh = time.monotonic()
+
+        conn = self.connect()
+        try:
+            moved = conn.execute("""
+                SELECT m.file_name, m.category_id, p.category_id, m.vector
+                FROM category_centroid_members m LEFT JOIN papers p ON p.file_name = m.file_name
+                WHERE m.embedding_model = ? AND p.category_id IS NOT m.category_id
+            """, (self.model_name,)).fetchall()
+            placeholders = ", ".join("?" * len(self.category_ids))
+            missing = conn.execute(f"""
+                SELECT p.file_name, p.category_id, p.title, p.formatted_preview
+                FROM papers p LEFT JOIN category_centroid_members m
+                    ON m.file_name = p.file_name AND m.embedding_model = ?
+                WHERE m.file_name IS NULL AND p.category_id IN ({placeholders})
+                ORDER BY p.file_name
+                LIMIT ?
+            """, (self.model_name, *self.category_ids, self.refresh_limit + 1)).fetchall()
+            self._backlog = len(missing) > self.refresh_limit
+            missing = missing[:self.refresh_limit]
+
+            vectors = []
+            for start in range(0, len(missing), EMBED_BATCH_SIZE):
+                batch = missing[start:start + EMBED_BATCH_SIZE]
+                vectors.extend(_normalize(np.asarray(
+                    self.embed_model.get_text_embedding_batch([paper_text(row[2], row[3]) for row in batch]),
+                    dtype=np.float32
+                )))
+
+            now = datetime.now().isoformat()
+            with self._lock:
+                for file_name, old_category, new_category, blob in moved:
+                    vector = np.frombuffer(blob, dtype=np.float32)
+                    self._add_vector(old_category, vector, -1)
+                    if new_category is None:
+                        conn.execute("DELETE FROM category_centroid_members WHERE file_name = ?", (file_name,))
+                    else:
+                        self._add_vector(new_category, vector, 1)
+                        conn.execute("UPDATE category_centroid_members SET category_id = ?, updated_at = ? "
+                                     "WHERE file_name = ?", (new_category, now, file_name))
+
+                for row, vector in zip(missing, vectors):
+                    self._add_vector(row[1], vector, 1)
+                conn.executemany("""
+                    INSERT OR REPLACE INTO category_centroid_members
+                        (file_name, category_id, embedding_model, vector, updated_at)
+                    VALUES (?, ?, ?, ?, ?)
+                """, [(row[0], row[1], self.model_name, vector.astype(np.float32).tobytes(), now)
+                      for row, vector in zip(missing, vectors)])
+                conn.commit()
+                self._centroids = _normalize(self._sums)
+        finally:
+            conn.close()
+
+        return len(moved) + len(missing)
+
+    # --- CLASSIFICAZIONE ---
+
+    def embed_document(self, text: str) -> np.ndarray:
+        """Embedding normalizzato dell'inizio del documento."""
+        return _normalize(np.asarray(self.embed_model.get_text_embedding(text[:CLASSIFIER_TEXT_CHARS]),
+                                     dtype=np.float32))
+
+    def predict(self, vector: np.ndarray) -> CentroidPrediction:
+        """Capitolo più vicino all'embedding, con margine sul secondo."""
+        with self._lock:
+            scores = self._centroids @ vector
+        order = np.argsort(-scores)
+        best = int(order[0])
+        runner_up = int(order[1]) if len(order) > 1 else None
+        margin = float(scores[best] - scores[runner_up]) if runner_up is not None else float(scores[best])
+        return CentroidPrediction(
+            category_id=self.category_ids[best],
+            similarity=float(scores[best]),
+            margin=margin,
+            runner_up=self.category_ids[runner_up] if runner_up is not None else None,
+            confident=float(scores[best]) >= self.min_similarity and margin >= self.min_margin
+        )
+
+    def classify(self, text: str, llm_classify: Callable[[str], str], file_name: Optional[str] = None) -> str:
+        """
+        Categoria del documento: diretta se il centroide è sicuro, altrimenti dall'LLM.
+
+        Args:
+            text: Testo completo del documento
+            llm_classify: Classificazione LLM (testo -> category_id), usata nei casi ambigui e negli audit
+            file_name: Nome del file, per il registro delle decisioni
+        """
+        try:
+            self.refresh()
+        except Exception as e:
+            # I centroidi già caricati restano validi: si classifica con quelli
+            logger.warning(f"Refresh dei centroidi fallito: {e}")
+        try:
+            vector = self.embed_document(text)
+        except Exception as e:
+            logger.warning(f"Embedding non disponibile per {file_name}, classificazione con l'LLM: {e}")
+            return llm_classify(text)
+        prediction = self.predict(vector)
+
+        audit = prediction.confident and self._random.random() < self.audit_rate
+        llm_category = llm_classify(text) if (not prediction.confident or audit) else None
+
+        if prediction.confident and not audit:
+            decided_by, category_id = 'centroid', prediction.category_id
+        else:
+            decided_by, category_id = ('audit' if audit else 'llm'), llm_category
+
+        self._log(file_name, prediction, llm_category, category_id, decided_by)
+        return category_id
+
+    def _log(self, file_name: Optional[str], prediction: CentroidPrediction, llm_category: Optional[str],
+             category_id: str, decided_by: str) -> None:
+        conn = self.connect()
+        try:
+            conn.execute("""
+                INSERT INTO classification_log (file_name, centroid_category, similarity, margin, confident,
+                    llm_category, final_category, decided_by, embedding_model, created_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """, (file_name, prediction.category_id, prediction.similarity, prediction.margin,
+                  int(prediction.confident), llm_category, category_id, decided_by, self.model_name,
+                  datetime.now().isoformat()))
+            conn.commit()
+        finally:
+            conn.close()
+
+    # --- METRICHE ---
+
+    def agreement_metrics(self, since: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Tasso di assegnazione diretta e accordo tra centroide e LLM.
+
+        `confident_agreement` (dagli audit) stima la precisione delle
+        assegnazioni dirette; `ambiguous_agreement` indica quanto spesso il
+        centroide avrebbe indovinato anche sotto soglia, utile per tarare le
+        soglie.
+        """
+        conn = self.connect()
+        try:
+            row = conn.execute("""
+                SELECT
+                    COUNT(*),
+                    SUM(decided_by = 'centroid'),
+                    SUM(confident = 1 AND llm_category IS NOT NULL),
+                    SUM(confident = 1 AND llm_category = centroid_category),
+                    SUM(confident = 0 AND llm_category IS NOT NULL),
+                    SUM(confident = 0 AND llm_category = centroid_category)
+                FROM classification_log
+                WHERE created_at >= COALESCE(?, '')
+            """, (since,)).fetchone()
+        finally:
+            conn.close()
+
+        total, direct, audited, audited_agree, ambiguous, ambiguous_agree = [value or 0 for value in row]
+        return {
+            'classifications': total,
+            'direct_assignments': direct,
+            'llm_calls': total - direct,
+            'direct_rate': direct / total if total else 0.0,
+            'audited': audited,
+            'confident_agreement': audited_agree / audited if audited else None,
+            'ambiguous': ambiguous,
+            'ambiguous_agreement': ambiguous_agree / ambiguous if ambiguous else None
+        }
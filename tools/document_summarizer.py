@@ -0,0 +1,310 @@
+# -*- coding: utf-8 -*-
+"""
+Riassunto map-reduce dei documenti indicizzati
+
+I chunk di un documento vengono letti direttamente per metadato
+`file_name` (docstore o vector store, es. Chroma), senza ricerca per
+similarità. Sono raggruppati entro un budget di caratteri e riassunti in
+parallelo (map); i riassunti parziali vengono poi fusi a livelli (reduce)
+finché ne resta uno, così nessun prompt supera il contesto del modello.
+
+Ogni riassunto intermedio è in cache per hash del modello, del contenuto e
+del prompt (tabella `summary_cache`, creata in `setup_database`): dopo una piccola
+modifica al documento si rigenerano solo i gruppi cambiati e i livelli di
+reduce sopra di essi.
+"""
+import hashlib
+import logging
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# --- CONFIGURAZIONE ---
+MAX_GROUP_CHARS = 12_000        # testo per prompt (~3000 token)
+BOUNDARY_MODULUS = 4            # in media un confine di gruppo ogni 4 chunk
+REDUCE_FAN_IN = 4               # riassunti fusi per chiamata di reduce
+MAX_REDUCE_LEVELS = 6           # oltre, i riassunti vengono troncati e fusi nel prompt finale
+MAX_WORKERS = 4                 # chiamate LLM contemporanee nella fase map
+SUMMARY_CACHE_MAX_ENTRIES = 20_000
+
+MAP_PROMPT = (
+    "Riassumi in italiano la seguente sezione del documento '{file_name}', "
+    "conservando fatti, dati, definizioni e conclusioni:\n\n{text}"
+)
+REDUCE_PROMPT = (
+    "Unisci in un unico riassunto in italiano i seguenti riassunti parziali "
+    "di sezioni consecutive del documento '{file_name}', senza perdere informazioni:\n\n{text}"
+)
+FINAL_PROMPT = (
+    "Crea un riassunto dettagliato, completo e ben strutturato in italiano "
+    "del seguente testo estratto dal documento '{file_name}':\n\n{text}"
+)
+SECTION_SEPARATOR = "\n---\n"
+
+
+# --- LETTURA DEI CHUNK ---
+
+def _node_position(node) -> int:
+    """Posizione del nodo nel documento (start_char_idx), per ricostruire l'ordine."""
+    start = getattr(node, "start_char_idx", None)
+    return start if start is not None else 0
+
+
+def _nodes_from_docstore(docstore, file_name: str) -> list:
+    """Nodi del documento dal docstore, tramite le ref_doc_info con quel file_name."""
+    ref_docs = docstore.get_all_ref_doc_info() or {}
+    node_ids = [
+        node_id
+        for info in ref_docs.values()
+        if (info.metadata or {}).get("file_name") == file_name
+        for node_id in info.node_ids
+    ]
+    return docstore.get_nodes(node_ids, raise_error=False) if node_ids else []
+
+
+def _nodes_from_vector_store(vector_store, file_name: str) -> list:
+    """Nodi del documento dal vector store (Chroma salva il testo) con un filtro sui metadati."""
+    from llama_index.core.vector_stores import ExactMatchFilter, MetadataFilters
+
+    filters = MetadataFilters(filters=[ExactMatchFilter(key="file_name", value=file_name)])
+    try:
+        return vector_store.get_nodes(filters=filters)
+    except NotImplementedError:
+        return []
+
+
+def fetch_document_chunks(index, file_name: str) -> List[str]:
+    """
+    Testo dei chunk di un documento nell'ordine originale.
+
+    Con ChromaVectorStore il docstore resta vuoto: in quel caso i nodi
+    vengono letti dal vector store. In entrambi i casi è un lookup per
+    metadato, non una query di similarità.
+    """
+    nodes = [node for node in _nodes_from_docstore(index.docstore, file_name) if node is not None]
+    if not nodes:
+        nodes = _nodes_from_vector_store(index.vector_store, file_name)
+    nodes.sort(key=_node_position)
+    return [node.get_content() for node in nodes]
+
+
+# --- RAGGRUPPAMENTO ---
+
+def _truncate(text: str, max_chars: int) -> str:
+    """Taglia `text` a `max_chars` caratteri, all'ultimo spazio se possibile."""
+    if len(text) <= max_chars:
+        return text
+    cut = text[:max_chars]
+    space = cut.rfind(" ")
+    return cut[:space] if space > max_chars // 2 else cut
+
+
+def _model_name(llm) -> str:
+    """Nome del modello per la chiave di cache (metadata.model_name degli LLM LlamaIndex)."""
+    metadata = getattr(llm, "metadata", None)
+    for name in (getattr(metadata, "model_name", None), getattr(llm, "model", None),
+                 getattr(llm, "model_name", None)):
+        if isinstance(name, str) and name:
+            return name
+    return type(llm).__name__
+
+
+def _hash(*parts: str) -> str:
+    digest = hashlib.sha1()
+    for part in parts:
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def group_chunks(chunks: List[str], max_chars: int = MAX_GROUP_CHARS,
+                 boundary_modulus: int = BOUNDARY_MODULUS) -> List[List[str]]:
+    """
+    Raggruppa chunk consecutivi entro `max_chars`.
+
+    I confini dipendono dal contenuto (un gruppo si chiude dopo un chunk il
+    cui hash è multiplo di `boundary_modulus`) oltre che dal budget: una
+    modifica locale cambia il gruppo che la contiene, non sposta i confini
+    di tutti i gruppi successivi, e le altre voci in cache restano valide.
+    Un documento che entra interamente nel budget resta un solo gruppo.
+    """
+    if sum(len(chunk) + len(SECTION_SEPARATOR) for chunk in chunks) <= max_chars:
+        return [list(chunks)] if chunks else []
+
+    groups, current, size = [], [], 0
+    for chunk in chunks:
+        if current and size + len(chunk) > max_chars:
+            groups.append(current)
+            current, size = [], 0
+        current.append(chunk)
+        size += len(chunk) + len(SECTION_SEPARATOR)
+        if int(_hash(chunk)[:8], 16) % boundary_modulus == 0:
+            groups.append(current)
+            current, size = [], 0
+    if current:
+        groups.append(current)
+    return groups
+
+
+# --- CACHE ---
+
+class SummaryCache:
+    """Riassunti intermedi per hash di prompt e contenuto, nella tabella summary_cache."""
+
+    def __init__(self, connect: Callable[[], sqlite3.Connection], max_entries: int = SUMMARY_CACHE_MAX_ENTRIES):
+        """
+        Args:
+            connect: Factory di connessioni SQLite (es. file_utils.db_connect)
+            max_entries: Voci conservate; oltre si eliminano le meno usate
+        """
+        self.connect = connect
+        self.max_entries = max_entries
+
+    def get_many(self, keys: List[str]) -> Dict[str, str]:
+        if not keys:
+            return {}
+        conn = self.connect()
+        try:
+            placeholders = ",".join("?" * len(keys))
+            rows = conn.execute(
+                f"SELECT content_hash, summary FROM summary_cache WHERE content_hash IN ({placeholders})", keys
+            ).fetchall()
+            if rows:
+                conn.execute(
+                    f"UPDATE summary_cache SET last_used_at = ? WHERE content_hash IN ({placeholders})",
+                    [datetime.now().isoformat(), *keys]
+                )
+                conn.commit()
+            return {row[0]: row[1] for row in rows}
+        finally:
+            conn.close()
+
+    def put_many(self, entries: Dict[str, tuple]) -> None:
+        """Salva {hash: (fase, riassunto)} e pota le voci in eccesso."""
+        if not entries:
+            return
+        now = datetime.now().isoformat()
+        conn = self.connect()
+        try:
+            conn.executemany("""
+                INSERT OR REPLACE INTO summary_cache (content_hash, stage, summary, created_at, last_used_at)
+                VALUES (?, ?, ?, ?, ?)
+            """, [(key, stage, summary, now, now) for key, (stage, summary) in entries.items()])
+            conn.execute("""
+                DELETE FROM summary_cache WHERE content_hash IN (
+                    SELECT content_hash FROM summary_cache ORDER BY last_used_at DESC LIMIT -1 OFFSET ?
+                )
+            """, (self.max_entries,))
+            conn.commit()
+        finally:
+            conn.close()
+
+
+# --- MAP-REDUCE ---
+
+class DocumentSummarizer:
+    """
+    Riassunto map-reduce con contesto limitato e cache dei passi intermedi.
+
+    `llm` espone `complete(prompt)` con risultato dotato di `.text`
+    (interfaccia degli LLM LlamaIndex, es. Settings.llm).
+    """
+
+    def __init__(self, llm, cache: Optional[SummaryCache] = None, max_group_chars: int = MAX_GROUP_CHARS,
+                 reduce_fan_in: int = REDUCE_FAN_IN, max_workers: int = MAX_WORKERS,
+                 max_reduce_levels: int = MAX_REDUCE_LEVELS):
+        self.llm = llm
+        self.model_name = _model_name(llm)
+        self.cache = cache
+        self.max_group_chars = max_group_chars
+        self.reduce_fan_in = max(2, reduce_fan_in)
+        self.max_workers = max_workers
+        self.max_reduce_levels = max_reduce_levels
+        self.stats = {'llm_calls': 0, 'cache_hits': 0, 'reduce_levels': 0, 'truncated': 0}
+
+    def summarize(self, file_name: str, chunks: List[str]) -> str:
+        """Riassunto finale dei chunk di un documento."""
+        groups = group_chunks(chunks, self.max_group_chars)
+        if len(groups) == 1:
+            # Il documento entra in un solo prompt: nessun passo intermedio
+            return self._run_stage("final", FINAL_PROMPT, file_name, [SECTION_SEPARATOR.join(groups[0])])[0]
+
+        summaries = self._run_stage("map", MAP_PROMPT, file_name,
+                                    [SECTION_SEPARATOR.join(group) for group in groups])
+
+        for _ in range(self.max_reduce_levels):
+            batches = self._reduce_batches(summaries)
+            if len(batches) == 1:
+                return self._run_stage("final", FINAL_PROMPT, file_name, [SECTION_SEPARATOR.join(batches[0])])[0]
+            summaries = self._run_stage("reduce", REDUCE_PROMPT, file_name,
+                                        [SECTION_SEPARATOR.join(batch) for batch in batches])
+            self.stats['reduce_levels'] += 1
+
+        # Limite di livelli raggiunto: ogni riassunto riceve una quota uguale del prompt finale
+        share = max(1, self.max_group_chars // len(summaries) - len(SECTION_SEPARATOR))
+        text = SECTION_SEPARATOR.join(self._truncate(summary, share) for summary in summaries)
+        return self._run_stage("final", FINAL_PROMPT, file_name, [text])[0]
+
+    def _truncate(self, summary: str, max_chars: int) -> str:
+        truncated = _truncate(summary, max_chars)
+        if truncated is not summary:
+            self.stats['truncated'] += 1
+        return truncated
+
+    def _reduce_batches(self, summaries: List[str]) -> List[List[str]]:
+        """
+        Riassunti consecutivi a gruppi di `reduce_fan_in`, entro il budget di caratteri.
+
+        Ogni riassunto è limitato a metà del budget, così un gruppo ne contiene
+        sempre almeno due e ogni livello riduce il numero di riassunti.
+        """
+        limit = max(1, self.max_group_chars // 2 - len(SECTION_SEPARATOR))
+        batches, current, size = [], [], 0
+        for summary in summaries:
+            summary = self._truncate(summary, limit)
+            full = len(current) >= self.reduce_fan_in or size + len(summary) > self.max_group_chars
+            if len(current) >= 2 and full:
+                batches.append(current)
+                current, size = [], 0
+            current.append(summary)
+            size += len(summary) + len(SECTION_SEPARATOR)
+        if current:
+            batches.append(current)
+        return batches
+
+    def _run_stage(self, stage: str, template: str, file_name: str, texts: List[str]) -> List[str]:
+        """Esegue un prompt per testo in parallelo, riusando i risultati in cache."""
+        prompts = [template.format(file_name=file_name, text=text) for text in texts]
+        keys = [_hash(stage, self.model_name, prompt) for prompt in prompts]
+
+        cached = self.cache.get_many(list(set(keys))) if self.cache else {}
+        self.stats['cache_hits'] += sum(1 for key in keys if key in cached)
+
+        missing = {key: prompt for key, prompt in zip(keys, prompts) if key not in cached}
+        if missing:
+            with ThreadPoolExecutor(max_workers=min(self.max_workers, len(missing))) as executor:
+                generated = dict(zip(missing, executor.map(self._complete, missing.values())))
+            self.stats['llm_calls'] += len(generated)
+            if self.cache:
+                self.cache.put_many({key: (stage, summary) for key, summary in generated.items()})
+            cached.update(generated)
+
+        return [cached[key] for key in keys]
+
+    def _complete(self, prompt: str) -> str:
+        return self.llm.complete(prompt).text
+
+
+def summarize_indexed_document(index, file_name: str, llm, cache: Optional[SummaryCache] = None) -> Optional[str]:
+    """Riassunto di un documento dell'indice, o None se il documento non è indicizzato."""
+    chunks = fetch_document_chunks(index, file_name)
+    if not chunks:
+        return None
+    summarizer = DocumentSummarizer(llm, cache)
+    summary = summarizer.summarize(file_name, chunks)
+    logger.info("Riassunto di %s: %d chunk, %d chiamate LLM, %d riassunti dalla cache",
+                file_name, len(chunks), summarizer.stats['llm_calls'], summarizer.stats['cache_hits'])
+    return summary
@@ -0,0 +1,330 @@
+# -*- coding: utf-8 -*-
+"""
+Chunking con riuso degli embedding di frase
+
+SemanticSplitterNodeParser calcola l'embedding di ogni frase (con le
+frasi vicine) per trovare i punti di rottura, poi VectorStoreIndex
+ricalcola l'embedding di ogni chunk, ripassando tutto il testo nel
+modello. Qui ogni frase è embeddata una sola volta, da sola: il vettore
+con buffer usato per le rotture è la media dei vettori delle frasi
+vicine, e l'embedding di ogni chunk è la media normalizzata dei vettori
+delle sue frasi, senza il contributo delle frasi oltre i suoi confini.
+Un chunk viene ricalcolato solo se le sue frasi sono poco coese (la
+media sarebbe una cattiva approssimazione); una frase isolata ha già il
+proprio embedding esatto. La media copre anche il testo oltre la
+finestra del modello (128 token per mpnet), che l'embedding diretto
+troncherebbe.
+
+Per i formati dove lo split semantico non vale il costo (testo semplice,
+markdown, html) c'è un chunker a finestra fissa: un solo embedding per
+chunk. La strategia si sceglie per estensione (CHUNKING_BY_EXTENSION).
+
+I nodi prodotti hanno già `embedding`, `start_char_idx` e la relazione
+SOURCE col documento: `index.insert_nodes` non li ricalcola e
+`delete_ref_doc` continua a funzionare.
+"""
+import hashlib
+import os
+import re
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# --- CONFIGURAZIONE ---
+BUFFER_SIZE = 1                  # frasi vicine mediate nel vettore usato per le rotture
+BREAKPOINT_PERCENTILE = 95       # come SemanticSplitterNodeParser
+REUSE_MIN_COHESION = 0.6         # norma minima della media delle frasi (senza buffer) per riusarla
+WINDOW_CHARS = 1500              # chunker a finestra fissa
+WINDOW_OVERLAP = 200
+EMBED_BATCH_SIZE = 64
+EMBEDDING_CACHE_MAX_ENTRIES = 50_000
+
+CHUNKING_BY_EXTENSION = {
+    ".pdf": "semantic",
+    ".docx": "semantic",
+    ".doc": "semantic",
+    ".rtf": "semantic",
+    ".txt": "fixed",
+    ".md": "fixed",
+    ".html": "fixed",
+    ".htm": "fixed",
+    ".csv": "fixed",
+}
+DEFAULT_STRATEGY = "semantic"
+REUSE_POLICIES = ("auto", "pooled", "reembed")
+
+SENTENCE_BOUNDARY = re.compile(r'[.!?…]+["»”’)\]]*\s+|\n\s*\n')
+
+
+@dataclass
+class TextChunk:
+    """Porzione di documento con posizione ed embedding normalizzato."""
+    text: str
+    start: int
+    end: int
+    embedding: np.ndarray
+    reused: bool = False
+
+
+# --- EMBEDDING CON CACHE ---
+
+class EmbeddingCache:
+    """Cache LRU in memoria degli embedding per (modello, hash del testo), thread-safe."""
+
+    def __init__(self, max_entries: int = EMBEDDING_CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Tuple[str, str], np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(model_name: str, text: str) -> Tuple[str, str]:
+        return model_name, hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+    def get(self, key: Tuple[str, str]) -> Optional[np.ndarray]:
+        with self._lock:
+            vector = self._entries.get(key)
+            if vector is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return vector
+
+    def put(self, key: Tuple[str, str], vector: np.ndarray) -> None:
+        with self._lock:
+            self._entries[key] = vector
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.where(norms == 0, 1.0, norms)
+
+
+def model_name_of(embed_model) -> str:
+    return getattr(embed_model, "model_name", None) or type(embed_model).__name__
+
+
+def embed_texts(embed_model, texts: Sequence[str], cache: Optional[EmbeddingCache] = None,
+                batch_size: int = EMBED_BATCH_SIZE) -> Tuple[np.ndarray, int]:
+    """
+    Embedding normalizzati dei testi, calcolando solo quelli non in cache.
+
+    `embed_model` espone `get_text_embedding_batch` (interfaccia LlamaIndex).
+    Restituisce (matrice, testi effettivamente passati al modello).
+    """
+    model_name = model_name_of(embed_model)
+    keys = [EmbeddingCache.key(model_name, text) for text in texts]
+    vectors: Dict[Tuple[str, str], np.ndarray] = {}
+    if cache is not None:
+        for key in set(keys):
+            vector = cache.get(key)
+            if vector is not None:
+                vectors[key] = vector
+
+    missing = {}
+    for key, text in zip(keys, texts):
+        if key not in vectors:
+            missing.setdefault(key, text)
+    pending = list(missing.items())
+    for start in range(0, len(pending), batch_size):
+        batch = pending[start:start + batch_size]
+        embedded = _normalize(np.asarray(
+            embed_model.get_text_embedding_batch([text for _, text in batch]), dtype=np.float32))
+        for (key, _), vector in zip(batch, embedded):
+            vectors[key] = vector
+            if cache is not None:
+                cache.put(key, vector)
+
+    if not keys:
+        return np.zeros((0, 0), dtype=np.float32), 0
+    return np.stack([vectors[key] for key in keys]), len(pending)
+
+
+# --- SPLIT ---
+
+def split_sentences(text: str) -> List[Tuple[int, int]]:
+    """Intervalli (inizio, fine) delle frasi; la loro concatenazione è il testo intero."""
+    spans, start = [], 0
+    for match in SENTENCE_BOUNDARY.finditer(text):
+        spans.append((start, match.end()))
+        start = match.end()
+    if start < len(text):
+        spans.append((start, len(text)))
+    return [(a, b) for a, b in spans if text[a:b].strip()]
+
+
+class _BaseChunker:
+    """Statistiche e conversione in nodi LlamaIndex comuni ai chunker."""
+
+    strategy = ""
+
+    def __init__(self, embed_model, cache: Optional[EmbeddingCache] = None):
+        self.embed_model = embed_model
+        self.cache = cache
+        self.stats = {'documents': 0, 'chunks': 0, 'embedded_texts': 0, 'reused_chunks': 0, 'reembedded_chunks': 0}
+
+    def _embed(self, texts: Sequence[str]) -> np.ndarray:
+        vectors, embedded = embed_texts(self.embed_model, texts, self.cache)
+        self.stats['embedded_texts'] += embedded
+        return vectors
+
+    def split(self, text: str) -> List[TextChunk]:
+        raise NotImplementedError
+
+    def build_nodes(self, document) -> list:
+        """
+        Nodi del documento LlamaIndex con embedding già calcolato, pronti per
+        `index.insert_nodes` / `VectorStoreIndex(nodes, ...)`.
+        """
+        from llama_index.core.schema import NodeRelationship, TextNode
+
+        text = document.get_content()
+        nodes = []
+        for chunk in self.split(text):
+            node = TextNode(
+                text=chunk.text,
+                embedding=chunk.embedding.tolist(),
+                metadata=dict(document.metadata),
+                excluded_embed_metadata_keys=list(document.excluded_embed_metadata_keys),
+                excluded_llm_metadata_keys=list(document.excluded_llm_metadata_keys),
+                start_char_idx=chunk.start,
+                end_char_idx=chunk.end,
+            )
+            node.relationships[NodeRelationship.SOURCE] = document.as_related_node_info()
+            nodes.append(node)
+        return nodes
+
+
+class SemanticChunker(_BaseChunker):
+    """
+    Split semantico (frasi con buffer, rottura oltre il percentile delle
+    distanze coseno consecutive) con embedding dei chunk ricavati da quelli
+    delle singole frasi.
+
+    `reuse`: "auto" usa la media se le frasi sono coese e ricalcola le
+    altre, "pooled" usa sempre la media, "reembed" ricalcola sempre
+    (comportamento di SemanticSplitterNodeParser + VectorStoreIndex).
+    """
+
+    strategy = "semantic"
+
+    def __init__(self, embed_model, cache: Optional[EmbeddingCache] = None, buffer_size: int = BUFFER_SIZE,
+                 breakpoint_percentile: float = BREAKPOINT_PERCENTILE, reuse: str = "auto",
+                 min_cohesion: float = REUSE_MIN_COHESION):
+        if reuse not in REUSE_POLICIES:
+            raise ValueError(f"reuse deve essere uno di {REUSE_POLICIES}")
+        super().__init__(embed_model, cache)
+        self.buffer_size = buffer_size
+        self.breakpoint_percentile = breakpoint_percentile
+        self.reuse = reuse
+        self.min_cohesion = min_cohesion
+
+    def _buffered_vectors(self, sentence_vectors: np.ndarray) -> np.ndarray:
+        """Ogni frase mediata con le `buffer_size` precedenti e successive, al posto del testo concatenato."""
+        cumulative = np.vstack([np.zeros((1, sentence_vectors.shape[1]), dtype=sentence_vectors.dtype),
+                                np.cumsum(sentence_vectors, axis=0)])
+        count = len(sentence_vectors)
+        first = np.maximum(np.arange(count) - self.buffer_size, 0)
+        last = np.minimum(np.arange(count) + self.buffer_size + 1, count)
+        return _normalize(cumulative[last] - cumulative[first])
+
+    def split(self, text: str) -> List[TextChunk]:
+        spans = split_sentences(text)
+        if not spans:
+            return []
+        sentence_vectors = self._embed([text[a:b] for a, b in spans])
+
+        breaks = []
+        if len(spans) > 1:
+            buffered = self._buffered_vectors(sentence_vectors)
+            distances = 1.0 - np.sum(buffered[:-1] * buffered[1:], axis=1)
+            threshold = np.percentile(distances, self.breakpoint_percentile)
+            breaks = [i + 1 for i, distance in enumerate(distances) if distance > threshold]
+
+        chunks, to_reembed = [], []
+        for first, last in zip([0] + breaks, breaks + [len(spans)]):
+            start, end = spans[first][0], spans[last - 1][1]
+            mean = sentence_vectors[first:last].mean(axis=0)
+            cohesion = float(np.linalg.norm(mean))
+            chunk = TextChunk(text[start:end], start, end, _normalize(mean), reused=True)
+            if self.reuse == "reembed" or (self.reuse == "auto" and cohesion < self.min_cohesion):
+                chunk.reused = False
+                to_reembed.append(chunk)
+            chunks.append(chunk)
+
+        if to_reembed:
+            for chunk, vector in zip(to_reembed, self._embed([chunk.text for chunk in to_reembed])):
+                chunk.embedding = vector
+
+        self.stats['documents'] += 1
+        self.stats['chunks'] += len(chunks)
+        self.stats['reembedded_chunks'] += len(to_reembed)
+        self.stats['reused_chunks'] += len(chunks) - len(to_reembed)
+        return chunks
+
+
+class FixedWindowChunker(_BaseChunker):
+    """Finestre di `window_chars` con sovrapposizione, tagliate su spazi; un embedding per chunk."""
+
+    strategy = "fixed"
+
+    def __init__(self, embed_model, cache: Optional[EmbeddingCache] = None, window_chars: int = WINDOW_CHARS,
+                 overlap: int = WINDOW_OVERLAP):
+        if overlap >= window_chars:
+            raise ValueError("overlap deve essere minore di window_chars")
+        super().__init__(embed_model, cache)
+        self.window_chars = window_chars
+        self.overlap = overlap
+
+    def _windows(self, text: str) -> List[Tuple[int, int]]:
+        windows, start = [], 0
+        while start < len(text):
+            end = min(len(text), start + self.window_chars)
+            if end < len(text):
+                cut = text.rfind(" ", start + self.overlap + 1, end)
+                end = cut if cut > 0 else end
+            if text[start:end].strip():
+                windows.append((start, end))
+            if end >= len(text):
+                break
+            next_start = end - self.overlap
+            space = text.find(" ", next_start, end)
+            start = space + 1 if space >= 0 else next_start
+        return windows
+
+    def split(self, text: str) -> List[TextChunk]:
+        windows = self._windows(text)
+        vectors = self._embed([text[a:b] for a, b in windows]) if windows else []
+        chunks = [TextChunk(text[a:b], a, b, vector) for (a, b), vector in zip(windows, vectors)]
+        self.stats['documents'] += 1
+        self.stats['chunks'] += len(chunks)
+        self.stats['reembedded_chunks'] += len(chunks)
+        return chunks
+
+
+# --- SELEZIONE PER TIPO DI FILE ---
+
+def chunking_strategy_for(file_name: str) -> str:
+    return CHUNKING_BY_EXTENSION.get(os.path.splitext(file_name)[1].lower(), DEFAULT_STRATEGY)
+
+
+def get_chunker(file_name: str, embed_model, strategy: Optional[str] = None):
+    """Chunker per il file (strategia esplicita o da CHUNKING_BY_EXTENSION) con la cache condivisa."""
+    strategy = strategy or chunking_strategy_for(file_name)
+    if strategy == "semantic":
+        return SemanticChunker(embed_model, embedding_cache)
+    if strategy == "fixed":
+        return FixedWindowChunker(embed_model, embedding_cache)
+    raise ValueError(f"Strategia di chunking sconosciuta: {strategy}")
+
+
+# Istanza globale: i retry di una fase di indicizzazione riusano gli embedding già calcolati
+embedding_cache = EmbeddingCache()
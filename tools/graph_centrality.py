@@ -0,0 +1,334 @@
+# -*- coding: utf-8 -*-
+"""
+Servizio di centralità per il Grafo della Conoscenza
+
+Grado pesato, PageRank e un'approssimazione della betweenness vengono
+calcolati in un solo passaggio vettoriale sul grafo CSR (tools.graph_engine)
+e salvati per utente e versione del grafo (l'ultima modifica applicata dal
+log `knowledge_graph_changes`). Finché il grafo non cambia, la UI legge
+classifiche già ordinate: i primi k elementi sono una semplice slice.
+"""
+import time
+import logging
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from tools.graph_engine import CSRKnowledgeGraph, ENGINE_CACHE_SIZE, knowledge_graph_registry
+
+logger = logging.getLogger(__name__)
+
+# --- CONFIGURAZIONE ---
+CENTRALITY_METRICS = ('weighted_degree', 'pagerank', 'betweenness')
+PAGERANK_DAMPING = 0.85
+PAGERANK_MAX_ITER = 100
+PAGERANK_TOLERANCE = 1e-6
+BETWEENNESS_PIVOTS = 64         # sorgenti campionate (Brandes con pivot); esatta se n <= pivot
+BETWEENNESS_SEED = 42           # seed fisso: classifiche stabili tra un ricalcolo e l'altro
+MAX_CACHED_RANKINGS = 64        # combinazioni (metrica, soglia, tipo) tenute in memoria per utente
+
+
+# --- CALCOLO VETTORIALE ---
+
+def weighted_pagerank(graph: CSRKnowledgeGraph, damping: float = PAGERANK_DAMPING,
+                      max_iter: int = PAGERANK_MAX_ITER, tol: float = PAGERANK_TOLERANCE) -> np.ndarray:
+    """
+    PageRank pesato per confidenza (iterazione di potenza sull'adiacenza CSR).
+
+    Stessa definizione di networkx.pagerank su grafo non orientato: i nodi senza
+    archi ridistribuiscono la massa in modo uniforme sui nodi vivi.
+    """
+    size = len(graph.entity_ids)
+    n = graph.num_nodes
+    if n == 0:
+        return np.zeros(size)
+
+    weights = graph.edge_conf[graph.adj_edges].astype(np.float64)
+    out_weight = np.bincount(graph.adj_rows, weights=weights, minlength=size)
+    share = np.divide(weights, out_weight[graph.adj_rows], out=np.zeros_like(weights),
+                      where=out_weight[graph.adj_rows] > 0)
+    dangling = graph.alive & (out_weight == 0)
+    uniform = graph.alive / n
+
+    scores = uniform.copy()
+    for _ in range(max_iter):
+        previous = scores
+        scores = damping * np.bincount(graph.indices, weights=previous[graph.adj_rows] * share, minlength=size)
+        scores += (damping * previous[dangling].sum() + 1 - damping) * uniform
+        if np.abs(scores - previous).sum() < n * tol:
+            break
+    return scores
+
+
+def _single_source_dependencies(graph: CSRKnowledgeGraph, source: int) -> np.ndarray:
+    """Dipendenze di Brandes da una sorgente: BFS per livelli, poi accumulo all'indietro."""
+    size = len(graph.entity_ids)
+    distance = np.full(size, -1, dtype=np.int32)
+    sigma = np.zeros(size)
+    distance[source] = 0
+    sigma[source] = 1.0
+
+    levels: List[Tuple[np.ndarray, np.ndarray]] = []
+    frontier = np.asarray([source], dtype=np.int64)
+    depth = 0
+    while frontier.size:
+        parents, children = graph.frontier_edges(frontier)
+        distance[children[distance[children] < 0]] = depth + 1
+        on_next = distance[children] == depth + 1
+        # Archi multipli tra la stessa coppia contano come un solo cammino
+        pairs = np.unique(parents[on_next] * size + children[on_next])
+        parents, children = pairs // size, pairs % size
+        if children.size == 0:
+            break
+        frontier, inverse = np.unique(children, return_inverse=True)
+        sigma[frontier] = np.bincount(inverse, weights=sigma[parents])
+        levels.append((parents, children))
+        depth += 1
+
+    delta = np.zeros(size)
+    for parents, children in reversed(levels):
+        contribution = sigma[parents] / sigma[children] * (1.0 + delta[children])
+        unique_parents, inverse = np.unique(parents, return_inverse=True)
+        delta[unique_parents] += np.bincount(inverse, weights=contribution)
+    delta[source] = 0.0
+    return delta
+
+
+def approximate_betweenness(graph: CSRKnowledgeGraph, pivots: int = BETWEENNESS_PIVOTS,
+                            seed: int = BETWEENNESS_SEED) -> np.ndarray:
+    """
+    Betweenness normalizzata stimata da un campione di sorgenti (Brandes & Pich).
+
+    Con n <= pivot il risultato coincide con networkx.betweenness_centrality
+    (normalized=True, cammini non pesati).
+    """
+    size = len(graph.entity_ids)
+    alive_nodes = np.nonzero(graph.alive)[0]
+    n = alive_nodes.size
+    centrality = np.zeros(size)
+    if n < 3:
+        return centrality
+
+    if n > pivots:
+        sources = np.random.default_rng(seed).choice(alive_nodes, pivots, replace=False)
+    else:
+        sources = alive_nodes
+    for source in sources:
+        centrality += _single_source_dependencies(graph, int(source))
+    return centrality * (n / sources.size) / ((n - 1) * (n - 2))
+
+
+def compute_centrality(graph: CSRKnowledgeGraph) -> Dict[str, np.ndarray]:
+    """Tutte le metriche di CENTRALITY_METRICS per ogni nodo del grafo."""
+    return {
+        'weighted_degree': graph.weighted_degree(),
+        'pagerank': weighted_pagerank(graph),
+        'betweenness': approximate_betweenness(graph),
+    }
+
+
+# --- PUNTEGGI PER VERSIONE DEL GRAFO ---
+
+class CentralityScores:
+    """
+    Punteggi di centralità di una versione del grafo e classifiche derivate.
+
+    Le classifiche filtrate (soglia di confidenza, tipo di entità) vengono
+    ordinate una sola volta e poi servite come slice.
+    """
+
+    def __init__(self, version: Tuple[int, int, int], scores: Dict[str, np.ndarray],
+                 computed_at: Optional[str] = None):
+        self.version = version
+        self.scores = scores
+        self.computed_at = computed_at or datetime.now().isoformat()
+        self._rankings: "OrderedDict[Tuple[str, float, Optional[str]], Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def ranking(self, graph: CSRKnowledgeGraph, metric: str, min_confidence: float = 0.0,
+                entity_type: Optional[str] = None) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Nodi ordinati per punteggio decrescente con i relativi valori.
+
+        Il grado pesato segue la soglia di confidenza sugli archi (come la vista
+        "Entità più influenti"); PageRank e betweenness sono globali e la soglia
+        filtra solo i nodi elencati. Le entità senza archi sopra soglia sono escluse.
+
+        Returns:
+            (nodi, punteggi, grado pesato, grado) allineati
+        """
+        if metric not in CENTRALITY_METRICS:
+            raise ValueError(f"Metrica di centralità non supportata: {metric}")
+        key = (metric, round(float(min_confidence), 4), entity_type)
+        with self._lock:
+            cached = self._rankings.get(key)
+            if cached is not None:
+                self._rankings.move_to_end(key)
+                return cached
+
+        weighted = graph.weighted_degree(min_confidence)
+        degree = graph.degree(min_confidence)
+        values = weighted if metric == 'weighted_degree' else self.scores[metric]
+        mask = graph.node_mask(min_confidence, entity_type) & (degree > 0)
+        nodes = np.nonzero(mask)[0]
+        nodes = nodes[np.argsort(-values[nodes], kind='stable')]
+        ranking = (nodes, values[nodes], weighted[nodes], degree[nodes])
+
+        with self._lock:
+            self._rankings[key] = ranking
+            while len(self._rankings) > MAX_CACHED_RANKINGS:
+                self._rankings.popitem(last=False)
+        return ranking
+
+
+# --- SERVIZIO ---
+
+class GraphCentralityService:
+    """
+    Punteggi di centralità per utente, ricalcolati solo quando il grafo cambia.
+
+    Ordine di lookup: memoria -> tabella graph_centrality_scores (stessa
+    versione, es. calcolata da un altro processo) -> calcolo e salvataggio.
+    """
+
+    def __init__(self, max_users: int = ENGINE_CACHE_SIZE):
+        self.max_users = max_users
+        self._scores: "OrderedDict[int, CentralityScores]" = OrderedDict()
+        self._lock = threading.RLock()
+        self.stats = {'hits': 0, 'loads': 0, 'computes': 0}
+
+    @staticmethod
+    def graph_version(graph: CSRKnowledgeGraph) -> Tuple[int, int, int]:
+        """Versione del grafo: ultima modifica applicata più conteggi (il log viene potato)."""
+        return int(graph.change_id), graph.num_nodes, graph.num_edges
+
+    def get_scores(self, user_id: int, connect: Callable,
+                   graph: Optional[CSRKnowledgeGraph] = None) -> Tuple[CSRKnowledgeGraph, CentralityScores]:
+        """
+        Grafo aggiornato dell'utente e relativi punteggi di centralità.
+
+        Args:
+            user_id: ID utente
+            connect: Factory di connessioni SQLite (es. file_utils.db_connect)
+            graph: Grafo già ottenuto dal registro (evita una seconda sincronizzazione)
+        """
+        if graph is None:
+            graph = knowledge_graph_registry.get(user_id, connect)
+        version = self.graph_version(graph)
+
+        with self._lock:
+            scores = self._scores.get(user_id)
+            if scores is not None and scores.version == version:
+                self._scores.move_to_end(user_id)
+                self.stats['hits'] += 1
+                return graph, scores
+
+            with connect() as conn:
+                scores = self._load(conn, user_id, graph, version)
+                if scores is not None:
+                    self.stats['loads'] += 1
+                else:
+                    started = time.perf_counter()
+                    scores = CentralityScores(version, compute_centrality(graph))
+                    self._persist(conn, user_id, graph, scores, time.perf_counter() - started)
+                    self.stats['computes'] += 1
+
+            self._scores[user_id] = scores
+            self._scores.move_to_end(user_id)
+            while len(self._scores) > self.max_users:
+                self._scores.popitem(last=False)
+            return graph, scores
+
+    def top_entities(self, user_id: int, connect: Callable, metric: str = 'weighted_degree', k: int = 10,
+                     min_confidence: float = 0.0, entity_type: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        Le k entità più centrali secondo la metrica scelta.
+
+        Returns:
+            Lista di dizionari con entity_id, entity_name, entity_type, score,
+            weighted_degree, avg_confidence, pagerank e betweenness
+        """
+        graph, scores = self.get_scores(user_id, connect)
+        nodes, values, weighted, degree = scores.ranking(graph, metric, min_confidence, entity_type)
+        return [
+            {
+                'entity_id': int(graph.entity_ids[node]),
+                'entity_name': graph.names[node],
+                'entity_type': graph.type_labels[graph.type_codes[node]],
+                'score': float(values[i]),
+                'weighted_degree': float(weighted[i]),
+                'avg_confidence': float(weighted[i] / degree[i]),
+                'pagerank': float(scores.scores['pagerank'][node]),
+                'betweenness': float(scores.scores['betweenness'][node]),
+            }
+            for i, node in enumerate(nodes[:k])
+        ]
+
+    def invalidate(self, user_id: Optional[int] = None):
+        with self._lock:
+            if user_id is None:
+                self._scores.clear()
+            else:
+                self._scores.pop(user_id, None)
+
+    # --- PERSISTENZA ---
+
+    @staticmethod
+    def _load(conn, user_id: int, graph: CSRKnowledgeGraph,
+              version: Tuple[int, int, int]) -> Optional[CentralityScores]:
+        run = conn.execute("""
+            SELECT graph_version, node_count, edge_count, computed_at
+            FROM graph_centrality_runs WHERE user_id = ?
+        """, (user_id,)).fetchone()
+        if run is None or (run['graph_version'], run['node_count'], run['edge_count']) != version:
+            return None
+
+        rows = conn.execute("""
+            SELECT entity_id, weighted_degree, pagerank, betweenness
+            FROM graph_centrality_scores WHERE user_id = ?
+        """, (user_id,)).fetchall()
+        size = len(graph.entity_ids)
+        scores = {metric: np.zeros(size) for metric in CENTRALITY_METRICS}
+        for row in rows:
+            node = graph.node_for_entity_id(row['entity_id'])
+            if node is None:
+                return None
+            for metric in CENTRALITY_METRICS:
+                scores[metric][node] = row[metric]
+        return CentralityScores(version, scores, run['computed_at'])
+
+    @staticmethod
+    def _persist(conn, user_id: int, graph: CSRKnowledgeGraph, scores: CentralityScores, duration: float):
+        nodes = np.nonzero(graph.alive)[0]
+        values = {metric: scores.scores[metric][nodes].tolist() for metric in CENTRALITY_METRICS}
+        graph_version, node_count, edge_count = scores.version
+        try:
+            conn.execute("DELETE FROM graph_centrality_scores WHERE user_id = ?", (user_id,))
+            conn.executemany("""
+                INSERT INTO graph_centrality_scores (user_id, entity_id, weighted_degree, pagerank, betweenness)
+                VALUES (?, ?, ?, ?, ?)
+            """, zip([user_id] * len(nodes), graph.entity_ids[nodes].tolist(),
+                     values['weighted_degree'], values['pagerank'], values['betweenness']))
+            conn.execute("""
+                INSERT INTO graph_centrality_runs (user_id, graph_version, node_count, edge_count, duration_ms, computed_at)
+                VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT(user_id) DO UPDATE SET
+                    graph_version = excluded.graph_version, node_count = excluded.node_count,
+                    edge_count = excluded.edge_count, duration_ms = excluded.duration_ms,
+                    computed_at = excluded.computed_at
+            """, (user_id, graph_version, node_count, edge_count, duration * 1000, scores.computed_at))
+            conn.commit()
+        except Exception as e:
+            # Il salvataggio è solo una cache condivisa: i punteggi restano validi in memoria
+            conn.rollback()
+            logger.warning(f"Centrality scores for user {user_id} not persisted: {e}")
+            return
+        logger.info(f"Centrality for user {user_id} computed: {node_count} nodes, "
+                    f"{edge_count} edges in {duration * 1000:.0f}ms")
+
+
+# --- ISTANZA GLOBALE ---
+graph_centrality_service = GraphCentralityService()
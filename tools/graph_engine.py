@@ -0,0 +1,511 @@
+# -*- coding: utf-8 -*-
+"""
+Motore del Grafo della Conoscenza in formato compatto (CSR)
+
+Il grafo di un utente viene caricato una sola volta in array NumPy:
+nodi con id interi, adiacenza CSR (indptr/indices) non orientata, array di
+confidenza e di tipo. Vicinato, k-hop, gradi e filtri di confidenza sono
+calcolati in forma vettoriale invece di scorrere liste di dizionari.
+
+Il registro dei motori mantiene un'istanza per utente e la aggiorna in modo
+incrementale leggendo il log delle modifiche `knowledge_graph_changes`
+(popolato dai trigger su concept_entities e concept_relationships); oltre
+una certa quantità di modifiche il grafo viene ricostruito da zero.
+Le patch vengono applicate a una copia che sostituisce l'istanza in un solo
+passo: chi sta leggendo il grafo precedente non vede mai uno stato a metà.
+"""
+import time
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# --- CONFIGURAZIONE ---
+PATCH_MAX_CHANGES = 2000        # oltre questo numero di modifiche si ricostruisce il grafo
+PATCH_MAX_RATIO = 0.05          # ...o oltre il 5% degli archi
+ENGINE_MAX_AGE_SECONDS = 3600   # ricostruzione completa periodica (il log viene potato)
+ENGINE_CACHE_SIZE = 8           # utenti mantenuti in memoria
+SQLITE_MAX_VARIABLES = 900
+
+
+def _chunks(values: List[Any], size: int = SQLITE_MAX_VARIABLES) -> Iterable[List[Any]]:
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+# --- GRAFO CSR ---
+
+class CSRKnowledgeGraph:
+    """
+    Grafo della conoscenza di un utente in strutture array.
+
+    Nodi: indici 0..n-1 con `entity_ids`, `names`, `type_codes`, `confidence`,
+    `sources` e maschera `alive` (entità cancellate dopo una patch).
+    Archi: array COO (`edge_ids`, `edge_src`, `edge_dst`, `edge_conf`,
+    `edge_type_codes`) da cui viene derivata l'adiacenza CSR simmetrica.
+    """
+
+    def __init__(self, entity_ids, names, types, confidence, sources,
+                 edge_ids, edge_src_entity, edge_dst_entity, edge_conf, edge_types):
+        self.type_labels: List[str] = []
+        self._type_codes: Dict[str, int] = {}
+        self.relationship_labels: List[str] = []
+        self._relationship_codes: Dict[str, int] = {}
+
+        self.entity_ids = np.asarray(entity_ids, dtype=np.int64)
+        self.names = np.asarray(names, dtype=object)
+        self.type_codes = np.asarray([self._code(self._type_codes, self.type_labels, t) for t in types], dtype=np.int16)
+        self.confidence = np.asarray(confidence, dtype=np.float32)
+        self.sources = np.asarray(sources, dtype=object)
+        self.alive = np.ones(len(self.entity_ids), dtype=bool)
+        self.change_id = 0  # ultima modifica del log applicata (versione del grafo)
+        self._rebuild_node_index()
+
+        src, dst, keep = self._map_endpoints(edge_src_entity, edge_dst_entity)
+        self.edge_ids = np.asarray(edge_ids, dtype=np.int64)[keep]
+        self.edge_src = src[keep]
+        self.edge_dst = dst[keep]
+        self.edge_conf = np.asarray(edge_conf, dtype=np.float32)[keep]
+        self.edge_type_codes = np.asarray(
+            [self._code(self._relationship_codes, self.relationship_labels, t) for t in edge_types],
+            dtype=np.int16
+        )[keep] if len(edge_types) else np.zeros(0, dtype=np.int16)
+        self._rebuild_edge_index()
+
+        self._build_csr()
+
+    @classmethod
+    def from_rows(cls, entities: List[Dict[str, Any]], relationships: List[Dict[str, Any]]) -> "CSRKnowledgeGraph":
+        """Costruisce il grafo dalle righe di concept_entities e concept_relationships."""
+        return cls(
+            entity_ids=[e['id'] for e in entities],
+            names=[e['entity_name'] for e in entities],
+            types=[e['entity_type'] for e in entities],
+            confidence=[e.get('confidence_score') if e.get('confidence_score') is not None else 0.5 for e in entities],
+            sources=[e.get('source_file_name') for e in entities],
+            edge_ids=[r['id'] for r in relationships],
+            edge_src_entity=[r['source_entity_id'] for r in relationships],
+            edge_dst_entity=[r['target_entity_id'] for r in relationships],
+            edge_conf=[r.get('confidence_score') if r.get('confidence_score') is not None else 0.5 for r in relationships],
+            edge_types=[r['relationship_type'] for r in relationships],
+        )
+
+    # --- COSTRUZIONE ---
+
+    @staticmethod
+    def _code(codes: Dict[str, int], labels: List[str], label: str) -> int:
+        code = codes.get(label)
+        if code is None:
+            code = codes[label] = len(labels)
+            labels.append(label)
+        return code
+
+    def _rebuild_node_index(self):
+        self._node_by_entity = {int(eid): i for i, eid in enumerate(self.entity_ids)}
+        self._nodes_by_name: Dict[str, List[int]] = {}
+        for i, name in enumerate(self.names):
+            if self.alive[i]:
+                self._nodes_by_name.setdefault(name, []).append(i)
+
+    def _rebuild_edge_index(self):
+        self._edge_pos = {int(rid): i for i, rid in enumerate(self.edge_ids)}
+
+    def _map_endpoints(self, src_entities, dst_entities) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Converte gli id entità degli estremi in indici nodo (-1 se sconosciuti)."""
+        src = np.fromiter((self._node_by_entity.get(int(e), -1) for e in src_entities), dtype=np.int64, count=len(src_entities))
+        dst = np.fromiter((self._node_by_entity.get(int(e), -1) for e in dst_entities), dtype=np.int64, count=len(dst_entities))
+        return src, dst, (src >= 0) & (dst >= 0)
+
+    def _build_csr(self):
+        """Deriva l'adiacenza CSR simmetrica dagli archi COO validi."""
+        n = len(self.entity_ids)
+        valid = np.nonzero(self.alive[self.edge_src] & self.alive[self.edge_dst])[0] if len(self.edge_src) else np.zeros(0, dtype=np.int64)
+
+        rows = np.concatenate([self.edge_src[valid], self.edge_dst[valid]])
+        cols = np.concatenate([self.edge_dst[valid], self.edge_src[valid]])
+        edge_pos = np.concatenate([valid, valid])
+
+        order = np.argsort(rows, kind='stable')
+        self.adj_rows = rows[order]
+        self.indices = cols[order]
+        self.adj_edges = edge_pos[order]
+        self.indptr = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(np.bincount(self.adj_rows, minlength=n), out=self.indptr[1:])
+        self.version = getattr(self, 'version', 0) + 1
+
+    # --- PROPRIETÀ ---
+
+    @property
+    def num_nodes(self) -> int:
+        return int(self.alive.sum())
+
+    @property
+    def num_edges(self) -> int:
+        return len(self.adj_edges) // 2
+
+    def nodes_for_name(self, entity_name: str) -> List[int]:
+        return self._nodes_by_name.get(entity_name, [])
+
+    def node_index(self, entity_name: str) -> Optional[int]:
+        nodes = self.nodes_for_name(entity_name)
+        return nodes[0] if nodes else None
+
+    def node_for_entity_id(self, entity_id: int) -> Optional[int]:
+        node = self._node_by_entity.get(int(entity_id))
+        return node if node is not None and self.alive[node] else None
+
+    def type_code(self, entity_type: str) -> int:
+        return self._type_codes.get(entity_type, -1)
+
+    # --- QUERY VETTORIALI ---
+
+    def _gather(self, frontier: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Vicini e posizioni arco di un insieme di nodi, senza cicli Python."""
+        starts = self.indptr[frontier]
+        lengths = self.indptr[frontier + 1] - starts
+        total = int(lengths.sum())
+        if total == 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+        offsets = np.cumsum(lengths) - lengths
+        positions = np.arange(total) - np.repeat(offsets, lengths) + np.repeat(starts, lengths)
+        return self.indices[positions], self.adj_edges[positions]
+
+    def frontier_edges(self, frontier: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Coppie (nodo della frontiera, vicino) per tutte le voci di adiacenza della frontiera."""
+        nbrs, _ = self._gather(frontier)
+        lengths = self.indptr[frontier + 1] - self.indptr[frontier]
+        return np.repeat(frontier, lengths), nbrs
+
+    def neighbors(self, node: int, min_confidence: float = 0.0) -> np.ndarray:
+        """Vicini diretti di un nodo (archi con confidenza >= soglia)."""
+        nbrs, edges = self._gather(np.asarray([node], dtype=np.int64))
+        if min_confidence > 0:
+            nbrs = nbrs[self.edge_conf[edges] >= min_confidence]
+        return np.unique(nbrs)
+
+    def k_hop(self, start, k: int, min_confidence: float = 0.0) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Nodi raggiungibili entro k passi (BFS per livelli sulla frontiera).
+
+        Args:
+            start: Indice nodo o sequenza di indici di partenza
+            k: Profondità massima
+            min_confidence: Soglia di confidenza degli archi attraversati
+
+        Returns:
+            (nodi, profondità) ordinati per indice nodo
+        """
+        depth = np.full(len(self.entity_ids), -1, dtype=np.int32)
+        frontier = np.unique(np.atleast_1d(np.asarray(start, dtype=np.int64)))
+        depth[frontier] = 0
+
+        for level in range(1, k + 1):
+            nbrs, edges = self._gather(frontier)
+            if min_confidence > 0:
+                nbrs = nbrs[self.edge_conf[edges] >= min_confidence]
+            nbrs = np.unique(nbrs)
+            frontier = nbrs[depth[nbrs] < 0]
+            if frontier.size == 0:
+                break
+            depth[frontier] = level
+
+        nodes = np.nonzero(depth >= 0)[0]
+        return nodes, depth[nodes]
+
+    def edges_within(self, nodes: np.ndarray, min_confidence: float = 0.0) -> np.ndarray:
+        """Posizioni degli archi con entrambi gli estremi nell'insieme di nodi."""
+        member = np.zeros(len(self.entity_ids), dtype=bool)
+        member[nodes] = True
+        mask = member[self.edge_src] & member[self.edge_dst] & self.alive[self.edge_src] & self.alive[self.edge_dst]
+        if min_confidence > 0:
+            mask &= self.edge_conf >= min_confidence
+        return np.nonzero(mask)[0]
+
+    def _adjacency_mask(self, min_confidence: float) -> Optional[np.ndarray]:
+        return self.edge_conf[self.adj_edges] >= min_confidence if min_confidence > 0 else None
+
+    def degree(self, min_confidence: float = 0.0) -> np.ndarray:
+        """Grado di ogni nodo (archi con confidenza >= soglia)."""
+        mask = self._adjacency_mask(min_confidence)
+        if mask is None:
+            return np.diff(self.indptr)
+        return np.bincount(self.adj_rows[mask], minlength=len(self.entity_ids))
+
+    def weighted_degree(self, min_confidence: float = 0.0) -> np.ndarray:
+        """Somma delle confidenze degli archi incidenti."""
+        weights = self.edge_conf[self.adj_edges].astype(np.float64)
+        mask = self._adjacency_mask(min_confidence)
+        if mask is not None:
+            weights = np.where(mask, weights, 0.0)
+        return np.bincount(self.adj_rows, weights=weights, minlength=len(self.entity_ids))
+
+    def degree_centrality(self, min_confidence: float = 0.0) -> np.ndarray:
+        """Grado normalizzato su n-1 (come networkx.degree_centrality)."""
+        n = self.num_nodes
+        return self.degree(min_confidence) / (n - 1) if n > 1 else np.zeros(len(self.entity_ids))
+
+    def node_mask(self, min_confidence: float = 0.0, entity_type: Optional[str] = None) -> np.ndarray:
+        """Maschera dei nodi vivi con confidenza >= soglia ed eventualmente del tipo indicato."""
+        mask = self.alive & (self.confidence >= min_confidence)
+        if entity_type is not None:
+            mask &= self.type_codes == self.type_code(entity_type)
+        return mask
+
+    def edge_mask(self, min_confidence: float = 0.0, node_mask: Optional[np.ndarray] = None) -> np.ndarray:
+        """Maschera degli archi con confidenza >= soglia (e con estremi nella maschera nodi)."""
+        mask = (self.edge_conf >= min_confidence) & self.alive[self.edge_src] & self.alive[self.edge_dst]
+        if node_mask is not None:
+            mask &= node_mask[self.edge_src] & node_mask[self.edge_dst]
+        return mask
+
+    def top_k(self, scores: np.ndarray, k: int, node_mask: Optional[np.ndarray] = None) -> np.ndarray:
+        """Indici dei k nodi con punteggio più alto (argpartition, O(n))."""
+        scores = np.where(node_mask if node_mask is not None else self.alive, scores, -np.inf)
+        k = min(k, int(np.isfinite(scores).sum()))
+        if k <= 0:
+            return np.zeros(0, dtype=np.int64)
+        candidates = np.argpartition(-scores, k - 1)[:k]
+        return candidates[np.argsort(-scores[candidates], kind='stable')]
+
+    def summary(self, min_confidence: float = 0.0, entity_type: Optional[str] = None) -> Dict[str, Any]:
+        """Conteggi per la pagina del grafo (entità, relazioni, tipi, documenti sorgente)."""
+        nodes = self.node_mask(min_confidence, entity_type)
+        alive_sources = self.sources[self.alive]
+        return {
+            'entities': int(nodes.sum()),
+            'relationships': int(self.edge_mask(min_confidence).sum()),
+            'entity_types': int(np.unique(self.type_codes[self.alive]).size),
+            'sources': len(set(alive_sources.tolist())),
+        }
+
+    # --- PATCH INCREMENTALI ---
+
+    # Array e tabelle dei codici modificati elemento per elemento da apply_changes
+    _MUTABLE_ARRAYS = ('names', 'type_codes', 'confidence', 'sources', 'alive',
+                       'edge_ids', 'edge_src', 'edge_dst', 'edge_conf', 'edge_type_codes')
+
+    def copy(self) -> "CSRKnowledgeGraph":
+        """Copia su cui applicare una patch senza toccare l'istanza condivisa con altri thread."""
+        clone = object.__new__(type(self))
+        clone.__dict__.update(self.__dict__)
+        for name in self._MUTABLE_ARRAYS:
+            setattr(clone, name, getattr(self, name).copy())
+        clone.type_labels = list(self.type_labels)
+        clone._type_codes = dict(self._type_codes)
+        clone.relationship_labels = list(self.relationship_labels)
+        clone._relationship_codes = dict(self._relationship_codes)
+        return clone
+
+    def with_changes(self, entity_rows: List[Dict[str, Any]], relationship_rows: List[Dict[str, Any]],
+                     deleted_entity_ids: Iterable[int] = (),
+                     deleted_relationship_ids: Iterable[int] = ()) -> Optional["CSRKnowledgeGraph"]:
+        """
+        Nuovo grafo con le modifiche applicate; questa istanza resta invariata.
+
+        Returns:
+            Il grafo aggiornato, o None se serve una ricostruzione completa
+        """
+        patched = self.copy()
+        if not patched.apply_changes(entity_rows, relationship_rows, deleted_entity_ids, deleted_relationship_ids):
+            return None
+        return patched
+
+    def apply_changes(self, entity_rows: List[Dict[str, Any]], relationship_rows: List[Dict[str, Any]],
+                      deleted_entity_ids: Iterable[int] = (), deleted_relationship_ids: Iterable[int] = ()) -> bool:
+        """
+        Applica inserimenti, aggiornamenti e cancellazioni senza ricaricare il grafo.
+
+        Modifica l'istanza in place: per un grafo già condiviso usare `with_changes`.
+
+        Returns:
+            False se una relazione punta a un'entità sconosciuta (serve una ricostruzione)
+        """
+        # Entità: aggiornamento in place o aggiunta in coda
+        new_entities = []
+        for row in entity_rows:
+            node = self._node_by_entity.get(int(row['id']))
+            if node is None:
+                new_entities.append(row)
+                continue
+            self.names[node] = row['entity_name']
+            self.type_codes[node] = self._code(self._type_codes, self.type_labels, row['entity_type'])
+            self.confidence[node] = row.get('confidence_score') if row.get('confidence_score') is not None else 0.5
+            self.sources[node] = row.get('source_file_name')
+            self.alive[node] = True
+        if new_entities:
+            self.entity_ids = np.concatenate([self.entity_ids, np.asarray([r['id'] for r in new_entities], dtype=np.int64)])
+            self.names = np.concatenate([self.names, np.asarray([r['entity_name'] for r in new_entities], dtype=object)])
+            self.type_codes = np.concatenate([self.type_codes, np.asarray(
+                [self._code(self._type_codes, self.type_labels, r['entity_type']) for r in new_entities], dtype=np.int16)])
+            self.confidence = np.concatenate([self.confidence, np.asarray(
+                [r.get('confidence_score') if r.get('confidence_score') is not None else 0.5 for r in new_entities], dtype=np.float32)])
+            self.sources = np.concatenate([self.sources, np.asarray([r.get('source_file_name') for r in new_entities], dtype=object)])
+            self.alive = np.concatenate([self.alive, np.ones(len(new_entities), dtype=bool)])
+
+        for entity_id in deleted_entity_ids:
+            node = self._node_by_entity.get(int(entity_id))
+            if node is not None:
+                self.alive[node] = False
+        self._rebuild_node_index()
+
+        # Relazioni: cancellazioni, poi aggiornamenti e inserimenti
+        deleted_positions = [self._edge_pos[int(rid)] for rid in deleted_relationship_ids if int(rid) in self._edge_pos]
+        if deleted_positions:
+            keep = np.ones(len(self.edge_ids), dtype=bool)
+            keep[deleted_positions] = False
+            self.edge_ids, self.edge_src, self.edge_dst = self.edge_ids[keep], self.edge_src[keep], self.edge_dst[keep]
+            self.edge_conf, self.edge_type_codes = self.edge_conf[keep], self.edge_type_codes[keep]
+            self._rebuild_edge_index()
+
+        new_relationships = []
+        for row in relationship_rows:
+            src = self._node_by_entity.get(int(row['source_entity_id']))
+            dst = self._node_by_entity.get(int(row['target_entity_id']))
+            if src is None or dst is None:
+                return False
+            position = self._edge_pos.get(int(row['id']))
+            conf = row.get('confidence_score') if row.get('confidence_score') is not None else 0.5
+            type_code = self._code(self._relationship_codes, self.relationship_labels, row['relationship_type'])
+            if position is None:
+                new_relationships.append((int(row['id']), src, dst, conf, type_code))
+            else:
+                self.edge_src[position], self.edge_dst[position] = src, dst
+                self.edge_conf[position], self.edge_type_codes[position] = conf, type_code
+        if new_relationships:
+            ids, srcs, dsts, confs, codes = zip(*new_relationships)
+            self.edge_ids = np.concatenate([self.edge_ids, np.asarray(ids, dtype=np.int64)])
+            self.edge_src = np.concatenate([self.edge_src, np.asarray(srcs, dtype=np.int64)])
+            self.edge_dst = np.concatenate([self.edge_dst, np.asarray(dsts, dtype=np.int64)])
+            self.edge_conf = np.concatenate([self.edge_conf, np.asarray(confs, dtype=np.float32)])
+            self.edge_type_codes = np.concatenate([self.edge_type_codes, np.asarray(codes, dtype=np.int16)])
+            self._rebuild_edge_index()
+
+        self._build_csr()
+        return True
+
+
+# --- REGISTRO DEI MOTORI PER UTENTE ---
+
+class KnowledgeGraphEngineRegistry:
+    """
+    Mantiene un CSRKnowledgeGraph per utente, sincronizzato col database.
+
+    A ogni richiesta legge le modifiche successive all'ultima applicata
+    (una query indicizzata): nessuna modifica -> grafo in cache; poche
+    modifiche -> patch incrementale; molte -> ricostruzione completa.
+    """
+
+    def __init__(self, max_users: int = ENGINE_CACHE_SIZE):
+        self.max_users = max_users
+        self._engines: "OrderedDict[int, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.RLock()
+        self.stats = {'hits': 0, 'patches': 0, 'rebuilds': 0}
+
+    def get(self, user_id: int, connect: Callable) -> CSRKnowledgeGraph:
+        """
+        Restituisce il grafo aggiornato di un utente.
+
+        Args:
+            user_id: ID utente
+            connect: Factory di connessioni SQLite (es. file_utils.db_connect)
+        """
+        with self._lock:
+            entry = self._engines.get(user_id)
+            with connect() as conn:
+                if entry is None or time.time() - entry['built_at'] > ENGINE_MAX_AGE_SECONDS:
+                    entry = self._rebuild(conn, user_id)
+                else:
+                    entry = self._sync(conn, user_id, entry)
+            self._engines[user_id] = entry
+            self._engines.move_to_end(user_id)
+            while len(self._engines) > self.max_users:
+                self._engines.popitem(last=False)
+            return entry['graph']
+
+    def invalidate(self, user_id: Optional[int] = None):
+        with self._lock:
+            if user_id is None:
+                self._engines.clear()
+            else:
+                self._engines.pop(user_id, None)
+
+    def _last_change_id(self, conn, user_id: int) -> int:
+        row = conn.execute(
+            "SELECT COALESCE(MAX(id), 0) FROM knowledge_graph_changes WHERE user_id = ?", (user_id,)
+        ).fetchone()
+        return int(row[0])
+
+    def _rebuild(self, conn, user_id: int) -> Dict[str, Any]:
+        started = time.perf_counter()
+        # L'id dell'ultima modifica va letto prima dei dati: le modifiche concorrenti
+        # verranno riapplicate alla prossima sincronizzazione (le patch sono idempotenti)
+        last_change_id = self._last_change_id(conn, user_id)
+        entities = [dict(r) for r in conn.execute("""
+            SELECT id, entity_name, entity_type, confidence_score, source_file_name
+            FROM concept_entities WHERE user_id = ?
+        """, (user_id,)).fetchall()]
+        relationships = [dict(r) for r in conn.execute("""
+            SELECT id, source_entity_id, target_entity_id, relationship_type, confidence_score
+            FROM concept_relationships WHERE user_id = ?
+        """, (user_id,)).fetchall()]
+        graph = CSRKnowledgeGraph.from_rows(entities, relationships)
+        graph.change_id = last_change_id
+        self.stats['rebuilds'] += 1
+        logger.info(f"Knowledge graph for user {user_id} built: {graph.num_nodes} nodes, "
+                    f"{graph.num_edges} edges in {(time.perf_counter() - started) * 1000:.0f}ms")
+        return {'graph': graph, 'last_change_id': last_change_id, 'built_at': time.time()}
+
+    def _sync(self, conn, user_id: int, entry: Dict[str, Any]) -> Dict[str, Any]:
+        changes = conn.execute("""
+            SELECT id, entity_kind, row_id, operation FROM knowledge_graph_changes
+            WHERE user_id = ? AND id > ? ORDER BY id
+        """, (user_id, entry['last_change_id'])).fetchall()
+        if not changes:
+            self.stats['hits'] += 1
+            return entry
+
+        graph = entry['graph']
+        patch_limit = min(PATCH_MAX_CHANGES, max(100, int(graph.num_edges * PATCH_MAX_RATIO)))
+        if len(changes) > patch_limit:
+            return self._rebuild(conn, user_id)
+
+        # Ultima operazione per riga
+        latest: Dict[Tuple[str, int], str] = {}
+        for change in changes:
+            latest[(change['entity_kind'], int(change['row_id']))] = change['operation']
+
+        def fetch(table: str, columns: str, ids: List[int]) -> List[Dict[str, Any]]:
+            rows = []
+            for chunk in _chunks(ids):
+                rows.extend(dict(r) for r in conn.execute(
+                    f"SELECT {columns} FROM {table} WHERE id IN ({','.join('?' * len(chunk))})", chunk
+                ).fetchall())
+            return rows
+
+        upserted_entities = [rid for (kind, rid), op in latest.items() if kind == 'entity' and op != 'delete']
+        upserted_relationships = [rid for (kind, rid), op in latest.items() if kind == 'relationship' and op != 'delete']
+        entity_rows = fetch('concept_entities', 'id, entity_name, entity_type, confidence_score, source_file_name', upserted_entities)
+        relationship_rows = fetch('concept_relationships', 'id, source_entity_id, target_entity_id, relationship_type, confidence_score', upserted_relationships)
+
+        # Righe cancellate nel frattempo: trattate come cancellazioni
+        found_entities = {r['id'] for r in entity_rows}
+        found_relationships = {r['id'] for r in relationship_rows}
+        deleted_entities = [rid for (kind, rid), op in latest.items() if kind == 'entity' and (op == 'delete' or rid not in found_entities)]
+        deleted_relationships = [rid for (kind, rid), op in latest.items() if kind == 'relationship' and (op == 'delete' or rid not in found_relationships)]
+
+        patched = graph.with_changes(entity_rows, relationship_rows, deleted_entities, deleted_relationships)
+        if patched is None:
+            return self._rebuild(conn, user_id)
+
+        self.stats['patches'] += 1
+        # Nuova voce: i lettori che hanno ancora il grafo precedente continuano a usarlo invariato
+        patched.change_id = int(changes[-1]['id'])
+        return {'graph': patched, 'last_change_id': patched.change_id, 'built_at': entry['built_at']}
+
+
+# --- ISTANZA GLOBALE ---
+knowledge_graph_registry = KnowledgeGraphEngineRegistry()
@@ -5,7 +5,9 @@ utilizzata per categorizzare automaticamente i documenti.
 
 Include modelli Bayesian per la gestione dinamica della conoscenza con punteggi di confidenza.
 """
+import os
 import re
+from functools import lru_cache
 from pydantic import BaseModel, Field
 from typing import List, Optional
 from datetime import datetime
@@ -76,14 +78,19 @@ def get_category_choices():
             choices.append((full_id, full_description))
     return choices
 
+@lru_cache(maxsize=4)
+def _read_manual(manual_filepath, mtime):
+    """Contenuto del manuale, riletto dal disco solo quando cambia la data di modifica."""
+    with open(manual_filepath, 'r', encoding='utf-8') as f:
+        return f.read()
+
 def get_structure_for_prompt(manual_filepath="Master_Indexing_Manual.md"):
     """
     Loads the detailed indexing manual from a file and formats it
     for an LLM prompt.
     """
     try:
-        with open(manual_filepath, 'r', encoding='utf-8') as f:
-            manual_content = f.read()
+        manual_content = _read_manual(manual_filepath, os.path.getmtime(manual_filepath))
     except FileNotFoundError:
         error_message = (
             f"ERRORE CRITICO: Il file del manuale di indicizzazione '{manual_filepath}' non è stato trovato. "
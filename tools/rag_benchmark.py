@@ -0,0 +1,509 @@
+# -*- coding: utf-8 -*-
+"""
+Harness di valutazione e benchmark del RAG
+
+Valuta un insieme di domande contro una o più configurazioni di retriever
+(top-k, chunking, keyword / vector / hybrid) con un pool asyncio limitato.
+Per ogni domanda registra latenza di retrieval, recall@k sui documenti di
+riferimento, faithfulness della risposta ed eventuali altri punteggi
+(answer e context relevancy); per ogni configurazione i percentili di
+latenza e le medie. I report sono JSON versionati
+(`rag_benchmark_v0001.json`, ...) e `find_regressions` confronta un report
+con il precedente.
+
+Tutto funziona offline: retriever locali (BM25, embedding a hashing,
+fusione RRF), un LLM stub estrattivo e un giudice di faithfulness per
+sovrapposizione lessicale. Gli adattatori LlamaIndex permettono di usare
+lo stesso harness con l'indice e gli evaluator reali.
+"""
+import asyncio
+import glob
+import hashlib
+import json
+import math
+import os
+import re
+import time
+import zlib
+from collections import Counter, defaultdict
+from dataclasses import asdict, dataclass, field
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+
+# --- CONFIGURAZIONE ---
+REPORT_SCHEMA_VERSION = 1
+REPORT_DIR = "benchmark_reports"
+REPORT_PATTERN = "rag_benchmark_v{version:04d}.json"
+DEFAULT_CONCURRENCY = 8
+LATENCY_PERCENTILES = (50, 90, 95, 99)
+RRF_K = 60                        # costante della reciprocal rank fusion
+EMBEDDING_DIMENSIONS = 512
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+_SENTENCE_RE = re.compile(r"(?<=[.!?])\s+")
+
+
+def tokenize(text: str) -> List[str]:
+    """Token minuscoli alfanumerici."""
+    return _TOKEN_RE.findall(text.lower()) if text else []
+
+
+# --- DATI ---
+
+@dataclass
+class EvalQuestion:
+    """Domanda di valutazione con i documenti che contengono la risposta."""
+    query: str
+    relevant_documents: List[str]
+    reference_answer: str = ""
+
+
+@dataclass
+class Chunk:
+    """Porzione di documento indicizzata dai retriever."""
+    document_id: str
+    text: str
+    score: float = 0.0
+
+
+@dataclass
+class RetrieverConfig:
+    """Configurazione confrontata nel benchmark."""
+    name: str
+    mode: str = "hybrid"          # 'keyword', 'vector', 'hybrid'
+    top_k: int = 5
+    chunk_size: int = 200         # parole per chunk
+    chunk_overlap: int = 40
+
+
+@dataclass
+class QuestionResult:
+    """Esito della valutazione di una domanda."""
+    query: str
+    retrieved_documents: List[str]
+    recall_at_k: float
+    faithfulness: Optional[float]
+    retrieval_latency_ms: float
+    total_latency_ms: float
+    answer: str = ""
+    error: Optional[str] = None
+    scores: Dict[str, Optional[float]] = field(default_factory=dict)
+
+
+def chunk_documents(documents: Dict[str, str], chunk_size: int, chunk_overlap: int) -> List[Chunk]:
+    """Divide i documenti in finestre di `chunk_size` parole sovrapposte di `chunk_overlap`."""
+    if chunk_size <= 0 or not 0 <= chunk_overlap < chunk_size:
+        raise ValueError("chunk_size deve essere positivo e chunk_overlap compreso tra 0 e chunk_size")
+    step = chunk_size - chunk_overlap
+    chunks = []
+    for document_id, text in documents.items():
+        words = (text or "").split()
+        for start in range(0, max(len(words) - chunk_overlap, 1), step):
+            window = words[start:start + chunk_size]
+            if window:
+                chunks.append(Chunk(document_id, " ".join(window)))
+    return chunks
+
+
+# --- RETRIEVER LOCALI ---
+
+class KeywordRetriever:
+    """Retriever BM25 su indice invertito in memoria."""
+
+    def __init__(self, chunks: List[Chunk], k1: float = 1.5, b: float = 0.75):
+        self.chunks = chunks
+        self.k1, self.b = k1, b
+        self.postings: Dict[str, List[tuple]] = defaultdict(list)
+        self.lengths = []
+        for index, chunk in enumerate(chunks):
+            counts = Counter(tokenize(chunk.text))
+            self.lengths.append(sum(counts.values()))
+            for term, count in counts.items():
+                self.postings[term].append((index, count))
+        self.avg_length = (sum(self.lengths) / len(self.lengths)) if self.lengths else 0.0
+
+    def retrieve(self, query: str, top_k: int) -> List[Chunk]:
+        scores: Dict[int, float] = defaultdict(float)
+        total = len(self.chunks)
+        for term in set(tokenize(query)):
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (total - len(postings) + 0.5) / (len(postings) + 0.5))
+            for index, count in postings:
+                norm = self.k1 * (1 - self.b + self.b * self.lengths[index] / (self.avg_length or 1))
+                scores[index] += idf * count * (self.k1 + 1) / (count + norm)
+        best = sorted(scores.items(), key=lambda item: (-item[1], item[0]))[:top_k]
+        return [Chunk(self.chunks[i].document_id, self.chunks[i].text, score) for i, score in best]
+
+
+class HashingEmbedder:
+    """Embedding deterministico offline: bag-of-words con hashing, normalizzato L2."""
+
+    def __init__(self, dimensions: int = EMBEDDING_DIMENSIONS):
+        self.dimensions = dimensions
+
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        matrix = np.zeros((len(texts), self.dimensions), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for token in tokenize(text):
+                matrix[row, zlib.crc32(token.encode("utf-8")) % self.dimensions] += 1.0
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        return matrix / np.where(norms == 0, 1.0, norms)
+
+
+class VectorRetriever:
+    """Retriever per similarità coseno sugli embedding dei chunk."""
+
+    def __init__(self, chunks: List[Chunk], embedder=None):
+        self.chunks = chunks
+        self.embedder = embedder or HashingEmbedder()
+        self.matrix = self.embedder.embed([chunk.text for chunk in chunks]) if chunks else None
+
+    def retrieve(self, query: str, top_k: int) -> List[Chunk]:
+        if self.matrix is None:
+            return []
+        scores = self.matrix @ self.embedder.embed([query])[0]
+        top_k = min(top_k, len(scores))
+        best = np.argpartition(-scores, top_k - 1)[:top_k]
+        best = best[np.argsort(-scores[best], kind="stable")]
+        return [Chunk(self.chunks[i].document_id, self.chunks[i].text, float(scores[i])) for i in best]
+
+
+class HybridRetriever:
+    """Fusione RRF dei risultati keyword e vector."""
+
+    def __init__(self, retrievers: Sequence[Any], candidates_factor: int = 2):
+        self.retrievers = retrievers
+        self.candidates_factor = candidates_factor
+
+    def retrieve(self, query: str, top_k: int) -> List[Chunk]:
+        fused: Dict[tuple, float] = defaultdict(float)
+        chunks: Dict[tuple, Chunk] = {}
+        for retriever in self.retrievers:
+            for rank, chunk in enumerate(retriever.retrieve(query, top_k * self.candidates_factor)):
+                key = (chunk.document_id, chunk.text)
+                fused[key] += 1.0 / (RRF_K + rank + 1)
+                chunks.setdefault(key, chunk)
+        best = sorted(fused.items(), key=lambda item: -item[1])[:top_k]
+        return [Chunk(chunks[key].document_id, chunks[key].text, score) for key, score in best]
+
+
+def build_local_retriever(documents: Dict[str, str], config: RetrieverConfig, embedder=None):
+    """Retriever locale per una configurazione (chunking e modalità)."""
+    chunks = chunk_documents(documents, config.chunk_size, config.chunk_overlap)
+    if config.mode == "keyword":
+        return KeywordRetriever(chunks)
+    if config.mode == "vector":
+        return VectorRetriever(chunks, embedder)
+    if config.mode == "hybrid":
+        return HybridRetriever([KeywordRetriever(chunks), VectorRetriever(chunks, embedder)])
+    raise ValueError(f"Modalità di retrieval non valida: {config.mode}")
+
+
+# --- LLM E GIUDICE OFFLINE ---
+
+class StubLLM:
+    """
+    LLM locale deterministico: risponde con le frasi dei contesti che
+    condividono più termini con la domanda. `latency` simula il tempo di
+    generazione di un modello reale.
+    """
+
+    def __init__(self, max_sentences: int = 2, latency: float = 0.0):
+        self.max_sentences = max_sentences
+        self.latency = latency
+
+    async def aanswer(self, query: str, contexts: List[str]) -> str:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        query_terms = set(tokenize(query))
+        sentences = [s for context in contexts for s in _SENTENCE_RE.split(context) if s.strip()]
+        ranked = sorted(sentences, key=lambda s: -len(query_terms & set(tokenize(s))))
+        return " ".join(ranked[:self.max_sentences])
+
+
+class OverlapFaithfulnessJudge:
+    """Faithfulness offline: quota di frasi della risposta supportate dai contesti."""
+
+    def __init__(self, support_threshold: float = 0.8):
+        self.support_threshold = support_threshold
+
+    async def ascore(self, query: str, answer: str, contexts: List[str]) -> Optional[float]:
+        sentences = [s for s in _SENTENCE_RE.split(answer or "") if tokenize(s)]
+        if not sentences:
+            return None
+        context_terms = set(tokenize(" ".join(contexts)))
+        supported = 0
+        for sentence in sentences:
+            terms = tokenize(sentence)
+            if sum(1 for term in terms if term in context_terms) / len(terms) >= self.support_threshold:
+                supported += 1
+        return supported / len(sentences)
+
+
+# --- ADATTATORI LLAMAINDEX ---
+
+class LlamaIndexRetriever:
+    """Adatta un retriever LlamaIndex (index.as_retriever) all'interfaccia dell'harness."""
+
+    def __init__(self, retriever_factory: Callable[[int], Any], document_key: str = "file_name"):
+        self.retriever_factory = retriever_factory
+        self.document_key = document_key
+        self._retrievers: Dict[int, Any] = {}
+
+    def retrieve(self, query: str, top_k: int) -> List[Chunk]:
+        if top_k not in self._retrievers:
+            self._retrievers[top_k] = self.retriever_factory(top_k)
+        nodes = self._retrievers[top_k].retrieve(query)
+        return [
+            Chunk(str(node.node.metadata.get(self.document_key, node.node.node_id)), node.node.get_content(),
+                  float(node.score or 0.0))
+            for node in nodes
+        ]
+
+
+class LlamaIndexAnswerer:
+    """Genera la risposta con un LLM LlamaIndex a partire dai contesti recuperati."""
+
+    PROMPT = (
+        "Rispondi alla domanda usando solo il contesto.\n\n"
+        "Contesto:\n{context}\n\nDomanda: {query}\nRisposta:"
+    )
+
+    def __init__(self, llm):
+        self.llm = llm
+
+    async def aanswer(self, query: str, contexts: List[str]) -> str:
+        response = await self.llm.acomplete(self.PROMPT.format(context="\n\n".join(contexts), query=query))
+        return str(response)
+
+
+class LlamaIndexEvaluatorJudge:
+    """Usa un evaluator LlamaIndex (Faithfulness, Relevancy, ContextRelevancy) come giudice."""
+
+    def __init__(self, evaluator):
+        self.evaluator = evaluator
+
+    async def ascore(self, query: str, answer: str, contexts: List[str]) -> Optional[float]:
+        result = await self.evaluator.aevaluate(query=query, response=answer, contexts=contexts)
+        return result.score
+
+
+# --- VALUTAZIONE ---
+
+def recall_at_k(retrieved_documents: Iterable[str], relevant_documents: Iterable[str]) -> float:
+    """Quota dei documenti rilevanti presenti tra i recuperati."""
+    relevant = set(relevant_documents)
+    if not relevant:
+        return 0.0
+    return len(relevant & set(retrieved_documents)) / len(relevant)
+
+
+def percentile(values: Sequence[float], q: float) -> float:
+    """Percentile con interpolazione lineare (come numpy.percentile)."""
+    return float(np.percentile(values, q)) if len(values) else 0.0
+
+
+async def evaluate_questions(questions: List[EvalQuestion], retriever, top_k: int, llm=None, judge=None,
+                             concurrency: int = DEFAULT_CONCURRENCY,
+                             extra_judges: Optional[Dict[str, Any]] = None) -> List[QuestionResult]:
+    """
+    Valuta le domande con al più `concurrency` valutazioni in corso.
+
+    Il retrieval (sincrono, spesso I/O verso embedding o vector store) gira
+    in un thread; generazione e giudizio sono coroutine. Un errore su una
+    domanda viene registrato nel suo risultato senza fermare le altre.
+    `extra_judges` (nome -> giudice) aggiunge punteggi in `scores`.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def evaluate(question: EvalQuestion) -> QuestionResult:
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                chunks = await asyncio.to_thread(retriever.retrieve, question.query, top_k)
+                retrieval_ms = (time.perf_counter() - start) * 1000
+                documents = list(dict.fromkeys(chunk.document_id for chunk in chunks))
+                contexts = [chunk.text for chunk in chunks]
+
+                answer, faithfulness, scores = "", None, {}
+                if llm is not None:
+                    answer = await llm.aanswer(question.query, contexts)
+                    if judge is not None:
+                        faithfulness = await judge.ascore(question.query, answer, contexts)
+                    for name, extra_judge in (extra_judges or {}).items():
+                        scores[name] = await extra_judge.ascore(question.query, answer, contexts)
+
+                return QuestionResult(
+                    query=question.query,
+                    retrieved_documents=documents,
+                    recall_at_k=recall_at_k(documents, question.relevant_documents),
+                    faithfulness=faithfulness,
+                    retrieval_latency_ms=retrieval_ms,
+                    total_latency_ms=(time.perf_counter() - start) * 1000,
+                    answer=answer,
+                    scores=scores
+                )
+            except Exception as e:
+                elapsed = (time.perf_counter() - start) * 1000
+                return QuestionResult(question.query, [], 0.0, None, elapsed, elapsed, error=str(e))
+
+    return list(await asyncio.gather(*(evaluate(question) for question in questions)))
+
+
+def summarize_results(results: List[QuestionResult]) -> Dict[str, Any]:
+    """Percentili di latenza, recall@k e faithfulness medi di una configurazione."""
+    latencies = [result.retrieval_latency_ms for result in results if result.error is None]
+    faithfulness = [result.faithfulness for result in results if result.faithfulness is not None]
+    summary = {
+        'questions': len(results),
+        'errors': sum(1 for result in results if result.error is not None),
+        'recall_at_k': sum(result.recall_at_k for result in results) / len(results) if results else 0.0,
+        'faithfulness': sum(faithfulness) / len(faithfulness) if faithfulness else None,
+        'latency_mean_ms': sum(latencies) / len(latencies) if latencies else 0.0,
+        'scores': {},
+    }
+    for q in LATENCY_PERCENTILES:
+        summary[f'latency_p{q}_ms'] = percentile(latencies, q)
+    for name in dict.fromkeys(name for result in results for name in result.scores):
+        values = [result.scores[name] for result in results if result.scores.get(name) is not None]
+        summary['scores'][name] = sum(values) / len(values) if values else None
+    return summary
+
+
+def dataset_fingerprint(documents: Dict[str, str], questions: List[EvalQuestion]) -> str:
+    """
+    Impronta del corpus di valutazione: i report sono confrontabili solo a parità di dataset.
+
+    Conta solo i documenti di riferimento delle domande: i documenti
+    aggiunti al resto dell'archivio non rendono incomparabili due report.
+    """
+    referenced = {document_id for question in questions for document_id in question.relevant_documents}
+    digest = hashlib.sha1()
+    for document_id in sorted(referenced & set(documents)):
+        digest.update(document_id.encode("utf-8"))
+        digest.update(hashlib.sha1((documents[document_id] or "").encode("utf-8")).digest())
+    for question in questions:
+        digest.update(json.dumps(asdict(question), sort_keys=True).encode("utf-8"))
+    return digest.hexdigest()
+
+
+async def run_benchmark(documents: Dict[str, str], questions: List[EvalQuestion],
+                        configs: List[RetrieverConfig], llm=None, judge=None,
+                        concurrency: int = DEFAULT_CONCURRENCY,
+                        retriever_factory: Optional[Callable[[RetrieverConfig], Any]] = None,
+                        extra_judges: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    Confronta le configurazioni di retriever sulle stesse domande.
+
+    Args:
+        documents: Testo per documento (usato dai retriever locali)
+        questions: Domande con documenti di riferimento
+        configs: Configurazioni da confrontare
+        llm: Generatore delle risposte (StubLLM offline); None salta la faithfulness
+        judge: Giudice di faithfulness
+        concurrency: Valutazioni contemporanee per configurazione
+        retriever_factory: Costruttore del retriever per configurazione
+            (default: retriever locali su `documents`)
+        extra_judges: Altri giudici per nome (es. answer/context relevancy)
+
+    Returns:
+        Report con riepilogo e risultati per domanda di ogni configurazione
+    """
+    factory = retriever_factory or (lambda config: build_local_retriever(documents, config))
+    configurations = {}
+    for config in configs:
+        build_start = time.perf_counter()
+        retriever = factory(config)
+        build_ms = (time.perf_counter() - build_start) * 1000
+
+        results = await evaluate_questions(questions, retriever, config.top_k, llm, judge, concurrency, extra_judges)
+        configurations[config.name] = {
+            'config': asdict(config),
+            'index_build_ms': build_ms,
+            'summary': summarize_results(results),
+            'questions': [asdict(result) for result in results]
+        }
+
+    return {
+        'schema_version': REPORT_SCHEMA_VERSION,
+        'created_at': datetime.now().isoformat(),
+        'dataset': {
+            'documents': len(documents),
+            'questions': len(questions),
+            'fingerprint': dataset_fingerprint(documents, questions)
+        },
+        'configurations': configurations
+    }
+
+
+# --- REPORT VERSIONATI ---
+
+def _report_versions(directory: str) -> List[int]:
+    versions = []
+    for path in glob.glob(os.path.join(directory, "rag_benchmark_v*.json")):
+        match = re.search(r"_v(\d+)\.json$", path)
+        if match:
+            versions.append(int(match.group(1)))
+    return sorted(versions)
+
+
+def write_report(report: Dict[str, Any], directory: str = REPORT_DIR) -> str:
+    """Salva il report con il numero di versione successivo e ne restituisce il percorso."""
+    os.makedirs(directory, exist_ok=True)
+    versions = _report_versions(directory)
+    version = (versions[-1] + 1) if versions else 1
+    report = dict(report, report_version=version)
+    path = os.path.join(directory, REPORT_PATTERN.format(version=version))
+    with open(path, "x", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    return path
+
+
+def load_latest_report(directory: str = REPORT_DIR) -> Optional[Dict[str, Any]]:
+    """Ultimo report salvato, o None."""
+    versions = _report_versions(directory)
+    if not versions:
+        return None
+    with open(os.path.join(directory, REPORT_PATTERN.format(version=versions[-1])), encoding="utf-8") as f:
+        return json.load(f)
+
+
+def find_regressions(baseline: Dict[str, Any], current: Dict[str, Any], recall_tolerance: float = 0.02,
+                     faithfulness_tolerance: float = 0.05, latency_tolerance: float = 0.5) -> List[str]:
+    """
+    Regressioni di `current` rispetto a `baseline`, configurazione per configurazione.
+
+    Recall, faithfulness e gli altri punteggi regrediscono se calano più
+    della tolleranza assoluta (quella della faithfulness per i punteggi);
+    la latenza p95 se cresce più della tolleranza relativa.
+    Report su dataset diversi non sono confrontabili.
+    """
+    if baseline.get('dataset', {}).get('fingerprint') != current.get('dataset', {}).get('fingerprint'):
+        return ["Dataset diverso dal report di riferimento: confronto non significativo"]
+
+    regressions = []
+    for name, entry in current.get('configurations', {}).items():
+        previous = baseline.get('configurations', {}).get(name)
+        if previous is None:
+            continue
+        old, new = previous['summary'], entry['summary']
+
+        if new['recall_at_k'] < old['recall_at_k'] - recall_tolerance:
+            regressions.append(f"{name}: recall@k {old['recall_at_k']:.3f} → {new['recall_at_k']:.3f}")
+        if old.get('faithfulness') is not None and new.get('faithfulness') is not None \
+                and new['faithfulness'] < old['faithfulness'] - faithfulness_tolerance:
+            regressions.append(f"{name}: faithfulness {old['faithfulness']:.3f} → {new['faithfulness']:.3f}")
+        for score, value in new.get('scores', {}).items():
+            previous_value = old.get('scores', {}).get(score)
+            if previous_value is not None and value is not None and value < previous_value - faithfulness_tolerance:
+                regressions.append(f"{name}: {score} {previous_value:.3f} → {value:.3f}")
+        if old['latency_p95_ms'] > 0 and new['latency_p95_ms'] > old['latency_p95_ms'] * (1 + latency_tolerance):
+            regressions.append(f"{name}: latenza p95 {old['latency_p95_ms']:.1f}ms → {new['latency_p95_ms']:.1f}ms")
+        if new['errors'] > old['errors']:
+            regressions.append(f"{name}: errori {old['errors']} → {new['errors']}")
+
+    return regressions
@@ -1,6 +1,7 @@
 from llama_index.core import VectorStoreIndex, Settings
-from llama_index.core.vector_stores import MetadataFilters, ExactMatchFilter
 from duckduckgo_search import DDGS
+from file_utils import db_connect
+from tools.document_summarizer import SummaryCache, summarize_indexed_document
 
 def web_search(query: str) -> str:
     """
@@ -33,23 +34,12 @@ def summarize_document(file_name: str, index: VectorStoreIndex) -> str:
     """
     print(f"--- Avvio riassunto per il file: {file_name} ---")
     try:
-        # Creiamo un retriever che filtra i nodi solo per il file specificato
-        retriever = index.as_retriever(
-            similarity_top_k=1000,  # Prendiamo un numero elevato di nodi
-            filters=MetadataFilters(filters=[ExactMatchFilter(key="file_name", value=file_name)])
-        )
-        
-        nodes = retriever.retrieve("contenuto completo del documento")
-        
-        if not nodes:
+        # Chunk letti per metadato e riassunti map-reduce, con cache dei passi intermedi
+        summary = summarize_indexed_document(index, file_name, Settings.llm, SummaryCache(db_connect))
+
+        if summary is None:
             return f"Non ho trovato il documento '{file_name}' nella base di conoscenza."
-            
-        full_text = "\n---\n".join([node.get_content() for node in nodes])
-        
-        summarization_prompt = f"Crea un riassunto dettagliato, completo e ben strutturato in italiano del seguente testo estratto dal documento '{file_name}':\n\n{full_text}"
-        
-        response = Settings.llm.complete(summarization_prompt)
-        
-        return response.text
+
+        return summary
     except Exception as e:
         return f"Si è verificato un errore durante la creazione del riassunto: {e}"
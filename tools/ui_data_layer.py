@@ -0,0 +1,357 @@
+# -*- coding: utf-8 -*-
+"""
+Livello di accesso ai dati per l'interfaccia Streamlit
+
+Le pagine leggono archivio, grafo della conoscenza e dashboard attraverso
+funzioni decorate con `versioned_data`. Invece di un TTL, ogni risultato è
+legato alla versione delle tabelle da cui dipende: la tabella
+`data_versions` tiene un contatore per (tabella, utente) che i trigger
+creati da `create_data_version_schema` incrementano a ogni scrittura.
+
+Un rerun della pagina costa quindi una lettura dei contatori; una
+scrittura invalida solo i risultati delle tabelle (e dell'utente) toccati.
+I risultati restano in cache già serializzati: i DataFrame in formato Arrow
+(o come array di colonne se pyarrow non è installato o non converte una
+colonna, es. object con tipi misti), le liste di dizionari per colonne. Ogni chiamata ricostruisce un oggetto nuovo, quindi le pagine
+possono modificarlo senza sporcare la cache.
+"""
+import inspect
+import logging
+import pickle
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+try:
+    import pyarrow as pa
+except ImportError:  # fallback: array di colonne serializzati con pickle
+    pa = None
+
+logger = logging.getLogger(__name__)
+
+# --- CONFIGURAZIONE ---
+UI_CACHE_MAX_BYTES = 256 * 1024 * 1024   # memoria massima dei risultati serializzati
+GLOBAL_SCOPE = 0                          # "utente" delle tabelle condivise (es. papers)
+
+# Tabelle versionate -> colonna dell'utente proprietario della riga (None = tabella condivisa)
+VERSIONED_TABLES = {
+    'papers': None,
+    'concept_entities': 'user_id',
+    'concept_relationships': 'user_id',
+    'user_activity': 'user_id',
+    'users': 'id',
+}
+
+DataDependency = Tuple[str, int]
+
+
+# --- VERSIONI DEI DATI ---
+
+def create_data_version_schema(cursor: sqlite3.Cursor) -> None:
+    """Crea `data_versions` e i trigger che ne incrementano i contatori (chiamata da setup_database)."""
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS data_versions (
+            table_name TEXT NOT NULL,
+            user_id INTEGER NOT NULL,
+            version INTEGER NOT NULL,
+            PRIMARY KEY (table_name, user_id)
+        ) WITHOUT ROWID
+    """)
+    for table, owner in VERSIONED_TABLES.items():
+        for event, rows in (("INSERT", ("NEW",)), ("UPDATE", ("OLD", "NEW")), ("DELETE", ("OLD",))):
+            # Un UPDATE che cambia proprietario invalida entrambi gli utenti
+            bumps = "".join(f"""
+                INSERT INTO data_versions (table_name, user_id, version)
+                VALUES ('{table}', {f'{row}.{owner}' if owner else GLOBAL_SCOPE}, 1)
+                ON CONFLICT (table_name, user_id) DO UPDATE SET version = version + 1;"""
+                for row in (rows if owner else rows[-1:]))
+            cursor.execute(f"""
+                CREATE TRIGGER IF NOT EXISTS trg_{table}_{event.lower()}_data_version
+                AFTER {event} ON {table}
+                BEGIN{bumps}
+                END
+            """)
+
+
+def dependencies_for(tables: Iterable[str], user_id: Optional[int] = None) -> List[DataDependency]:
+    """Coppie (tabella, utente) di cui leggere la versione; le tabelle condivise usano GLOBAL_SCOPE."""
+    dependencies = []
+    for table in tables:
+        if table not in VERSIONED_TABLES:
+            raise ValueError(f"Tabella non versionata: {table}")
+        owned = VERSIONED_TABLES[table] is not None
+        dependencies.append((table, int(user_id) if owned and user_id is not None else GLOBAL_SCOPE))
+    return dependencies
+
+
+def get_data_versions(conn: sqlite3.Connection, dependencies: List[DataDependency]) -> Optional[Tuple[int, ...]]:
+    """Versioni correnti delle dipendenze (0 se mai scritte), o None se `data_versions` non esiste ancora."""
+    if not dependencies:
+        return ()
+    where = " OR ".join("(table_name = ? AND user_id = ?)" for _ in dependencies)
+    params = [value for dependency in dependencies for value in dependency]
+    try:
+        rows = conn.execute(f"SELECT table_name, user_id, version FROM data_versions WHERE {where}", params).fetchall()
+    except sqlite3.OperationalError:
+        return None
+    versions = {(row[0], row[1]): row[2] for row in rows}
+    return tuple(versions.get(dependency, 0) for dependency in dependencies)
+
+
+def bump_data_version(conn: sqlite3.Connection, table: str, user_id: Optional[int] = None) -> None:
+    """Incrementa a mano una versione, per le modifiche che non passano dai trigger (es. file su disco)."""
+    (dependency,) = dependencies_for([table], user_id)
+    conn.execute("""
+        INSERT INTO data_versions (table_name, user_id, version) VALUES (?, ?, 1)
+        ON CONFLICT (table_name, user_id) DO UPDATE SET version = version + 1
+    """, dependency)
+    conn.commit()
+
+
+# --- SERIALIZZAZIONE COMPATTA ---
+
+class _Packed:
+    """Valore già convertito in forma compatta: 'arrow', 'columns' (DataFrame) o 'records'."""
+    __slots__ = ('kind', 'data')
+
+    def __init__(self, kind: str, data: Any):
+        self.kind = kind
+        self.data = data
+
+    def __getstate__(self):
+        return self.kind, self.data
+
+    def __setstate__(self, state):
+        self.kind, self.data = state
+
+
+def _is_dataframe(value: Any) -> bool:
+    return type(value).__name__ == 'DataFrame' and hasattr(value, 'columns') and hasattr(value, 'dtypes')
+
+
+def _pack_frame(df) -> _Packed:
+    if pa is not None:
+        try:
+            table = pa.Table.from_pandas(df, preserve_index=True)
+            sink = pa.BufferOutputStream()
+            with pa.ipc.new_stream(sink, table.schema) as writer:
+                writer.write_table(table)
+            return _Packed('arrow', sink.getvalue().to_pybytes())
+        except (pa.ArrowException, TypeError, ValueError):
+            # Colonne object con tipi misti (es. anno int e str): Arrow non le converte
+            pass
+    return _Packed('columns', {
+        'columns': list(df.columns),
+        'arrays': [df[column].to_numpy() for column in df.columns] if df.columns.is_unique
+        else [df.iloc[:, i].to_numpy() for i in range(df.shape[1])],
+        'index': df.index,
+    })
+
+
+def _unpack_frame(packed: _Packed):
+    import pandas as pd  # differito: pandas non serve al primo rendering
+    if packed.kind == 'arrow':
+        return pa.ipc.open_stream(packed.data).read_all().to_pandas()
+    data = packed.data
+    df = pd.DataFrame(dict(enumerate(data['arrays'])), index=data['index'], copy=False)
+    df.columns = data['columns']
+    return df
+
+
+def _pack(value: Any) -> Any:
+    """Converte DataFrame e liste di dizionari omogenei in forma colonnare, ricorsivamente."""
+    if _is_dataframe(value):
+        return _pack_frame(value)
+    if isinstance(value, dict):
+        return {key: _pack(item) for key, item in value.items()}
+    if isinstance(value, list) and value and all(type(item) is dict for item in value):
+        keys = list(value[0])
+        if all(list(item) == keys for item in value):
+            return _Packed('records', (keys, [[item[key] for item in value] for key in keys]))
+    return value
+
+
+def _unpack(value: Any) -> Any:
+    if isinstance(value, _Packed):
+        if value.kind == 'records':
+            keys, columns = value.data
+            return [dict(zip(keys, row)) for row in zip(*columns)]
+        return _unpack_frame(value)
+    if isinstance(value, dict):
+        return {key: _unpack(item) for key, item in value.items()}
+    return value
+
+
+def serialize(value: Any) -> bytes:
+    """Forma serializzata salvata in cache."""
+    return pickle.dumps(_pack(value), protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def deserialize(payload: bytes) -> Any:
+    """Oggetto nuovo ricostruito da `serialize`."""
+    return _unpack(pickle.loads(payload))
+
+
+# --- CACHE PER VERSIONE ---
+
+class _Entry:
+    __slots__ = ('source', 'dependencies', 'versions', 'payload', 'created_at', 'max_age')
+
+    def __init__(self, source, dependencies, versions, payload, created_at, max_age):
+        self.source = source
+        self.dependencies = dependencies
+        self.versions = versions
+        self.payload = payload
+        self.created_at = created_at
+        self.max_age = max_age
+
+
+class VersionedDataCache:
+    """
+    Risultati serializzati in cache finché le versioni delle loro tabelle non cambiano.
+
+    La memoria è limitata da `max_bytes` (LRU sui payload). `max_age_seconds`
+    serve solo ai risultati che dipendono anche dall'ora corrente
+    (es. "attività degli ultimi 7 giorni").
+    """
+
+    def __init__(self, max_bytes: int = UI_CACHE_MAX_BYTES, clock: Callable[[], float] = time.monotonic):
+        self.max_bytes = max_bytes
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Tuple, _Entry]" = OrderedDict()
+        self._bytes = 0
+        self._sources: Dict[str, Dict[str, int]] = {}
+
+    def _count(self, source: str, metric: str, amount: int = 1) -> None:
+        counters = self._sources.setdefault(source, {'hits': 0, 'misses': 0, 'invalidations': 0, 'uncached': 0})
+        counters[metric] += amount
+
+    def get(self, connect: Callable[[], sqlite3.Connection], source: str, params: Tuple,
+            dependencies: List[DataDependency], loader: Callable[[], Any],
+            max_age_seconds: Optional[float] = None) -> Any:
+        """Risultato di `loader()` per `source`/`params`, ricalcolato solo se una dipendenza è cambiata."""
+        conn = connect()
+        try:
+            versions = get_data_versions(conn, dependencies)
+        finally:
+            conn.close()
+
+        key = (source, params)
+        payload = None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                fresh = entry.max_age is None or self._clock() - entry.created_at < entry.max_age
+                if versions is not None and entry.versions == versions and fresh:
+                    self._entries.move_to_end(key)
+                    payload = entry.payload
+                    self._count(source, 'hits')
+                else:
+                    self._remove(key)
+                    self._count(source, 'invalidations')
+            if payload is None:
+                self._count(source, 'misses')
+        if payload is not None:
+            return deserialize(payload)
+
+        value = loader()
+        try:
+            payload = serialize(value)
+        except Exception as e:
+            # Un risultato non serializzabile viene restituito lo stesso, senza cache
+            logger.warning(f"Risultato di {source} non salvato in cache: {e}")
+            with self._lock:
+                self._count(source, 'uncached')
+            return value
+        if versions is not None:  # senza contatori non si può sapere quando il risultato scade
+            self._store(key, _Entry(source, tuple(dependencies), versions, payload, self._clock(), max_age_seconds))
+        # L'oggetto restituito non è quello in cache: il chiamante può modificarlo
+        return value
+
+    def _store(self, key: Tuple, entry: _Entry) -> None:
+        if len(entry.payload) > self.max_bytes:
+            return
+        with self._lock:
+            self._remove(key)
+            self._entries[key] = entry
+            self._bytes += len(entry.payload)
+            while self._bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+
+    def _remove(self, key: Tuple) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= len(entry.payload)
+
+    def invalidate(self, table: Optional[str] = None, user_id: Optional[int] = None,
+                   source: Optional[str] = None) -> int:
+        """
+        Scarta i risultati che dipendono da `table` (per `user_id`, se indicato)
+        o prodotti da `source`; senza argomenti svuota la cache. Restituisce il numero di voci rimosse.
+        """
+        with self._lock:
+            keys = [
+                key for key, entry in self._entries.items()
+                if (source is None or entry.source == source)
+                and (table is None or any(
+                    dep_table == table and (user_id is None or dep_user in (user_id, GLOBAL_SCOPE))
+                    for dep_table, dep_user in entry.dependencies))
+            ]
+            for key in keys:
+                self._count(key[0], 'invalidations')
+                self._remove(key)
+            return len(keys)
+
+    def clear(self) -> int:
+        return self.invalidate()
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'format': 'arrow' if pa is not None else 'columns',
+                'sources': {name: dict(counters) for name, counters in self._sources.items()},
+            }
+
+
+def versioned_data(connect: Callable[[], sqlite3.Connection], tables: Iterable[str],
+                   max_age_seconds: Optional[float] = None, cache: Optional[VersionedDataCache] = None):
+    """
+    Decoratore al posto di `st.cache_data(ttl=...)`: il risultato dipende dalle
+    versioni di `tables`. Per le tabelle per utente la versione letta è quella
+    dell'argomento `user_id` della funzione. Espone `.clear()` come st.cache_data.
+    """
+    tables = tuple(tables)
+
+    def decorator(func):
+        source = f"{func.__module__}.{func.__qualname__}"
+        signature = inspect.signature(func)
+
+        def target_cache() -> VersionedDataCache:
+            return cache if cache is not None else ui_data_cache
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            params = tuple(bound.arguments.items())
+            dependencies = dependencies_for(tables, bound.arguments.get('user_id'))
+            return target_cache().get(connect, source, params, dependencies,
+                                      lambda: func(*args, **kwargs), max_age_seconds)
+
+        wrapper.clear = lambda: target_cache().invalidate(source=source)
+        wrapper.data_source = source
+        return wrapper
+
+    return decorator
+
+
+# --- ISTANZA GLOBALE ---
+ui_data_cache = VersionedDataCache()